@@ -0,0 +1,754 @@
+"""
+Azure Front Door 异步缓存清除引擎
+
+基于 azure.mgmt.cdn.aio 与 azure.identity.aio 实现。所有清除操作运行在同一个
+事件循环上，并共享同一个 HTTP 会话，因此可以同时保持数百个清除操作在途，
+而不需要为每个 endpoint 占用一个线程。
+"""
+
+import asyncio
+import dataclasses
+import functools
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from azure_clients import create_credential, create_cdn_client, create_aio_transport
+from instrumentation import Instrumentation, PHASE_AUTH
+from endpoint_inventory import EndpointInventory, EndpointInfo, make_inventory_key
+from path_planner import plan_purge_units, DEFAULT_MAX_PATHS_PER_REQUEST
+from purge_journal import PurgeJournal, make_unit_key, DEFAULT_IDEMPOTENCY_WINDOW
+from purge_coordination import PurgeCoordinator, CoordinationSession, CLAIM_FRESH, CLAIM_ATTACHED
+from purge_plan import PurgePlan, LroHistory, DEFAULT_HISTORY_LIMIT
+from purge_models import PurgeUnit, PurgeOutcome, UnitResult, PurgeJob, JobResult
+from rate_control import RateController
+from route_index import RouteIndex, load_cached_index, save_cached_index
+from retry_policy import RetryPolicy, CircuitBreaker
+from purge_scheduler import (
+    PurgeScheduler, DEFAULT_POLL_INTERVAL, DEFAULT_POLL_BACKOFF, DEFAULT_MAX_POLL_INTERVAL
+)
+
+if TYPE_CHECKING:
+    from azure.mgmt.cdn.aio import CdnManagementClient
+
+
+# 默认最大并发清除数
+DEFAULT_MAX_CONCURRENCY = 100
+
+# ARM 访问令牌的 scope
+ARM_SCOPE = 'https://management.azure.com/.default'
+
+
+class AsyncAzureFrontDoorPurgeClient:
+    """Azure Front Door 异步缓存清除客户端"""
+
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str,
+                 subscription_id: str, resource_group_name: str, front_door_name: str,
+                 log: Optional[Callable[[str], None]] = None,
+                 max_connections: int = DEFAULT_MAX_CONCURRENCY,
+                 rate_controller: Optional[RateController] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 journal: Optional[PurgeJournal] = None,
+                 idempotency_window: float = DEFAULT_IDEMPOTENCY_WINDOW,
+                 inventory: Optional[EndpointInventory] = None,
+                 cdn_client: Optional["CdnManagementClient"] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 coordinator: Optional[PurgeCoordinator] = None):
+        """
+        初始化客户端
+
+        Args:
+            tenant_id: Azure AD 租户 ID
+            client_id: 服务主体客户端 ID
+            client_secret: 服务主体客户端密钥
+            subscription_id: Azure 订阅 ID
+            resource_group_name: 资源组名称
+            front_door_name: Front Door 名称
+            log: 输出函数，默认为 print
+            max_connections: 共享 HTTP 会话的最大连接数
+            rate_controller: 共享的 ARM 速率控制器，为 None 时新建
+            retry_policy: 清除提交与轮询的重试策略，为 None 时使用默认策略
+            journal: 清除任务日志，为 None 时不记录
+            idempotency_window: 幂等窗口（秒），窗口期内已成功的相同单元不再提交
+            inventory: endpoint 清单缓存，为 None 时新建
+            cdn_client: 共享的 CDN 管理客户端（多 profile 清除时同一订阅共用），
+                由调用方负责关闭；为 None 时在 open 中自行创建
+            instrumentation: 埋点记录器（各阶段 span 与计数器），为 None 时不记录
+            coordinator: 跨进程清除协调表，提交前跳过或等待其他进程相同的清除；为 None 时不去重
+        """
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.subscription_id = subscription_id
+        self.resource_group_name = resource_group_name
+        self.front_door_name = front_door_name
+        self.log = log or print
+        self.max_connections = max_connections
+
+        # 本客户端的所有清除调用共享同一个速率控制器
+        self.rate_controller = rate_controller or RateController(max_concurrency=max_connections)
+        self.retry_policy = retry_policy or RetryPolicy()
+        # 熔断器在多次 purge_many 调用之间保持状态
+        self.circuit_breaker = CircuitBreaker()
+
+        self.journal = journal
+        self.idempotency_window = idempotency_window
+        self.coordinator = coordinator
+        self.job_id: Optional[str] = None
+        self.inventory = inventory or EndpointInventory()
+        self._route_index: Optional[RouteIndex] = None
+        self.instrumentation = (instrumentation or Instrumentation()).bind(profile=front_door_name)
+
+        # 在进入异步上下文时创建；使用共享客户端时不创建也不关闭
+        self.session = None
+        self.credential = None
+        self.cdn_client = cdn_client
+        self._owns_cdn_client = cdn_client is None
+
+    async def __aenter__(self) -> "AsyncAzureFrontDoorPurgeClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self):
+        """创建共享的 HTTP 会话、认证凭据和 CDN 管理客户端"""
+        if self.cdn_client is not None:
+            return
+
+        # Azure SDK 和 aiohttp 只在第一次真正访问 ARM 时导入
+        import aiohttp
+
+        # 认证和 ARM 调用共用同一个 HTTP 会话（连接池）
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections)
+        )
+
+        self.credential = create_credential(
+            self.tenant_id, self.client_id, self.client_secret, aio=True,
+            transport=create_aio_transport(self.session)
+        )
+
+        self.cdn_client = create_cdn_client(
+            self.credential, self.subscription_id, aio=True,
+            transport=create_aio_transport(self.session)
+        )
+        await self.authenticate()
+
+    async def authenticate(self):
+        """
+        预先获取 ARM 访问令牌，把认证耗时单独记录为 auth 阶段
+
+        令牌由凭据缓存，之后的 ARM 调用直接复用；使用共享客户端时由 ClientPool 负责。
+        """
+        if self.credential is None:
+            return
+        try:
+            with self.instrumentation.span(PHASE_AUTH):
+                await self.credential.get_token(ARM_SCOPE)
+        except Exception as e:
+            # 认证错误会在第一次 ARM 调用时按原有流程报告
+            self.log(f"⚠️  获取访问令牌失败: {str(e)}")
+
+    async def close(self):
+        """关闭客户端并释放 HTTP 会话"""
+        if not self._owns_cdn_client:
+            return
+        if self.cdn_client is not None:
+            await self.cdn_client.close()
+            self.cdn_client = None
+        if self.credential is not None:
+            await self.credential.close()
+            self.credential = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_endpoints(self, refresh: bool = False) -> List[EndpointInfo]:
+        """
+        获取 profile 下的所有 endpoints（优先使用 endpoint 清单缓存）
+
+        Args:
+            refresh: 是否忽略缓存，重新从 ARM 拉取
+
+        Returns:
+            List[EndpointInfo]: endpoint 清单
+        """
+        await self.open()
+
+        async def fetch():
+            return [endpoint async for endpoint in self.cdn_client.afd_endpoints.list_by_profile(
+                resource_group_name=self.resource_group_name,
+                profile_name=self.front_door_name
+            )]
+
+        key = make_inventory_key(self.subscription_id, self.resource_group_name, self.front_door_name)
+        return await self.inventory.aget(key, fetch, refresh=refresh)
+
+    async def get_route_index(self, refresh: bool = False) -> RouteIndex:
+        """
+        获取 profile 的路由 / 域名索引（构建一次后缓存在内存和磁盘）
+
+        Args:
+            refresh: 是否忽略缓存，重新从 ARM 拉取路由和自定义域名
+
+        Returns:
+            RouteIndex: 路由索引
+        """
+        key = make_inventory_key(self.subscription_id, self.resource_group_name, self.front_door_name)
+        if not refresh:
+            if self._route_index is not None:
+                return self._route_index
+            cached = load_cached_index(key, self.inventory.ttl)
+            if cached is not None:
+                self._route_index = cached
+                return cached
+
+        endpoints = await self.get_endpoints(refresh=refresh)
+
+        async def list_routes(endpoint_name: str):
+            return endpoint_name, [route async for route in self.cdn_client.routes.list_by_endpoint(
+                resource_group_name=self.resource_group_name,
+                profile_name=self.front_door_name,
+                endpoint_name=endpoint_name
+            )]
+
+        routes_by_endpoint = dict(await asyncio.gather(*(list_routes(e.name) for e in endpoints)))
+        custom_domains = [domain async for domain in self.cdn_client.afd_custom_domains.list_by_profile(
+            resource_group_name=self.resource_group_name,
+            profile_name=self.front_door_name
+        )]
+
+        self._route_index = RouteIndex.from_models(endpoints, routes_by_endpoint, custom_domains)
+        save_cached_index(key, self._route_index)
+        return self._route_index
+
+    async def purge_many(self, endpoint_names: List[str], paths: List[str],
+                         max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                         route_aware: bool = False,
+                         domains: Optional[List[str]] = None,
+                         **kwargs) -> Dict[str, PurgeOutcome]:
+        """
+        并发清除多个 endpoints 的缓存
+
+        路径先经过规范化并按请求上限拆分为清除单元，再交给 purge_units 执行。
+
+        Args:
+            endpoint_names: 要清除的 endpoint 名称列表
+            paths: 要清除的路径列表
+            max_paths_per_request: 单次清除请求的最大路径数
+            route_aware: 是否按路由索引只向实际提供路径的 endpoints 发送清除，并填写 domains
+            domains: 只清除这些域名下的缓存，指定时覆盖路由索引给出的 domains
+            **kwargs: 传给 purge_units 的调度参数
+
+        Returns:
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射（所有路径块都成功才算成功）
+        """
+        units = await self.plan_units(endpoint_names, paths, max_paths_per_request, route_aware, domains)
+        results = await self.purge_units(units, **kwargs)
+        self.fill_skipped_endpoints(endpoint_names, results)
+        return results
+
+    async def plan_units(self, endpoint_names: List[str], paths: List[str],
+                         max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                         route_aware: bool = False,
+                         domains: Optional[List[str]] = None) -> List[PurgeUnit]:
+        """
+        生成清除单元（参数见 purge_many）
+
+        Returns:
+            List[PurgeUnit]: 清除单元列表
+        """
+        route_index = await self._get_route_index_or_none() if route_aware else None
+        units = plan_purge_units(endpoint_names, paths, max_paths_per_request, route_index)
+        if domains:
+            units = [dataclasses.replace(unit, domains=tuple(domains)) for unit in units]
+        return units
+
+    def fill_skipped_endpoints(self, endpoint_names: List[str], results: Dict[str, PurgeOutcome]):
+        """为没有生成任何清除单元的 endpoints 补上（成功的）空结果"""
+        # 没有路由提供任何清除路径的 endpoints 无需清除
+        for endpoint_name in endpoint_names:
+            if endpoint_name not in results:
+                self.log(f"⏭️  Endpoint '{endpoint_name}' 的路由不包含任何清除路径，已跳过")
+                results[endpoint_name] = PurgeOutcome(endpoint_name)
+
+    async def plan(self, endpoint_names: List[str], paths: List[str],
+                   max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                   route_aware: bool = False,
+                   domains: Optional[List[str]] = None,
+                   **kwargs) -> PurgePlan:
+        """
+        生成清除计划（dry run）：解析路由并拆分清除单元，估计 ARM 调用次数和耗时，但不提交任何清除
+
+        Args:
+            endpoint_names: 要清除的 endpoint 名称列表
+            paths: 要清除的路径列表
+            max_paths_per_request: 单次清除请求的最大路径数
+            route_aware: 是否按路由索引只向实际提供路径的 endpoints 发送清除
+            domains: 只清除这些域名下的缓存
+            **kwargs: 与 purge_units 相同的调度参数（max_concurrency、poll_interval 等）
+
+        Returns:
+            PurgePlan: 清除计划
+        """
+        units = await self.plan_units(endpoint_names, paths, max_paths_per_request, route_aware, domains)
+        return self.build_plan(endpoint_names, units, max_paths_per_request, **kwargs)
+
+    async def plan_resume(self, job_id: str, **kwargs) -> PurgePlan:
+        """
+        生成恢复任务的清除计划（只包含未完成的清除单元）
+
+        Args:
+            job_id: 任务 ID
+            **kwargs: 与 purge_units 相同的调度参数
+
+        Returns:
+            PurgePlan: 清除计划
+        """
+        units = self._load_incomplete_units(job_id)
+        endpoint_names = list(dict.fromkeys(unit.endpoint_name for unit in units))
+        max_paths = max((len(unit.paths) for unit in units), default=0)
+        return self.build_plan(endpoint_names, units, max_paths, **kwargs)
+
+    def build_plan(self, endpoint_names: List[str], units: List[PurgeUnit], max_paths_per_request: int,
+                   max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                   poll_interval: float = DEFAULT_POLL_INTERVAL,
+                   poll_backoff: float = DEFAULT_POLL_BACKOFF,
+                   max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL) -> PurgePlan:
+        """按当前速率控制器、幂等窗口和任务日志中的 LRO 历史为清除单元生成计划"""
+        recent = []
+        samples = []
+        if self.journal is not None:
+            # 与 _skip_recent_units 一致：幂等窗口内已成功的相同单元不会再提交
+            remaining = []
+            for unit in units:
+                if self.journal.recently_succeeded(self._unit_key(unit), self.idempotency_window):
+                    recent.append(unit)
+                else:
+                    remaining.append(unit)
+            units = remaining
+            samples = self.journal.recent_lro_samples(
+                self.subscription_id, self.resource_group_name, self.front_door_name, DEFAULT_HISTORY_LIMIT
+            )
+
+        bucket = self.rate_controller.bucket
+        return PurgePlan(
+            profile=self.front_door_name,
+            endpoint_names=list(endpoint_names),
+            units=units,
+            recent_units=recent,
+            max_paths_per_request=max_paths_per_request,
+            max_concurrency=max_concurrency,
+            rate=bucket.rate,
+            burst=bucket.capacity,
+            poll_interval=poll_interval,
+            poll_backoff=poll_backoff,
+            max_poll_interval=max_poll_interval,
+            history=LroHistory.from_samples(samples)
+        )
+
+    async def _get_route_index_or_none(self) -> Optional[RouteIndex]:
+        """获取路由索引，失败时返回 None（退回到清除所有 endpoints）"""
+        try:
+            return await self.get_route_index()
+        except Exception as e:
+            self.log(f"⚠️  构建路由索引失败，将清除所有 endpoints: {str(e)}")
+            return None
+
+    async def purge_jobs(self, jobs: AsyncIterable[PurgeJob],
+                         max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                         route_aware: bool = False,
+                         max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                         poll_interval: float = DEFAULT_POLL_INTERVAL,
+                         poll_backoff: float = DEFAULT_POLL_BACKOFF,
+                         max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL) -> AsyncIterator[JobResult]:
+        """
+        流式执行批量清除任务
+
+        任务到达后立即拆分为清除单元并加入同一个调度器，不必等待全部任务读取完毕；
+        每个任务的所有单元完成后立即产出该任务的结果。所有任务记录在同一个任务日志中。
+
+        Args:
+            jobs: 清除任务的异步迭代器
+            max_paths_per_request: 单次清除请求的最大路径数
+            route_aware: 是否按路由索引只向实际提供路径的 endpoints 发送清除
+            max_concurrency: 同时进行的最大提交请求数
+            poll_interval: 首次轮询间隔（秒）
+            poll_backoff: 每轮轮询后间隔的放大倍数
+            max_poll_interval: 轮询间隔上限（秒）
+
+        Yields:
+            JobResult: 按完成顺序产出的任务结果
+        """
+        await self.open()
+        route_index = await self._get_route_index_or_none() if route_aware else None
+
+        job_id = None
+        if self.journal is not None:
+            job_id = self.journal.create_job(
+                self.subscription_id, self.resource_group_name, self.front_door_name, []
+            )
+            self.job_id = job_id
+            self.log(f"🧾 清除任务 ID: {job_id}")
+
+        scheduler = self._create_scheduler(job_id, max_concurrency, poll_interval, poll_backoff, max_poll_interval)
+
+        # 以下协程只在 async with self._coordination() 内运行，使用其中的 session
+        # 已完成的任务结果；None 表示全部任务结束
+        finished: asyncio.Queue = asyncio.Queue()
+        # 清除单元（按对象标识）所属的任务，以及每个任务尚未完成的单元数
+        owners: Dict[int, JobResult] = {}
+        remaining: Dict[int, int] = {}
+        # 待提交的单元；None 表示一个来源（读取任务，或等待其他进程的清除）结束
+        ready: asyncio.Queue = asyncio.Queue()
+        sources = 1
+        background: List[asyncio.Task] = []
+
+        def finish_unit(job_result: JobResult):
+            remaining[id(job_result)] -= 1
+            if not remaining[id(job_result)]:
+                del remaining[id(job_result)]
+                finished.put_nowait(job_result)
+
+        async def wait_attached(units: List[PurgeUnit], job_result: JobResult, arrived_at: float):
+            try:
+                async for unit in self._wait_attached(session, units, job_result.outcomes, job_id,
+                                                      lambda skipped: finish_unit(job_result), arrived_at):
+                    ready.put_nowait(unit)
+            finally:
+                ready.put_nowait(None)
+
+        async def read_jobs():
+            nonlocal sources
+            try:
+                async for job in jobs:
+                    # 只沿用任务到达之后才开始的其他进程的清除
+                    arrived_at = time.time()
+                    try:
+                        endpoint_names = list(job.endpoint_names) or [e.name for e in await self.get_endpoints()]
+                        units = plan_purge_units(endpoint_names, job.paths, max_paths_per_request, route_index)
+                    except Exception as e:
+                        finished.put_nowait(JobResult(job.job_id, error=str(e)))
+                        continue
+                    if job.domains:
+                        units = [dataclasses.replace(unit, domains=job.domains) for unit in units]
+
+                    job_result = JobResult(job.job_id, {name: PurgeOutcome(name) for name in endpoint_names})
+                    if self.journal is not None:
+                        self.journal.add_units(
+                            job_id, self.subscription_id, self.resource_group_name, self.front_door_name, units
+                        )
+                        units = self._skip_recent_units(units, job_result.outcomes, job_id)
+                    attached: List[PurgeUnit] = []
+                    if session is not None:
+                        units, attached = self._claim_units(session, units, job_result.outcomes, job_id,
+                                                            not_before=arrived_at)
+
+                    if not units and not attached:
+                        finished.put_nowait(job_result)
+                        continue
+                    remaining[id(job_result)] = len(units) + len(attached)
+                    for unit in units + attached:
+                        owners[id(unit)] = job_result
+                    if attached:
+                        sources += 1
+                        background.append(asyncio.create_task(wait_attached(attached, job_result, arrived_at)))
+                    for unit in units:
+                        ready.put_nowait(unit)
+            except Exception as e:
+                ready.put_nowait(e)
+            finally:
+                ready.put_nowait(None)
+
+        async def feed_units():
+            nonlocal sources
+            background.append(asyncio.create_task(read_jobs()))
+            while sources:
+                item = await ready.get()
+                if item is None:
+                    sources -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+
+        async def collect():
+            try:
+                async for unit_result in scheduler.run_stream(feed_units()):
+                    job_result = owners.pop(id(unit_result.unit))
+                    job_result.outcomes[unit_result.unit.endpoint_name].add(unit_result)
+                    self._record_result(session, job_id, unit_result)
+                    finish_unit(job_result)
+            except Exception as e:
+                finished.put_nowait(e)
+            finally:
+                finished.put_nowait(None)
+
+        async with self._coordination() as session:
+            collector = asyncio.create_task(collect())
+            try:
+                while True:
+                    item = await finished.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                collector.cancel()
+                for task in background:
+                    task.cancel()
+                await asyncio.gather(collector, *background, return_exceptions=True)
+
+    async def resume(self, job_id: str, **kwargs) -> Dict[str, PurgeOutcome]:
+        """
+        恢复任务：只重新提交任务中尚未成功完成的清除单元
+
+        Args:
+            job_id: 任务 ID
+            **kwargs: 传给 purge_units 的调度参数
+
+        Returns:
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射
+        """
+        units = self._load_incomplete_units(job_id)
+        self.log(f"🧾 恢复任务 {job_id}: {len(units)} 个未完成的清除单元")
+        return await self.purge_units(units, job_id=job_id, **kwargs)
+
+    def _load_incomplete_units(self, job_id: str) -> List[PurgeUnit]:
+        """
+        读取任务中尚未成功完成的清除单元
+
+        Raises:
+            ValueError: 未启用任务日志、任务不存在或属于其他 Front Door
+        """
+        if self.journal is None:
+            raise ValueError("未启用清除任务日志，无法恢复任务")
+
+        job = self.journal.get_job(job_id)
+        if job is None:
+            raise ValueError(f"未找到清除任务: {job_id}")
+        if (job['subscription_id'], job['resource_group'], job['profile']) != (
+                self.subscription_id, self.resource_group_name, self.front_door_name):
+            raise ValueError(f"任务 {job_id} 属于 Front Door '{job['profile']}'，与当前配置不一致")
+
+        return self.journal.incomplete_units(job_id)
+
+    async def purge_units(self, units: List[PurgeUnit], job_id: Optional[str] = None,
+                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                          poll_interval: float = DEFAULT_POLL_INTERVAL,
+                          poll_backoff: float = DEFAULT_POLL_BACKOFF,
+                          max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                          on_result: Optional[Callable[[UnitResult], None]] = None) -> Dict[str, PurgeOutcome]:
+        """
+        执行清除单元
+
+        所有单元先全部提交，再在单个循环中轮询全部 LRO，每个单元完成时立即输出结果。
+        启用任务日志时，每个单元的提交和完成都会写入日志，幂等窗口内已成功的相同单元直接跳过。
+        启用跨进程协调时，已被其他进程清除的单元跳过，正被其他进程清除的单元等待其完成后沿用结果。
+
+        Args:
+            units: 清除单元列表
+            job_id: 已有任务 ID（恢复任务时使用），为 None 时新建任务
+            max_concurrency: 本次调用同时进行的最大提交请求数（不超过共享速率控制器的并发上限）
+            poll_interval: 首次轮询间隔（秒）
+            poll_backoff: 每轮轮询后间隔的放大倍数
+            max_poll_interval: 轮询间隔上限（秒）
+            on_result: 每个单元完成时的回调（跳过或沿用其他进程结果的单元也会回调，attempts 为 0）
+
+        Returns:
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射
+        """
+        await self.open()
+
+        results = {unit.endpoint_name: PurgeOutcome(unit.endpoint_name) for unit in units}
+
+        if self.journal is not None:
+            if job_id is None:
+                job_id = self.journal.create_job(
+                    self.subscription_id, self.resource_group_name, self.front_door_name, units
+                )
+                self.log(f"🧾 清除任务 ID: {job_id}")
+            self.job_id = job_id
+            units = self._skip_recent_units(units, results, job_id, on_result)
+
+        scheduler = self._create_scheduler(job_id, max_concurrency, poll_interval, poll_backoff, max_poll_interval)
+        completed = 0
+
+        async with self._coordination() as session:
+            attached: List[PurgeUnit] = []
+            if session is not None:
+                units, attached = self._claim_units(session, units, results, job_id, on_result)
+            total = len(units)
+
+            async def feed_units():
+                nonlocal total
+                for unit in units:
+                    yield unit
+                async for unit in self._wait_attached(session, attached, results, job_id, on_result):
+                    total += 1
+                    yield unit
+
+            # 按完成顺序收集结果
+            async for unit_result in scheduler.run_stream(feed_units()) if attached else scheduler.run(units):
+                endpoint_name = unit_result.unit.endpoint_name
+                path_count = len(unit_result.unit.paths)
+                completed += 1
+                results[endpoint_name].add(unit_result)
+                self._record_result(session, job_id, unit_result)
+                if on_result is not None:
+                    on_result(unit_result)
+
+                if unit_result.success:
+                    self.log(f"✅ [{completed}/{total}] Endpoint '{endpoint_name}' 缓存清除成功 ({path_count} 个路径)")
+                    self.log(f"   ⏰ 完成时间: {time.strftime('%Y-%m-%d %H:%M:%S')} "
+                             f"(耗时 {unit_result.elapsed:.1f}s, 尝试 {unit_result.attempts} 次)")
+                else:
+                    self.log(f"❌ [{completed}/{total}] Endpoint '{endpoint_name}' 缓存清除失败 ({path_count} 个路径, "
+                             f"尝试 {unit_result.attempts} 次): {unit_result.error}")
+
+        if scheduler.retried:
+            self.log(f"🔄 自动重试 {scheduler.retried} 次")
+        if scheduler.throttled:
+            self.log(f"🐢 ARM 限流 {scheduler.throttled} 次，已自动重新排队；当前并发上限: {self.rate_controller.concurrency}")
+
+        return results
+
+    def _unit_key(self, unit: PurgeUnit) -> str:
+        return make_unit_key(self.subscription_id, self.resource_group_name, self.front_door_name, unit)
+
+    def _create_scheduler(self, job_id: Optional[str], max_concurrency: int, poll_interval: float,
+                          poll_backoff: float, max_poll_interval: float) -> PurgeScheduler:
+        """创建共享本客户端速率控制器、重试策略和熔断器的调度器（参数见 purge_units）"""
+        return PurgeScheduler(
+            functools.partial(self._submit_unit, job_id=job_id),
+            poll_interval=poll_interval,
+            poll_backoff=poll_backoff,
+            max_poll_interval=max_poll_interval,
+            rate_controller=self.rate_controller,
+            retry_policy=self.retry_policy,
+            circuit_breaker=self.circuit_breaker,
+            instrumentation=self.instrumentation,
+            max_concurrency=max_concurrency
+        )
+
+    @asynccontextmanager
+    async def _coordination(self) -> AsyncIterator[Optional[CoordinationSession]]:
+        """
+        在跨进程协调表中登记一次运行：运行期间定期续约，结束、出错或被取消时释放仍在途的记录
+
+        Yields:
+            Optional[CoordinationSession]: 协调会话，未启用跨进程协调时为 None
+        """
+        if self.coordinator is None:
+            yield None
+            return
+
+        session = self.coordinator.session(
+            make_inventory_key(self.subscription_id, self.resource_group_name, self.front_door_name)
+        )
+        keep_alive = asyncio.create_task(session.keep_alive())
+        try:
+            yield session
+        finally:
+            keep_alive.cancel()
+            await asyncio.gather(keep_alive, return_exceptions=True)
+            session.release()
+
+    async def _wait_attached(self, session: CoordinationSession, units: List[PurgeUnit],
+                             results: Dict[str, PurgeOutcome], job_id: Optional[str],
+                             on_result: Optional[Callable[[UnitResult], None]] = None,
+                             not_before: Optional[float] = None) -> AsyncIterator[PurgeUnit]:
+        """
+        等待附加到其他进程清除上的单元：其他进程成功时沿用其结果，
+        失败或租约过期时由本进程重新认领，并产出该单元交给调度器提交
+        """
+        async for unit, claim in session.wait(units, not_before):
+            if claim == CLAIM_FRESH:
+                self.log(f"🔗 Endpoint '{unit.endpoint_name}' 的相同清除已由其他进程完成，沿用其结果")
+                self._record_skipped(unit, results, job_id, on_result)
+            else:
+                yield unit
+
+    def _record_result(self, session: Optional[CoordinationSession], job_id: Optional[str],
+                       unit_result: UnitResult):
+        """把本进程提交的单元的最终结果写入协调表和任务日志"""
+        if session is not None:
+            session.complete(unit_result.unit, unit_result.success)
+        if self.journal is not None:
+            self.journal.mark_completed(job_id, self._unit_key(unit_result.unit), unit_result)
+
+    def _record_skipped(self, unit: PurgeUnit, results: Dict[str, PurgeOutcome], job_id: Optional[str],
+                        on_result: Optional[Callable[[UnitResult], None]] = None):
+        """记录无需提交的单元：按成功计入结果，尝试次数为 0"""
+        skipped = UnitResult(unit=unit, success=True, attempts=0)
+        results[unit.endpoint_name].add(skipped)
+        if self.journal is not None:
+            self.journal.mark_completed(job_id, self._unit_key(unit), skipped, skipped=True)
+        if on_result is not None:
+            on_result(skipped)
+
+    def _skip_recent_units(self, units: List[PurgeUnit], results: Dict[str, PurgeOutcome], job_id: str,
+                           on_result: Optional[Callable[[UnitResult], None]] = None) -> List[PurgeUnit]:
+        """跳过幂等窗口内已成功完成的相同单元，返回仍需提交的单元"""
+        remaining = []
+        for unit in units:
+            if self.journal.recently_succeeded(self._unit_key(unit), self.idempotency_window):
+                self._record_skipped(unit, results, job_id, on_result)
+            else:
+                remaining.append(unit)
+
+        if len(remaining) < len(units):
+            self.log(f"♻️  {len(units) - len(remaining)} 个清除单元在 {self.idempotency_window:.0f}s 内已成功执行，跳过")
+        return remaining
+
+    def _claim_units(self, session: CoordinationSession, units: List[PurgeUnit],
+                     results: Dict[str, PurgeOutcome], job_id: Optional[str],
+                     on_result: Optional[Callable[[UnitResult], None]] = None,
+                     not_before: Optional[float] = None) -> Tuple[List[PurgeUnit], List[PurgeUnit]]:
+        """
+        在跨进程协调表中认领清除单元（not_before 见 CoordinationSession.claim）
+
+        Returns:
+            Tuple[List[PurgeUnit], List[PurgeUnit]]: (由本进程提交的单元, 等待其他进程完成的单元)
+        """
+        owned, attached, fresh = [], [], 0
+        for unit, claim in zip(units, session.claim(units, not_before)):
+            if claim == CLAIM_FRESH:
+                fresh += 1
+                self._record_skipped(unit, results, job_id, on_result)
+            elif claim == CLAIM_ATTACHED:
+                attached.append(unit)
+            else:
+                owned.append(unit)
+
+        if fresh:
+            self.log(f"♻️  {fresh} 个清除单元已被其他进程在 {self.coordinator.freshness:.0f}s 内清除，跳过")
+        if attached:
+            self.log(f"🔗 {len(attached)} 个清除单元正在被其他进程清除，等待其完成")
+        return owned, attached
+
+    async def _submit_unit(self, unit: PurgeUnit, job_id: Optional[str] = None):
+        """
+        提交单个清除单元，不等待 LRO 完成
+
+        Args:
+            unit: 清除单元
+            job_id: 记录提交的任务 ID（启用任务日志时）
+
+        Returns:
+            AsyncLROPoller: 清除操作的 poller
+        """
+        self.log(f"⏳ 提交 endpoint '{unit.endpoint_name}' 的缓存清除操作...")
+        poller = await self.cdn_client.afd_endpoints.begin_purge_content(
+            resource_group_name=self.resource_group_name,
+            profile_name=self.front_door_name,
+            endpoint_name=unit.endpoint_name,
+            contents=unit.contents(),
+            raw_response_hook=self.rate_controller.observe_response
+        )
+        if self.journal is not None:
+            self.journal.mark_submitted(job_id, self._unit_key(unit))
+        return poller
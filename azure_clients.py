@@ -0,0 +1,116 @@
+"""
+Azure SDK 客户端工厂
+
+集中创建认证凭据和 CDN 管理客户端。Azure SDK 模块只在真正创建客户端时才导入，
+不访问 ARM 的命令（--help、verify、参数校验失败等）不必承担导入开销。
+
+凭据默认使用持久化的令牌缓存：令牌加密保存在本机（Windows DPAPI、macOS Keychain、
+Linux libsecret），有效期内的后续运行直接复用，不再向 AAD 重新申请令牌。
+"""
+
+import functools
+import os
+import sys
+from typing import Any, Optional
+
+
+# 令牌缓存名称（同一台机器上的所有运行共用）
+DEFAULT_TOKEN_CACHE_NAME = 'afd-purge'
+
+
+@functools.lru_cache(maxsize=None)
+def _encryption_available() -> bool:
+    """
+    当前环境能否加密保存令牌缓存（Linux 需要可用的 libsecret）
+
+    只检查 msal_extensions 加密持久化依赖的 libsecret 绑定能否加载，不在磁盘上创建任何文件。
+    """
+    if not sys.platform.startswith('linux'):
+        return True
+    try:
+        import gi  # libsecret 通过 PyGObject 访问
+        gi.require_version('Secret', '1')
+        from gi.repository import Secret  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def get_token_cache_options() -> Optional[Any]:
+    """
+    根据环境变量生成令牌缓存配置
+
+    - PURGE_TOKEN_CACHE=false 关闭持久化缓存
+    - PURGE_TOKEN_CACHE_ALLOW_UNENCRYPTED=true 在无法加密时退回明文文件（默认不允许）
+
+    Returns:
+        Optional[TokenCachePersistenceOptions]: 缓存配置；关闭或无法加密时返回 None（只使用内存缓存）
+    """
+    if os.getenv('PURGE_TOKEN_CACHE', 'true').lower() != 'true':
+        return None
+
+    allow_unencrypted = os.getenv('PURGE_TOKEN_CACHE_ALLOW_UNENCRYPTED', 'false').lower() == 'true'
+    if not allow_unencrypted and not _encryption_available():
+        return None
+
+    from azure.identity import TokenCachePersistenceOptions
+    return TokenCachePersistenceOptions(
+        name=os.getenv('PURGE_TOKEN_CACHE_NAME', DEFAULT_TOKEN_CACHE_NAME),
+        allow_unencrypted_storage=allow_unencrypted
+    )
+
+
+def create_credential(tenant_id: str, client_id: str, client_secret: str, aio: bool = False, **kwargs):
+    """
+    创建服务主体凭据（带持久化令牌缓存）
+
+    Args:
+        tenant_id: Azure AD 租户 ID
+        client_id: 服务主体客户端 ID
+        client_secret: 服务主体客户端密钥
+        aio: 是否创建 azure.identity.aio 的异步凭据
+        **kwargs: 传给凭据构造函数的其他参数（例如 transport）
+
+    Returns:
+        ClientSecretCredential: 同步或异步凭据
+    """
+    if aio:
+        from azure.identity.aio import ClientSecretCredential
+    else:
+        from azure.identity import ClientSecretCredential
+
+    cache_options = get_token_cache_options()
+    if cache_options is not None:
+        kwargs['cache_persistence_options'] = cache_options
+    return ClientSecretCredential(
+        tenant_id=tenant_id,
+        client_id=client_id,
+        client_secret=client_secret,
+        **kwargs
+    )
+
+
+def create_cdn_client(credential: Any, subscription_id: str, aio: bool = False, **kwargs):
+    """
+    创建 CDN 管理客户端
+
+    Args:
+        credential: create_credential 创建的凭据
+        subscription_id: Azure 订阅 ID
+        aio: 是否创建 azure.mgmt.cdn.aio 的异步客户端
+        **kwargs: 传给客户端构造函数的其他参数（例如 transport）
+
+    Returns:
+        CdnManagementClient: 同步或异步客户端
+    """
+    if aio:
+        from azure.mgmt.cdn.aio import CdnManagementClient
+    else:
+        from azure.mgmt.cdn import CdnManagementClient
+    return CdnManagementClient(credential=credential, subscription_id=subscription_id, **kwargs)
+
+
+def create_aio_transport(session: Any):
+    """创建共用 aiohttp 会话的 azure-core 传输层（会话由调用方关闭）"""
+    from azure.core.pipeline.transport import AioHttpTransport
+    return AioHttpTransport(session=session, session_owner=False)
@@ -0,0 +1,149 @@
+"""
+模拟的 Front Door ARM 服务（进程内）
+
+实现清除引擎用到的 afd_endpoints 接口（list_by_profile、begin_purge_content 以及
+AsyncLROPoller 的 polling_method），可以配置提交延迟、LRO 时长、失败率和 429 限流，
+并统计发出的 API 调用次数，用于在没有真实订阅的情况下测量清除吞吐。
+统计和服务端令牌桶是线程安全的，多个线程可以各自在自己的事件循环中调用同一个模拟服务。
+
+限流有两种：按概率随机返回 429，以及与 ARM 一致的订阅级写操作令牌桶
+（容量 server_burst，每秒补充 server_rate 个，耗尽时返回 429 和 Retry-After）。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, Optional
+
+
+@dataclass
+class FakeServiceConfig:
+    """模拟服务参数"""
+
+    endpoints: int = 10
+    submit_latency: float = 0.05    # begin_purge_content 的平均延迟（秒）
+    poll_latency: float = 0.02      # 每次查询 LRO 状态的平均延迟（秒）
+    lro_duration: float = 2.0       # LRO 的平均时长（秒）
+    jitter: float = 0.2             # 延迟和时长的随机浮动比例
+    failure_rate: float = 0.0       # LRO 以 Failed 结束的概率
+    throttle_rate: float = 0.0      # 提交时随机返回 429 的概率
+    retry_after: float = 1.0        # 429 响应的 Retry-After（秒）
+    server_rate: float = 0.0        # 写操作令牌桶每秒补充数，0 表示不限制
+    server_burst: int = 200         # 写操作令牌桶容量
+    seed: Optional[int] = 0
+
+
+class FakeHttpError(Exception):
+    """模拟 azure-core 的 HttpResponseError（只提供引擎用到的 status_code / response.headers）"""
+
+    def __init__(self, status_code: int, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"Operation returned an invalid status code ({status_code})")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class _PollingMethod:
+    """模拟 AsyncLROBasePolling 的 finished / update_status / status"""
+
+    def __init__(self, service: "FakeFrontDoor", duration: float, fail: bool):
+        self._service = service
+        self._done_at = time.monotonic() + duration
+        self._fail = fail
+        self._status = 'InProgress'
+
+    def finished(self) -> bool:
+        return self._status != 'InProgress'
+
+    def status(self) -> str:
+        return self._status
+
+    async def update_status(self):
+        self._service.count('polls')
+        await asyncio.sleep(self._service._vary(self._service.config.poll_latency))
+        if time.monotonic() >= self._done_at:
+            self._status = 'Failed' if self._fail else 'Succeeded'
+            self._service.count('failed' if self._fail else 'succeeded')
+
+
+class _Poller:
+    def __init__(self, polling_method: _PollingMethod):
+        self._polling_method = polling_method
+
+    def polling_method(self) -> _PollingMethod:
+        return self._polling_method
+
+
+class FakeFrontDoor:
+    """模拟的 afd_endpoints 操作组"""
+
+    def __init__(self, config: FakeServiceConfig):
+        self.config = config
+        self.endpoint_names = [f"endpoint-{index:04d}" for index in range(config.endpoints)]
+        self.stats: Dict[str, int] = {
+            'lists': 0, 'submits': 0, 'polls': 0, 'throttled': 0, 'succeeded': 0, 'failed': 0,
+        }
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._tokens = float(config.server_burst)
+        self._refilled_at = time.monotonic()
+
+    def _vary(self, value: float) -> float:
+        if value <= 0:
+            return 0.0
+        return max(0.0, value * (1 + self._rng.uniform(-self.config.jitter, self.config.jitter)))
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _take_write_token(self) -> bool:
+        if self.config.server_rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.config.server_burst,
+                               self._tokens + (now - self._refilled_at) * self.config.server_rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    async def list_by_profile(self, resource_group_name: str, profile_name: str, **kwargs) -> AsyncIterator:
+        self.count('lists')
+        for name in self.endpoint_names:
+            yield SimpleNamespace(name=name, host_name=f"{name}.azurefd.net", provisioning_state='Succeeded')
+
+    async def begin_purge_content(self, resource_group_name: str, profile_name: str, endpoint_name: str,
+                                  contents: dict, raw_response_hook: Optional[Callable] = None, **kwargs) -> _Poller:
+        self.count('submits')
+        await asyncio.sleep(self._vary(self.config.submit_latency))
+
+        if not self._take_write_token() or self._rng.random() < self.config.throttle_rate:
+            self.count('throttled')
+            raise FakeHttpError(429, {'Retry-After': f"{self.config.retry_after:g}"})
+
+        if raw_response_hook is not None:
+            headers = {}
+            if self.config.server_rate > 0:
+                headers['x-ms-ratelimit-remaining-subscription-writes'] = str(int(self._tokens))
+            raw_response_hook(SimpleNamespace(http_response=SimpleNamespace(status_code=202, headers=headers)))
+
+        fail = self._rng.random() < self.config.failure_rate
+        return _Poller(_PollingMethod(self, self._vary(self.config.lro_duration), fail))
+
+
+@dataclass
+class FakeCdnClient:
+    """可以作为 cdn_client 传给 AsyncAzureFrontDoorPurgeClient 的模拟客户端"""
+
+    config: FakeServiceConfig = field(default_factory=FakeServiceConfig)
+
+    def __post_init__(self):
+        self.afd_endpoints = FakeFrontDoor(self.config)
+
+    async def close(self):
+        pass
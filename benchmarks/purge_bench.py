@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+清除引擎基准
+
+用进程内模拟的 Front Door ARM 服务（fake_frontdoor.py）分别对 10、100、1000 个 endpoints
+运行清除引擎，报告墙钟时间、峰值线程数、峰值内存和发出的 API 调用次数。每个场景在
+独立的子进程中运行，内存峰值互不影响。
+
+引擎：
+- threadpool：参考基线，重现最初的实现——ThreadPoolExecutor(max_workers=5)，每个线程提交一个
+  endpoint 后阻塞在 .result() 上等待 LRO 完成，没有重试、限流控制和路径拆分
+- async：直接调用 AsyncAzureFrontDoorPurgeClient.purge_many
+- parallel：调用 AzureFrontDoorPurgeClient.purge_cache_parallel（同步封装，含任务日志和日志输出）
+
+threadpool 的墙钟时间约为 endpoints / 5 × LRO 时长，1000 个 endpoints 在默认参数下需要数分钟；
+只比较新引擎时可以用 --engine async,parallel 跳过。
+
+使用方法:
+    python benchmarks/purge_bench.py
+    python benchmarks/purge_bench.py --endpoints 1000 --throttle-rate 0.05 --failure-rate 0.01 --engine async,parallel
+    python benchmarks/purge_bench.py --client-rate 1000 --poll-interval 0.5 --lro-duration 1 --json bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Optional
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_frontdoor import FakeCdnClient, FakeServiceConfig  # noqa: E402
+
+ENGINES = ('threadpool', 'async', 'parallel')
+# 最初实现的线程池大小（purge_cache_parallel 的 max_workers 默认值）
+THREADPOOL_WORKERS = 5
+DEFAULT_ENDPOINT_COUNTS = '10,100,1000'
+
+FAKE_ENV = {
+    'AZURE_TENANT_ID': 'bench', 'AZURE_CLIENT_ID': 'bench', 'AZURE_CLIENT_SECRET': 'bench',
+    'AZURE_SUBSCRIPTION_ID': 'bench', 'RESOURCE_GROUP_NAME': 'bench', 'FRONT_DOOR_NAME': 'bench',
+}
+
+
+class ThreadSampler:
+    """在后台线程中采样活动线程数，记录峰值（不含采样线程本身）"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count() - 1)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "ThreadSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_threadpool_engine(cdn: FakeCdnClient, scenario: dict):
+    endpoints = cdn.afd_endpoints
+
+    def purge(endpoint_name: str) -> bool:
+        async def submit_and_wait() -> bool:
+            poller = await endpoints.begin_purge_content(
+                'bench', 'bench', endpoint_name, contents={'content_paths': scenario['paths']}
+            )
+            # 与 LROPoller.result() 一样在本线程中按固定间隔轮询，直到 LRO 结束
+            polling_method = poller.polling_method()
+            while not polling_method.finished():
+                await asyncio.sleep(scenario['poll_interval'])
+                await polling_method.update_status()
+            return polling_method.status() == 'Succeeded'
+
+        # 模拟服务是异步接口：每个工作线程在自己的事件循环中同步等待，等价于阻塞的 .result()
+        try:
+            return asyncio.run(submit_and_wait())
+        except Exception:
+            return False
+
+    with ThreadPoolExecutor(max_workers=scenario.get('threadpool_workers', THREADPOOL_WORKERS)) as executor:
+        return dict(zip(endpoints.endpoint_names, executor.map(purge, endpoints.endpoint_names)))
+
+
+def _run_async_engine(cdn: FakeCdnClient, scenario: dict):
+    from async_purge import AsyncAzureFrontDoorPurgeClient
+    from endpoint_inventory import EndpointInventory
+    from rate_control import RateController
+
+    async def run():
+        client = AsyncAzureFrontDoorPurgeClient(
+            'bench', 'bench', 'bench', 'bench', 'bench', 'bench',
+            log=lambda message: None,
+            rate_controller=RateController(rate=scenario['client_rate'], burst=scenario['client_burst'],
+                                           max_concurrency=scenario['max_concurrency']),
+            cdn_client=cdn,
+            # 只用内存缓存，不读写用户状态目录下的 inventory.json
+            inventory=EndpointInventory(persist=False)
+        )
+        async with client:
+            return await client.purge_many(
+                cdn.afd_endpoints.endpoint_names, scenario['paths'],
+                max_concurrency=scenario['max_concurrency'], poll_interval=scenario['poll_interval']
+            )
+
+    return asyncio.run(run())
+
+
+def _run_parallel_engine(cdn: FakeCdnClient, scenario: dict):
+    # 同步封装从环境变量读取配置：只在本场景内生效，状态（任务日志等）写入临时目录
+    with tempfile.TemporaryDirectory(prefix='afd-purge-bench-') as state_dir, mock.patch.dict(os.environ, {
+        **FAKE_ENV,
+        'PURGE_STATE_DIR': state_dir,
+        'PURGE_ARM_RATE': str(scenario['client_rate']),
+        'PURGE_ARM_BURST': str(scenario['client_burst']),
+        'PURGE_POLL_INTERVAL': str(scenario['poll_interval']),
+        'PURGE_ROUTE_AWARE': 'false',
+    }):
+        return _purge_parallel(cdn, scenario)
+
+
+def _purge_parallel(cdn: FakeCdnClient, scenario: dict):
+    import purge_cache
+
+    class BenchClient(purge_cache.AzureFrontDoorPurgeClient):
+        def _create_async_client(self, max_concurrency: int = purge_cache.DEFAULT_MAX_CONCURRENCY):
+            client = super()._create_async_client(max_concurrency)
+            client.cdn_client = cdn
+            client._owns_cdn_client = False
+            return client
+
+    client = BenchClient()
+    client.log_stream = open(os.devnull, 'w')
+    try:
+        return client.purge_cache_parallel(cdn.afd_endpoints.endpoint_names, scenario['paths'],
+                                           scenario['max_concurrency'])
+    finally:
+        client.close()
+
+
+def run_scenario(scenario: dict) -> dict:
+    """在当前进程中运行一个场景"""
+    cdn = FakeCdnClient(FakeServiceConfig(**scenario['service']))
+    runner = {
+        'threadpool': _run_threadpool_engine,
+        'async': _run_async_engine,
+        'parallel': _run_parallel_engine,
+    }[scenario['engine']]
+
+    with ThreadSampler() as sampler:
+        started = time.perf_counter()
+        results = runner(cdn, scenario)
+        wall = time.perf_counter() - started
+
+    stats = cdn.afd_endpoints.stats
+    units = stats['succeeded'] + stats['failed']
+    return {
+        'engine': scenario['engine'],
+        'endpoints': scenario['service']['endpoints'],
+        'wall_seconds': round(wall, 3),
+        'units_per_second': round(units / wall, 1) if wall > 0 else None,
+        'peak_threads': sampler.peak,
+        'peak_rss_mb': round(_peak_rss_mb() or 0, 1),
+        'endpoints_succeeded': sum(1 for outcome in results.values() if outcome),
+        **{f'api_{name}': value for name, value in stats.items()},
+    }
+
+
+def _run_in_subprocess(scenario: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--scenario', json.dumps(scenario)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _print_header():
+    print(f"{'引擎':<9}{'endpoints':>10}{'墙钟(s)':>10}{'单元/s':>9}{'峰值线程':>9}{'峰值内存(MB)':>13}"
+          f"{'提交':>7}{'轮询':>8}{'429':>6}{'成功':>7}")
+
+
+def _print_row(row: dict):
+    print(f"{row['engine']:<9}{row['endpoints']:>10}{row['wall_seconds']:>10.2f}{row['units_per_second']:>9}"
+          f"{row['peak_threads']:>9}{row['peak_rss_mb']:>13.1f}{row['api_submits']:>7}{row['api_polls']:>8}"
+          f"{row['api_throttled']:>6}{row['endpoints_succeeded']:>7}", flush=True)
+
+
+def main():
+    from rate_control import DEFAULT_RATE, DEFAULT_BURST
+    from async_purge import DEFAULT_MAX_CONCURRENCY
+    from purge_scheduler import DEFAULT_POLL_INTERVAL
+
+    defaults = FakeServiceConfig()
+    parser = argparse.ArgumentParser(description='用模拟的 Front Door 服务测量清除引擎吞吐')
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--endpoints', default=DEFAULT_ENDPOINT_COUNTS,
+                        help=f'逗号分隔的 endpoint 数量（默认 {DEFAULT_ENDPOINT_COUNTS}）')
+    parser.add_argument('--engine', default=','.join(ENGINES), help=f"逗号分隔的引擎（默认 {','.join(ENGINES)}）")
+    parser.add_argument('--paths', default='/*', help="逗号分隔的清除路径（默认 '/*'）")
+    parser.add_argument('--submit-latency', type=float, default=defaults.submit_latency, help='提交延迟（秒）')
+    parser.add_argument('--lro-duration', type=float, default=defaults.lro_duration, help='LRO 时长（秒）')
+    parser.add_argument('--failure-rate', type=float, default=defaults.failure_rate, help='LRO 失败概率')
+    parser.add_argument('--throttle-rate', type=float, default=defaults.throttle_rate, help='提交时随机 429 的概率')
+    parser.add_argument('--server-rate', type=float, default=defaults.server_rate,
+                        help='模拟服务写操作令牌桶每秒补充数，0 表示不限制')
+    parser.add_argument('--server-burst', type=int, default=defaults.server_burst, help='模拟服务写操作令牌桶容量')
+    parser.add_argument('--client-rate', type=float, default=DEFAULT_RATE, help=f'引擎的 ARM 调用速率（默认 {DEFAULT_RATE}）')
+    parser.add_argument('--client-burst', type=int, default=DEFAULT_BURST, help=f'引擎的突发容量（默认 {DEFAULT_BURST}）')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY, help='引擎的最大并发')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help='引擎的首次轮询间隔（秒），threadpool 引擎以此为固定轮询间隔')
+    parser.add_argument('--threadpool-workers', type=int, default=THREADPOOL_WORKERS,
+                        help=f'threadpool 引擎的线程数（默认 {THREADPOOL_WORKERS}，与最初实现一致）')
+    parser.add_argument('--json', metavar='FILE', help='把结果写入 JSON 文件，便于比较不同版本')
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return
+
+    rows = []
+    _print_header()
+    for engine in args.engine.split(','):
+        if engine not in ENGINES:
+            parser.error(f"未知的引擎: {engine}")
+        for count in (int(value) for value in args.endpoints.split(',')):
+            service = asdict(defaults)
+            service.update(
+                endpoints=count, submit_latency=args.submit_latency, lro_duration=args.lro_duration,
+                failure_rate=args.failure_rate, throttle_rate=args.throttle_rate,
+                server_rate=args.server_rate, server_burst=args.server_burst
+            )
+            rows.append(_run_in_subprocess({
+                'engine': engine,
+                'service': service,
+                'paths': [path.strip() for path in args.paths.split(',') if path.strip()],
+                'client_rate': args.client_rate,
+                'client_burst': args.client_burst,
+                'max_concurrency': args.max_concurrency,
+                'poll_interval': args.poll_interval,
+                'threadpool_workers': args.threadpool_workers,
+            }))
+            _print_row(rows[-1])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准
+
+在全新的子进程中多次测量以下场景的耗时（取中位数），防止启动开销回退：
+
+- import：导入 purge_cache 模块
+- help：运行 purge_cache.py --help
+- construct：导入并创建 AzureFrontDoorPurgeClient（使用假的环境变量，不访问网络）
+
+同时检查导入和创建客户端后没有加载 Azure SDK 与 aiohttp。
+
+使用方法:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --max-ms 300   # 任一场景中位数超过 300ms 时以状态码 1 退出
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动阶段不应加载的重量级模块
+HEAVY_MODULES = ('azure.identity', 'azure.mgmt.cdn', 'azure.core', 'aiohttp')
+
+FAKE_ENV = {
+    'AZURE_TENANT_ID': '00000000-0000-0000-0000-000000000000',
+    'AZURE_CLIENT_ID': '00000000-0000-0000-0000-000000000000',
+    'AZURE_CLIENT_SECRET': 'benchmark',
+    'AZURE_SUBSCRIPTION_ID': '00000000-0000-0000-0000-000000000000',
+    'RESOURCE_GROUP_NAME': 'benchmark',
+    'FRONT_DOOR_NAME': 'benchmark',
+}
+
+CONSTRUCT_SCRIPT = (
+    "import sys, json, purge_cache\n"
+    "purge_cache.AzureFrontDoorPurgeClient()\n"
+    "print(json.dumps([m for m in %r if m in sys.modules]))\n" % (HEAVY_MODULES,)
+)
+
+SCENARIOS = {
+    'import': [sys.executable, '-c', 'import purge_cache'],
+    'help': [sys.executable, os.path.join(ROOT, 'purge_cache.py'), '--help'],
+    'construct': [sys.executable, '-c', CONSTRUCT_SCRIPT],
+}
+
+
+def _run_once(command: List[str], env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def _loaded_heavy_modules(env: Dict[str, str]) -> List[str]:
+    output = subprocess.run(SCENARIOS['construct'], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量命令行启动耗时')
+    parser.add_argument('--runs', type=int, default=10, help='每个场景的运行次数（默认 10）')
+    parser.add_argument('--max-ms', type=float, help='中位数阈值（毫秒），超过时以状态码 1 退出')
+    args = parser.parse_args()
+
+    # 使用临时状态目录，基准不读写用户的 ~/.afd-purge
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = dict(os.environ, **FAKE_ENV, PURGE_STATE_DIR=state_dir)
+        # 预热一次，让 .pyc 和文件系统缓存就绪，只测量稳定状态
+        for command in SCENARIOS.values():
+            _run_once(command, env)
+
+        failed = False
+        for name, command in SCENARIOS.items():
+            samples = [_run_once(command, env) for _ in range(args.runs)]
+            median = statistics.median(samples)
+            over = args.max_ms is not None and median > args.max_ms
+            failed = failed or over
+            print(f"{'❌' if over else '✅'} {name:<10} 中位数 {median:7.1f}ms  "
+                  f"最小 {min(samples):7.1f}ms  最大 {max(samples):7.1f}ms")
+
+        loaded = _loaded_heavy_modules(env)
+        if loaded:
+            failed = True
+            print(f"❌ 启动阶段加载了重量级模块: {', '.join(loaded)}")
+        else:
+            print("✅ 启动阶段没有加载 Azure SDK / aiohttp")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
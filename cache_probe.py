@@ -0,0 +1,309 @@
+"""
+缓存响应探测引擎
+
+并发地向多个 URL 重复发送请求并记录缓存相关的响应头（X-Cache、ETag 等）。
+所有请求共用一个 aiohttp 会话（keep-alive 连接池），每个 URL 的多次请求按各自的
+间隔独立调度，一个 URL 的等待不会阻塞其他 URL。
+
+探测模式：
+- get：下载完整响应体（响应时间包含传输时间）
+- head：只发送 HEAD 请求读取响应头
+- range：GET 带 `Range: bytes=0-0`，只取 1 个字节，走与普通 GET 相同的缓存路径
+- stream：按固定大小的块流式读取响应体并计算 SHA-256，不缓冲整个响应体，
+  用于 ETag 缺失或为弱 ETag 时检测内容是否变化
+
+每次请求都记录收到响应头的时间（ttfb）和完成时间（total_time）。response_time 在 get 模式下
+为完成时间（与旧版本一致），其他模式下为 ttfb，反映缓存命中与否而不是内容大小。
+
+指定边缘 IP 时，同一请求会并发发送到每个 IP：URL 不变（Host 头和 TLS SNI 仍为原主机名），
+只把连接固定到该 IP，结果中记录 edge_ip，并从 X-Azure-Ref 解析出 POP 代码。
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import re
+import socket
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+# 默认参数
+DEFAULT_CONCURRENCY = 20       # 同时在途的最大请求数
+DEFAULT_INTERVAL = 2.0         # 同一 URL 两次请求之间的间隔（秒）
+DEFAULT_TIMEOUT = 10.0         # 单个请求的超时（秒）
+
+# 探测模式
+MODE_GET = 'get'
+MODE_HEAD = 'head'
+MODE_RANGE = 'range'
+MODE_STREAM = 'stream'
+PROBE_MODES = (MODE_GET, MODE_HEAD, MODE_RANGE, MODE_STREAM)
+
+# stream 模式每次读取的块大小（字节）
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 记录的响应头：结果字段 → 响应头名称
+PROBE_HEADERS = {
+    'cache_control': 'Cache-Control',
+    'etag': 'ETag',
+    'last_modified': 'Last-Modified',
+    'x_cache': 'X-Cache',
+    'x_azure_ref': 'X-Azure-Ref',
+    'content_length': 'Content-Length',
+}
+
+
+def is_hit(cache_state: str) -> bool:
+    """X-Cache 是否表示命中（TCP_HIT、TCP_REMOTE_HIT 等）"""
+    return 'HIT' in cache_state.upper()
+
+
+# 无法从 X-Azure-Ref 中解析出 POP 时使用的值
+UNKNOWN_POP = 'unknown'
+
+# X-Azure-Ref 中的边缘节点名，例如 LON21EDGE0512 → POP 代码 LON21
+_EDGE_PATTERN = re.compile(r'(?<![A-Z])([A-Z]{2,5}\d{0,3})EDGE\d*')
+
+
+def parse_pop(azure_ref: Optional[str]) -> str:
+    """
+    从 X-Azure-Ref 响应头解析边缘节点的 POP 代码
+
+    经典格式为 '0' 加 base64 编码的内容，其中包含边缘节点名（例如 LON21EDGE0512）；
+    也直接在原始值中查找节点名。
+
+    Args:
+        azure_ref: X-Azure-Ref 响应头
+
+    Returns:
+        str: POP 代码（大写），无法解析时为 UNKNOWN_POP
+    """
+    if not azure_ref or azure_ref == 'N/A':
+        return UNKNOWN_POP
+
+    candidates = [azure_ref]
+    if azure_ref.startswith('0'):
+        encoded = azure_ref[1:]
+        try:
+            candidates.append(base64.b64decode(encoded + '=' * (-len(encoded) % 4)).decode('latin-1'))
+        except (ValueError, binascii.Error):
+            pass
+
+    for text in candidates:
+        match = _EDGE_PATTERN.search(text)
+        if match:
+            return match.group(1)
+    return UNKNOWN_POP
+
+
+def pop_label(result: dict) -> str:
+    """探测结果的 POP 分组名：无法解析 POP 时用边缘 IP 代替，避免不同边缘节点被合并"""
+    pop = result.get('pop', UNKNOWN_POP)
+    if pop == UNKNOWN_POP and result.get('edge_ip'):
+        return result['edge_ip']
+    return pop
+
+
+class PinnedResolver:
+    """aiohttp 解析器：把所有主机名解析到固定的 IP，URL、Host 头和 TLS SNI 保持不变"""
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[dict]:
+        return [{
+            'hostname': host, 'host': self.ip, 'port': port, 'family': self.family,
+            'proto': 0, 'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+        }]
+
+    async def close(self):
+        pass
+
+
+class CacheProber:
+    """并发的缓存响应探测器"""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 interval: float = DEFAULT_INTERVAL,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 mode: str = MODE_GET,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            concurrency: 同时在途的最大请求数（也是连接池大小）
+            interval: 同一 URL 两次请求之间的间隔（秒）
+            timeout: 单个请求的超时（秒）
+            mode: 探测模式，见 PROBE_MODES
+            log: 输出函数，默认为 print
+
+        Raises:
+            ValueError: 未知的探测模式
+        """
+        if mode not in PROBE_MODES:
+            raise ValueError(f"未知的探测模式: {mode}（可选: {', '.join(PROBE_MODES)}）")
+        self.mode = mode
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.timeout = timeout
+        self.log = log or print
+
+    async def run(self, urls: Sequence[str], iterations: int,
+                  edge_ips: Optional[Dict[str, Sequence[str]]] = None) -> Dict[str, List[dict]]:
+        """
+        对每个 URL（指定边缘 IP 时为每个 URL × 边缘 IP）发送 iterations 次请求
+
+        Args:
+            urls: 要探测的 URL 列表（重复的 URL 只探测一次）
+            iterations: 每个 URL 的请求次数
+            edge_ips: 主机名到边缘 IP 的映射；不在映射中的主机名按本机解析器正常解析
+
+        Returns:
+            Dict[str, List[dict]]: URL 到各次请求结果的映射（按输入顺序），
+                成功时包含状态码、response_time / ttfb / total_time（毫秒）、pop 和 PROBE_HEADERS 中的响应头，
+                stream 模式另有 digest 和 body_bytes；失败时包含 error；固定到边缘 IP 的请求另有 edge_ip
+        """
+        results: Dict[str, List[dict]] = {url: [] for url in urls}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        targets = self.edge_targets(results, edge_ips)
+
+        async with self.edge_sessions(ip for _, ip in targets) as sessions:
+            async def probe_target(url: str, ip: Optional[str]):
+                for index in range(iterations):
+                    if index:
+                        await asyncio.sleep(self.interval)
+                    async with semaphore:
+                        result = await self.probe(sessions[ip], url)
+                    if ip is not None:
+                        result['edge_ip'] = ip
+                    results[url].append(result)
+                    self._log_result(url, index + 1, iterations, result)
+
+            await asyncio.gather(*(probe_target(url, ip) for url, ip in targets))
+
+        return results
+
+    @staticmethod
+    def edge_targets(urls: Iterable[str],
+                     edge_ips: Optional[Dict[str, Sequence[str]]] = None) -> List[Tuple[str, Optional[str]]]:
+        """URL × 边缘 IP 的组合；主机名不在 edge_ips 中的 URL 对应 None（按本机解析器正常解析）"""
+        edge_ips = edge_ips or {}
+        return [(url, ip) for url in dict.fromkeys(urls) for ip in edge_ips.get(urlsplit(url).hostname) or [None]]
+
+    @asynccontextmanager
+    async def edge_sessions(self, ips: Iterable[Optional[str]]
+                            ) -> AsyncIterator[Dict[Optional[str], "aiohttp.ClientSession"]]:
+        """每个边缘 IP 一个会话（连接固定到该 IP），None 对应正常解析的默认会话"""
+        sessions: Dict[Optional[str], "aiohttp.ClientSession"] = {}
+        try:
+            for ip in ips:
+                if ip not in sessions:
+                    sessions[ip] = self.create_session(ip)
+            yield sessions
+        finally:
+            for session in sessions.values():
+                await session.close()
+
+    def create_session(self, edge_ip: Optional[str] = None) -> "aiohttp.ClientSession":
+        """
+        创建 HTTP 会话（连接池大小为 concurrency）
+
+        Args:
+            edge_ip: 指定时所有连接都建立到该 IP
+        """
+        # aiohttp 只在真正发送请求时导入
+        import aiohttp
+
+        resolver = PinnedResolver(edge_ip) if edge_ip else None
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, resolver=resolver),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def probe(self, session: "aiohttp.ClientSession", url: str) -> dict:
+        """
+        发送一次请求并记录缓存相关的响应头
+
+        Args:
+            session: 共享的 HTTP 会话
+            url: 要探测的 URL
+
+        Returns:
+            dict: 单次请求结果
+        """
+        import aiohttp
+
+        method = 'HEAD' if self.mode == MODE_HEAD else 'GET'
+        headers = {'Range': 'bytes=0-0'} if self.mode == MODE_RANGE else None
+        try:
+            start_time = time.perf_counter()
+            async with session.request(method, url, headers=headers) as response:
+                ttfb = time.perf_counter() - start_time
+                result = {
+                    'status_code': response.status,
+                    'timestamp': datetime.now().strftime('%H:%M:%S'),
+                    'mode': self.mode,
+                }
+                for field, header in PROBE_HEADERS.items():
+                    result[field] = response.headers.get(header, 'N/A')
+                result['pop'] = parse_pop(result['x_azure_ref'])
+
+                if self.mode == MODE_GET:
+                    await response.read()
+                elif self.mode == MODE_RANGE:
+                    self._read_range(response, result)
+                    if response.status == 206:
+                        await response.read()
+                elif self.mode == MODE_STREAM:
+                    await self._hash_body(response, result)
+                total_time = time.perf_counter() - start_time
+
+                # 毫秒
+                result['ttfb'] = round(ttfb * 1000, 2)
+                result['total_time'] = round(total_time * 1000, 2)
+                result['response_time'] = result['total_time'] if self.mode == MODE_GET else result['ttfb']
+                return result
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {
+                'error': str(e) or type(e).__name__,
+                'timestamp': datetime.now().strftime('%H:%M:%S')
+            }
+
+    @staticmethod
+    def _read_range(response: "aiohttp.ClientResponse", result: dict):
+        """range 模式：用 Content-Range 中的总长度作为内容长度；服务器忽略 Range 时不读取响应体"""
+        content_range = response.headers.get('Content-Range', '')
+        if response.status == 206 and '/' in content_range:
+            result['content_length'] = content_range.rsplit('/', 1)[1]
+        elif response.status != 206:
+            # 返回了完整内容：直接关闭连接，避免下载整个响应体
+            response.close()
+
+    @staticmethod
+    async def _hash_body(response: "aiohttp.ClientResponse", result: dict):
+        """stream 模式：按块计算响应体的 SHA-256，不在内存中保留响应体"""
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+        result['digest'] = digest.hexdigest()
+        result['body_bytes'] = size
+
+    def _log_result(self, url: str, iteration: int, iterations: int, result: dict):
+        edge = f" @ {result['edge_ip']}" if 'edge_ip' in result else ''
+        if 'error' in result:
+            self.log(f"  ❌ [{iteration}/{iterations}] {url}{edge} 请求失败: {result['error']}")
+        else:
+            digest = f", 摘要: {result['digest'][:12]}" if 'digest' in result else ''
+            pop = f", POP: {result['pop']}" if edge else ''
+            self.log(f"  ✅ [{iteration}/{iterations}] {url}{edge} 状态: {result['status_code']}, "
+                     f"响应时间: {result['response_time']}ms, X-Cache: {result['x_cache']}{pop}{digest}")
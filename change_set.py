@@ -0,0 +1,265 @@
+"""
+部署变更清除集
+
+把一次部署中变更的文件（来自标准输入、文件列表，或两个带内容哈希的构建清单的差异）
+按可配置的"文件 → URL"映射转换为 URL 路径，并在更划算时合并为目录通配符，
+得到最小的清除路径集合，避免每次发布都清除 '/*' 造成回源风暴。
+本模块不依赖 Azure SDK，可以独立测试。
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Tuple
+from urllib.parse import quote
+
+from path_planner import WILDCARD, normalize_paths
+
+
+# 目录中变更文件占比达到该值时合并为目录通配符
+DEFAULT_COLLAPSE_RATIO = 0.8
+
+# 不知道目录文件总数时（只有变更列表），单个目录变更文件数达到该值即合并
+DEFAULT_MAX_FILES_PER_DIR = 50
+
+
+def read_changed_files(stream: TextIO) -> List[str]:
+    """
+    读取变更文件列表：每行一个文件，忽略空行和以 '#' 开头的注释
+
+    Args:
+        stream: 文本流（例如 sys.stdin 或打开的文件）
+
+    Returns:
+        List[str]: 文件路径列表
+    """
+    files = []
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            files.append(line)
+    return files
+
+
+def load_manifest(path: str) -> Dict[str, str]:
+    """
+    读取构建清单（文件 → 内容哈希）
+
+    支持两种格式：
+    - JSON 对象：{"index.html": "<hash>", ...}
+    - sha256sum / md5sum 输出：每行 "<hash>  <file>"
+
+    Args:
+        path: 清单文件路径
+
+    Returns:
+        Dict[str, str]: 文件路径到内容哈希的映射
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    if text.lstrip().startswith('{'):
+        return {str(name): str(digest) for name, digest in json.loads(text).items()}
+
+    manifest = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        digest, name = line.split(None, 1)
+        manifest[name.lstrip('*')] = digest
+    return manifest
+
+
+def diff_manifests(old: Dict[str, str], new: Dict[str, str], include_added: bool = False) -> List[str]:
+    """
+    比较两个构建清单，返回需要清除的文件
+
+    内容变化和被删除的文件需要清除；新增文件通常还没有被缓存，默认不清除
+    （如果 CDN 缓存了 404 响应，可以设置 include_added）。
+
+    Args:
+        old: 上一次部署的清单
+        new: 本次部署的清单
+        include_added: 是否包含新增文件
+
+    Returns:
+        List[str]: 按文件名排序的变更文件列表
+    """
+    changed = {name for name, digest in new.items() if name in old and old[name] != digest}
+    changed.update(name for name in old if name not in new)
+    if include_added:
+        changed.update(name for name in new if name not in old)
+    return sorted(changed)
+
+
+@dataclass
+class UrlMapping:
+    """
+    文件 → URL 路径映射
+
+    rules 按最长前缀匹配，把文件路径前缀替换为 URL 前缀（例如 'dist/' → '/'）；
+    没有规则匹配的文件直接挂在 '/' 下。index_files 中的文件同时映射到所在目录的 URL，
+    clean_extensions 中扩展名的文件同时映射到去掉扩展名的 URL。
+    """
+
+    rules: List[Tuple[str, str]] = field(default_factory=list)
+    index_files: Tuple[str, ...] = ('index.html',)
+    clean_extensions: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UrlMapping":
+        """
+        从配置字典创建映射，例如::
+
+            {
+                "rules": [{"from": "dist/", "to": "/"}, {"from": "dist/assets/", "to": "/static/"}],
+                "index_files": ["index.html"],
+                "clean_extensions": [".html"]
+            }
+        """
+        return cls(
+            rules=[(rule['from'], rule['to']) for rule in data.get('rules', [])],
+            index_files=tuple(data.get('index_files', cls.index_files)),
+            clean_extensions=tuple(data.get('clean_extensions', ()))
+        )
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "UrlMapping":
+        """从 JSON 文件加载映射，path 为空时使用默认映射"""
+        if not path:
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def map_file(self, file_path: str) -> List[str]:
+        """
+        把单个文件映射为一个或多个 URL 路径
+
+        Args:
+            file_path: 相对构建目录的文件路径（'\\' 会被视为 '/'）
+
+        Returns:
+            List[str]: URL 路径列表（已做百分号编码）
+        """
+        file_path = file_path.replace('\\', '/')
+        while file_path.startswith('./'):
+            file_path = file_path[2:]
+        file_path = file_path.lstrip('/')
+
+        url = '/' + file_path
+        for source, target in sorted(self.rules, key=lambda rule: len(rule[0]), reverse=True):
+            if file_path.startswith(source):
+                url = '/' + (target.strip('/') + '/' + file_path[len(source):].lstrip('/')).lstrip('/')
+                break
+
+        urls = [url]
+        directory, _, name = url.rpartition('/')
+        if name in self.index_files:
+            urls.append(directory + '/')
+        else:
+            for extension in self.clean_extensions:
+                if name.endswith(extension):
+                    urls.append(url[:-len(extension)])
+                    break
+        return [quote(url, safe="/~!$&'()*+,;=:@") for url in urls]
+
+    def map_files(self, files: Iterable[str]) -> List[str]:
+        """映射多个文件，保持顺序并去重"""
+        urls = []
+        seen = set()
+        for file_path in files:
+            for url in self.map_file(file_path):
+                if url not in seen:
+                    seen.add(url)
+                    urls.append(url)
+        return urls
+
+
+def _directories(url: str) -> List[str]:
+    """URL 的所有上级目录（含自身所在目录），由浅到深，例如 '/a/b/c.js' → ['/', '/a/', '/a/b/']"""
+    parts = url.split('/')[1:-1]
+    return ['/' + ''.join(part + '/' for part in parts[:depth]) for depth in range(len(parts) + 1)]
+
+
+def collapse_paths(urls: Iterable[str], universe: Optional[Iterable[str]] = None,
+                   collapse_ratio: float = DEFAULT_COLLAPSE_RATIO,
+                   max_files_per_dir: int = DEFAULT_MAX_FILES_PER_DIR) -> List[str]:
+    """
+    在更划算时把变更 URL 合并为目录通配符
+
+    一个目录通配符只占一个清除路径，但会让目录下所有文件失效。已知目录下全部文件
+    （universe，通常来自新构建清单）时，变更文件占比达到 collapse_ratio 才合并，
+    使额外失效的未变更文件保持在少数；不知道目录内容时，变更文件数达到
+    max_files_per_dir 才合并（根目录除外）。合并选择满足条件的最浅目录。
+
+    Args:
+        urls: 变更文件的 URL 路径
+        universe: 站点全部文件的 URL 路径，未知时为 None
+        collapse_ratio: 合并所需的最小变更占比
+        max_files_per_dir: 未知目录内容时合并所需的最小变更文件数
+
+    Returns:
+        List[str]: 合并后的 URL 路径（按字母排序）
+    """
+    urls = sorted(set(urls))
+
+    changed_counts: Dict[str, int] = {}
+    for url in urls:
+        for directory in _directories(url):
+            changed_counts[directory] = changed_counts.get(directory, 0) + 1
+
+    total_counts: Dict[str, int] = {}
+    if universe is not None:
+        for url in set(universe).union(urls):
+            for directory in _directories(url):
+                total_counts[directory] = total_counts.get(directory, 0) + 1
+
+    def should_collapse(directory: str) -> bool:
+        changed = changed_counts[directory]
+        if changed < 2:
+            return False
+        if universe is not None:
+            return changed / total_counts[directory] >= collapse_ratio
+        # 不知道站点内容时不把整个站点合并为 '/*'
+        return directory != '/' and changed >= max_files_per_dir
+
+    collapsed: Set[str] = set()
+    for directory in sorted(changed_counts, key=lambda d: d.count('/')):
+        if not any(directory.startswith(parent) for parent in collapsed) and should_collapse(directory):
+            collapsed.add(directory)
+
+    result = {directory + WILDCARD for directory in collapsed}
+    result.update(url for url in urls if not any(url.startswith(directory) for directory in collapsed))
+    return sorted(result)
+
+
+def plan_changed_paths(files: Iterable[str], mapping: Optional[UrlMapping] = None,
+                       manifest: Optional[Dict[str, str]] = None,
+                       collapse_ratio: float = DEFAULT_COLLAPSE_RATIO,
+                       max_files_per_dir: int = DEFAULT_MAX_FILES_PER_DIR) -> List[str]:
+    """
+    由变更文件计算最小清除路径集合
+
+    Args:
+        files: 变更文件
+        mapping: 文件 → URL 映射，默认把构建目录根映射到 '/'
+        manifest: 本次部署的完整清单，用于判断目录通配符是否划算
+        collapse_ratio: 见 collapse_paths
+        max_files_per_dir: 见 collapse_paths
+
+    Returns:
+        List[str]: 规范化后的清除路径，可直接传给清除流程
+    """
+    mapping = mapping or UrlMapping()
+    urls = mapping.map_files(files)
+    universe = mapping.map_files(manifest) if manifest is not None else None
+    return normalize_paths(collapse_paths(urls, universe, collapse_ratio, max_files_per_dir))
+
+
+def get_collapse_options() -> dict:
+    """从环境变量读取目录合并参数"""
+    return {
+        'collapse_ratio': float(os.getenv('PURGE_COLLAPSE_RATIO', DEFAULT_COLLAPSE_RATIO)),
+        'max_files_per_dir': int(os.getenv('PURGE_MAX_FILES_PER_DIR', DEFAULT_MAX_FILES_PER_DIR)),
+    }
@@ -0,0 +1,193 @@
+"""
+边缘节点 IP 解析
+
+Front Door 的主机名由 DNS 按解析器所在位置调度到不同的边缘节点，本机解析器只会给出其中一个。
+本模块向多个递归解析器分别发送 A 记录查询（标准库实现的最小 DNS 客户端，跟随解析器返回的
+CNAME 链，只收集 A 记录），汇总得到一组边缘 IP，供 CacheProber 把同一请求固定发送到每个 IP。
+"""
+
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+# 默认参数
+DNS_PORT = 53
+DEFAULT_DNS_TIMEOUT = 3.0      # 单次查询的超时（秒）
+
+# 常用的公共递归解析器，--resolver public 时使用
+PUBLIC_RESOLVERS = ('8.8.8.8', '1.1.1.1', '9.9.9.9', '208.67.222.222')
+
+# 使用本机解析器（getaddrinfo）
+SYSTEM_RESOLVER = 'system'
+
+_TYPE_A = 1
+_CLASS_IN = 1
+
+
+def parse_ip_list(values: Iterable[str]) -> List[str]:
+    """
+    解析并校验 IP 列表（每项可以是逗号分隔的多个 IP），保持顺序并去重
+
+    Raises:
+        ValueError: 不是合法的 IPv4 / IPv6 地址
+    """
+    ips = []
+    for value in values:
+        for item in value.split(','):
+            item = item.strip()
+            if item:
+                try:
+                    ips.append(str(ipaddress.ip_address(item)))
+                except ValueError:
+                    raise ValueError(f"无效的 IP 地址: {item}") from None
+    return list(dict.fromkeys(ips))
+
+
+def expand_resolvers(values: Iterable[str]) -> List[str]:
+    """展开解析器列表：'public' 展开为 PUBLIC_RESOLVERS，'system' 保留，其余必须是 IP"""
+    resolvers = []
+    for value in values:
+        for item in value.split(','):
+            item = item.strip()
+            if item == 'public':
+                resolvers.extend(PUBLIC_RESOLVERS)
+            elif item == SYSTEM_RESOLVER:
+                resolvers.append(item)
+            elif item:
+                resolvers.extend(parse_ip_list([item]))
+    return list(dict.fromkeys(resolvers))
+
+
+def _build_query(host: str, query_id: int) -> bytes:
+    """构造递归查询 A 记录的 DNS 报文"""
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    name = b''.join(bytes([len(label)]) + label for label in host.rstrip('.').encode('idna').split(b'.'))
+    return header + name + b'\x00' + struct.pack('!HH', _TYPE_A, _CLASS_IN)
+
+
+def _skip_name(packet: bytes, offset: int) -> int:
+    """跳过报文中的域名（支持压缩指针），返回其后的偏移"""
+    while True:
+        length = packet[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def _parse_a_records(packet: bytes, query_id: int) -> List[str]:
+    """
+    从 DNS 响应中取出所有 A 记录
+
+    Raises:
+        ValueError: 响应 ID 不匹配、报文被截断或解析器返回错误
+    """
+    if len(packet) < 12:
+        raise ValueError("DNS 响应过短")
+    response_id, flags, questions, answers = struct.unpack('!HHHH', packet[:8])
+    if response_id != query_id:
+        raise ValueError("DNS 响应 ID 不匹配")
+    if flags & 0x0200:
+        raise ValueError("DNS 响应被截断")
+    if flags & 0x000F:
+        raise ValueError(f"DNS 查询失败 (RCODE {flags & 0x000F})")
+
+    offset = 12
+    for _ in range(questions):
+        offset = _skip_name(packet, offset) + 4
+    ips = []
+    for _ in range(answers):
+        offset = _skip_name(packet, offset)
+        record_type, record_class, _, length = struct.unpack('!HHIH', packet[offset:offset + 10])
+        offset += 10
+        if record_type == _TYPE_A and record_class == _CLASS_IN and length == 4:
+            ips.append(socket.inet_ntoa(packet[offset:offset + 4]))
+        offset += length
+    return ips
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+
+    def datagram_received(self, data: bytes, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc: Exception):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def query_a(host: str, resolver: str, timeout: float = DEFAULT_DNS_TIMEOUT) -> List[str]:
+    """
+    向指定解析器查询主机名的 A 记录
+
+    Args:
+        host: 主机名
+        resolver: 解析器 IP，或 SYSTEM_RESOLVER 表示本机解析器
+        timeout: 超时（秒）
+
+    Returns:
+        List[str]: IPv4 地址
+
+    Raises:
+        OSError / ValueError / asyncio.TimeoutError: 查询失败
+    """
+    loop = asyncio.get_running_loop()
+    if resolver == SYSTEM_RESOLVER:
+        infos = await asyncio.wait_for(
+            loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_STREAM), timeout
+        )
+        return list(dict.fromkeys(info[4][0] for info in infos))
+
+    query_id = random.getrandbits(16)
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _QueryProtocol(future), remote_addr=(resolver, DNS_PORT)
+    )
+    try:
+        transport.sendto(_build_query(host, query_id))
+        return _parse_a_records(await asyncio.wait_for(future, timeout), query_id)
+    finally:
+        transport.close()
+
+
+async def resolve_edge_ips(hosts: Sequence[str], resolvers: Sequence[str],
+                           timeout: float = DEFAULT_DNS_TIMEOUT,
+                           log: Optional[Callable[[str], None]] = None) -> Dict[str, List[str]]:
+    """
+    用多个解析器并发解析每个主机名，汇总各解析器给出的边缘 IP
+
+    单个解析器失败只输出警告，不影响其他解析器的结果。
+
+    Args:
+        hosts: 主机名
+        resolvers: 解析器 IP 或 SYSTEM_RESOLVER
+        timeout: 单次查询的超时（秒）
+        log: 输出函数，默认为 print
+
+    Returns:
+        Dict[str, List[str]]: 主机名到边缘 IP 的映射（按首次出现的顺序去重）
+    """
+    log = log or print
+    hosts = list(dict.fromkeys(hosts))
+
+    async def lookup(host: str, resolver: str) -> List[str]:
+        try:
+            ips = await query_a(host, resolver, timeout)
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            log(f"⚠️  解析器 {resolver} 解析 {host} 失败: {str(e) or type(e).__name__}")
+            return []
+        log(f"🧭 {resolver} → {host}: {', '.join(ips) or '无 A 记录'}")
+        return ips
+
+    answers = await asyncio.gather(*(lookup(host, resolver) for host in hosts for resolver in resolvers))
+    edge_ips: Dict[str, List[str]] = {host: [] for host in hosts}
+    for index, ips in enumerate(answers):
+        edge_ips[hosts[index // len(resolvers)]].extend(ips)
+    return {host: list(dict.fromkeys(ips)) for host, ips in edge_ips.items()}
@@ -0,0 +1,155 @@
+"""
+Endpoint 清单缓存
+
+缓存 afd_endpoints.list_by_profile 的结果，带 TTL，同时保存在内存和磁盘上。
+清单新鲜时，脚本化的清除可以完全跳过 ARM 列表调用。
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from purge_settings import get_state_path, ensure_parent_dir
+
+
+# 默认缓存有效期（秒）
+DEFAULT_INVENTORY_TTL = 600.0
+
+
+@dataclass(frozen=True)
+class EndpointInfo:
+    """清除流程需要的 endpoint 信息"""
+
+    name: str
+    host_name: str
+    provisioning_state: str = 'Unknown'
+
+    @classmethod
+    def from_model(cls, endpoint: Any) -> "EndpointInfo":
+        """从 SDK 的 AFDEndpoint 模型转换"""
+        return cls(
+            name=endpoint.name,
+            host_name=getattr(endpoint, 'host_name', None) or '',
+            provisioning_state=getattr(endpoint, 'provisioning_state', None) or 'Unknown'
+        )
+
+
+def make_inventory_key(subscription_id: str, resource_group: str, profile: str) -> str:
+    """生成 Front Door profile 的缓存键"""
+    return '/'.join([subscription_id, resource_group.lower(), profile.lower()])
+
+
+class EndpointInventory:
+    """带 TTL 的 endpoint 清单缓存（内存 + 磁盘）"""
+
+    def __init__(self, ttl: float = DEFAULT_INVENTORY_TTL, path: Optional[str] = None,
+                 persist: bool = True):
+        """
+        Args:
+            ttl: 缓存有效期（秒）
+            path: 磁盘缓存文件路径，默认为状态目录下的 inventory.json
+            persist: 是否使用磁盘缓存
+        """
+        self.ttl = ttl
+        self.persist = persist
+        self.path = path or (get_state_path('inventory.json') if persist else None)
+        self._memory: Dict[str, Tuple[float, List[EndpointInfo]]] = {}
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.ttl
+
+    def _load_disk(self) -> Dict[str, dict]:
+        if not self.persist or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_disk(self, data: Dict[str, dict]):
+        # 先写临时文件再替换，避免并发进程读到半个文件
+        ensure_parent_dir(self.path)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, key: str) -> Optional[List[EndpointInfo]]:
+        """
+        查找新鲜的缓存清单
+
+        Args:
+            key: make_inventory_key 生成的缓存键
+
+        Returns:
+            Optional[List[EndpointInfo]]: 缓存命中时返回清单，否则返回 None
+        """
+        cached = self._memory.get(key)
+        if cached and self._is_fresh(cached[0]):
+            return cached[1]
+
+        entry = self._load_disk().get(key)
+        if entry and self._is_fresh(entry['fetched_at']):
+            endpoints = [EndpointInfo(**item) for item in entry['endpoints']]
+            self._memory[key] = (entry['fetched_at'], endpoints)
+            return endpoints
+        return None
+
+    def store(self, key: str, endpoints: Iterable[Any]) -> List[EndpointInfo]:
+        """
+        保存清单到内存和磁盘
+
+        Args:
+            key: 缓存键
+            endpoints: SDK 模型或 EndpointInfo 列表
+
+        Returns:
+            List[EndpointInfo]: 转换后的清单
+        """
+        infos = [e if isinstance(e, EndpointInfo) else EndpointInfo.from_model(e) for e in endpoints]
+        fetched_at = time.time()
+        self._memory[key] = (fetched_at, infos)
+
+        if self.persist:
+            data = self._load_disk()
+            data[key] = {'fetched_at': fetched_at, 'endpoints': [asdict(info) for info in infos]}
+            self._write_disk(data)
+        return infos
+
+    def invalidate(self, key: str):
+        """使某个 profile 的缓存失效"""
+        self._memory.pop(key, None)
+        if self.persist:
+            data = self._load_disk()
+            if data.pop(key, None) is not None:
+                self._write_disk(data)
+
+    def get(self, key: str, fetch: Callable[[], Iterable[Any]], refresh: bool = False) -> List[EndpointInfo]:
+        """
+        获取清单：缓存新鲜时直接返回，否则调用 fetch 拉取并缓存
+
+        Args:
+            key: 缓存键
+            fetch: 拉取 endpoints 的函数（例如调用 list_by_profile）
+            refresh: 是否强制刷新
+
+        Returns:
+            List[EndpointInfo]: endpoint 清单
+        """
+        if not refresh:
+            cached = self.lookup(key)
+            if cached is not None:
+                return cached
+        return self.store(key, fetch())
+
+    async def aget(self, key: str, fetch: Callable[[], Awaitable[Iterable[Any]]],
+                   refresh: bool = False) -> List[EndpointInfo]:
+        """get 的异步版本，fetch 为协程函数"""
+        if not refresh:
+            cached = self.lookup(key)
+            if cached is not None:
+                return cached
+        return self.store(key, await fetch())
@@ -0,0 +1,318 @@
+"""
+多 profile / 多订阅批量清除
+
+按配置文件列出的目标（订阅、资源组、Front Door profile、可选的 endpoint 过滤）
+同时清除多个 profile。所有目标共用一个 HTTP 会话和一个认证凭据，同一订阅的目标
+共用一个 CdnManagementClient；每个订阅有自己的 ARM 速率控制器，所有订阅共享一个
+全局并发预算，最后输出一份汇总报告。
+
+配置示例::
+
+    {
+        "paths": ["/*"],
+        "targets": [
+            {"subscription_id": "...", "resource_group": "rg-web", "profile": "fd-web"},
+            {"subscription_id": "...", "resource_group": "rg-api", "profile": "fd-api",
+             "endpoints": ["api-*"], "paths": ["/v1/*"]}
+        ]
+    }
+"""
+
+import asyncio
+import fnmatch
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from async_purge import AsyncAzureFrontDoorPurgeClient, DEFAULT_MAX_CONCURRENCY, ARM_SCOPE
+from azure_clients import create_credential, create_cdn_client, create_aio_transport
+from endpoint_inventory import EndpointInventory
+from instrumentation import Instrumentation, PHASE_AUTH
+from path_planner import DEFAULT_MAX_PATHS_PER_REQUEST
+from purge_journal import PurgeJournal, DEFAULT_IDEMPOTENCY_WINDOW
+from purge_coordination import PurgeCoordinator
+from purge_models import PurgeOutcome
+from rate_control import RateController, ConcurrencyBudget
+from retry_policy import RetryPolicy
+
+
+@dataclass(frozen=True)
+class FleetTarget:
+    """一个要清除的 Front Door profile"""
+
+    subscription_id: str
+    resource_group: str
+    profile: str
+    endpoints: Tuple[str, ...] = ()
+    paths: Tuple[str, ...] = ()
+
+    @property
+    def label(self) -> str:
+        return f"{self.resource_group}/{self.profile}"
+
+    def select_endpoints(self, endpoint_names: List[str]) -> List[str]:
+        """按 endpoint 过滤（名称或通配模式，例如 'api-*'）选择 endpoints，未配置过滤时全选"""
+        if not self.endpoints:
+            return list(endpoint_names)
+        return [
+            name for name in endpoint_names
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in self.endpoints)
+        ]
+
+
+def load_fleet_config(path: str) -> Tuple[List[FleetTarget], List[str]]:
+    """
+    读取批量清除配置
+
+    Args:
+        path: JSON 配置文件路径
+
+    Returns:
+        Tuple[List[FleetTarget], List[str]]: (目标列表, 默认清除路径)
+
+    Raises:
+        ValueError: 配置格式不正确
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    targets = []
+    for index, item in enumerate(data.get('targets') or []):
+        missing = [key for key in ('subscription_id', 'resource_group', 'profile') if not item.get(key)]
+        if missing:
+            raise ValueError(f"第 {index + 1} 个目标缺少字段: {', '.join(missing)}")
+        targets.append(FleetTarget(
+            subscription_id=item['subscription_id'],
+            resource_group=item['resource_group'],
+            profile=item['profile'],
+            endpoints=tuple(item.get('endpoints') or ()),
+            paths=tuple(item.get('paths') or ())
+        ))
+    if not targets:
+        raise ValueError("配置中没有任何目标")
+    return targets, list(data.get('paths') or [])
+
+
+class ClientPool:
+    """共享的 HTTP 会话和认证凭据，每个订阅一个 CdnManagementClient"""
+
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str,
+                 max_connections: int = DEFAULT_MAX_CONCURRENCY):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_connections = max_connections
+        self.session = None
+        self.credential = None
+        self.clients: Dict[str, Any] = {}
+
+    def _ensure_credential(self):
+        if self.session is None:
+            import aiohttp
+
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections)
+            )
+            self.credential = create_credential(
+                self.tenant_id, self.client_id, self.client_secret, aio=True,
+                transport=create_aio_transport(self.session)
+            )
+
+    async def authenticate(self, instrumentation: Instrumentation, log: Callable[[str], None] = print):
+        """预先获取 ARM 访问令牌（所有目标共用），把认证耗时单独记录为 auth 阶段"""
+        self._ensure_credential()
+        try:
+            with instrumentation.span(PHASE_AUTH):
+                await self.credential.get_token(ARM_SCOPE)
+        except Exception as e:
+            log(f"⚠️  获取访问令牌失败: {str(e)}")
+
+    def get(self, subscription_id: str):
+        """获取（延迟创建）订阅的 CDN 管理客户端（azure.mgmt.cdn.aio），需在事件循环中调用"""
+        self._ensure_credential()
+        if subscription_id not in self.clients:
+            self.clients[subscription_id] = create_cdn_client(
+                self.credential, subscription_id, aio=True,
+                transport=create_aio_transport(self.session)
+            )
+        return self.clients[subscription_id]
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
+        self.clients.clear()
+        if self.credential is not None:
+            await self.credential.close()
+            self.credential = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+@dataclass
+class TargetResult:
+    """单个目标的清除结果"""
+
+    target: FleetTarget
+    outcomes: Dict[str, PurgeOutcome] = field(default_factory=dict)
+    error: Optional[str] = None
+    job_id: Optional[str] = None
+    elapsed: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and all(self.outcomes.values())
+
+
+@dataclass
+class FleetReport:
+    """所有目标的汇总报告"""
+
+    results: List[TargetResult]
+    elapsed: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return all(result.success for result in self.results)
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def summary_lines(self) -> List[str]:
+        """生成可读的汇总报告"""
+        endpoint_total = sum(len(result.outcomes) for result in self.results)
+        endpoint_ok = sum(1 for result in self.results for outcome in result.outcomes.values() if outcome)
+        target_ok = sum(1 for result in self.results if result.success)
+
+        lines = [
+            f"📊 批量清除完成: {target_ok}/{len(self.results)} 个 profiles 成功, "
+            f"{endpoint_ok}/{endpoint_total} 个 endpoints 成功 (总耗时 {self.elapsed:.1f}s)"
+        ]
+        for result in self.results:
+            icon = '✅' if result.success else '❌'
+            ok = sum(1 for outcome in result.outcomes.values() if outcome)
+            line = (f"{icon} {result.target.label} ({result.target.subscription_id}): "
+                    f"{ok}/{len(result.outcomes)} 个 endpoints 成功, 耗时 {result.elapsed:.1f}s")
+            if result.job_id:
+                line += f", 任务 ID {result.job_id}"
+            lines.append(line)
+            if result.error:
+                lines.append(f"   - {result.error}")
+            for name, outcome in result.outcomes.items():
+                if not outcome:
+                    lines.append(f"   - {name} (尝试 {outcome.attempts} 次): {outcome.error}")
+        return lines
+
+
+class FleetPurger:
+    """多 profile 批量清除"""
+
+    def __init__(self, targets: List[FleetTarget], pool: ClientPool,
+                 log: Optional[Callable[[str], None]] = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 rate_controller_factory: Callable[..., RateController] = RateController,
+                 retry_policy_factory: Callable[[], RetryPolicy] = RetryPolicy,
+                 journal: Optional[PurgeJournal] = None,
+                 idempotency_window: float = DEFAULT_IDEMPOTENCY_WINDOW,
+                 inventory: Optional[EndpointInventory] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 coordinator: Optional[PurgeCoordinator] = None):
+        """
+        Args:
+            targets: 要清除的目标
+            pool: 共享的客户端池，由调用方负责关闭
+            log: 输出函数，默认为 print
+            max_concurrency: 所有目标共享的全局并发预算
+            rate_controller_factory: 创建每个订阅速率控制器的函数（接收 budget 关键字参数）
+            retry_policy_factory: 创建每个目标重试策略的函数
+            journal: 共享的清除任务日志
+            idempotency_window: 幂等窗口（秒）
+            inventory: 共享的 endpoint 清单缓存
+            instrumentation: 埋点记录器，每个目标的客户端绑定各自的 profile 属性
+            coordinator: 共享的跨进程清除协调表，为 None 时不去重
+        """
+        self.targets = targets
+        self.pool = pool
+        self.log = log or print
+        self.max_concurrency = max_concurrency
+        self.budget = ConcurrencyBudget(max_concurrency)
+        self.journal = journal
+        self.idempotency_window = idempotency_window
+        self.inventory = inventory or EndpointInventory()
+        self.instrumentation = instrumentation or Instrumentation()
+        self.coordinator = coordinator
+
+        # ARM 按订阅限流：同一订阅的目标共用一个速率控制器
+        self.rate_controllers: Dict[str, RateController] = {}
+        self._rate_controller_factory = rate_controller_factory
+        self._retry_policy_factory = retry_policy_factory
+
+    def _get_rate_controller(self, subscription_id: str) -> RateController:
+        if subscription_id not in self.rate_controllers:
+            self.rate_controllers[subscription_id] = self._rate_controller_factory(
+                max_concurrency=self.max_concurrency, budget=self.budget
+            )
+        return self.rate_controllers[subscription_id]
+
+    def _create_client(self, target: FleetTarget) -> AsyncAzureFrontDoorPurgeClient:
+        return AsyncAzureFrontDoorPurgeClient(
+            tenant_id=self.pool.tenant_id,
+            client_id=self.pool.client_id,
+            client_secret=self.pool.client_secret,
+            subscription_id=target.subscription_id,
+            resource_group_name=target.resource_group,
+            front_door_name=target.profile,
+            log=lambda message: self.log(f"[{target.label}] {message}"),
+            rate_controller=self._get_rate_controller(target.subscription_id),
+            retry_policy=self._retry_policy_factory(),
+            journal=self.journal,
+            idempotency_window=self.idempotency_window,
+            inventory=self.inventory,
+            cdn_client=self.pool.get(target.subscription_id),
+            instrumentation=self.instrumentation,
+            coordinator=self.coordinator
+        )
+
+    async def _purge_target(self, target: FleetTarget, paths: List[str], **kwargs) -> TargetResult:
+        result = TargetResult(target)
+        started = time.time()
+        client = self._create_client(target)
+        try:
+            endpoint_names = target.select_endpoints([e.name for e in await client.get_endpoints()])
+            if not endpoint_names:
+                result.error = "没有匹配过滤条件的 endpoints"
+            else:
+                result.outcomes = await client.purge_many(endpoint_names, list(target.paths) or paths, **kwargs)
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            result.job_id = client.job_id
+            result.elapsed = time.time() - started
+        return result
+
+    async def purge(self, paths: List[str],
+                    max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                    route_aware: bool = False, **kwargs) -> FleetReport:
+        """
+        同时清除所有目标
+
+        Args:
+            paths: 默认清除路径（目标自己配置了 paths 时使用目标的路径）
+            max_paths_per_request: 单次清除请求的最大路径数
+            route_aware: 是否按路由索引只向实际提供路径的 endpoints 发送清除
+            **kwargs: 传给 purge_units 的轮询参数
+
+        Returns:
+            FleetReport: 汇总报告
+        """
+        started = time.time()
+        await self.pool.authenticate(self.instrumentation, self.log)
+        # 每个目标的 purge_units 会把速率控制器的并发上限设为该值；全局上限由共享预算保证
+        kwargs['max_concurrency'] = self.max_concurrency
+        results = await asyncio.gather(*(
+            self._purge_target(target, paths, max_paths_per_request=max_paths_per_request,
+                               route_aware=route_aware, **kwargs)
+            for target in self.targets
+        ))
+        return FleetReport(list(results), elapsed=time.time() - started)
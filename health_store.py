@@ -0,0 +1,479 @@
+"""
+缓存健康时间序列
+
+按固定间隔持续探测一组 URL，把每个样本（状态码、TTFB / 总耗时、缓存状态、ETag、POP）写入本地 SQLite。
+原始样本保留 PURGE_HEALTH_RAW_DAYS（默认 7 天），每个整点之后按小时、URL、POP 汇总为 rollup
+（保留 PURGE_HEALTH_ROLLUP_DAYS，默认 90 天）。查询按时间桶给出命中率和延迟百分位数的趋势，
+并可对比任务日志中每次清除前后的变化。
+"""
+
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache_probe import CacheProber, MODE_RANGE, UNKNOWN_POP, is_hit
+from latency_stats import LATENCY_FIELDS, PERCENTILES, TIMINGS, format_ms, group_percentiles
+from purge_settings import get_state_path, ensure_parent_dir
+
+
+# 默认参数
+DEFAULT_SAMPLE_INTERVAL = 60.0         # 两轮探测之间的间隔（秒）
+DEFAULT_RAW_DAYS = 7                   # 原始样本保留天数
+DEFAULT_ROLLUP_DAYS = 90               # 小时汇总保留天数
+DEFAULT_EVENT_WINDOW = 3600.0          # 比较清除前后各多长时间（秒）
+DEFAULT_SAMPLE_MODE = MODE_RANGE       # 持续探测只取 1 个字节，避免反复下载完整内容
+ROLLUP_RESOLUTION = 3600               # 汇总的时间粒度（秒）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    url_id INTEGER NOT NULL,
+    pop TEXT NOT NULL,
+    status INTEGER,
+    ttfb REAL,
+    total REAL,
+    hit INTEGER NOT NULL,
+    cache_state TEXT,
+    etag TEXT,
+    edge_ip TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    bucket INTEGER NOT NULL,
+    url_id INTEGER NOT NULL,
+    pop TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    ttfb_p50 REAL, ttfb_p90 REAL, ttfb_p99 REAL, ttfb_max REAL,
+    total_p50 REAL, total_p90 REAL, total_p99 REAL, total_max REAL,
+    PRIMARY KEY (bucket, url_id, pop)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+_DURATION_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(text: str) -> float:
+    """
+    解析时长，例如 90、30s、15m、24h、7d
+
+    Raises:
+        ValueError: 格式无效
+    """
+    match = _DURATION_PATTERN.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"无效的时长: {text}（例如 30m、24h、7d）")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def summarize(samples: Iterable[Tuple[Optional[int], Optional[float], Optional[float], int]]) -> dict:
+    """
+    汇总一组样本
+
+    Args:
+        samples: (状态码, TTFB, 总耗时, 是否命中)，状态码为 None 表示请求失败
+
+    Returns:
+        dict: samples、errors、hits、hit_ratio 以及 ttfb / total 的 p50 / p90 / p99 / max（毫秒）
+    """
+    count = errors = hits = 0
+    timings: Dict[str, List[float]] = {timing: [] for timing in TIMINGS}
+    for status, ttfb, total, hit in samples:
+        count += 1
+        if status is None:
+            errors += 1
+            continue
+        hits += bool(hit)
+        timings['ttfb'].append(ttfb)
+        timings['total'].append(total)
+
+    summary = {'samples': count, 'errors': errors, 'hits': hits,
+               'hit_ratio': round(hits / (count - errors), 4) if count > errors else None}
+    for timing, values in timings.items():
+        # 与 verify 报告使用同一套百分位数算法（latency_stats），全部样本作为一组
+        stats = group_percentiles(np.zeros(len(values), dtype=int), np.array(values, dtype=float), 1)
+        for name, value in stats.items():
+            summary[f"{timing}_{name}"] = None if np.isnan(value[0]) else round(float(value[0]), 2)
+    return summary
+
+
+def merge_summaries(summaries: Sequence[dict]) -> dict:
+    """
+    合并多个汇总（例如多个小时、多个 URL 的 rollup）
+
+    计数直接相加；百分位数按成功样本数加权平均，是近似值；最大值取最大。
+    """
+    count = sum(summary['samples'] for summary in summaries)
+    errors = sum(summary['errors'] for summary in summaries)
+    hits = sum(summary['hits'] for summary in summaries)
+    merged = {'samples': count, 'errors': errors, 'hits': hits,
+              'hit_ratio': round(hits / (count - errors), 4) if count > errors else None}
+    for field in LATENCY_FIELDS:
+        weighted = [(summary[field], summary['samples'] - summary['errors'])
+                    for summary in summaries if summary[field] is not None]
+        if not weighted:
+            merged[field] = None
+        elif field.endswith('_max'):
+            merged[field] = max(value for value, _ in weighted)
+        else:
+            weight = sum(ok for _, ok in weighted)
+            merged[field] = round(sum(value * ok for value, ok in weighted) / weight, 2) if weight else None
+    return merged
+
+
+class HealthStore:
+    """基于 SQLite 的缓存健康时间序列"""
+
+    def __init__(self, path: Optional[str] = None,
+                 raw_retention: Optional[float] = None,
+                 rollup_retention: Optional[float] = None):
+        """
+        Args:
+            path: 数据库文件路径，默认为 PURGE_HEALTH_DB 或状态目录下的 health.db
+            raw_retention: 原始样本保留秒数，默认为 PURGE_HEALTH_RAW_DAYS 天
+            rollup_retention: 小时汇总保留秒数，默认为 PURGE_HEALTH_ROLLUP_DAYS 天
+        """
+        self.path = os.path.expanduser(path or os.getenv('PURGE_HEALTH_DB') or get_state_path('health.db'))
+        if raw_retention is None:
+            raw_retention = float(os.getenv('PURGE_HEALTH_RAW_DAYS', DEFAULT_RAW_DAYS)) * 86400
+        if rollup_retention is None:
+            rollup_retention = float(os.getenv('PURGE_HEALTH_ROLLUP_DAYS', DEFAULT_ROLLUP_DAYS)) * 86400
+        # 原始样本至少保留到被汇总之后
+        self.raw_retention = max(raw_retention, 2 * ROLLUP_RESOLUTION)
+        self.rollup_retention = rollup_retention
+        ensure_parent_dir(self.path)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+        self._url_ids: Dict[str, int] = dict(self.conn.execute('SELECT url, url_id FROM urls'))
+
+    def close(self):
+        self.conn.close()
+
+    def _url_id(self, url: str) -> int:
+        if url not in self._url_ids:
+            self.conn.execute('INSERT OR IGNORE INTO urls (url) VALUES (?)', (url,))
+            self._url_ids[url] = self.conn.execute('SELECT url_id FROM urls WHERE url = ?', (url,)).fetchone()[0]
+        return self._url_ids[url]
+
+    def _get_meta(self, key: str) -> Optional[float]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def add_samples(self, results: Dict[str, List[dict]], ts: Optional[float] = None) -> int:
+        """
+        写入一轮探测结果
+
+        Args:
+            results: URL 到探测结果的映射（CacheProber.run 的返回值）
+            ts: 样本时间，默认为当前时间
+
+        Returns:
+            int: 写入的样本数
+        """
+        ts = time.time() if ts is None else ts
+        with self.conn:
+            rows = [
+                (ts, self._url_id(url), sample.get('pop', UNKNOWN_POP), sample.get('status_code'),
+                 sample.get('ttfb'), sample.get('total_time'),
+                 int('status_code' in sample and is_hit(sample.get('x_cache', 'N/A'))),
+                 sample.get('x_cache'), sample.get('etag'), sample.get('edge_ip'))
+                for url, samples in results.items() for sample in samples
+            ]
+            self.conn.executemany('INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def rollup(self, now: Optional[float] = None) -> int:
+        """
+        把已经结束的整点小时汇总为 rollup，并清理超过保留期的原始样本和汇总
+
+        每轮探测后都可以调用，没有新的完整小时时几乎没有开销。
+
+        Returns:
+            int: 新写入的汇总行数
+        """
+        now = time.time() if now is None else now
+        end = math.floor(now / ROLLUP_RESOLUTION) * ROLLUP_RESOLUTION
+        start = self._get_meta('rolled_up_until')
+        if start is None:
+            first = self.conn.execute('SELECT MIN(ts) FROM samples').fetchone()[0]
+            if first is None:
+                return 0
+            start = math.floor(first / ROLLUP_RESOLUTION) * ROLLUP_RESOLUTION
+        if start >= end:
+            return 0
+
+        groups: Dict[Tuple[int, int, str], list] = {}
+        for ts, url_id, pop, status, ttfb, total, hit in self.conn.execute(
+                'SELECT ts, url_id, pop, status, ttfb, total, hit FROM samples WHERE ts >= ? AND ts < ?',
+                (start, end)):
+            bucket = int(ts // ROLLUP_RESOLUTION * ROLLUP_RESOLUTION)
+            groups.setdefault((bucket, url_id, pop), []).append((status, ttfb, total, hit))
+
+        with self.conn:
+            for (bucket, url_id, pop), samples in groups.items():
+                summary = summarize(samples)
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * len(LATENCY_FIELDS))})",
+                    (bucket, url_id, pop, summary['samples'], summary['errors'], summary['hits'])
+                    + tuple(summary[field] for field in LATENCY_FIELDS)
+                )
+            self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('rolled_up_until', end))
+            # 原始样本按整点清理，保证原始样本与汇总覆盖的时间范围在整点处衔接
+            raw_cutoff = min(end, math.floor((now - self.raw_retention) / ROLLUP_RESOLUTION) * ROLLUP_RESOLUTION)
+            self.conn.execute('DELETE FROM samples WHERE ts < ?', (raw_cutoff,))
+            self.conn.execute('DELETE FROM rollups WHERE bucket < ?', (now - self.rollup_retention,))
+        return len(groups)
+
+    def _filters(self, url: Optional[str], pop: Optional[str]) -> Tuple[str, tuple]:
+        clauses, params = [], []
+        if url is not None:
+            clauses.append('url_id = ?')
+            params.append(self._url_ids.get(url, -1))
+        if pop is not None:
+            clauses.append('pop = ?')
+            params.append(pop)
+        return ''.join(f' AND {clause}' for clause in clauses), tuple(params)
+
+    def _raw_start(self) -> float:
+        """
+        原始样本覆盖范围的起点（整点）
+
+        原始样本按整点清理，最早样本所在的整点之后的原始样本都是完整的，之前的时间只能使用汇总。
+        """
+        first = self.conn.execute('SELECT MIN(ts) FROM samples').fetchone()[0]
+        if first is None:
+            return math.inf
+        return math.floor(first / ROLLUP_RESOLUTION) * ROLLUP_RESOLUTION
+
+    def _select_samples(self, since: float, until: float, url: Optional[str],
+                        pop: Optional[str]) -> Iterable[Tuple[float, Optional[int], Optional[float], Optional[float], int]]:
+        where, params = self._filters(url, pop)
+        return self.conn.execute(
+            f"SELECT ts, status, ttfb, total, hit FROM samples WHERE ts >= ? AND ts < ?{where}",
+            (since, until) + params
+        )
+
+    def _select_rollups(self, since: float, until: float, url: Optional[str],
+                        pop: Optional[str]) -> Iterable[Tuple[int, dict]]:
+        where, params = self._filters(url, pop)
+        fields = ('samples', 'errors', 'hits') + LATENCY_FIELDS
+        cursor = self.conn.execute(
+            f"SELECT bucket, {', '.join(fields)} FROM rollups WHERE bucket >= ? AND bucket < ?{where}",
+            (math.floor(since / ROLLUP_RESOLUTION) * ROLLUP_RESOLUTION, until) + params
+        )
+        return ((bucket, dict(zip(fields, values))) for bucket, *values in cursor)
+
+    def trend(self, since: float, until: float, resolution: float = ROLLUP_RESOLUTION,
+              url: Optional[str] = None, pop: Optional[str] = None) -> List[dict]:
+        """
+        按时间桶统计命中率和延迟
+
+        原始样本覆盖的时间按 resolution 分桶精确计算；更早的时间使用小时汇总
+        （桶宽至少 1 小时，百分位数为近似值，行中 approximate 为 True）。
+
+        Args:
+            since: 起始时间（time.time()）
+            until: 结束时间
+            resolution: 桶宽（秒）
+            url: 只统计该 URL
+            pop: 只统计该 POP
+
+        Returns:
+            List[dict]: 每个桶一行：time（桶起始时间）、approximate 和 summarize 的字段，按时间排列
+        """
+        resolution = max(1.0, resolution)
+        raw_start = max(since, self._raw_start())
+        rollup_resolution = max(ROLLUP_RESOLUTION, resolution)
+        # 桶起始时间 -> (小时汇总, 原始样本)；衔接处的桶可能同时包含两者
+        buckets: Dict[float, Tuple[List[dict], list]] = {}
+
+        if since < raw_start:
+            for bucket, summary in self._select_rollups(since, min(until, raw_start), url, pop):
+                buckets.setdefault(bucket // rollup_resolution * rollup_resolution, ([], []))[0].append(summary)
+        for ts, *sample in self._select_samples(raw_start, until, url, pop):
+            buckets.setdefault(ts // resolution * resolution, ([], []))[1].append(sample)
+
+        rows = []
+        for bucket, (summaries, samples) in sorted(buckets.items()):
+            if not summaries:
+                rows.append({'time': bucket, 'approximate': False, **summarize(samples)})
+                continue
+            if samples:
+                summaries.append(summarize(samples))
+            rows.append({'time': bucket, 'approximate': True, **merge_summaries(summaries)})
+        return rows
+
+    def window(self, since: float, until: float, url: Optional[str] = None,
+               pop: Optional[str] = None) -> dict:
+        """
+        统计一个时间窗口内的全部样本
+
+        窗口全部在原始样本覆盖范围内时为精确值；包含更早的时间时合并小时汇总，approximate 为 True。
+        """
+        raw_start = max(since, self._raw_start())
+        summaries = [summary for _, summary in self._select_rollups(since, min(until, raw_start), url, pop)] \
+            if since < raw_start else []
+        raw = [sample for _, *sample in self._select_samples(raw_start, until, url, pop)]
+        if not summaries:
+            return {'approximate': False, **summarize(raw)}
+        if raw:
+            summaries.append(summarize(raw))
+        return {'approximate': True, **merge_summaries(summaries)}
+
+    def around(self, event_time: float, window: float = DEFAULT_EVENT_WINDOW,
+               url: Optional[str] = None, pop: Optional[str] = None) -> Dict[str, dict]:
+        """
+        比较某个时间点（例如清除完成）前后各 window 秒的命中率和延迟
+
+        Returns:
+            Dict[str, dict]: {'before': 统计, 'after': 统计}
+        """
+        return {
+            'before': self.window(event_time - window, event_time, url, pop),
+            'after': self.window(event_time, event_time + window, url, pop),
+        }
+
+    def urls(self) -> List[str]:
+        return list(self._url_ids)
+
+    def pops(self) -> List[str]:
+        rows = self.conn.execute('SELECT DISTINCT pop FROM samples UNION SELECT DISTINCT pop FROM rollups')
+        return sorted(row[0] for row in rows)
+
+
+class HealthSampler:
+    """按固定间隔持续探测 URL 并写入 HealthStore"""
+
+    def __init__(self, store: HealthStore, urls: Sequence[str],
+                 interval: float = DEFAULT_SAMPLE_INTERVAL,
+                 prober: Optional[CacheProber] = None,
+                 edge_ips: Optional[Dict[str, Sequence[str]]] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            store: 时间序列存储
+            urls: 要探测的 URL
+            interval: 两轮探测之间的间隔（秒），按固定节拍调度，不受单轮耗时影响
+            prober: 探测器，默认为 range 模式的 CacheProber
+            edge_ips: 主机名到边缘 IP 的映射，指定时每轮在每个边缘 IP 上分别探测
+            log: 输出函数，默认为 print
+        """
+        self.store = store
+        self.urls = list(dict.fromkeys(urls))
+        self.interval = interval
+        self.log = log or print
+        self.prober = prober or CacheProber(mode=DEFAULT_SAMPLE_MODE, log=self.log)
+        self.edge_ips = edge_ips
+
+    async def run(self, duration: Optional[float] = None, rounds: Optional[int] = None) -> int:
+        """
+        持续探测，直到达到 duration 秒或 rounds 轮（都未指定时一直运行）
+
+        Returns:
+            int: 写入的样本总数
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        next_at = started
+        semaphore = asyncio.Semaphore(self.prober.concurrency)
+        targets = self.prober.edge_targets(self.urls, self.edge_ips)
+        written = completed = 0
+
+        async def probe(session, url: str, ip: Optional[str]) -> Tuple[str, dict]:
+            async with semaphore:
+                result = await self.prober.probe(session, url)
+            if ip is not None:
+                result['edge_ip'] = ip
+            return url, result
+
+        async with self.prober.edge_sessions(ip for _, ip in targets) as sessions:
+            while True:
+                sampled_at = time.time()
+                results: Dict[str, List[dict]] = {url: [] for url in self.urls}
+                for url, result in await asyncio.gather(*(probe(sessions[ip], url, ip) for url, ip in targets)):
+                    results[url].append(result)
+                written += self.store.add_samples(results, sampled_at)
+                self.store.rollup()
+                completed += 1
+                self._log_round(sampled_at, results)
+
+                if (rounds and completed >= rounds) or (duration and loop.time() - started >= duration):
+                    return written
+                # 固定节拍：某一轮超时则跳过错过的节拍，而不是连续补发
+                next_at += self.interval
+                while next_at <= loop.time():
+                    next_at += self.interval
+                await asyncio.sleep(next_at - loop.time())
+
+    def _log_round(self, sampled_at: float, results: Dict[str, List[dict]]):
+        summary = summarize(
+            (sample.get('status_code'), sample.get('ttfb'), sample.get('total_time'),
+             'status_code' in sample and is_hit(sample.get('x_cache', 'N/A')))
+            for samples in results.values() for sample in samples
+        )
+        hit_ratio = f"{summary['hit_ratio']:.0%}" if summary['hit_ratio'] is not None else '-'
+        self.log(f"🩺 {time.strftime('%H:%M:%S', time.localtime(sampled_at))} {summary['samples']} 个样本, "
+                 f"错误 {summary['errors']}, 命中率 {hit_ratio}, TTFB p50 {format_ms(summary['ttfb_p50'])} / "
+                 f"p99 {format_ms(summary['ttfb_p99'])}")
+
+
+def _format_ratio(value: Optional[float]) -> str:
+    return f"{value:.0%}" if value is not None else '-'
+
+
+def describe_trend(rows: Sequence[dict], events: Sequence[dict], resolution: float) -> List[str]:
+    """
+    把趋势和清除事件格式化为文本表格
+
+    Args:
+        rows: HealthStore.trend 的返回值
+        events: 清除任务（PurgeJournal.completed_jobs 的返回值，附带 around 的 before / after）
+        resolution: 桶宽（秒），用于决定时间格式以及把清除事件标在所在的桶上
+
+    Returns:
+        List[str]: 输出行；近似值（来自小时汇总）的行以 ~ 标记，包含清除完成时间的行以 🧹 标记
+    """
+    time_format = '%m-%d' if resolution >= 86400 else '%m-%d %H:%M'
+    lines = [f"{'时间':<12}{'样本':>7}{'错误':>6}{'命中率':>7}  {'TTFB p50/p90/p99':>24}  {'总耗时 p50/p99':>13}"]
+    for index, row in enumerate(rows):
+        end = rows[index + 1]['time'] if index + 1 < len(rows) else math.inf
+        purged = any(row['time'] <= event['completed_at'] < end for event in events)
+        ttfb = '/'.join(format_ms(row[f"ttfb_p{p}"]) for p in PERCENTILES)
+        total = f"{format_ms(row['total_p50'])}/{format_ms(row['total_p99'])}"
+        lines.append(
+            f"{time.strftime(time_format, time.localtime(row['time'])):<12}{row['samples']:>7}{row['errors']:>6}"
+            f"{_format_ratio(row['hit_ratio']):>8}  {ttfb:>24}  {total:>16}"
+            f"{' ~' if row['approximate'] else ''}{' 🧹' if purged else ''}"
+        )
+
+    if events:
+        lines.append('')
+        lines.append('🧹 清除前后对比:')
+    for event in events:
+        before, after = event['before'], event['after']
+        lines.append(
+            f"  {time.strftime('%m-%d %H:%M:%S', time.localtime(event['completed_at']))} 任务 {event['job_id']} "
+            f"({event['profile']}, {event['endpoints']} 个 endpoint, {event['succeeded']}/{event['units']} 个单元成功): "
+            f"命中率 {_format_ratio(before['hit_ratio'])} → {_format_ratio(after['hit_ratio'])}, "
+            f"TTFB p50 {format_ms(before['ttfb_p50'])} → {format_ms(after['ttfb_p50'])}, "
+            f"p99 {format_ms(before['ttfb_p99'])} → {format_ms(after['ttfb_p99'])} "
+            f"(样本 {before['samples']} / {after['samples']})"
+        )
+    return lines
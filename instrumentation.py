@@ -0,0 +1,388 @@
+"""
+清除过程的结构化埋点
+
+清除路径上的各个阶段记录为带属性（endpoint、profile 等）的 span，成功、失败、
+限流和重试记录为计数器。埋点本身不做输出，而是交给一个或多个 sink：
+
+- PrometheusSink：聚合为 Prometheus 文本格式，可写入文件（node_exporter textfile）或由服务的 /metrics 提供
+- OpenTelemetrySink：转发为 OpenTelemetry span 和计数器（需要安装 opentelemetry-api）
+- TimingSummarySink：运行结束时在控制台输出各阶段耗时汇总
+
+另外提供基于队列的日志输出 QueueLogWriter：调用方只把日志行放入队列，由后台线程
+统一写出，热路径上不需要为每行日志获取全局锁。
+"""
+
+import os
+import queue
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+
+# 阶段名称
+PHASE_AUTH = 'auth'              # 获取 AAD 访问令牌
+PHASE_SUBMIT = 'submit'          # 提交 begin_purge_content
+PHASE_LRO_WAIT = 'lro_wait'      # 提交成功到 LRO 结束
+PHASE_RETRY_WAIT = 'retry_wait'  # 失败后等待重试的退避时间
+PHASE_PURGE = 'purge'            # 清除单元从首次提交到最终完成
+
+# 计数器名称
+COUNTER_SUCCEEDED = 'units_succeeded'
+COUNTER_FAILED = 'units_failed'
+COUNTER_THROTTLED = 'throttled'
+COUNTER_RETRIES = 'retries'
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+# Prometheus 指标名前缀与耗时直方图分桶（秒）
+METRIC_PREFIX = 'afd_purge'
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+@dataclass
+class Span:
+    """一个已结束的阶段"""
+
+    name: str
+    start: float                    # time.time() 时间戳
+    end: float
+    status: str = STATUS_OK
+    attributes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+
+class Sink:
+    """埋点输出的基类，子类按需覆盖"""
+
+    def on_span(self, span: Span):
+        pass
+
+    def on_count(self, name: str, value: float, labels: Dict[str, str]):
+        pass
+
+    def close(self):
+        pass
+
+
+class Instrumentation:
+    """
+    埋点记录器
+
+    没有 sink 时所有调用几乎没有开销。bind 返回共享同一组 sink、但附带默认属性的记录器，
+    例如每个 profile 的客户端各自绑定 profile 属性。
+    """
+
+    def __init__(self, sinks: Sequence[Sink] = (), attributes: Optional[Dict[str, str]] = None):
+        self.sinks: List[Sink] = sinks if isinstance(sinks, list) else list(sinks)
+        self.attributes = dict(attributes or {})
+
+    def bind(self, **attributes: str) -> "Instrumentation":
+        return Instrumentation(self.sinks, {**self.attributes, **attributes})
+
+    def add_sink(self, sink: Sink):
+        self.sinks.append(sink)
+
+    def find_sink(self, sink_type: type) -> Optional[Sink]:
+        return next((sink for sink in self.sinks if isinstance(sink, sink_type)), None)
+
+    def record_span(self, name: str, start: float, end: float, status: str = STATUS_OK, **attributes: str):
+        """记录一个在别处计时的阶段（例如由调度器测量的 LRO 等待）"""
+        if not self.sinks:
+            return
+        span = Span(name, start, end, status, {**self.attributes, **attributes})
+        for sink in self.sinks:
+            sink.on_span(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: str) -> Iterator[None]:
+        """记录包裹代码块的阶段，代码块抛出异常时状态为 error"""
+        start = time.time()
+        status = STATUS_OK
+        try:
+            yield
+        except BaseException:
+            status = STATUS_ERROR
+            raise
+        finally:
+            self.record_span(name, start, time.time(), status, **attributes)
+
+    def count(self, name: str, value: float = 1, **labels: str):
+        """增加计数器"""
+        if not self.sinks:
+            return
+        labels = {**self.attributes, **labels}
+        for sink in self.sinks:
+            sink.on_count(name, value, labels)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class PrometheusSink(Sink):
+    """
+    聚合为 Prometheus 指标
+
+    span 按 (阶段, 状态, label_names 中的属性) 聚合为耗时直方图，不按 endpoint 区分，
+    避免上千个 endpoints 产生过多时间序列；计数器同样只保留 label_names 中的标签。
+    """
+
+    def __init__(self, path: Optional[str] = None, label_names: Sequence[str] = ('profile',),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            path: 关闭时写入的文本文件路径，为 None 时不写文件
+            label_names: 保留的属性名
+            buckets: 耗时直方图分桶（秒）
+        """
+        self.path = path
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms: Dict[tuple, List[float]] = {}
+        self._counters: Dict[tuple, float] = {}
+
+    def _labels(self, attributes: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, str(attributes[name])) for name in self.label_names if name in attributes)
+
+    def on_span(self, span: Span):
+        key = (('phase', span.name), ('status', span.status)) + self._labels(span.attributes)
+        with self._lock:
+            # [各分桶计数..., +Inf 计数, 总和]
+            values = self._histograms.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    values[index] += 1
+            values[-2] += 1
+            values[-1] += span.duration
+
+    def on_count(self, name: str, value: float, labels: Dict[str, str]):
+        key = (name,) + self._labels(labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式"""
+        with self._lock:
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            counters = dict(self._counters)
+
+        metric = f'{METRIC_PREFIX}_phase_duration_seconds'
+        lines = [f'# HELP {metric} 清除各阶段耗时', f'# TYPE {metric} histogram']
+        for labels, values in sorted(histograms.items()):
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{metric}_bucket{_format_labels(labels + (("le", repr(bound)),))} {count:g}')
+            lines.append(f'{metric}_bucket{_format_labels(labels + (("le", "+Inf"),))} {values[-2]:g}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {values[-2]:g}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {values[-1]:.6f}')
+
+        for name in sorted({key[0] for key in counters}):
+            metric = f'{METRIC_PREFIX}_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for key, value in sorted(counters.items()):
+                if key[0] == name:
+                    lines.append(f'{metric}{_format_labels(key[1:])} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Optional[str] = None):
+        """原子地写入文本文件（先写临时文件再替换）"""
+        path = path or self.path
+        if not path:
+            return
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+    def close(self):
+        self.write()
+
+
+class OpenTelemetrySink(Sink):
+    """
+    转发为 OpenTelemetry span 和计数器
+
+    只依赖 opentelemetry-api；导出目标由进程中配置的 TracerProvider / MeterProvider 决定
+    （例如使用 opentelemetry-instrument 运行，或通过 OTEL_* 环境变量配置 SDK）。
+    """
+
+    def __init__(self, name: str = 'afd-purge'):
+        try:
+            from opentelemetry import metrics, trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetry 输出需要安装 opentelemetry-api") from e
+        self._trace = trace
+        self._tracer = trace.get_tracer(name)
+        self._meter = metrics.get_meter(name)
+        self._counters: Dict[str, object] = {}
+
+    def on_span(self, span: Span):
+        otel_span = self._tracer.start_span(
+            span.name, start_time=int(span.start * 1e9), attributes=span.attributes
+        )
+        if span.status == STATUS_ERROR:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        otel_span.end(end_time=int(span.end * 1e9))
+
+    def on_count(self, name: str, value: float, labels: Dict[str, str]):
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters[name] = self._meter.create_counter(f'{METRIC_PREFIX}.{name}')
+        counter.add(value, attributes=labels)
+
+
+class TimingSummarySink(Sink):
+    """运行结束时输出各阶段耗时汇总和最慢的 endpoints，回答"时间都花在哪里\""""
+
+    def __init__(self, log: Callable[[str], None] = print, slowest: int = 5):
+        self.log = log
+        self.slowest = slowest
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = {}
+        self._counts: Dict[str, float] = {}
+        self._purges: List[Span] = []
+
+    def on_span(self, span: Span):
+        with self._lock:
+            self._durations.setdefault(span.name, []).append(span.duration)
+            if span.name == PHASE_PURGE:
+                self._purges.append(span)
+
+    def on_count(self, name: str, value: float, labels: Dict[str, str]):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0.0) + value
+
+    def summary_lines(self) -> List[str]:
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            counts = dict(self._counts)
+            purges = sorted(self._purges, key=lambda span: span.duration, reverse=True)[:self.slowest]
+        if not durations and not counts:
+            return []
+
+        lines = ["⏱️  阶段耗时:"]
+        for name, values in durations.items():
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            lines.append(f"   {name:<11} {len(values):>6} 次  合计 {sum(values):8.1f}s  "
+                         f"中位数 {statistics.median(values):6.2f}s  p95 {p95:6.2f}s  最大 {values[-1]:6.2f}s")
+        if counts:
+            lines.append("   " + ", ".join(f"{name} {value:g}" for name, value in sorted(counts.items())))
+        if purges:
+            lines.append("🐌 最慢的清除单元:")
+            for span in purges:
+                target = '/'.join(filter(None, (span.attributes.get('profile'), span.attributes.get('endpoint'))))
+                lines.append(f"   {target}: {span.duration:.1f}s（尝试 {span.attributes.get('attempts', '1')} 次）")
+        return lines
+
+    def close(self):
+        for line in self.summary_lines():
+            self.log(line)
+
+
+class QueueLogWriter:
+    """
+    基于队列的日志输出
+
+    write 只把 (流, 消息) 放入无锁的 SimpleQueue，由后台线程写出并批量刷新，
+    调用方不会因为终端输出慢或其他线程正在输出而阻塞。flush 等待已排队的日志全部写出。
+    """
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+    def write(self, message: str, stream: TextIO):
+        if self._thread is None:
+            self._ensure_started()
+        self._queue.put((stream, message))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            dirty = set()
+            while True:
+                if item is None:
+                    self._flush_streams(dirty)
+                    return
+                if isinstance(item, threading.Event):
+                    self._flush_streams(dirty)
+                    dirty.clear()
+                    item.set()
+                else:
+                    stream, message = item
+                    try:
+                        stream.write(message + '\n')
+                        dirty.add(stream)
+                    except Exception:
+                        pass
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._flush_streams(dirty)
+
+    @staticmethod
+    def _flush_streams(streams):
+        for stream in streams:
+            try:
+                stream.flush()
+            except Exception:
+                pass
+
+    def flush(self, timeout: Optional[float] = 5.0):
+        """等待已排队的日志全部写出"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(5.0)
+
+
+def create_instrumentation(log: Callable[[str], None] = print,
+                           metrics_file: Optional[str] = None) -> Instrumentation:
+    """
+    按环境变量创建埋点记录器
+
+    - PURGE_METRICS_FILE：结束时写入 Prometheus 文本文件（metrics_file 参数优先）
+    - PURGE_OTEL=true：输出 OpenTelemetry span 和计数器
+    - PURGE_TIMING_SUMMARY=true：结束时在控制台输出阶段耗时汇总
+    """
+    sinks: List[Sink] = []
+    metrics_file = metrics_file or os.getenv('PURGE_METRICS_FILE')
+    if metrics_file:
+        sinks.append(PrometheusSink(metrics_file))
+    if os.getenv('PURGE_OTEL', 'false').lower() == 'true':
+        sinks.append(OpenTelemetrySink())
+    if os.getenv('PURGE_TIMING_SUMMARY', 'false').lower() == 'true':
+        sinks.append(TimingSummarySink(log))
+    return Instrumentation(sinks)
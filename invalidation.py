@@ -0,0 +1,341 @@
+"""
+清除生效监测（time-to-MISS）
+
+ARM 的清除 LRO 成功只代表 Front Door 接受并完成了清除操作，不代表各个边缘节点已经不再
+返回旧内容。本模块把清除和验证串成一条流水线：清除前先探测每个 endpoint 的样本 URL 记录
+基线 ETag；某个 endpoint 的所有清除单元完成后，立即并发轮询该 endpoint 的样本 URL，
+直到 X-Cache 出现 MISS 或 ETag 与基线不同（或超时），记录每个 URL 的失效耗时，
+并按 X-Azure-Ref 中的 POP 代码（见 cache_probe.parse_pop）汇总各边缘节点的传播延迟。
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from cache_probe import CacheProber, UNKNOWN_POP
+from path_planner import DEFAULT_MAX_PATHS_PER_REQUEST, WILDCARD, parse_path_list
+from purge_models import PurgeOutcome, PurgeUnit, UnitResult
+
+if TYPE_CHECKING:
+    import aiohttp
+    from async_purge import AsyncAzureFrontDoorPurgeClient
+
+
+# 默认参数
+DEFAULT_WATCH_TIMEOUT = 300.0       # 清除完成后等待失效的最长时间（秒）
+DEFAULT_WATCH_INTERVAL = 2.0        # 同一 URL 两次探测之间的间隔（秒）
+DEFAULT_WATCH_CONCURRENCY = 20      # 同时在途的最大探测请求数
+DEFAULT_MAX_SAMPLE_URLS = 5         # 未指定样本路径时，每个 endpoint 从清除路径中选取的最大 URL 数
+
+# 失效判断依据
+REASON_MISS = 'miss'
+REASON_ETAG = 'etag'
+REASON_TIMEOUT = 'timeout'
+
+
+def select_sample_paths(paths: Sequence[str], limit: int = DEFAULT_MAX_SAMPLE_URLS) -> List[str]:
+    """从清除路径中选取可以直接请求的样本路径（跳过通配符路径）"""
+    return [path for path in dict.fromkeys(paths) if WILDCARD not in path][:limit]
+
+
+@dataclass
+class InvalidationResult:
+    """单个样本 URL 的失效监测结果"""
+
+    endpoint_name: str
+    url: str
+    invalidated: bool
+    reason: str
+    pop: str = UNKNOWN_POP
+    probes: int = 0
+    since_complete: Optional[float] = None     # 从清除 LRO 完成到观测到失效的秒数
+    since_submit: Optional[float] = None       # 从第一次提交清除到观测到失效的秒数
+    baseline_etag: Optional[str] = None
+    etag: Optional[str] = None
+    x_cache: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class InvalidationReport:
+    """所有样本 URL 的失效监测结果，按 URL 和 POP 汇总"""
+
+    def __init__(self, results: Optional[List[InvalidationResult]] = None):
+        self.results = results or []
+
+    def by_pop(self) -> Dict[str, dict]:
+        """
+        按 POP 汇总
+
+        Returns:
+            Dict[str, dict]: POP 代码 → urls、invalidated、p50 / max（从 LRO 完成起的秒数）
+        """
+        grouped: Dict[str, List[InvalidationResult]] = {}
+        for result in self.results:
+            grouped.setdefault(result.pop, []).append(result)
+
+        summary = {}
+        for pop, results in sorted(grouped.items()):
+            delays = [result.since_complete for result in results if result.invalidated]
+            summary[pop] = {
+                'urls': len(results),
+                'invalidated': len(delays),
+                'p50': round(statistics.median(delays), 2) if delays else None,
+                'max': round(max(delays), 2) if delays else None,
+            }
+        return summary
+
+    def describe(self) -> List[str]:
+        """生成可读的汇总文本"""
+        if not self.results:
+            return ["🔭 没有可监测的样本 URL"]
+
+        invalidated = [result for result in self.results if result.invalidated]
+        lines = [f"🔭 清除生效监测: {len(invalidated)}/{len(self.results)} 个样本 URL 已失效"]
+        if invalidated:
+            delays = [result.since_complete for result in invalidated]
+            lines.append(f"   LRO 完成后失效耗时: p50 {statistics.median(delays):.1f}s, max {max(delays):.1f}s")
+        for pop, summary in self.by_pop().items():
+            timing = f"p50 {summary['p50']}s, max {summary['max']}s" if summary['invalidated'] else '-'
+            lines.append(f"   📍 {pop}: {summary['invalidated']}/{summary['urls']} 已失效 ({timing})")
+        for result in self.results:
+            if not result.invalidated:
+                detail = result.error or f"X-Cache: {result.x_cache}"
+                lines.append(f"   ⏳ {result.url} 在超时前未观测到失效 ({detail})")
+        return lines
+
+    def to_dict(self) -> dict:
+        """转换为可序列化为 JSON 的字典"""
+        return {
+            'urls': [result.to_dict() for result in self.results],
+            'pops': self.by_pop(),
+        }
+
+
+class InvalidationWatcher:
+    """并发探测样本 URL，直到观测到缓存失效"""
+
+    def __init__(self, sample_paths: Optional[Sequence[str]] = None,
+                 timeout: float = DEFAULT_WATCH_TIMEOUT,
+                 interval: float = DEFAULT_WATCH_INTERVAL,
+                 concurrency: int = DEFAULT_WATCH_CONCURRENCY,
+                 max_sample_urls: int = DEFAULT_MAX_SAMPLE_URLS,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            sample_paths: 每个 endpoint 上探测的路径；为 None 时从清除路径中选取非通配符路径
+            timeout: 清除完成后等待失效的最长时间（秒）
+            interval: 同一 URL 两次探测之间的间隔（秒）
+            concurrency: 同时在途的最大探测请求数
+            max_sample_urls: 从清除路径中选取样本时每个 endpoint 的最大 URL 数
+            log: 输出函数，默认为 print
+        """
+        self.sample_paths = list(sample_paths) if sample_paths else None
+        self.timeout = timeout
+        self.interval = interval
+        self.max_sample_urls = max_sample_urls
+        self.log = log or print
+        # 探测使用 range 模式：只取 1 个字节，与普通 GET 走相同的缓存路径
+        self.prober = CacheProber(concurrency=concurrency, mode='range', log=self.log)
+        self.baseline_etags: Dict[str, str] = {}
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "InvalidationWatcher":
+        self._session = self.prober.create_session()
+        self._semaphore = asyncio.Semaphore(self.prober.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def sample_urls(self, host_name: str, purged_paths: Sequence[str]) -> List[str]:
+        """生成 endpoint 的样本 URL"""
+        paths = self.sample_paths or select_sample_paths(purged_paths, self.max_sample_urls)
+        return [f"https://{host_name}{path}" for path in paths]
+
+    async def _probe(self, url: str) -> dict:
+        async with self._semaphore:
+            return await self.prober.probe(self._session, url)
+
+    async def capture_baseline(self, urls: Sequence[str]):
+        """清除前探测一次样本 URL，记录基线 ETag"""
+        async def capture(url: str):
+            result = await self._probe(url)
+            if result.get('etag', 'N/A') != 'N/A':
+                self.baseline_etags[url] = result['etag']
+
+        await asyncio.gather(*(capture(url) for url in urls))
+
+    async def watch(self, endpoint_name: str, urls: Sequence[str],
+                    submitted_at: float, completed_at: float) -> List[InvalidationResult]:
+        """
+        清除完成后并发探测 endpoint 的样本 URL，直到失效或超时
+
+        Args:
+            endpoint_name: endpoint 名称
+            urls: 样本 URL
+            submitted_at: 第一次提交清除的时间（time.time()）
+            completed_at: 所有清除单元完成的时间（time.time()）
+
+        Returns:
+            List[InvalidationResult]: 每个 URL 的监测结果
+        """
+        return list(await asyncio.gather(*(
+            self._watch_url(endpoint_name, url, submitted_at, completed_at) for url in urls
+        )))
+
+    async def _watch_url(self, endpoint_name: str, url: str,
+                         submitted_at: float, completed_at: float) -> InvalidationResult:
+        baseline = self.baseline_etags.get(url)
+        outcome = InvalidationResult(endpoint_name, url, invalidated=False, reason=REASON_TIMEOUT,
+                                     baseline_etag=baseline)
+        deadline = completed_at + self.timeout
+
+        while True:
+            response = await self._probe(url)
+            observed_at = time.time()
+            outcome.probes += 1
+
+            if 'error' in response:
+                outcome.error = response['error']
+            else:
+                outcome.error = None
+                outcome.x_cache = response['x_cache']
+                outcome.etag = response['etag']
+                outcome.pop = response['pop']
+                reason = None
+                if 'MISS' in response['x_cache'].upper():
+                    reason = REASON_MISS
+                elif baseline is not None and response['etag'] not in ('N/A', baseline):
+                    reason = REASON_ETAG
+                if reason is not None:
+                    outcome.invalidated = True
+                    outcome.reason = reason
+                    outcome.since_complete = round(observed_at - completed_at, 2)
+                    outcome.since_submit = round(observed_at - submitted_at, 2)
+                    self.log(f"🔭 {url} 已失效（{reason}, POP {outcome.pop}），"
+                             f"LRO 完成后 {outcome.since_complete:.1f}s")
+                    return outcome
+
+            if observed_at + self.interval > deadline:
+                return outcome
+            await asyncio.sleep(self.interval)
+
+
+class InvalidationPipeline:
+    """清除并监测生效：每个 endpoint 的清除完成后立即开始探测其样本 URL"""
+
+    def __init__(self, client: "AsyncAzureFrontDoorPurgeClient", watcher: InvalidationWatcher,
+                 runner: Optional[Callable[..., Awaitable[Dict[str, PurgeOutcome]]]] = None):
+        """
+        Args:
+            client: 异步清除客户端
+            watcher: 失效探测器
+            runner: 执行清除单元的协程函数（例如 StagedRollout.run），默认为 client.purge_units；
+                必须接受并转发 on_result 参数
+        """
+        self.client = client
+        self.watcher = watcher
+        self.runner = runner or client.purge_units
+        self.report = InvalidationReport()
+
+    async def run(self, units: List[PurgeUnit], **kwargs) -> Dict[str, PurgeOutcome]:
+        """
+        执行清除单元并监测生效
+
+        Args:
+            units: 清除单元
+            **kwargs: 传给 runner 的调度参数
+
+        Returns:
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射
+        """
+        hosts = {endpoint.name: endpoint.host_name for endpoint in await self.client.get_endpoints()}
+        paths_by_endpoint: Dict[str, List[str]] = {}
+        for unit in units:
+            paths_by_endpoint.setdefault(unit.endpoint_name, []).extend(unit.paths)
+        targets = {
+            name: self.watcher.sample_urls(hosts[name], paths)
+            for name, paths in paths_by_endpoint.items() if hosts.get(name)
+        }
+        targets = {name: urls for name, urls in targets.items() if urls}
+        if not targets:
+            self.client.log("⚠️  没有可直接请求的样本路径（清除路径都是通配符），跳过生效监测；"
+                            "可用 --watch-path 指定样本路径")
+            return await self.runner(units, **kwargs)
+
+        async with self.watcher:
+            await self.watcher.capture_baseline([url for urls in targets.values() for url in urls])
+
+            remaining = Counter(unit.endpoint_name for unit in units)
+            submitted: Dict[str, float] = {}
+            failed = set()
+            purged = set()
+            tasks: List[asyncio.Task] = []
+
+            def on_result(result: UnitResult):
+                name = result.unit.endpoint_name
+                remaining[name] -= 1
+                if not result.success:
+                    failed.add(name)
+                if result.attempts:
+                    purged.add(name)
+                    submitted[name] = min(submitted.get(name, result.submitted_at), result.submitted_at)
+                # 该 endpoint 的所有单元都已完成：立即开始探测，不等待其他 endpoints
+                if remaining[name] == 0 and name in purged and name not in failed and name in targets:
+                    tasks.append(asyncio.ensure_future(
+                        self.watcher.watch(name, targets[name], submitted[name], time.time())
+                    ))
+
+            try:
+                results = await self.runner(units, on_result=on_result, **kwargs)
+                watched = await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        self.report = InvalidationReport([result for results_ in watched for result in results_])
+        for line in self.report.describe():
+            self.client.log(line)
+        return results
+
+    async def purge(self, endpoint_names: List[str], paths: List[str],
+                    max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                    route_aware: bool = False,
+                    domains: Optional[List[str]] = None,
+                    **kwargs) -> Dict[str, PurgeOutcome]:
+        """清除多个 endpoints 的缓存并监测生效，参数与 AsyncAzureFrontDoorPurgeClient.purge_many 相同"""
+        units = await self.client.plan_units(endpoint_names, paths, max_paths_per_request, route_aware, domains)
+        results = await self.run(units, **kwargs)
+        self.client.fill_skipped_endpoints(endpoint_names, results)
+        return results
+
+
+def get_watch_options() -> dict:
+    """从环境变量读取生效监测参数"""
+    return {
+        'sample_paths': parse_path_list(os.getenv('PURGE_WATCH_PATHS', '')),
+        'timeout': float(os.getenv('PURGE_WATCH_TIMEOUT', DEFAULT_WATCH_TIMEOUT)),
+        'interval': float(os.getenv('PURGE_WATCH_INTERVAL', DEFAULT_WATCH_INTERVAL)),
+        'concurrency': int(os.getenv('PURGE_WATCH_CONCURRENCY', DEFAULT_WATCH_CONCURRENCY)),
+    }
+
+
+def create_watcher(options: dict, log: Optional[Callable[[str], None]] = None) -> InvalidationWatcher:
+    """由 get_watch_options 形式的参数创建失效探测器"""
+    return InvalidationWatcher(
+        sample_paths=options.get('sample_paths') or None,
+        timeout=options.get('timeout', DEFAULT_WATCH_TIMEOUT),
+        interval=options.get('interval', DEFAULT_WATCH_INTERVAL),
+        concurrency=options.get('concurrency', DEFAULT_WATCH_CONCURRENCY),
+        log=log
+    )
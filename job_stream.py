@@ -0,0 +1,55 @@
+"""
+NDJSON 批量任务流
+
+从标准输入或文件逐行读取清除任务（每行一个 JSON 对象），并把每个任务的结果
+在完成时立即以一行 JSON 写出，使大批量运行不必等待全部任务结束才能看到结果。
+
+输入示例::
+
+    {"id": "deploy-42", "endpoints": ["web", "api"], "paths": ["/index.html", "/static/*"]}
+    {"paths": ["/*"], "domains": ["www.example.com"]}
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Callable, TextIO
+
+from purge_models import PurgeJob, JobResult
+
+
+async def read_jobs(stream: TextIO, on_invalid: Callable[[JobResult], None]) -> AsyncIterator[PurgeJob]:
+    """
+    逐行读取 NDJSON 任务
+
+    读取在线程池中进行，不阻塞事件循环，因此前面的任务可以在后续输入到达前开始执行。
+    空行和以 '#' 开头的行会被忽略；无法解析的行交给 on_invalid，不中断整个批次。
+
+    Args:
+        stream: 文本输入流
+        on_invalid: 处理无效任务（已转换为失败的 JobResult）的回调
+
+    Yields:
+        PurgeJob: 清除任务，未指定 id 时使用行号
+    """
+    loop = asyncio.get_running_loop()
+    line_number = 0
+    while True:
+        line = await loop.run_in_executor(None, stream.readline)
+        if not line:
+            return
+        line_number += 1
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        default_id = f"line-{line_number}"
+        try:
+            yield PurgeJob.from_dict(json.loads(line), default_id)
+        except ValueError as e:
+            on_invalid(JobResult(default_id, error=f"无效的任务: {str(e)}"))
+
+
+def write_result(result: JobResult, stream: TextIO):
+    """把任务结果写为一行 JSON 并立即刷新"""
+    stream.write(json.dumps(result.to_dict(), ensure_ascii=False) + '\n')
+    stream.flush()
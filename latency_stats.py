@@ -0,0 +1,325 @@
+"""
+缓存探测延迟统计
+
+把 CacheProber / test_cache_refresh 收集的样本整理为 numpy 数组，按 URL、缓存状态（X-Cache）
+分组，一次排序后用向量化的下标运算计算各组的 p50 / p90 / p99 / 最大延迟、命中率，
+并分别统计收到响应头的时间（TTFB）和完成时间。支持比较清除前后两次运行，
+报告可以导出为 JSON、CSV 或 Parquet（Parquet 需要安装 pyarrow）。
+"""
+
+import csv
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from cache_probe import is_hit
+
+
+# 统计的百分位数
+PERCENTILES = (50, 90, 99)
+
+# 分组中表示“全部”的值
+ALL = '*'
+
+# 报告中的延迟字段（毫秒）
+TIMINGS = ('ttfb', 'total')
+LATENCY_FIELDS = tuple(f"{timing}_{stat}" for timing in TIMINGS
+                       for stat in [f"p{p}" for p in PERCENTILES] + ['max'])
+METRIC_FIELDS = ('hit_ratio',) + LATENCY_FIELDS
+ROW_FIELDS = ('url', 'cache_state', 'samples', 'errors') + METRIC_FIELDS
+
+# 支持的导出格式
+EXPORT_FORMATS = ('json', 'csv', 'parquet')
+
+
+class SampleSet:
+    """探测样本的列式表示：每个字段一个 numpy 数组，失败的请求延迟为 NaN"""
+
+    def __init__(self, results: Dict[str, List[dict]]):
+        """
+        Args:
+            results: URL 到各次请求结果的映射（test_cache_refresh 的返回值）
+        """
+        urls, states, ttfb, total, ok = [], [], [], [], []
+        for url, samples in results.items():
+            for sample in samples:
+                succeeded = 'status_code' in sample
+                response_time = sample.get('response_time', math.nan)
+                urls.append(url)
+                states.append(str(sample.get('x_cache', 'N/A')) if succeeded else '')
+                ttfb.append(sample.get('ttfb', response_time) if succeeded else math.nan)
+                total.append(sample.get('total_time', response_time) if succeeded else math.nan)
+                ok.append(succeeded)
+
+        self.urls = np.array(urls, dtype=object)
+        self.states = np.array(states, dtype=object)
+        self.timings = {
+            'ttfb': np.array(ttfb, dtype=float),
+            'total': np.array(total, dtype=float),
+        }
+        self.ok = np.array(ok, dtype=bool)
+        self.hit = np.array([is_hit(state) for state in states], dtype=bool) & self.ok
+
+    def __len__(self) -> int:
+        return len(self.ok)
+
+
+def group_percentiles(codes: np.ndarray, values: np.ndarray, group_count: int) -> Dict[str, np.ndarray]:
+    """
+    一次排序计算所有组的百分位数（线性插值，与 numpy.percentile 默认方法一致）和最大值
+
+    Args:
+        codes: 每个样本所属组的编号（0 .. group_count-1）
+        values: 样本值，NaN 不参与统计
+        group_count: 组数
+
+    Returns:
+        Dict[str, np.ndarray]: p50 / p90 / p99 / max → 各组的值（空组为 NaN）
+    """
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    order = np.lexsort((values, codes))
+    values = values[order]
+
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+    empty = counts == 0
+    last = np.where(empty, 0, starts + counts - 1)
+
+    stats = {}
+    if not len(values):
+        for name in [f"p{p}" for p in PERCENTILES] + ['max']:
+            stats[name] = np.full(group_count, np.nan)
+        return stats
+
+    for p in PERCENTILES:
+        position = starts + (p / 100.0) * np.maximum(counts - 1, 0)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, last)
+        fraction = position - lower
+        lower, upper = np.where(empty, 0, lower), np.where(empty, 0, upper)
+        result = values[lower] + (values[upper] - values[lower]) * fraction
+        stats[f"p{p}"] = np.where(empty, np.nan, result)
+    stats['max'] = np.where(empty, np.nan, values[last])
+    return stats
+
+
+def _summarize(samples: SampleSet, mask: np.ndarray, by_url: bool, by_state: bool) -> List[dict]:
+    """对 mask 选中的样本按 URL 和 / 或缓存状态分组统计"""
+    if not mask.any():
+        return []
+
+    urls = samples.urls[mask] if by_url else np.full(mask.sum(), ALL, dtype=object)
+    states = samples.states[mask] if by_state else np.full(mask.sum(), ALL, dtype=object)
+    url_names, url_codes = np.unique(urls.astype(str), return_inverse=True)
+    state_names, state_codes = np.unique(states.astype(str), return_inverse=True)
+    groups, codes = np.unique(url_codes * len(state_names) + state_codes, return_inverse=True)
+    group_count = len(groups)
+
+    counts = np.bincount(codes, minlength=group_count)
+    successes = np.bincount(codes, weights=samples.ok[mask], minlength=group_count)
+    hits = np.bincount(codes, weights=samples.hit[mask], minlength=group_count)
+    hit_ratio = np.full(group_count, np.nan)
+    np.divide(hits, successes, out=hit_ratio, where=successes > 0)
+
+    stats = {'hit_ratio': hit_ratio}
+    for timing in TIMINGS:
+        for name, values in group_percentiles(codes, samples.timings[timing][mask], group_count).items():
+            stats[f"{timing}_{name}"] = values
+
+    rows = []
+    for group, key in enumerate(groups):
+        row = {
+            'url': str(url_names[key // len(state_names)]),
+            'cache_state': str(state_names[key % len(state_names)]),
+            'samples': int(counts[group]),
+            'errors': int(counts[group] - successes[group]),
+        }
+        for field in METRIC_FIELDS:
+            value = float(stats[field][group])
+            row[field] = None if math.isnan(value) else round(value, 4 if field == 'hit_ratio' else 2)
+        rows.append(row)
+    return rows
+
+
+def compute_stats(results: Dict[str, List[dict]]) -> List[dict]:
+    """
+    计算延迟统计
+
+    分组层级：每个 URL（全部缓存状态）、每个 URL × 缓存状态、每个缓存状态（全部 URL）、全部样本。
+    缓存状态分组只包含成功的请求，失败的请求计入“全部”分组的 errors。
+
+    Args:
+        results: URL 到各次请求结果的映射
+
+    Returns:
+        List[dict]: 报告行，字段见 ROW_FIELDS；url / cache_state 为 '*' 表示全部
+    """
+    samples = SampleSet(results)
+    if not len(samples):
+        return []
+
+    everything = np.ones(len(samples), dtype=bool)
+    rows = _summarize(samples, everything, by_url=True, by_state=False)
+    rows += _summarize(samples, samples.ok, by_url=True, by_state=True)
+    rows += _summarize(samples, samples.ok, by_url=False, by_state=True)
+    rows += _summarize(samples, everything, by_url=False, by_state=False)
+
+    # 保持 URL 的输入顺序
+    order = {url: index for index, url in enumerate(results)}
+    rows.sort(key=lambda row: (row['url'] == ALL, order.get(row['url'], 0), row['cache_state'] != ALL,
+                               row['cache_state']))
+    return rows
+
+
+def compare_stats(before: List[dict], after: List[dict]) -> List[dict]:
+    """
+    比较两次运行的统计（例如清除前后）
+
+    Args:
+        before: 之前的报告行
+        after: 之后的报告行
+
+    Returns:
+        List[dict]: 按 after 顺序排列的行，包含 after 的全部字段，以及各指标的
+            before_<字段> 和 delta_<字段>（after - before）；before 中没有的分组其值为 None
+    """
+    baseline = {(row['url'], row['cache_state']): row for row in before}
+    rows = []
+    for row in after:
+        previous = baseline.get((row['url'], row['cache_state']), {})
+        merged = dict(row)
+        for field in METRIC_FIELDS:
+            old, new = previous.get(field), row.get(field)
+            merged[f"before_{field}"] = old
+            merged[f"delta_{field}"] = (
+                round(new - old, 4 if field == 'hit_ratio' else 2) if old is not None and new is not None else None
+            )
+        rows.append(merged)
+    return rows
+
+
+def get_report_format(path: str, format: Optional[str] = None) -> str:
+    """
+    确定报告格式（format 为 None 时按扩展名判断）
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    format = (format or os.path.splitext(path)[1].lstrip('.')).lower()
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的报告格式: {format or path}（可选: {', '.join(EXPORT_FORMATS)}）")
+    return format
+
+
+def export_stats(rows: List[dict], path: str, format: Optional[str] = None):
+    """
+    导出报告
+
+    Args:
+        rows: 报告行（compute_stats 或 compare_stats 的返回值）
+        path: 输出文件路径
+        format: json / csv / parquet，为 None 时按扩展名判断
+
+    Raises:
+        ValueError: 不支持的格式
+        ImportError: 导出 Parquet 但没有安装 pyarrow
+    """
+    format = get_report_format(path, format)
+    fields = list(rows[0]) if rows else list(ROW_FIELDS)
+
+    if format == 'json':
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    elif format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        pyarrow, parquet = _import_pyarrow()
+        parquet.write_table(pyarrow.Table.from_pylist(rows), path)
+
+
+def load_stats(path: str, format: Optional[str] = None) -> List[dict]:
+    """
+    读取之前导出的报告（用作比较的基线）
+
+    Args:
+        path: 报告文件路径
+        format: json / csv / parquet，为 None 时按扩展名判断
+
+    Returns:
+        List[dict]: 报告行
+    """
+    format = get_report_format(path, format)
+    if format == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if format == 'csv':
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return [_parse_csv_row(row) for row in csv.DictReader(f)]
+    _, parquet = _import_pyarrow()
+    return parquet.read_table(path).to_pylist()
+
+
+def _parse_csv_row(row: Dict[str, str]) -> dict:
+    parsed: dict = {'url': row['url'], 'cache_state': row['cache_state']}
+    for field, value in row.items():
+        if field in parsed:
+            continue
+        if value in ('', None):
+            parsed[field] = None
+        else:
+            parsed[field] = int(value) if field in ('samples', 'errors') else float(value)
+    return parsed
+
+
+def _import_pyarrow() -> Tuple[object, object]:
+    try:
+        import pyarrow
+        import pyarrow.parquet as parquet
+    except ImportError as e:
+        raise ImportError("Parquet 报告需要安装 pyarrow") from e
+    return pyarrow, parquet
+
+
+def format_ms(value: Optional[float]) -> str:
+    """毫秒值的显示文本，缺失时为 '-'"""
+    return '-' if value is None else f"{value:.1f}ms"
+
+
+def _format_delta(value: Optional[float], percent: bool = False) -> str:
+    if value is None:
+        return '-'
+    return f"{value * 100:+.1f}%" if percent else f"{value:+.1f}ms"
+
+
+def describe_row(row: dict) -> List[str]:
+    """生成单个分组的可读统计文本"""
+    lines = []
+    if row['hit_ratio'] is not None:
+        lines.append(f"🎯 命中率: {row['hit_ratio']:.0%} ({row['samples'] - row['errors']} 个成功样本)")
+    for timing, label in (('ttfb', 'TTFB'), ('total', '总耗时')):
+        lines.append(f"⏱️  {label}: " + ', '.join(
+            f"p{p} {format_ms(row[f'{timing}_p{p}'])}" for p in PERCENTILES
+        ) + f", max {format_ms(row[f'{timing}_max'])}")
+    return lines
+
+
+def describe_comparison(rows: Iterable[dict]) -> List[str]:
+    """生成清除前后对比的可读文本（每个分组一行）"""
+    lines = []
+    for row in rows:
+        url = '全部 URL' if row['url'] == ALL else row['url']
+        state = '' if row['cache_state'] == ALL else f" [{row['cache_state']}]"
+        lines.append(
+            f"  {url}{state}: 总耗时 p50 {_format_delta(row['delta_total_p50'])}, "
+            f"p90 {_format_delta(row['delta_total_p90'])}, p99 {_format_delta(row['delta_total_p99'])}; "
+            f"TTFB p99 {_format_delta(row['delta_ttfb_p99'])}; "
+            f"命中率 {_format_delta(row['delta_hit_ratio'], percent=True)}"
+        )
+    return lines
@@ -0,0 +1,196 @@
+"""
+清除路径规划
+
+对清除路径进行规范化、去重和通配符覆盖消除，并按单次请求的路径数上限
+拆分成多个清除单元。本模块不依赖 Azure SDK，可以独立测试。
+"""
+
+import re
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from purge_models import PurgeUnit
+
+if TYPE_CHECKING:
+    from route_index import RouteIndex
+
+
+# 单次 begin_purge_content 请求允许的最大路径数
+DEFAULT_MAX_PATHS_PER_REQUEST = 100
+
+# 通配符后缀
+WILDCARD = '*'
+
+
+def normalize_path(path: str) -> Optional[str]:
+    """
+    规范化单个清除路径
+
+    - 去除首尾空白，空路径返回 None
+    - 完整 URL 只保留路径和查询部分
+    - 补全开头的 '/'，合并连续的 '/'
+    - 通配符只能出现在路径末尾；其后的查询字符串没有意义，统一截断为以 '*' 结尾
+
+    Args:
+        path: 原始路径
+
+    Returns:
+        Optional[str]: 规范化后的路径
+
+    Raises:
+        ValueError: 通配符出现在路径中间（例如 '/img/*.png'），截断会把清除范围扩大到整个目录
+    """
+    path = path.strip()
+    if not path:
+        return None
+
+    if path.startswith(('http://', 'https://')):
+        parts = urlsplit(path)
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+
+    if not path.startswith('/'):
+        path = '/' + path
+
+    path = re.sub(r'/{2,}', '/', path)
+
+    if WILDCARD in path:
+        if WILDCARD in path.split('?', 1)[0].rstrip(WILDCARD):
+            raise ValueError(f"通配符只能出现在路径末尾: {path}")
+        path = path[:path.index(WILDCARD) + 1]
+
+    return path
+
+
+def parse_path_list(text: str) -> List[str]:
+    """解析逗号分隔的路径列表（例如 PURGE_PATHS 环境变量）"""
+    return [path.strip() for path in text.split(',') if path.strip()]
+
+
+class PathTrie:
+    """记录通配符前缀的字符前缀树，用于判断路径是否已被更宽的通配符覆盖"""
+
+    _TERMINAL = ''
+
+    def __init__(self):
+        self.root: Dict[str, dict] = {}
+
+    def add_wildcard(self, prefix: str):
+        """
+        添加一个通配符前缀（'/api/*' 对应前缀 '/api/'）
+
+        Args:
+            prefix: 去掉 '*' 的通配符前缀
+        """
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._TERMINAL] = {}
+
+    def covers(self, path: str) -> bool:
+        """
+        判断路径是否被已添加的某个通配符覆盖
+
+        Args:
+            path: 规范化后的路径；通配符路径按其前缀判断
+
+        Returns:
+            bool: 是否被覆盖
+        """
+        node = self.root
+        for char in path.rstrip(WILDCARD):
+            if self._TERMINAL in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self._TERMINAL in node
+
+
+def normalize_paths(paths: Iterable[str]) -> List[str]:
+    """
+    规范化路径集合：去重并移除被更宽通配符覆盖的路径
+
+    例如 ['/*', '/api/*', '/images/*'] 会被合并为 ['/*']。
+
+    Args:
+        paths: 原始路径
+
+    Returns:
+        List[str]: 规范化后的最小路径集合（保持首次出现的顺序）
+    """
+    normalized = []
+    seen = set()
+    for path in paths:
+        path = normalize_path(path)
+        if path and path not in seen:
+            seen.add(path)
+            normalized.append(path)
+
+    # 由短到长加入通配符，已被覆盖的通配符不再加入
+    trie = PathTrie()
+    kept_wildcards = set()
+    for path in sorted((p for p in normalized if p.endswith(WILDCARD)), key=len):
+        if not trie.covers(path):
+            trie.add_wildcard(path[:-1])
+            kept_wildcards.add(path)
+
+    return [
+        path for path in normalized
+        if path in kept_wildcards or (not path.endswith(WILDCARD) and not trie.covers(path))
+    ]
+
+
+def chunk_paths(paths: List[str], max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST) -> List[List[str]]:
+    """
+    按单次请求的路径数上限拆分路径列表
+
+    Args:
+        paths: 路径列表
+        max_paths_per_request: 单次请求的最大路径数
+
+    Returns:
+        List[List[str]]: 路径块列表
+    """
+    if max_paths_per_request < 1:
+        raise ValueError("max_paths_per_request 必须大于 0")
+    return [paths[i:i + max_paths_per_request] for i in range(0, len(paths), max_paths_per_request)]
+
+
+def plan_purge_units(endpoint_names: List[str], paths: Iterable[str],
+                     max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                     route_index: Optional["RouteIndex"] = None) -> List[PurgeUnit]:
+    """
+    生成清除单元列表
+
+    路径先经过规范化和拆分，再按"路径块轮转"的顺序在 endpoints 之间交错排列，
+    使每个 endpoint 的第一个路径块都尽早提交，而不是一个 endpoint 的所有块排在一起。
+    提供路由索引时，每个 endpoint 只清除其路由实际提供的路径，并填写对应的 domains。
+
+    Args:
+        endpoint_names: endpoint 名称列表
+        paths: 原始路径
+        max_paths_per_request: 单次请求的最大路径数
+        route_index: 路由索引（route_index.RouteIndex），为 None 时所有路径发往所有 endpoints
+
+    Returns:
+        List[PurgeUnit]: 清除单元列表
+    """
+    paths = normalize_paths(paths)
+
+    chunks_by_endpoint = []
+    for endpoint_name in endpoint_names:
+        endpoint_paths = paths
+        if route_index is not None:
+            endpoint_paths = [path for path in paths if route_index.serves(endpoint_name, path)]
+
+        units = []
+        for chunk in chunk_paths(endpoint_paths, max_paths_per_request):
+            domains = route_index.domains_for(endpoint_name, chunk) if route_index is not None else ()
+            units.append(PurgeUnit(endpoint_name, tuple(chunk), domains))
+        chunks_by_endpoint.append(units)
+
+    # 按路径块轮转交错排列
+    planned = []
+    for index in range(max((len(units) for units in chunks_by_endpoint), default=0)):
+        planned.extend(units[index] for units in chunks_by_endpoint if index < len(units))
+    return planned
@@ -0,0 +1,418 @@
+"""
+缓存预热
+
+清除 `/*` 之后，最先到达的真实用户要承担冷缓存的延迟，源站也要一次性承受回填流量。
+本模块在清除成功后（或单独运行）主动请求热点 URL，把内容重新填入边缘缓存：
+
+- URL 来源：sitemap.xml（本地文件或 URL，支持 sitemap 索引和 .gz）、URL 列表文件、
+  访问日志导出中请求次数最多的前 N 个路径
+- 所有请求共用 keep-alive 连接池，同时在途的请求数和每秒请求数都有上限，避免压垮源站；
+  源站返回 429 / 503 时把速率减半
+- 可以把同一 URL 分别固定到多个边缘 IP 预热（见 edge_resolver）
+- 某个 URL 的 X-Cache 出现 HIT 后即停止对它的请求
+"""
+
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from cache_probe import CacheProber, DEFAULT_TIMEOUT, MODE_GET, UNKNOWN_POP, is_hit
+from path_planner import parse_path_list
+from rate_control import DECREASE_COOLDOWN, TokenBucket
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+# 默认参数
+DEFAULT_WARM_CONCURRENCY = 10      # 同时在途的最大预热请求数
+DEFAULT_WARM_RATE = 20.0           # 每秒最多发出的预热请求数
+DEFAULT_MAX_ATTEMPTS = 3           # 每个 URL（每个边缘 IP）最多请求的次数，出现 HIT 即停止
+DEFAULT_WARM_INTERVAL = 1.0        # 同一 URL 两次请求之间的间隔（秒）
+DEFAULT_TOP_PATHS = 100            # 从访问日志中选取的热点路径数
+MIN_WARM_RATE = 1.0                # 源站限流时速率下调的下限
+
+# 源站过载时边缘节点返回的状态码
+OVERLOAD_STATUS_CODES = (429, 503)
+
+# sitemap 索引最多展开的层数
+MAX_SITEMAP_DEPTH = 3
+
+# 访问日志中的请求 URI 与方法字段（Front Door 访问日志、Log Analytics 导出）
+_URI_FIELDS = ('requestUri', 'requestUri_s', 'RequestUri', 'request_uri')
+_METHOD_FIELDS = ('httpMethod', 'httpMethod_s', 'HttpMethod', 'method')
+_STATUS_FIELDS = ('httpStatusCode', 'httpStatusCode_s', 'HttpStatusCode', 'status')
+
+# 通用日志格式中的请求行，例如 "GET /index.html HTTP/1.1" 200
+_REQUEST_LINE = re.compile(r'"(GET|HEAD|POST|PUT|DELETE|OPTIONS|PATCH) (\S+) HTTP/[\d.]+" (\d{3})')
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sitemap(content: bytes) -> Tuple[List[str], List[str]]:
+    """
+    解析 sitemap（支持 gzip 压缩）
+
+    Returns:
+        Tuple[List[str], List[str]]: (页面 URL, sitemap 索引中的子 sitemap URL)
+
+    Raises:
+        ValueError: 不是合法的 XML
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"无效的 sitemap: {str(e)}") from e
+
+    urls, sitemaps = [], []
+    for entry in root:
+        loc = next((child.text.strip() for child in entry if _local_name(child.tag) == 'loc' and child.text), None)
+        if loc:
+            (sitemaps if _local_name(entry.tag) == 'sitemap' else urls).append(loc)
+    return urls, sitemaps
+
+
+async def load_sitemap(source: str, session: Optional["aiohttp.ClientSession"] = None,
+                       depth: int = MAX_SITEMAP_DEPTH) -> List[str]:
+    """
+    读取 sitemap 中的所有 URL，递归展开 sitemap 索引
+
+    Args:
+        source: 本地文件路径或 http(s) URL
+        session: 读取远程 sitemap 使用的 HTTP 会话
+        depth: 最多展开的索引层数
+
+    Raises:
+        ValueError: 远程 sitemap 但没有提供会话、读取失败，或 sitemap 无效
+    """
+    if source.startswith(('http://', 'https://')):
+        if session is None:
+            raise ValueError(f"读取远程 sitemap 需要 HTTP 会话: {source}")
+        import aiohttp
+
+        try:
+            async with session.get(source) as response:
+                response.raise_for_status()
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ValueError(f"读取 sitemap 失败: {source}: {str(e) or type(e).__name__}") from e
+    else:
+        with open(source, 'rb') as f:
+            content = f.read()
+
+    urls, sitemaps = parse_sitemap(content)
+    if depth > 0:
+        for child in sitemaps:
+            urls.extend(await load_sitemap(urljoin(source, child), session, depth - 1))
+    return urls
+
+
+def read_url_list(path: str) -> List[str]:
+    """读取 URL 列表文件：每行一个 URL，忽略空行和 # 注释"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def _first(record: dict, fields: Sequence[str]) -> Optional[str]:
+    for field in fields:
+        if record.get(field) not in (None, ''):
+            return str(record[field])
+    properties = record.get('properties')
+    if isinstance(properties, dict):
+        return _first(properties, fields)
+    return None
+
+
+def _read_log_requests(path: str) -> Iterable[Tuple[str, str, Optional[str]]]:
+    """逐条读出访问日志中的 (方法, 请求 URI, 状态码)，支持 JSON 数组、NDJSON、CSV 和通用日志格式"""
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(4096)
+        f.seek(0)
+        stripped = head.lstrip()
+        if stripped.startswith('['):
+            records: Iterable[dict] = json.load(f)
+        elif stripped.startswith('{'):
+            records = (json.loads(line) for line in f if line.strip())
+        elif any(field in head.split('\n', 1)[0] for field in _URI_FIELDS):
+            records = csv.DictReader(f)
+        else:
+            for line in f:
+                match = _REQUEST_LINE.search(line)
+                if match:
+                    yield match.group(1), match.group(2), match.group(3)
+            return
+
+        for record in records:
+            uri = _first(record, _URI_FIELDS)
+            if uri:
+                yield (_first(record, _METHOD_FIELDS) or 'GET').upper(), uri, _first(record, _STATUS_FIELDS)
+
+
+def top_urls_from_access_log(path: str, top: int = DEFAULT_TOP_PATHS,
+                             base_url: Optional[str] = None) -> List[str]:
+    """
+    从访问日志导出中选取请求次数最多的 URL
+
+    只统计状态码小于 400 的 GET 请求；请求 URI 只有路径时拼接到 base_url 上，没有 base_url 则忽略。
+
+    Args:
+        path: 访问日志文件
+        top: 选取的 URL 数
+        base_url: 站点地址，例如 https://www.example.com
+
+    Returns:
+        List[str]: 按请求次数从多到少排列的 URL
+    """
+    counts: Counter = Counter()
+    for method, uri, status in _read_log_requests(path):
+        if method != 'GET' or (status and status.isdigit() and int(status) >= 400):
+            continue
+        if not urlsplit(uri).scheme:
+            if not base_url:
+                continue
+            uri = urljoin(base_url, uri)
+        # 去掉默认端口，避免同一 URL 被计为两个（Front Door 日志中为 https://host:443/path）
+        parts = urlsplit(uri)
+        if (parts.scheme, parts.port) in (('https', 443), ('http', 80)):
+            uri = parts._replace(netloc=parts.hostname).geturl()
+        counts[uri] += 1
+    return [uri for uri, _ in counts.most_common(top)]
+
+
+async def load_warm_urls(urls: Sequence[str] = (), sitemaps: Sequence[str] = (),
+                         url_lists: Sequence[str] = (), access_logs: Sequence[str] = (),
+                         top: int = DEFAULT_TOP_PATHS, base_url: Optional[str] = None,
+                         timeout: float = DEFAULT_TIMEOUT) -> List[str]:
+    """
+    汇总各来源的预热 URL（保持顺序、去重）
+
+    Args:
+        urls: 直接指定的 URL
+        sitemaps: sitemap 文件或 URL
+        url_lists: URL 列表文件
+        access_logs: 访问日志导出文件
+        top: 每个访问日志选取的热点 URL 数
+        base_url: 访问日志中只有路径时使用的站点地址
+        timeout: 读取远程 sitemap 的超时（秒）
+
+    Returns:
+        List[str]: 预热 URL
+    """
+    collected = list(urls)
+    for path in url_lists:
+        collected.extend(read_url_list(path))
+    for path in access_logs:
+        collected.extend(top_urls_from_access_log(path, top, base_url))
+    if sitemaps:
+        prober = CacheProber(timeout=timeout)
+        async with prober.edge_sessions([None]) as sessions:
+            for source in sitemaps:
+                collected.extend(await load_sitemap(source, sessions[None]))
+    return list(dict.fromkeys(collected))
+
+
+@dataclass
+class WarmResult:
+    """单个 URL（在单个边缘 IP 上）的预热结果"""
+
+    url: str
+    edge_ip: Optional[str] = None
+    warmed: bool = False
+    requests: int = 0
+    pop: str = UNKNOWN_POP
+    status_code: Optional[int] = None
+    x_cache: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        """请求失败或返回错误状态码（未出现 HIT 但响应正常不算失败，例如内容不可缓存）"""
+        return self.error is not None or (self.status_code is not None and self.status_code >= 400)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class WarmReport:
+    """一次预热的结果汇总"""
+
+    def __init__(self, results: Optional[List[WarmResult]] = None, elapsed: float = 0.0):
+        self.results = results or []
+        self.elapsed = elapsed
+
+    @property
+    def warmed(self) -> List[WarmResult]:
+        return [result for result in self.results if result.warmed]
+
+    @property
+    def failed(self) -> List[WarmResult]:
+        return [result for result in self.results if result.failed]
+
+    def __bool__(self) -> bool:
+        return not self.failed
+
+    def describe(self) -> List[str]:
+        """生成可读的汇总文本"""
+        requests = sum(result.requests for result in self.results)
+        unconfirmed = len(self.results) - len(self.warmed) - len(self.failed)
+        lines = [
+            f"🔥 预热完成: {len(self.warmed)}/{len(self.results)} 个目标已命中缓存，"
+            f"共 {requests} 个请求，耗时 {self.elapsed:.1f}s",
+        ]
+        if unconfirmed:
+            lines.append(f"   ⚠️  {unconfirmed} 个目标在最大请求次数内未出现 HIT（可能不可缓存）")
+        for result in self.failed:
+            edge = f" @ {result.edge_ip}" if result.edge_ip else ''
+            detail = result.error or f"状态码 {result.status_code}"
+            lines.append(f"   ❌ {result.url}{edge}: {detail}")
+        return lines
+
+    def to_dict(self) -> dict:
+        """转换为可序列化为 JSON 的字典"""
+        return {
+            'targets': len(self.results),
+            'warmed': len(self.warmed),
+            'failed': len(self.failed),
+            'requests': sum(result.requests for result in self.results),
+            'elapsed_seconds': round(self.elapsed, 2),
+            'results': [result.to_dict() for result in self.results],
+        }
+
+
+class CacheWarmer:
+    """限速、限并发的缓存预热器"""
+
+    def __init__(self, concurrency: int = DEFAULT_WARM_CONCURRENCY,
+                 rate: float = DEFAULT_WARM_RATE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 interval: float = DEFAULT_WARM_INTERVAL,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 mode: str = MODE_GET,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            concurrency: 同时在途的最大请求数（也是每个连接池的大小）
+            rate: 每秒最多发出的请求数
+            max_attempts: 每个目标最多请求的次数，出现 HIT 即停止
+            interval: 同一目标两次请求之间的间隔（秒）
+            timeout: 单个请求的超时（秒）
+            mode: 请求方式，见 cache_probe.PROBE_MODES；大文件可用 stream 避免在内存中缓冲响应体
+            log: 输出函数，默认为 print
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.log = log or print
+        self.prober = CacheProber(concurrency=concurrency, interval=interval, timeout=timeout, mode=mode,
+                                  log=self.log)
+        self.bucket = TokenBucket(rate=max(rate, MIN_WARM_RATE), capacity=self.prober.concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._slowed_at = 0.0
+
+    async def run(self, urls: Sequence[str],
+                  edge_ips: Optional[Dict[str, Sequence[str]]] = None) -> WarmReport:
+        """
+        预热 URL
+
+        Args:
+            urls: 要预热的 URL
+            edge_ips: 主机名到边缘 IP 的映射；指定时每个 URL 在每个边缘 IP 上分别预热
+
+        Returns:
+            WarmReport: 预热结果
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self._semaphore = asyncio.Semaphore(self.prober.concurrency)
+        targets = self.prober.edge_targets(urls, edge_ips)
+        self.log(f"🔥 开始预热 {len(targets)} 个目标（最大并发 {self.prober.concurrency}，"
+                 f"每秒最多 {self.bucket.rate:g} 个请求）")
+
+        async with self.prober.edge_sessions(ip for _, ip in targets) as sessions:
+            results = await asyncio.gather(*(self._warm(sessions[ip], url, ip) for url, ip in targets))
+
+        return WarmReport(list(results), elapsed=loop.time() - started)
+
+    async def _warm(self, session: "aiohttp.ClientSession", url: str, edge_ip: Optional[str]) -> WarmResult:
+        """请求同一目标直到 X-Cache 出现 HIT、返回不会因重试而改变的错误或达到最大次数"""
+        result = WarmResult(url, edge_ip)
+        for attempt in range(self.max_attempts):
+            if attempt:
+                await asyncio.sleep(self.prober.interval)
+            await self.bucket.acquire()
+            async with self._semaphore:
+                response = await self.prober.probe(session, url)
+            result.requests += 1
+
+            if 'error' in response:
+                result.error = response['error']
+                continue
+            result.error = None
+            result.status_code = response['status_code']
+            result.x_cache = response['x_cache']
+            result.pop = response['pop']
+            if is_hit(result.x_cache):
+                result.warmed = True
+                return result
+            if result.status_code in OVERLOAD_STATUS_CODES:
+                self._slow_down(result.status_code)
+            elif result.status_code >= 400:
+                break
+        return result
+
+    def _slow_down(self, status_code: int):
+        """源站过载：每秒请求数减半（不低于 MIN_WARM_RATE），同一批并发请求的过载响应只减一次"""
+        now = time.monotonic()
+        rate = max(MIN_WARM_RATE, self.bucket.rate / 2)
+        if rate < self.bucket.rate and now - self._slowed_at >= DECREASE_COOLDOWN:
+            self._slowed_at = now
+            self.bucket.rate = rate
+            self.log(f"🐢 收到 {status_code}，预热速率降为每秒 {rate:g} 个请求")
+
+
+def get_warm_options() -> dict:
+    """从环境变量读取预热参数（CacheWarmer 的参数）"""
+    return {
+        'concurrency': int(os.getenv('PURGE_WARM_CONCURRENCY', DEFAULT_WARM_CONCURRENCY)),
+        'rate': float(os.getenv('PURGE_WARM_RATE', DEFAULT_WARM_RATE)),
+        'max_attempts': int(os.getenv('PURGE_WARM_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+        'interval': float(os.getenv('PURGE_WARM_INTERVAL', DEFAULT_WARM_INTERVAL)),
+    }
+
+
+def get_warm_sources() -> dict:
+    """从环境变量读取预热 URL 来源（load_warm_urls 的参数）"""
+    return {
+        'sitemaps': parse_path_list(os.getenv('PURGE_WARM_SITEMAPS', '')),
+        'url_lists': parse_path_list(os.getenv('PURGE_WARM_URL_LISTS', '')),
+        'access_logs': parse_path_list(os.getenv('PURGE_WARM_ACCESS_LOGS', '')),
+        'top': int(os.getenv('PURGE_WARM_TOP', DEFAULT_TOP_PATHS)),
+        'base_url': os.getenv('PURGE_WARM_BASE_URL') or None,
+    }
+
+
+def warm_urls(urls: Sequence[str], edge_ips: Optional[Dict[str, Sequence[str]]] = None,
+              **options) -> WarmReport:
+    """
+    预热 URL（CacheWarmer 的同步封装）
+
+    Args:
+        urls: 要预热的 URL
+        edge_ips: 主机名到边缘 IP 的映射
+        **options: CacheWarmer 的参数，默认值见 get_warm_options
+
+    Returns:
+        WarmReport: 预热结果
+    """
+    return asyncio.run(CacheWarmer(**{**get_warm_options(), **options}).run(urls, edge_ips))
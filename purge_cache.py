@@ -13,14 +13,85 @@ Azure Front Door Standard 缓存清除工具
 
 import os
 import sys
-from typing import List, Optional, Dict, Tuple
-from azure.identity import ClientSecretCredential
-from azure.mgmt.cdn import CdnManagementClient
-from dotenv import load_dotenv
+import json
+import argparse
 import time
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
-import threading
+from dataclasses import asdict
+from typing import List, Optional, Dict, TextIO, Tuple
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+import asyncio
+
+from azure_clients import create_credential, create_cdn_client
+from async_purge import AsyncAzureFrontDoorPurgeClient, DEFAULT_MAX_CONCURRENCY
+from purge_scheduler import DEFAULT_POLL_INTERVAL, DEFAULT_POLL_BACKOFF, DEFAULT_MAX_POLL_INTERVAL
+from rate_control import RateController, DEFAULT_RATE, DEFAULT_BURST
+from retry_policy import RetryPolicy, DEFAULT_MAX_ATTEMPTS, DEFAULT_BASE_DELAY
+from purge_models import PurgeOutcome, JobResult
+from job_stream import read_jobs, write_result
+from instrumentation import QueueLogWriter, PrometheusSink, create_instrumentation
+from fleet import FleetPurger, FleetReport, ClientPool, load_fleet_config
+from purge_daemon import (
+    PurgeDaemon, serve, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_DEBOUNCE_WINDOW, DEFAULT_MAX_DELAY
+)
+from purge_journal import PurgeJournal, DEFAULT_IDEMPOTENCY_WINDOW
+from purge_coordination import PurgeCoordinator, DEFAULT_LEASE, DEFAULT_WAIT_INTERVAL
+from endpoint_inventory import EndpointInventory, EndpointInfo, make_inventory_key, DEFAULT_INVENTORY_TTL
+from route_index import invalidate_cached_index
+from change_set import (
+    UrlMapping, read_changed_files, load_manifest, diff_manifests, plan_changed_paths, get_collapse_options
+)
+from rollout import create_rollout, get_rollout_options, WAVE_BY_ENDPOINT, WAVE_BY_PATH
+from path_planner import normalize_paths, parse_path_list, DEFAULT_MAX_PATHS_PER_REQUEST
+from purge_plan import PurgePlan
+from invalidation import InvalidationPipeline, InvalidationReport, create_watcher, get_watch_options
+from cache_probe import (
+    CacheProber, DEFAULT_CONCURRENCY as DEFAULT_VERIFY_CONCURRENCY, DEFAULT_INTERVAL as DEFAULT_VERIFY_INTERVAL,
+    PROBE_MODES, MODE_GET, MODE_RANGE
+)
+from edge_resolver import parse_ip_list, expand_resolvers, resolve_edge_ips
+from prewarm import (
+    load_warm_urls, warm_urls, get_warm_options, get_warm_sources, DEFAULT_WARM_CONCURRENCY, DEFAULT_WARM_RATE,
+    DEFAULT_MAX_ATTEMPTS, DEFAULT_WARM_INTERVAL, DEFAULT_TOP_PATHS, read_url_list
+)
+
+
+def create_rate_controller(**kwargs) -> RateController:
+    """按环境变量创建 ARM 速率控制器"""
+    return RateController(
+        rate=float(os.getenv('PURGE_ARM_RATE', DEFAULT_RATE)),
+        burst=int(os.getenv('PURGE_ARM_BURST', DEFAULT_BURST)),
+        **kwargs
+    )
+
+
+def create_retry_policy() -> RetryPolicy:
+    """按环境变量创建重试策略"""
+    return RetryPolicy(
+        max_attempts=int(os.getenv('PURGE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+        base_delay=float(os.getenv('PURGE_RETRY_BASE_DELAY', DEFAULT_BASE_DELAY))
+    )
+
+
+def create_coordinator() -> Optional[PurgeCoordinator]:
+    """按环境变量创建跨进程清除协调表；PURGE_DEDUP=false 时返回 None（不去重）"""
+    if os.getenv('PURGE_DEDUP', 'true').lower() != 'true':
+        return None
+    return PurgeCoordinator(
+        freshness=float(os.getenv('PURGE_IDEMPOTENCY_WINDOW', DEFAULT_IDEMPOTENCY_WINDOW)),
+        lease=float(os.getenv('PURGE_DEDUP_LEASE', DEFAULT_LEASE)),
+        wait_interval=float(os.getenv('PURGE_DEDUP_WAIT_INTERVAL', DEFAULT_WAIT_INTERVAL))
+    )
+
+
+def get_schedule_options(max_concurrency: int) -> dict:
+    """从环境变量读取调度参数"""
+    return {
+        'max_concurrency': max_concurrency,
+        'poll_interval': float(os.getenv('PURGE_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)),
+        'poll_backoff': float(os.getenv('PURGE_POLL_BACKOFF', DEFAULT_POLL_BACKOFF)),
+        'max_poll_interval': float(os.getenv('PURGE_MAX_POLL_INTERVAL', DEFAULT_MAX_POLL_INTERVAL)),
+    }
 
 
 class AzureFrontDoorPurgeClient:
@@ -44,21 +115,30 @@ class AzureFrontDoorPurgeClient:
         # 验证必需的环境变量
         self._validate_config()
         
-        # 创建认证凭据
-        self.credential = ClientSecretCredential(
-            tenant_id=self.tenant_id,
-            client_id=self.client_id,
-            client_secret=self.client_secret
-        )
+        # 认证凭据和 CDN 管理客户端在第一次访问 ARM 时才创建（见 credential / cdn_client）
+        self._credential = None
+        self._cdn_client = None
         
-        # 创建 CDN 管理客户端
-        self.cdn_client = CdnManagementClient(
-            credential=self.credential,
-            subscription_id=self.subscription_id
-        )
+        # 日志经队列由后台线程写出；NDJSON 批量模式下日志改写到 stderr，stdout 只输出结果
+        self.log_writer = QueueLogWriter()
+        self.log_stream = sys.stdout
+        
+        # 埋点：各阶段 span 与计数器，输出目标由环境变量决定（见 instrumentation.create_instrumentation）
+        self.instrumentation = create_instrumentation(self.safe_print)
         
-        # 线程锁用于控制输出
-        self.print_lock = threading.Lock()
+        # endpoint 清单缓存，所有方法共享
+        self.inventory = EndpointInventory(ttl=float(os.getenv('PURGE_INVENTORY_TTL', DEFAULT_INVENTORY_TTL)))
+        
+        # 清除任务日志（首次清除时创建）
+        self.journal: Optional[PurgeJournal] = None
+        self.last_job_id: Optional[str] = None
+        
+        # 跨进程清除去重（首次清除时创建；purge --no-dedup 时关闭）
+        self.dedup = True
+        self.coordinator: Optional[PurgeCoordinator] = None
+        
+        # 最近一次清除的生效监测结果（启用 watch_options 时）
+        self.last_invalidation_report: Optional[InvalidationReport] = None
     
     def _validate_config(self):
         """验证配置是否完整"""
@@ -76,11 +156,29 @@ class AzureFrontDoorPurgeClient:
             print(f"错误: 缺少以下环境变量: {', '.join(missing_vars)}")
             print("请复制 .env.example 为 .env 并填入正确的配置信息")
             sys.exit(1)
-    
+
+    @property
+    def credential(self):
+        """服务主体认证凭据（延迟创建，带持久化令牌缓存）"""
+        if self._credential is None:
+            self._credential = create_credential(self.tenant_id, self.client_id, self.client_secret)
+        return self._credential
+
+    @property
+    def cdn_client(self):
+        """CDN 管理客户端（延迟创建）"""
+        if self._cdn_client is None:
+            self._cdn_client = create_cdn_client(self.credential, self.subscription_id)
+        return self._cdn_client
+
     def safe_print(self, message: str):
-        """线程安全的打印函数"""
-        with self.print_lock:
-            print(message)
+        """线程安全的打印函数（放入日志队列，不阻塞调用方）"""
+        self.log_writer.write(message, self.log_stream)
+    
+    def close(self):
+        """输出埋点结果（指标文件、耗时汇总等）并写完所有日志"""
+        self.instrumentation.close()
+        self.log_writer.close()
 
     def get_user_choice(self) -> Tuple[str, List[str]]:
         """
@@ -156,73 +254,251 @@ class AzureFrontDoorPurgeClient:
                         sys.exit(0)
                     continue
 
-    def purge_cache_parallel(self, endpoint_names: List[str], paths: Optional[List[str]] = None, max_workers: int = 5) -> Dict[str, bool]:
+    def purge_cache_parallel(self, endpoint_names: List[str], paths: Optional[List[str]] = None, max_workers: Optional[int] = None,
+                             domains: Optional[List[str]] = None,
+                             rollout_options: Optional[dict] = None,
+                             watch_options: Optional[dict] = None) -> Dict[str, PurgeOutcome]:
         """
-        并行清除多个 endpoints 的缓存
+        并行清除多个 endpoints 的缓存（异步引擎的同步封装）
         
         Args:
             endpoint_names: 要清除的 endpoint 名称列表
             paths: 要清除的路径列表，如果为 None 则清除所有缓存
-            max_workers: 最大并行工作线程数
+            max_workers: 同时在途的最大清除操作数，默认为 PURGE_MAX_CONCURRENCY 或 100
+            domains: 只清除这些域名下的缓存，为 None 时由路由索引决定
+            rollout_options: 分批发布参数（见 rollout.get_rollout_options），为 None 时一次性清除
+            watch_options: 生效监测参数（见 invalidation.get_watch_options），为 None 时不监测；
+                结果保存在 last_invalidation_report
             
         Returns:
-            Dict[str, bool]: endpoint 名称到操作结果的映射
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射（可按 bool 判断成功与否）
         """
         # 如果没有指定路径，从环境变量获取或使用默认值
         if paths is None:
-            env_paths = os.getenv('PURGE_PATHS', '/*')
-            paths = [path.strip() for path in env_paths.split(',')]
+            paths = parse_path_list(os.getenv('PURGE_PATHS', '/*'))
+        
+        # 规范化路径：去重并移除被更宽通配符覆盖的路径
+        paths = normalize_paths(paths)
+        
+        if max_workers is None:
+            max_workers = int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
         
         self.safe_print(f"🚀 开始并行清除 {len(endpoint_names)} 个 endpoints 的缓存...")
         self.safe_print(f"📁 清除路径: {paths}")
-        self.safe_print(f"⚡ 最大并行线程数: {max_workers}")
+        self.safe_print(f"⚡ 最大并发清除数: {max_workers}")
         self.safe_print("=" * 60)
         
-        results = {}
+        # 在单个事件循环上执行所有清除操作
+        results = asyncio.run(self._purge_many_async(endpoint_names, paths, max_workers, domains, rollout_options,
+                                                     watch_options))
+        self._print_summary(results)
+        return results
+
+    def resume_job(self, job_id: str, max_workers: Optional[int] = None) -> Dict[str, PurgeOutcome]:
+        """
+        恢复清除任务：只重新提交该任务中未成功完成的清除单元
         
-        # 使用线程池并行执行
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有任务
-            future_to_endpoint = {
-                executor.submit(self._purge_single_endpoint_with_result, endpoint_name, paths): endpoint_name
-                for endpoint_name in endpoint_names
-            }
+        Args:
+            job_id: 清除任务 ID
+            max_workers: 同时在途的最大清除操作数
             
-            # 收集结果
-            completed = 0
-            total = len(endpoint_names)
+        Returns:
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        
+        self.safe_print(f"🔁 恢复清除任务 {job_id}...")
+        self.safe_print("=" * 60)
+        
+        results = asyncio.run(self._resume_async(job_id, max_workers))
+        self._print_summary(results)
+        return results
+
+    def plan_purge(self, endpoint_names: List[str], paths: Optional[List[str]] = None,
+                   max_workers: Optional[int] = None, domains: Optional[List[str]] = None) -> PurgePlan:
+        """
+        生成清除计划（dry run）：解析路由、拆分清除单元并估计 ARM 调用次数和耗时，不提交任何清除
+        
+        Args:
+            endpoint_names: 要清除的 endpoint 名称列表
+            paths: 要清除的路径列表，如果为 None 则清除所有缓存
+            max_workers: 同时在途的最大清除操作数，默认为 PURGE_MAX_CONCURRENCY 或 100
+            domains: 只清除这些域名下的缓存，为 None 时由路由索引决定
             
-            for future in concurrent.futures.as_completed(future_to_endpoint):
-                endpoint_name = future_to_endpoint[future]
-                completed += 1
-                
-                try:
-                    success = future.result()
-                    results[endpoint_name] = success
-                    
-                    if success:
-                        self.safe_print(f"✅ [{completed}/{total}] Endpoint '{endpoint_name}' 缓存清除成功")
-                    else:
-                        self.safe_print(f"❌ [{completed}/{total}] Endpoint '{endpoint_name}' 缓存清除失败")
-                        
-                except Exception as e:
-                    results[endpoint_name] = False
-                    self.safe_print(f"❌ [{completed}/{total}] Endpoint '{endpoint_name}' 清除时发生异常: {str(e)}")
+        Returns:
+            PurgePlan: 清除计划
+        """
+        if paths is None:
+            paths = parse_path_list(os.getenv('PURGE_PATHS', '/*'))
+        paths = normalize_paths(paths)
+        
+        if max_workers is None:
+            max_workers = int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        
+        return asyncio.run(self._plan_async(endpoint_names, paths, max_workers, domains))
+
+    def plan_resume_job(self, job_id: str, max_workers: Optional[int] = None) -> PurgePlan:
+        """
+        生成恢复任务的清除计划（dry run），只包含未成功完成的清除单元
         
-        # 输出汇总结果
+        Args:
+            job_id: 清除任务 ID
+            max_workers: 同时在途的最大清除操作数
+            
+        Returns:
+            PurgePlan: 清除计划
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        return asyncio.run(self._plan_resume_async(job_id, max_workers))
+
+    def purge_jobs_stream(self, input_stream: TextIO, output_stream: TextIO,
+                          max_workers: Optional[int] = None) -> Tuple[int, int]:
+        """
+        流式执行 NDJSON 批量清除任务，每个任务完成时立即写出一行 JSON 结果
+        
+        Args:
+            input_stream: NDJSON 任务输入流
+            output_stream: NDJSON 结果输出流
+            max_workers: 同时在途的最大清除操作数
+            
+        Returns:
+            Tuple[int, int]: (成功任务数, 任务总数)
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        return asyncio.run(self._purge_jobs_async(input_stream, output_stream, max_workers))
+
+    def _print_summary(self, results: Dict[str, PurgeOutcome]):
+        """输出清除结果汇总"""
+        total = len(results)
         self.safe_print("=" * 60)
         success_count = sum(1 for success in results.values() if success)
         self.safe_print(f"📊 并行缓存清除完成: {success_count}/{total} 个 endpoints 成功")
         
         if success_count < total:
             self.safe_print("\n❌ 失败的 endpoints:")
-            for endpoint_name, success in results.items():
-                if not success:
-                    self.safe_print(f"   - {endpoint_name}")
-        
-        return results
+            for endpoint_name, outcome in results.items():
+                if not outcome:
+                    self.safe_print(f"   - {endpoint_name} (尝试 {outcome.attempts} 次): {outcome.error}")
+            if self.last_job_id:
+                self.safe_print(f"\n🔁 只重试未完成的部分: python purge_cache.py purge --resume {self.last_job_id}")
+        # 之后的输出直接 print，先等待队列中的日志写完
+        self.log_writer.flush()
+
+    def _get_journal(self) -> PurgeJournal:
+        """获取（延迟创建）清除任务日志"""
+        if self.journal is None:
+            self.journal = PurgeJournal()
+        return self.journal
+
+    def _get_coordinator(self) -> Optional[PurgeCoordinator]:
+        """获取（延迟创建）跨进程清除协调表，未启用去重时返回 None"""
+        if self.coordinator is None and self.dedup:
+            self.coordinator = create_coordinator()
+        return self.coordinator
+
+    def _create_async_client(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> AsyncAzureFrontDoorPurgeClient:
+        """使用当前配置创建异步清除客户端（速率控制器的并发上限在创建时确定）"""
+        return AsyncAzureFrontDoorPurgeClient(
+            tenant_id=self.tenant_id,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            subscription_id=self.subscription_id,
+            resource_group_name=self.resource_group_name,
+            front_door_name=self.front_door_name,
+            log=self.safe_print,
+            rate_controller=create_rate_controller(max_concurrency=max_concurrency),
+            retry_policy=create_retry_policy(),
+            journal=self._get_journal(),
+            idempotency_window=float(os.getenv('PURGE_IDEMPOTENCY_WINDOW', DEFAULT_IDEMPOTENCY_WINDOW)),
+            inventory=self.inventory,
+            instrumentation=self.instrumentation,
+            coordinator=self._get_coordinator()
+        )
+
+    def _get_schedule_options(self, max_concurrency: int) -> dict:
+        """从环境变量读取调度参数"""
+        return get_schedule_options(max_concurrency)
+
+    async def _purge_many_async(self, endpoint_names: List[str], paths: List[str], max_concurrency: int,
+                                domains: Optional[List[str]] = None,
+                                rollout_options: Optional[dict] = None,
+                                watch_options: Optional[dict] = None) -> Dict[str, PurgeOutcome]:
+        """在异步客户端上执行批量清除（指定 rollout_options 时分批执行，指定 watch_options 时监测生效）"""
+        async with self._create_async_client(max_concurrency) as async_client:
+            purge = async_client.purge_many
+            rollout = create_rollout(async_client, rollout_options) if rollout_options is not None else None
+            if rollout is not None:
+                purge = rollout.purge
+            pipeline = None
+            if watch_options is not None:
+                watcher = create_watcher(watch_options, log=async_client.log)
+                pipeline = InvalidationPipeline(async_client, watcher, rollout.run if rollout is not None else None)
+                purge = pipeline.purge
+            try:
+                return await purge(
+                    endpoint_names, paths,
+                    max_paths_per_request=int(os.getenv('PURGE_MAX_PATHS_PER_REQUEST', DEFAULT_MAX_PATHS_PER_REQUEST)),
+                    route_aware=os.getenv('PURGE_ROUTE_AWARE', 'true').lower() == 'true',
+                    domains=domains,
+                    **self._get_schedule_options(max_concurrency)
+                )
+            finally:
+                self.last_job_id = async_client.job_id
+                if pipeline is not None:
+                    self.last_invalidation_report = pipeline.report
+
+    async def _purge_jobs_async(self, input_stream: TextIO, output_stream: TextIO,
+                                max_concurrency: int) -> Tuple[int, int]:
+        """在异步客户端上流式执行批量任务"""
+        counts = [0, 0]
+
+        def emit(result: JobResult):
+            counts[0] += bool(result)
+            counts[1] += 1
+            write_result(result, output_stream)
 
-    def _purge_single_endpoint_with_result(self, endpoint_name: str, paths: List[str]) -> bool:
+        async with self._create_async_client(max_concurrency) as async_client:
+            try:
+                async for result in async_client.purge_jobs(
+                    read_jobs(input_stream, emit),
+                    max_paths_per_request=int(os.getenv('PURGE_MAX_PATHS_PER_REQUEST', DEFAULT_MAX_PATHS_PER_REQUEST)),
+                    route_aware=os.getenv('PURGE_ROUTE_AWARE', 'true').lower() == 'true',
+                    **self._get_schedule_options(max_concurrency)
+                ):
+                    emit(result)
+            finally:
+                self.last_job_id = async_client.job_id
+        return counts[0], counts[1]
+
+    async def _resume_async(self, job_id: str, max_concurrency: int) -> Dict[str, PurgeOutcome]:
+        """在异步客户端上恢复清除任务"""
+        async with self._create_async_client(max_concurrency) as async_client:
+            try:
+                return await async_client.resume(job_id, **self._get_schedule_options(max_concurrency))
+            finally:
+                self.last_job_id = async_client.job_id
+
+    async def _plan_async(self, endpoint_names: List[str], paths: List[str], max_concurrency: int,
+                          domains: Optional[List[str]] = None) -> PurgePlan:
+        """在异步客户端上生成清除计划"""
+        async with self._create_async_client(max_concurrency) as async_client:
+            return await async_client.plan(
+                endpoint_names, paths,
+                max_paths_per_request=int(os.getenv('PURGE_MAX_PATHS_PER_REQUEST', DEFAULT_MAX_PATHS_PER_REQUEST)),
+                route_aware=os.getenv('PURGE_ROUTE_AWARE', 'true').lower() == 'true',
+                domains=domains,
+                **self._get_schedule_options(max_concurrency)
+            )
+
+    async def _plan_resume_async(self, job_id: str, max_concurrency: int) -> PurgePlan:
+        """在异步客户端上生成恢复任务的清除计划"""
+        async with self._create_async_client(max_concurrency) as async_client:
+            return await async_client.plan_resume(job_id, **self._get_schedule_options(max_concurrency))
+
+    def _purge_single_endpoint_with_result(self, endpoint_name: str, paths: List[str]) -> PurgeOutcome:
         """
         清除单个 endpoint 的缓存（带线程安全输出）
         
@@ -231,34 +507,11 @@ class AzureFrontDoorPurgeClient:
             paths: 要清除的路径列表
             
         Returns:
-            bool: 操作是否成功
+            PurgeOutcome: 清除结果（可按 bool 判断成功与否）
         """
-        try:
-            self.safe_print(f"⏳ 开始清除 endpoint '{endpoint_name}' 的缓存...")
-            
-            # 发起缓存清除操作
-            purge_operation = self.cdn_client.afd_endpoints.begin_purge_content(
-                resource_group_name=self.resource_group_name,
-                profile_name=self.front_door_name,
-                endpoint_name=endpoint_name,
-                contents={
-                    "content_paths": paths
-                }
-            )
-            
-            # 等待操作完成
-            result = purge_operation.result()
-            
-            # 添加详细的成功确认信息
-            self.safe_print(f"✅ Endpoint '{endpoint_name}' 缓存清除操作已提交并确认")
-            self.safe_print(f"   📋 清除路径: {', '.join(paths)}")
-            self.safe_print(f"   ⏰ 完成时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            return True
-            
-        except Exception as e:
-            self.safe_print(f"❌ Endpoint '{endpoint_name}' 清除失败: {str(e)}")
-            return False
+        results = asyncio.run(self._purge_many_async([endpoint_name], paths, 1))
+        return results[endpoint_name]
+
     def purge_cache(self, paths: Optional[List[str]] = None, purge_all_endpoints: bool = True) -> bool:
         """
         清除 Front Door 缓存（保留原有功能以兼容性）
@@ -273,8 +526,7 @@ class AzureFrontDoorPurgeClient:
         try:
             # 如果没有指定路径，从环境变量获取或使用默认值
             if paths is None:
-                env_paths = os.getenv('PURGE_PATHS', '/*')
-                paths = [path.strip() for path in env_paths.split(',')]
+                paths = parse_path_list(os.getenv('PURGE_PATHS', '/*'))
             
             print(f"开始清除 Front Door '{self.front_door_name}' 的缓存...")
             print(f"资源组: {self.resource_group_name}")
@@ -302,46 +554,34 @@ class AzureFrontDoorPurgeClient:
             print(f"❌ 缓存清除操作失败: {str(e)}")
             return False
     
-    def _get_all_endpoints(self) -> List:
-        """获取所有可用的 endpoints"""
+    def _get_all_endpoints(self, refresh: bool = False) -> List[EndpointInfo]:
+        """
+        获取所有可用的 endpoints（优先使用 endpoint 清单缓存）
+        
+        Args:
+            refresh: 是否忽略缓存，重新从 ARM 拉取
+        """
+        key = make_inventory_key(self.subscription_id, self.resource_group_name, self.front_door_name)
+        if refresh:
+            # 路由索引依赖 endpoint 清单，一并失效
+            invalidate_cached_index(key)
         try:
-            endpoints = list(self.cdn_client.afd_endpoints.list_by_profile(
-                resource_group_name=self.resource_group_name,
-                profile_name=self.front_door_name
-            ))
-            return endpoints
+            return self.inventory.get(
+                key,
+                lambda: self.cdn_client.afd_endpoints.list_by_profile(
+                    resource_group_name=self.resource_group_name,
+                    profile_name=self.front_door_name
+                ),
+                refresh=refresh
+            )
         except Exception as e:
             print(f"获取 endpoints 列表时出错: {str(e)}")
             return []
     
     def _purge_single_endpoint(self, endpoint_name: str, paths: List[str]) -> bool:
         """清除单个 endpoint 的缓存"""
-        try:
-            # 发起缓存清除操作
-            purge_operation = self.cdn_client.afd_endpoints.begin_purge_content(
-                resource_group_name=self.resource_group_name,
-                profile_name=self.front_door_name,
-                endpoint_name=endpoint_name,
-                contents={
-                    "content_paths": paths
-                }
-            )
-            
-            print(f"⏳ 等待 endpoint '{endpoint_name}' 清除操作完成...")
-            
-            # 等待操作完成
-            result = purge_operation.result()
-            
-            # 添加更详细的成功确认信息
-            print(f"✅ Endpoint '{endpoint_name}' 缓存清除操作已提交并确认")
-            print(f"   📋 清除路径: {', '.join(paths)}")
-            print(f"   ⏰ 完成时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Endpoint '{endpoint_name}' 清除失败: {str(e)}")
-            return False
+        print(f"⏳ 等待 endpoint '{endpoint_name}' 清除操作完成...")
+        return self._purge_single_endpoint_with_result(endpoint_name, paths)
 
     def list_endpoints(self):
         """列出所有可用的 endpoints"""
@@ -376,85 +616,727 @@ class AzureFrontDoorPurgeClient:
             bool: 操作是否成功
         """
         if paths is None:
-            env_paths = os.getenv('PURGE_PATHS', '/*')
-            paths = [path.strip() for path in env_paths.split(',')]
+            paths = parse_path_list(os.getenv('PURGE_PATHS', '/*'))
         
         print(f"开始清除指定 endpoint '{endpoint_name}' 的缓存...")
         print(f"清除路径: {paths}")
         
         return self._purge_single_endpoint(endpoint_name, paths)
-def main():
+
+
+def _get_changed_paths(args: argparse.Namespace) -> Optional[List[str]]:
+    """
+    根据 --changed-files / --manifest-diff 计算部署变更的最小清除路径
+
+    Returns:
+        Optional[List[str]]: 清除路径；未使用变更模式时返回 None
+    """
+    manifest = None
+    if args.manifest_diff:
+        old_manifest, manifest = (load_manifest(path) for path in args.manifest_diff)
+        files = diff_manifests(old_manifest, manifest, include_added=args.include_added)
+    elif args.changed_files:
+        if args.changed_files == '-':
+            files = read_changed_files(sys.stdin)
+        else:
+            with open(args.changed_files, 'r', encoding='utf-8') as f:
+                files = read_changed_files(f)
+    else:
+        return None
+
+    mapping = UrlMapping.load(args.url_map or os.getenv('PURGE_URL_MAP'))
+    paths = plan_changed_paths(files, mapping, manifest, **get_collapse_options())
+    print(f"📝 变更文件 {len(files)} 个，合并为 {len(paths)} 个清除路径")
+    return paths
+
+
+# 子命令名称；不以子命令开头的参数按 purge 处理，兼容旧的 `purge_cache.py --resume JOB_ID` 用法
+COMMANDS = ('purge', 'list', 'verify', 'warm', 'monitor', 'health', 'serve', 'fleet')
+
+
+def _add_warm_source_arguments(parser):
+    """预热 URL 来源参数（warm 子命令与 purge --warm 共用）"""
+    parser.add_argument('--sitemap', action='append', dest='sitemaps', metavar='FILE_OR_URL',
+                        help='sitemap.xml（本地文件或 URL，支持 sitemap 索引），可重复指定，默认为 PURGE_WARM_SITEMAPS')
+    parser.add_argument('--url-list', action='append', dest='url_lists', metavar='FILE',
+                        help='URL 列表文件（每行一个 URL），可重复指定，默认为 PURGE_WARM_URL_LISTS')
+    parser.add_argument('--access-log', action='append', dest='access_logs', metavar='FILE',
+                        help='访问日志导出（JSON / NDJSON / CSV / 通用日志格式），取请求最多的 URL，'
+                             '默认为 PURGE_WARM_ACCESS_LOGS')
+    parser.add_argument('--top', type=int, metavar='N',
+                        help=f'从每个访问日志中选取的 URL 数，默认为 PURGE_WARM_TOP 或 {DEFAULT_TOP_PATHS}')
+    parser.add_argument('--base-url', metavar='URL',
+                        help='访问日志中只有路径时使用的站点地址，默认为 PURGE_WARM_BASE_URL')
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """构建命令行解析器"""
+    parser = argparse.ArgumentParser(
+        description="Azure Front Door Standard 缓存清除工具（不带参数运行时进入交互模式）"
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    
+    purge = subparsers.add_parser('purge', help='非交互地清除缓存')
+    targets = purge.add_mutually_exclusive_group()
+    targets.add_argument('-e', '--endpoint', action='append', dest='endpoints', metavar='NAME',
+                         help='要清除的 endpoint，可重复指定；默认清除所有 endpoints')
+    targets.add_argument('--all', action='store_true', help='清除所有 endpoints（默认）')
+    purge.add_argument('-p', '--paths', metavar='PATHS',
+                       help="逗号分隔的清除路径，默认为 PURGE_PATHS 或 '/*'")
+    purge.add_argument('--domains', metavar='DOMAINS',
+                       help='逗号分隔的域名，只清除这些域名下的缓存')
+    purge.add_argument('--max-concurrency', type=int, metavar='N',
+                       help='同时在途的最大清除操作数，默认为 PURGE_MAX_CONCURRENCY 或 100')
+    purge.add_argument('--refresh-endpoints', action='store_true',
+                       help='忽略 endpoint 清单缓存，重新从 Azure 拉取')
+    purge.add_argument('--metrics-file', metavar='FILE',
+                       help='结束时把各阶段耗时与计数器以 Prometheus 文本格式写入该文件')
+    purge.add_argument('--no-dedup', action='store_true',
+                       help='不与其他进程去重：即使相同的清除正在进行或刚刚完成也照常提交（默认由 PURGE_DEDUP 控制）')
+    modes = purge.add_mutually_exclusive_group()
+    modes.add_argument('--resume', metavar='JOB_ID',
+                       help='恢复清除任务，只重新提交该任务中未成功完成的清除单元')
+    modes.add_argument('--jobs', metavar='FILE',
+                       help="从 NDJSON 文件逐行读取清除任务（'-' 表示标准输入），结果以 NDJSON 写到标准输出")
+    modes.add_argument('--changed-files', metavar='FILE',
+                       help="只清除部署中变更的文件：每行一个文件路径，'-' 表示从标准输入读取")
+    modes.add_argument('--manifest-diff', nargs=2, metavar=('OLD', 'NEW'),
+                       help='比较两个构建清单（文件 → 内容哈希），只清除内容变化或被删除的文件')
+    purge.add_argument('--url-map', metavar='FILE',
+                       help='文件 → URL 映射配置（JSON），默认为 PURGE_URL_MAP')
+    purge.add_argument('--include-added', action='store_true',
+                       help='--manifest-diff 时同时清除新增文件（CDN 缓存了 404 时使用）')
+    rollout = purge.add_argument_group('分批发布', '按波次清除，波次之间探测源站健康，避免回源流量一次性涌向源站')
+    rollout.add_argument('--rollout', action='store_true', help='启用分批清除')
+    rollout.add_argument('--wave-by', choices=(WAVE_BY_ENDPOINT, WAVE_BY_PATH),
+                         help='按 endpoint 或按路径块分批，默认为 PURGE_WAVE_BY 或 endpoint')
+    rollout.add_argument('--wave-size', type=int, metavar='N',
+                         help='第一波的大小，之后按源站余量自适应调整，默认为 PURGE_WAVE_SIZE 或 1')
+    rollout.add_argument('--health-url', action='append', dest='health_urls', metavar='URL',
+                         help='源站健康检查 URL，可重复指定，默认为 PURGE_HEALTH_URLS')
+    rollout.add_argument('--settle', type=float, metavar='SECONDS',
+                         help='每波完成后等待回源流量到达的秒数，默认为 PURGE_WAVE_SETTLE 或 15')
+    dry_run = purge.add_argument_group('预演', '只生成清除计划并估计 ARM 调用次数和耗时，不提交任何清除操作')
+    dry_run.add_argument('--dry-run', action='store_true', help='输出清除计划后退出')
+    dry_run.add_argument('--plan-json', metavar='FILE',
+                         help="把完整的清除计划以 JSON 写入文件（'-' 表示标准输出），隐含 --dry-run")
+    watch = purge.add_argument_group('生效监测', '每个 endpoint 清除完成后探测样本 URL，记录各边缘节点观测到 MISS 的耗时')
+    watch.add_argument('--watch', action='store_true', help='清除后监测生效')
+    watch.add_argument('--watch-path', action='append', dest='watch_paths', metavar='PATH',
+                       help='在每个 endpoint 上探测的样本路径，可重复指定，默认为 PURGE_WATCH_PATHS 或清除路径中的非通配符路径')
+    watch.add_argument('--watch-timeout', type=float, metavar='SECONDS',
+                       help='清除完成后等待失效的最长时间，默认为 PURGE_WATCH_TIMEOUT 或 300')
+    watch.add_argument('--watch-report', metavar='FILE', help='把生效监测结果以 JSON 写入文件，隐含 --watch')
+    warm = purge.add_argument_group('预热', '所有 endpoints 清除成功后请求热点 URL，把内容重新填入边缘缓存')
+    warm.add_argument('--warm', action='store_true', help='清除成功后预热，URL 来源见下列参数或 PURGE_WARM_* 环境变量')
+    _add_warm_source_arguments(warm)
+    warm.add_argument('--warm-edge-ip', action='append', dest='edge_ips', metavar='IP',
+                      help='在这些边缘 IP 上分别预热，可重复指定或逗号分隔')
+    warm.add_argument('--warm-resolver', action='append', dest='resolvers', metavar='IP',
+                      help="用这些 DNS 解析器解析出边缘 IP 后分别预热（'public' / 'system' 同 verify --resolver）")
+    warm.add_argument('--warm-rate', type=float, dest='warm_rate', metavar='N',
+                      help=f'每秒最多发出的预热请求数，默认为 PURGE_WARM_RATE 或 {DEFAULT_WARM_RATE:g}')
+    warm.add_argument('--warm-concurrency', type=int, dest='warm_concurrency', metavar='N',
+                      help=f'同时在途的最大预热请求数，默认为 PURGE_WARM_CONCURRENCY 或 {DEFAULT_WARM_CONCURRENCY}')
+    
+    list_parser = subparsers.add_parser('list', help='列出 Front Door 的 endpoints')
+    list_parser.add_argument('--json', action='store_true', help='以 NDJSON 输出，每行一个 endpoint')
+    list_parser.add_argument('--refresh', action='store_true', help='忽略 endpoint 清单缓存，重新从 Azure 拉取')
+    
+    verify = subparsers.add_parser('verify', help='检测 URL 的缓存响应头，验证清除效果')
+    verify.add_argument('urls', nargs='+', metavar='URL', help='要检测的 URL')
+    verify.add_argument('-n', '--iterations', type=int, default=3, help='每个 URL 的请求次数（默认 3）')
+    verify.add_argument('-c', '--concurrency', type=int,
+                        default=int(os.getenv('PURGE_VERIFY_CONCURRENCY', DEFAULT_VERIFY_CONCURRENCY)),
+                        help=f'同时在途的最大请求数，默认为 PURGE_VERIFY_CONCURRENCY 或 {DEFAULT_VERIFY_CONCURRENCY}')
+    verify.add_argument('--interval', type=float, default=DEFAULT_VERIFY_INTERVAL,
+                        help=f'同一 URL 两次请求之间的间隔秒数（默认 {DEFAULT_VERIFY_INTERVAL:g}）')
+    verify.add_argument('--mode', choices=PROBE_MODES, default=os.getenv('PURGE_VERIFY_MODE', MODE_GET),
+                        help='探测模式：get 下载完整响应体；head / range 只读响应头（range 取 1 字节）；'
+                             'stream 流式计算内容摘要。默认为 PURGE_VERIFY_MODE 或 get')
+    edges = verify.add_argument_group('多 POP 探测', '把同一请求固定发送到多个边缘 IP（Host 头和 SNI 不变），按 POP 分组比较')
+    edges.add_argument('--edge-ip', action='append', dest='edge_ips', metavar='IP',
+                       help='边缘 IP，可重复指定或逗号分隔，默认为 PURGE_VERIFY_EDGE_IPS')
+    edges.add_argument('--resolver', action='append', dest='resolvers', metavar='IP',
+                       help="用这些 DNS 解析器分别解析 URL 的主机名并探测得到的所有边缘 IP，可重复指定；"
+                            "'public' 表示常用公共解析器，'system' 表示本机解析器。默认为 PURGE_VERIFY_RESOLVERS")
+    verify.add_argument('--report', metavar='FILE',
+                        help='把延迟统计（p50/p90/p99/max、命中率、TTFB 与总耗时）导出为 .json / .csv / .parquet')
+    verify.add_argument('--baseline', metavar='FILE',
+                        help='之前用 --report 导出的统计（例如清除前），输出并导出与本次的对比')
+    
+    warm = subparsers.add_parser('warm', help='预热缓存：限速请求热点 URL，直到边缘节点返回 HIT')
+    warm.add_argument('urls', nargs='*', metavar='URL', help='要预热的 URL')
+    _add_warm_source_arguments(warm)
+    warm.add_argument('-c', '--concurrency', type=int, dest='warm_concurrency', metavar='N',
+                      help=f'同时在途的最大请求数，默认为 PURGE_WARM_CONCURRENCY 或 {DEFAULT_WARM_CONCURRENCY}')
+    warm.add_argument('--rate', type=float, dest='warm_rate', metavar='N',
+                      help=f'每秒最多发出的请求数（源站返回 429 / 503 时自动减半），'
+                           f'默认为 PURGE_WARM_RATE 或 {DEFAULT_WARM_RATE:g}')
+    warm.add_argument('--max-attempts', type=int, dest='warm_attempts', metavar='N',
+                      help=f'每个 URL 最多请求的次数，出现 HIT 即停止，默认为 PURGE_WARM_MAX_ATTEMPTS 或 {DEFAULT_MAX_ATTEMPTS}')
+    warm.add_argument('--interval', type=float, dest='warm_interval', metavar='SECONDS',
+                      help=f'同一 URL 两次请求之间的间隔秒数，默认为 PURGE_WARM_INTERVAL 或 {DEFAULT_WARM_INTERVAL:g}')
+    warm.add_argument('--mode', choices=PROBE_MODES, default=MODE_GET,
+                      help='请求方式（同 verify --mode），大文件可用 stream 避免在内存中缓冲响应体')
+    warm.add_argument('--edge-ip', action='append', dest='edge_ips', metavar='IP',
+                      help='在这些边缘 IP 上分别预热，可重复指定或逗号分隔')
+    warm.add_argument('--resolver', action='append', dest='resolvers', metavar='IP',
+                      help="用这些 DNS 解析器解析出边缘 IP 后分别预热（'public' / 'system' 同 verify --resolver）")
+    warm.add_argument('--report', metavar='FILE', help='把预热结果以 JSON 写入文件')
+    
+    monitor = subparsers.add_parser('monitor', help='按固定间隔持续探测 URL，把缓存状态和延迟写入本地时间序列')
+    monitor.add_argument('urls', nargs='*', metavar='URL', help='要监测的 URL')
+    monitor.add_argument('--url-list', action='append', dest='url_lists', metavar='FILE',
+                         help='URL 列表文件（每行一个 URL），可重复指定')
+    monitor.add_argument('--interval', type=float,
+                         help='两轮探测之间的间隔秒数，默认为 PURGE_MONITOR_INTERVAL 或 60')
+    monitor.add_argument('--duration', metavar='DURATION', help='运行时长（例如 30m、24h），默认一直运行')
+    monitor.add_argument('--count', type=int, metavar='N', help='探测 N 轮后退出')
+    monitor.add_argument('-c', '--concurrency', type=int,
+                         default=int(os.getenv('PURGE_VERIFY_CONCURRENCY', DEFAULT_VERIFY_CONCURRENCY)),
+                         help=f'同时在途的最大请求数，默认为 PURGE_VERIFY_CONCURRENCY 或 {DEFAULT_VERIFY_CONCURRENCY}')
+    monitor.add_argument('--mode', choices=PROBE_MODES, default=MODE_RANGE,
+                         help=f'探测模式（同 verify --mode），默认为 {MODE_RANGE}（只取 1 个字节）')
+    monitor.add_argument('--edge-ip', action='append', dest='edge_ips', metavar='IP',
+                         help='在这些边缘 IP 上分别探测，可重复指定或逗号分隔，默认为 PURGE_VERIFY_EDGE_IPS')
+    monitor.add_argument('--resolver', action='append', dest='resolvers', metavar='IP',
+                         help="用这些 DNS 解析器解析出边缘 IP 后分别探测（'public' / 'system' 同 verify --resolver）")
+    monitor.add_argument('--db', metavar='FILE', help='时间序列数据库，默认为 PURGE_HEALTH_DB 或状态目录下的 health.db')
+    
+    health = subparsers.add_parser('health', help='查看 monitor 记录的命中率和延迟趋势，以及每次清除前后的变化')
+    health.add_argument('--since', default='24h', metavar='DURATION', help='从多久之前开始（默认 24h）')
+    health.add_argument('--until', metavar='DURATION', help='到多久之前结束（默认到现在）')
+    health.add_argument('--resolution', default='1h', metavar='DURATION', help='趋势的时间桶宽度（默认 1h）')
+    health.add_argument('--url', metavar='URL', help='只统计该 URL')
+    health.add_argument('--pop', metavar='POP', help='只统计该 POP')
+    health.add_argument('--window', default='1h', metavar='DURATION',
+                        help='比较每次清除完成前后各多长时间（默认 1h）')
+    health.add_argument('--json', action='store_true', help='以 JSON 输出趋势和清除前后对比')
+    health.add_argument('--db', metavar='FILE', help='时间序列数据库，默认为 PURGE_HEALTH_DB 或状态目录下的 health.db')
+    
+    serve = subparsers.add_parser('serve', help='运行清除合并服务：合并防抖窗口内的清除请求后统一提交')
+    serve.add_argument('--host', default=os.getenv('PURGE_DAEMON_HOST', DEFAULT_HOST),
+                       help=f'监听地址（默认 {DEFAULT_HOST}）')
+    serve.add_argument('--port', type=int, default=int(os.getenv('PURGE_DAEMON_PORT', DEFAULT_PORT)),
+                       help=f'监听端口（默认 {DEFAULT_PORT}）')
+    serve.add_argument('--unix', metavar='PATH', default=os.getenv('PURGE_DAEMON_SOCKET'),
+                       help='监听 Unix socket 而不是 TCP 端口')
+    serve.add_argument('--window', type=float,
+                       default=float(os.getenv('PURGE_DEBOUNCE_WINDOW', DEFAULT_DEBOUNCE_WINDOW)),
+                       help=f'防抖窗口秒数（默认 {DEFAULT_DEBOUNCE_WINDOW}）')
+    serve.add_argument('--max-delay', type=float,
+                       default=float(os.getenv('PURGE_DEBOUNCE_MAX_DELAY', DEFAULT_MAX_DELAY)),
+                       help=f'请求最长等待秒数（默认 {DEFAULT_MAX_DELAY}）')
+    serve.add_argument('--max-concurrency', type=int, metavar='N',
+                       help='同时在途的最大清除操作数，默认为 PURGE_MAX_CONCURRENCY 或 100')
+    
+    fleet = subparsers.add_parser('fleet', help='按配置文件同时清除多个订阅 / profile')
+    fleet.add_argument('config', help='批量清除配置文件（JSON）')
+    fleet.add_argument('-p', '--paths', metavar='PATHS',
+                       help="逗号分隔的默认清除路径，默认为配置中的 paths、PURGE_PATHS 或 '/*'")
+    fleet.add_argument('--metrics-file', metavar='FILE',
+                       help='结束时把各阶段耗时与计数器以 Prometheus 文本格式写入该文件')
+    fleet.add_argument('--max-concurrency', type=int, metavar='N',
+                       help='所有 profiles 共享的全局并发预算，默认为 PURGE_MAX_CONCURRENCY 或 100')
+    
+    return parser
+
+
+def _print_results(client: AzureFrontDoorPurgeClient, results: Dict[str, PurgeOutcome]):
+    """输出清除结果；有失败时以状态码 1 退出"""
+    success_count = sum(1 for success in results.values() if success)
+    total_count = len(results)
+    
+    if success_count == total_count:
+        print("\n🎉 所有缓存清除操作成功完成!")
+        print(f"✅ 成功清除了 {success_count} 个 endpoints 的缓存")
+        print("\n💡 验证缓存清除效果的方法:")
+        print("1. 访问您的网站，检查内容是否为最新版本")
+        print("2. 使用浏览器开发者工具查看响应头")
+        print("3. 运行验证命令: python purge_cache.py verify <URL>")
+        print("4. 检查响应时间和 X-Cache 头的变化")
+        return
+    
+    print(f"\n⚠️  部分缓存清除操作失败!")
+    print(f"📊 结果统计: {success_count}/{total_count} 个 endpoints 成功")
+    
+    if success_count > 0:
+        print("\n✅ 成功的 endpoints:")
+        for endpoint_name, success in results.items():
+            if success:
+                print(f"   - {endpoint_name}")
+    
+    print("\n❌ 失败的 endpoints:")
+    for endpoint_name, outcome in results.items():
+        if not outcome:
+            print(f"   - {endpoint_name} (尝试 {outcome.attempts} 次, 耗时 {outcome.elapsed:.1f}s): {outcome.error}")
+    
+    print("\n💡 建议:")
+    print("1. 临时性错误已自动重试，以上为重试后仍失败的 endpoints")
+    print("2. 检查网络连接和权限配置")
+    print("3. 查看详细的错误信息以诊断问题")
+    if client.last_job_id:
+        print(f"4. 只重试未完成的部分: python purge_cache.py purge --resume {client.last_job_id}")
+    
+    sys.exit(1)
+
+
+def _run_interactive(client: AzureFrontDoorPurgeClient):
+    """交互模式：列出 endpoints 并提示用户选择"""
+    # 列出可用的 endpoints（可选）
+    client.list_endpoints()
+    
+    # 获取用户选择
+    operation_type, selected_endpoints = client.get_user_choice()
+    
+    # 获取要清除的路径
+    paths = normalize_paths(parse_path_list(os.getenv('PURGE_PATHS', '/*')))
+    
+    print(f"\n🚀 开始执行缓存清除操作...")
+    print(f"📁 清除路径: {paths}")
+    
+    # 根据选择执行相应操作
+    if len(selected_endpoints) == 1:
+        # 单个 endpoint，直接清除
+        outcome = client._purge_single_endpoint_with_result(selected_endpoints[0], paths)
+        results = {selected_endpoints[0]: outcome}
+    else:
+        # 多个 endpoints，并行清除
+        results = client.purge_cache_parallel(selected_endpoints, paths)
+    
+    _print_results(client, results)
+
+
+def _run_purge(client: AzureFrontDoorPurgeClient, args: argparse.Namespace):
+    """purge 子命令"""
+    if args.metrics_file:
+        client.instrumentation.add_sink(PrometheusSink(args.metrics_file))
+    if args.refresh_endpoints:
+        client._get_all_endpoints(refresh=True)
+    if args.no_dedup:
+        client.dedup = False
+    
+    dry_run = args.dry_run or args.plan_json
+    if dry_run and args.jobs:
+        print("❌ --dry-run 不支持 --jobs 批量任务")
+        sys.exit(1)
+    if args.warm and not any(getattr(args, name) or get_warm_sources()[name]
+                             for name in ('sitemaps', 'url_lists', 'access_logs')):
+        print("❌ --warm 需要指定 URL 来源：--sitemap、--url-list、--access-log 或对应的 PURGE_WARM_* 环境变量")
+        sys.exit(1)
+    if args.plan_json == '-':
+        # 计划以 JSON 写到 stdout，日志改写到 stderr
+        client.log_stream = sys.stderr
+    
+    if args.jobs:
+        # NDJSON 批量模式：stdout 只输出结果，日志写到 stderr
+        client.log_stream = sys.stderr
+        if args.jobs == '-':
+            succeeded, total = client.purge_jobs_stream(sys.stdin, sys.stdout, args.max_concurrency)
+        else:
+            with open(args.jobs, 'r', encoding='utf-8') as f:
+                succeeded, total = client.purge_jobs_stream(f, sys.stdout, args.max_concurrency)
+        client.safe_print(f"📊 批量清除完成: {succeeded}/{total} 个任务成功")
+        if succeeded < total:
+            sys.exit(1)
+        return
+    
+    if args.resume:
+        # 恢复之前的清除任务
+        if dry_run:
+            _print_plan(client, client.plan_resume_job(args.resume, args.max_concurrency), args)
+            return
+        _print_results(client, client.resume_job(args.resume, args.max_concurrency))
+        return
+    
+    paths = _get_changed_paths(args)
+    if paths is not None and not paths:
+        print("✅ 没有需要清除的变更文件")
+        return
+    if paths is None:
+        paths = parse_path_list(args.paths or os.getenv('PURGE_PATHS', '/*'))
+    try:
+        paths = normalize_paths(paths)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    
+    endpoint_names = args.endpoints or [endpoint.name for endpoint in client._get_all_endpoints()]
+    if not endpoint_names:
+        print("❌ 未找到任何可用的 endpoints")
+        sys.exit(1)
+    
+    domains = parse_path_list(args.domains) if args.domains else None
+    if dry_run:
+        _print_plan(client, client.plan_purge(endpoint_names, paths, args.max_concurrency, domains), args)
+        return
+    rollout_options = _get_rollout_options(args) if args.rollout else None
+    watch_options = _get_watch_options(args) if args.watch or args.watch_report else None
+    results = client.purge_cache_parallel(endpoint_names, paths, args.max_concurrency, domains,
+                                          rollout_options, watch_options)
+    if args.watch_report and client.last_invalidation_report is not None:
+        with open(args.watch_report, 'w', encoding='utf-8') as f:
+            json.dump(client.last_invalidation_report.to_dict(), f, ensure_ascii=False, indent=2)
+        client.log_writer.flush()
+        print(f"💾 生效监测结果已写入 {args.watch_report}")
+    _print_results(client, results)
+    if args.warm:
+        # 只在所有 endpoints 都清除成功后预热（失败时 _print_results 已退出）
+        print()
+        for line in _warm_from_args(args).describe():
+            print(line)
+
+
+def _print_plan(client: AzureFrontDoorPurgeClient, plan: PurgePlan, args: argparse.Namespace):
+    """输出清除计划（--dry-run / --plan-json）"""
+    # 之后的输出直接 print，先等待队列中的日志写完
+    client.log_writer.flush()
+    if args.plan_json == '-':
+        print(json.dumps(plan.to_dict(), ensure_ascii=False, indent=2))
+        return
+    
+    for line in plan.describe():
+        print(line)
+    if args.rollout:
+        print(f"🌊 分批发布时每个波次之间还要等待源站健康检查（至少 {_get_rollout_options(args)['settle_time']:g}s），"
+              f"未计入预计耗时")
+    if args.plan_json:
+        with open(args.plan_json, 'w', encoding='utf-8') as f:
+            json.dump(plan.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"💾 完整计划已写入 {args.plan_json}")
+
+
+def _get_rollout_options(args: argparse.Namespace) -> dict:
+    """合并环境变量与命令行中的分批发布参数"""
+    options = get_rollout_options()
+    if args.wave_by:
+        options['by'] = args.wave_by
+    if args.wave_size:
+        options['initial_wave'] = args.wave_size
+    if args.health_urls:
+        options['health_urls'] = args.health_urls
+    if args.settle is not None:
+        options['settle_time'] = args.settle
+    return options
+
+
+def _get_watch_options(args: argparse.Namespace) -> dict:
+    """合并环境变量与命令行中的生效监测参数"""
+    options = get_watch_options()
+    if args.watch_paths:
+        options['sample_paths'] = args.watch_paths
+    if args.watch_timeout is not None:
+        options['timeout'] = args.watch_timeout
+    return options
+
+
+def _run_list(client: AzureFrontDoorPurgeClient, args: argparse.Namespace):
+    """list 子命令"""
+    if not args.json:
+        if args.refresh:
+            client._get_all_endpoints(refresh=True)
+        client.list_endpoints()
+        return
+    
+    for endpoint in client._get_all_endpoints(refresh=args.refresh):
+        print(json.dumps(asdict(endpoint), ensure_ascii=False))
+
+
+def _run_verify(args: argparse.Namespace):
+    """verify 子命令（不需要 Azure 凭据）"""
+    # 验证工具依赖 aiohttp 和 numpy，只在使用时导入
+    from verify_cache_refresh import test_cache_refresh, analyze_results
+    from latency_stats import load_stats, export_stats, get_report_format
+    
+    try:
+        for path in (args.report, args.baseline):
+            if path:
+                get_report_format(path)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    
+    edge_ips = _get_edge_ips(args, args.urls)
+    baseline = load_stats(args.baseline) if args.baseline else None
+    results = test_cache_refresh(args.urls, args.iterations, args.concurrency, args.interval, mode=args.mode,
+                                 edge_ips=edge_ips)
+    rows = analyze_results(results, baseline)
+    if args.report:
+        export_stats(rows, args.report)
+        print(f"\n💾 统计报告已写入 {args.report}")
+
+
+def _get_edge_ips(args: argparse.Namespace, urls: List[str]) -> Optional[Dict[str, List[str]]]:
+    """合并 --edge-ip 与 --resolver 的结果，得到每个主机名要探测的边缘 IP；都未指定时返回 None"""
+    try:
+        edge_ips = parse_ip_list(args.edge_ips or [os.getenv('PURGE_VERIFY_EDGE_IPS', '')])
+        resolvers = expand_resolvers(args.resolvers or [os.getenv('PURGE_VERIFY_RESOLVERS', '')])
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    if not edge_ips and not resolvers:
+        return None
+    
+    hosts = list(dict.fromkeys(urlsplit(url).hostname for url in urls if urlsplit(url).hostname))
+    resolved = asyncio.run(resolve_edge_ips(hosts, resolvers)) if resolvers else {}
+    # 手动指定的边缘 IP 用于所有主机名
+    result = {host: list(dict.fromkeys(resolved.get(host, []) + edge_ips)) for host in hosts}
+    if not any(result.values()):
+        print("❌ 没有得到任何边缘 IP")
+        sys.exit(1)
+    return result
+
+
+def _warm_from_args(args: argparse.Namespace):
+    """按命令行与环境变量中的来源和参数执行预热，返回 WarmReport；没有任何 URL 时以状态码 1 退出"""
+    sources = get_warm_sources()
+    for name in ('sitemaps', 'url_lists', 'access_logs', 'top', 'base_url'):
+        if getattr(args, name):
+            sources[name] = getattr(args, name)
+    try:
+        urls = asyncio.run(load_warm_urls(getattr(args, 'urls', None) or [], **sources))
+    except (OSError, ValueError) as e:
+        print(f"❌ 读取预热 URL 失败: {str(e)}")
+        sys.exit(1)
+    if not urls:
+        print("❌ 没有需要预热的 URL（使用 --sitemap、--url-list、--access-log 或直接指定 URL）")
+        sys.exit(1)
+    
+    options = get_warm_options()
+    for name, option in (('warm_concurrency', 'concurrency'), ('warm_rate', 'rate'), ('warm_attempts', 'max_attempts'),
+                         ('warm_interval', 'interval')):
+        if getattr(args, name, None):
+            options[option] = getattr(args, name)
+    return warm_urls(urls, _get_edge_ips(args, urls), mode=getattr(args, 'mode', MODE_GET), **options)
+
+
+def _run_warm(args: argparse.Namespace):
+    """warm 子命令（不需要 Azure 凭据）"""
+    report = _warm_from_args(args)
+    for line in report.describe():
+        print(line)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"💾 预热结果已写入 {args.report}")
+    if not report:
+        sys.exit(1)
+
+
+def _run_monitor(args: argparse.Namespace):
+    """monitor 子命令（不需要 Azure 凭据）"""
+    # 时间序列依赖 numpy（latency_stats），只在使用时导入
+    from health_store import HealthStore, HealthSampler, parse_duration, DEFAULT_SAMPLE_INTERVAL
+    
+    interval = args.interval or float(os.getenv('PURGE_MONITOR_INTERVAL', DEFAULT_SAMPLE_INTERVAL))
+    urls = list(args.urls)
+    try:
+        for path in args.url_lists or []:
+            urls.extend(read_url_list(path))
+        duration = parse_duration(args.duration) if args.duration else None
+    except (OSError, ValueError) as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    if not urls:
+        print("❌ 没有需要监测的 URL（直接指定 URL 或使用 --url-list）")
+        sys.exit(1)
+    
+    edge_ips = _get_edge_ips(args, urls)
+    store = HealthStore(args.db)
+    sampler = HealthSampler(store, urls, interval, CacheProber(concurrency=args.concurrency, mode=args.mode),
+                            edge_ips)
+    print(f"🩺 每 {interval:g} 秒探测 {len(sampler.urls)} 个 URL，样本写入 {store.path}")
+    try:
+        written = asyncio.run(sampler.run(duration, args.count))
+        print(f"✅ 共写入 {written} 个样本")
+    except KeyboardInterrupt:
+        print("\n⏹️  监测已停止")
+    finally:
+        store.close()
+
+
+def _run_health(args: argparse.Namespace):
+    """health 子命令（不需要 Azure 凭据）"""
+    from health_store import HealthStore, parse_duration, describe_trend
+    
+    now = time.time()
+    try:
+        since = now - parse_duration(args.since)
+        until = now - parse_duration(args.until) if args.until else now
+        resolution = parse_duration(args.resolution)
+        window = parse_duration(args.window)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    if since >= until:
+        print("❌ --since 必须早于 --until")
+        sys.exit(1)
+    
+    store = HealthStore(args.db)
+    journal = PurgeJournal()
+    try:
+        rows = store.trend(since, until, resolution, args.url, args.pop)
+        events = [dict(job, **store.around(job['completed_at'], window, args.url, args.pop))
+                  for job in journal.completed_jobs(since, until)]
+    finally:
+        journal.close()
+        store.close()
+    
+    if args.json:
+        print(json.dumps({'trend': rows, 'purges': events}, ensure_ascii=False, indent=2))
+        return
+    if not rows:
+        print(f"⚠️  时间范围内没有样本（先运行 monitor 子命令采集，数据库: {store.path}）")
+        return
+    for line in describe_trend(rows, events, resolution):
+        print(line)
+
+
+def _run_serve(client: AzureFrontDoorPurgeClient, args: argparse.Namespace):
+    """serve 子命令：所有请求共用一个预热的异步客户端"""
+    max_concurrency = args.max_concurrency or int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+    # 服务始终聚合 Prometheus 指标，由 GET /metrics 提供
+    metrics = client.instrumentation.find_sink(PrometheusSink)
+    if metrics is None:
+        metrics = PrometheusSink()
+        client.instrumentation.add_sink(metrics)
+    daemon = PurgeDaemon(
+        client._create_async_client(max_concurrency),
+        window=args.window,
+        max_delay=args.max_delay,
+        max_paths_per_request=int(os.getenv('PURGE_MAX_PATHS_PER_REQUEST', DEFAULT_MAX_PATHS_PER_REQUEST)),
+        route_aware=os.getenv('PURGE_ROUTE_AWARE', 'true').lower() == 'true',
+        schedule_options=client._get_schedule_options(max_concurrency),
+        metrics=metrics
+    )
+    serve(daemon, host=args.host, port=args.port, unix_path=args.unix)
+
+
+def _run_fleet(args: argparse.Namespace):
+    """fleet 子命令：只需要服务主体凭据，订阅和 profile 来自配置文件"""
+    load_dotenv()
+    missing_vars = [var for var in ('AZURE_TENANT_ID', 'AZURE_CLIENT_ID', 'AZURE_CLIENT_SECRET') if not os.getenv(var)]
+    if missing_vars:
+        print(f"错误: 缺少以下环境变量: {', '.join(missing_vars)}")
+        sys.exit(1)
+    
+    targets, config_paths = load_fleet_config(args.config)
+    try:
+        paths = normalize_paths(parse_path_list(args.paths) if args.paths else
+                                config_paths or parse_path_list(os.getenv('PURGE_PATHS', '/*')))
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    max_concurrency = args.max_concurrency or int(os.getenv('PURGE_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+    
+    print(f"🚀 开始批量清除 {len(targets)} 个 profiles 的缓存...")
+    print(f"📁 默认清除路径: {paths}")
+    print(f"⚡ 全局并发预算: {max_concurrency}")
+    print("=" * 60)
+    
+    log_writer = QueueLogWriter()
+    
+    def log(message: str):
+        log_writer.write(message, sys.stdout)
+    
+    instrumentation = create_instrumentation(log, args.metrics_file)
+    
+    async def run() -> FleetReport:
+        pool = ClientPool(os.getenv('AZURE_TENANT_ID'), os.getenv('AZURE_CLIENT_ID'),
+                          os.getenv('AZURE_CLIENT_SECRET'), max_connections=max_concurrency)
+        purger = FleetPurger(
+            targets, pool, log=log,
+            max_concurrency=max_concurrency,
+            rate_controller_factory=create_rate_controller,
+            retry_policy_factory=create_retry_policy,
+            journal=PurgeJournal(),
+            idempotency_window=float(os.getenv('PURGE_IDEMPOTENCY_WINDOW', DEFAULT_IDEMPOTENCY_WINDOW)),
+            inventory=EndpointInventory(ttl=float(os.getenv('PURGE_INVENTORY_TTL', DEFAULT_INVENTORY_TTL))),
+            instrumentation=instrumentation,
+            coordinator=create_coordinator()
+        )
+        try:
+            return await purger.purge(
+                paths,
+                max_paths_per_request=int(os.getenv('PURGE_MAX_PATHS_PER_REQUEST', DEFAULT_MAX_PATHS_PER_REQUEST)),
+                route_aware=os.getenv('PURGE_ROUTE_AWARE', 'true').lower() == 'true',
+                **get_schedule_options(max_concurrency)
+            )
+        finally:
+            await pool.close()
+    
+    try:
+        report = asyncio.run(run())
+    finally:
+        instrumentation.close()
+        log_writer.close()
+    print("=" * 60)
+    for line in report.summary_lines():
+        print(line)
+    if not report:
+        sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None):
     """主函数"""
-    print("Azure Front Door Standard 缓存清除工具")
-    print("=" * 50)
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        argv = ['purge'] + list(argv)
+    args = _build_parser().parse_args(argv)
     
+    if args.command == 'verify':
+        _run_verify(args)
+        return
+    if args.command == 'warm':
+        _run_warm(args)
+        return
+    if args.command == 'monitor':
+        _run_monitor(args)
+        return
+    if args.command == 'health':
+        _run_health(args)
+        return
+    if args.command == 'fleet':
+        try:
+            _run_fleet(args)
+        except KeyboardInterrupt:
+            print("\n\n操作被用户中断", file=sys.stderr)
+            sys.exit(0)
+        except Exception as e:
+            print(f"\n💥 程序执行出错: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        return
+    
+    # NDJSON 输出时 stdout 只保留机器可读的内容
+    if args.command is None or (args.command == 'purge' and not args.jobs and args.plan_json != '-'):
+        print("Azure Front Door Standard 缓存清除工具")
+        print("=" * 50)
+    
+    client = None
     try:
         # 创建客户端
         client = AzureFrontDoorPurgeClient()
         
-        # 列出可用的 endpoints（可选）
-        client.list_endpoints()
-        
-        # 获取用户选择
-        operation_type, selected_endpoints = client.get_user_choice()
-        
-        # 获取要清除的路径
-        env_paths = os.getenv('PURGE_PATHS', '/*')
-        paths = [path.strip() for path in env_paths.split(',')]
-        
-        print(f"\n🚀 开始执行缓存清除操作...")
-        print(f"📁 清除路径: {paths}")
-        
-        # 根据选择执行相应操作
-        if len(selected_endpoints) == 1:
-            # 单个 endpoint，直接清除
-            success = client._purge_single_endpoint_with_result(selected_endpoints[0], paths)
-            results = {selected_endpoints[0]: success}
+        if args.command == 'purge':
+            _run_purge(client, args)
+        elif args.command == 'list':
+            _run_list(client, args)
+        elif args.command == 'serve':
+            _run_serve(client, args)
         else:
-            # 多个 endpoints，并行清除
-            results = client.purge_cache_parallel(selected_endpoints, paths)
-        
-        # 统计结果
-        success_count = sum(1 for success in results.values() if success)
-        total_count = len(results)
-        
-        if success_count == total_count:
-            print("\n🎉 所有缓存清除操作成功完成!")
-            print(f"✅ 成功清除了 {success_count} 个 endpoints 的缓存")
-            print("\n💡 验证缓存清除效果的方法:")
-            print("1. 访问您的网站，检查内容是否为最新版本")
-            print("2. 使用浏览器开发者工具查看响应头")
-            print("3. 运行验证脚本: python verify_cache_refresh.py")
-            print("4. 检查响应时间和 X-Cache 头的变化")
-        else:
-            print(f"\n⚠️  部分缓存清除操作失败!")
-            print(f"📊 结果统计: {success_count}/{total_count} 个 endpoints 成功")
-            
-            if success_count > 0:
-                print("\n✅ 成功的 endpoints:")
-                for endpoint_name, success in results.items():
-                    if success:
-                        print(f"   - {endpoint_name}")
-            
-            if success_count < total_count:
-                print("\n❌ 失败的 endpoints:")
-                for endpoint_name, success in results.items():
-                    if not success:
-                        print(f"   - {endpoint_name}")
-                        
-                print("\n💡 建议:")
-                print("1. 检查网络连接和权限配置")
-                print("2. 重新运行程序重试失败的 endpoints")
-                print("3. 查看详细的错误信息以诊断问题")
-                
-            sys.exit(1)
+            _run_interactive(client)
             
     except KeyboardInterrupt:
-        print("\n\n操作被用户中断")
+        print("\n\n操作被用户中断", file=sys.stderr)
         sys.exit(0)
     except Exception as e:
-        print(f"\n💥 程序执行出错: {str(e)}")
+        print(f"\n💥 程序执行出错: {str(e)}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if client is not None:
+            client.close()
 
 
 if __name__ == "__main__":
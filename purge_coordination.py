@@ -0,0 +1,276 @@
+"""
+跨进程清除去重
+
+多个 CI 流水线或运维人员经常在几秒内对同一 profile 运行本工具，各自提交重叠的清除操作，
+既浪费 ARM 调用，也让源站重复承受回填。所有进程通过状态目录下的一个文件锁和一张 SQLite 表协调：
+表中按 profile、endpoint、域名和规范化路径记录在途和最近成功的清除。提交清除单元之前先在锁内认领：
+
+- 单元的所有路径都被新鲜期内成功的清除覆盖（含通配符覆盖）：直接跳过
+- 所有路径都被其他进程在途或新鲜的清除覆盖：附加到这些清除上，等待其完成后沿用结果
+- 否则认领单元的所有路径，由本进程提交
+
+只沿用在本次运行开始（流式任务为该任务到达）之后才开始的清除：更早开始的清除可能在本次部署
+完成之前就已清空边缘节点，之后回源取到的旧内容仍会留在缓存中。
+
+在途记录带有租约，提交方在运行期间定期续约；进程崩溃后租约过期，等待方重新认领并自行提交。
+其他进程的清除失败时记录被删除，等待方同样会重新认领。
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from path_planner import PathTrie, WILDCARD
+from purge_journal import DEFAULT_IDEMPOTENCY_WINDOW
+from purge_models import PurgeUnit
+from purge_settings import get_state_path, ensure_parent_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# 默认参数
+DEFAULT_LEASE = 60.0            # 在途记录的租约（秒），提交方每 1/3 租约续约一次
+DEFAULT_WAIT_INTERVAL = 2.0     # 等待其他进程的清除时，检查协调表的间隔（秒）
+
+# 认领结果
+CLAIM_FRESH = 'fresh'           # 已被新鲜期内成功的清除覆盖
+CLAIM_ATTACHED = 'attached'     # 等待其他进程在途的清除
+CLAIM_OWNED = 'owned'           # 由本进程提交
+
+STATUS_INFLIGHT = 'inflight'
+STATUS_SUCCEEDED = 'succeeded'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS purges (
+    scope TEXT NOT NULL,
+    endpoint_name TEXT NOT NULL,
+    domains TEXT NOT NULL,
+    path TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    expires_at REAL,
+    completed_at REAL,
+    PRIMARY KEY (scope, endpoint_name, domains, path, owner)
+);
+"""
+
+
+def _domains_key(domains: Sequence[str]) -> str:
+    return json.dumps(sorted(domain.lower() for domain in domains))
+
+
+def _covers(entries: Sequence[Tuple[str, str]], unit: PurgeUnit) -> bool:
+    """
+    判断一组清除记录是否覆盖单元的所有路径
+
+    Args:
+        entries: (路径, 域名键)；不限域名的清除覆盖任意域名，限定域名的清除只覆盖其域名的子集
+        unit: 清除单元
+    """
+    unit_domains = {domain.lower() for domain in unit.domains}
+    exact = set()
+    trie = PathTrie()
+    for path, domains in entries:
+        entry_domains = set(json.loads(domains))
+        if entry_domains and (not unit_domains or not unit_domains <= entry_domains):
+            continue
+        if path.endswith(WILDCARD):
+            trie.add_wildcard(path[:-1])
+        exact.add(path)
+    return all(path in exact or trie.covers(path) for path in unit.paths)
+
+
+class PurgeCoordinator:
+    """基于文件锁和 SQLite 的跨进程清除协调表"""
+
+    def __init__(self, path: Optional[str] = None,
+                 freshness: float = DEFAULT_IDEMPOTENCY_WINDOW,
+                 lease: float = DEFAULT_LEASE,
+                 wait_interval: float = DEFAULT_WAIT_INTERVAL):
+        """
+        Args:
+            path: 数据库文件路径，默认为状态目录下的 coordination.db（锁文件为同名 .lock）
+            freshness: 新鲜期（秒），期间内成功的清除可被其他进程直接沿用
+            lease: 在途记录的租约（秒）
+            wait_interval: 等待其他进程的清除时检查的间隔（秒）
+        """
+        self.path = path or get_state_path('coordination.db')
+        self.lock_path = self.path + '.lock'
+        self.freshness = freshness
+        self.lease = lease
+        self.wait_interval = wait_interval
+        ensure_parent_dir(self.path)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """持有跨进程的排他文件锁（认领时的读取-判断-写入必须是原子的）"""
+        with open(self.lock_path, 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def session(self, scope: str) -> "CoordinationSession":
+        """
+        开始一次清除运行的登记
+
+        Args:
+            scope: profile 标识（endpoint_inventory.make_inventory_key）
+        """
+        return CoordinationSession(self, scope)
+
+    def _live_entries(self, scope: str, endpoint_name: str, owner: str, now: float,
+                      not_before: float) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+        """获取 endpoint 上 not_before 之后开始的新鲜的成功清除，以及其他 owner 未过期的在途清除"""
+        fresh, inflight = [], []
+        for path, domains, status, entry_owner, expires_at, completed_at in self.conn.execute(
+                'SELECT path, domains, status, owner, expires_at, completed_at FROM purges '
+                'WHERE scope = ? AND endpoint_name = ? AND started_at >= ?', (scope, endpoint_name, not_before)):
+            if status == STATUS_SUCCEEDED and completed_at >= now - self.freshness:
+                fresh.append((path, domains))
+            elif status == STATUS_INFLIGHT and entry_owner != owner and expires_at >= now:
+                inflight.append((path, domains))
+        return fresh, inflight
+
+    def _claim(self, scope: str, owner: str, units: Sequence[PurgeUnit], not_before: float) -> List[str]:
+        """
+        在锁内为每个单元给出认领结果，并为需要本进程提交的单元写入在途记录
+
+        文件锁和 SQLite 写入直接在调用方（事件循环）上同步执行：锁只在一次认领的读取-判断-写入
+        期间持有（按 endpoint 各一次查询，加上在途记录的写入，通常为毫秒级），其他进程同样只短暂
+        持有，等待锁的时间可以忽略。放到线程池中执行则需要让连接跨线程使用，并串行化 complete、
+        renew 等同一连接上的写入，得不偿失。
+        """
+        now = time.time()
+        claims = []
+        with self._locked(), self.conn:
+            self.conn.execute(
+                'DELETE FROM purges WHERE (status = ? AND expires_at < ?) OR (status = ? AND completed_at < ?)',
+                (STATUS_INFLIGHT, now, STATUS_SUCCEEDED, now - self.freshness)
+            )
+            live: Dict[str, Tuple[list, list]] = {}
+            for unit in units:
+                endpoint_name = unit.endpoint_name.lower()
+                if endpoint_name not in live:
+                    live[endpoint_name] = self._live_entries(scope, endpoint_name, owner, now, not_before)
+                fresh, inflight = live[endpoint_name]
+                if _covers(fresh, unit):
+                    claims.append(CLAIM_FRESH)
+                elif _covers(fresh + inflight, unit):
+                    claims.append(CLAIM_ATTACHED)
+                else:
+                    claims.append(CLAIM_OWNED)
+                    self.conn.executemany(
+                        'INSERT OR REPLACE INTO purges VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)',
+                        [(scope, endpoint_name, _domains_key(unit.domains), path, owner, STATUS_INFLIGHT,
+                          now, now + self.lease) for path in unit.paths]
+                    )
+        return claims
+
+
+class CoordinationSession:
+    """一次清除运行在协调表中的登记：认领、续约、完成和释放"""
+
+    def __init__(self, coordinator: PurgeCoordinator, scope: str):
+        self.coordinator = coordinator
+        self.scope = scope
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.started_at = time.time()
+
+    def claim(self, units: Sequence[PurgeUnit], not_before: Optional[float] = None) -> List[str]:
+        """
+        认领清除单元
+
+        Args:
+            units: 清除单元
+            not_before: 只沿用此时间之后开始的清除，默认为会话开始的时间
+
+        Returns:
+            List[str]: 与 units 一一对应的 CLAIM_FRESH / CLAIM_ATTACHED / CLAIM_OWNED
+        """
+        return self.coordinator._claim(self.scope, self.owner, units,
+                                       self.started_at if not_before is None else not_before)
+
+    async def wait(self, units: Sequence[PurgeUnit],
+                   not_before: Optional[float] = None) -> AsyncIterator[Tuple[PurgeUnit, str]]:
+        """
+        等待附加的单元：每个单元不再被其他进程的在途清除覆盖时产出 (单元, 新的认领结果)
+
+        其他进程成功时结果为 CLAIM_FRESH；失败或租约过期时本进程重新认领，结果为 CLAIM_OWNED
+        （也可能附加到另一个进程新提交的清除上，继续等待）。not_before 同 claim。
+        """
+        pending = list(units)
+        while pending:
+            await asyncio.sleep(self.coordinator.wait_interval)
+            still_pending = []
+            for unit, claim in zip(pending, self.claim(pending, not_before)):
+                if claim == CLAIM_ATTACHED:
+                    still_pending.append(unit)
+                else:
+                    yield unit, claim
+            pending = still_pending
+
+    def complete(self, unit: PurgeUnit, success: bool):
+        """记录本进程提交的单元的结果；失败的记录直接删除，让等待方重新认领"""
+        conn = self.coordinator.conn
+        keys = [(self.scope, unit.endpoint_name.lower(), _domains_key(unit.domains), path, self.owner)
+                for path in unit.paths]
+        with conn:
+            if success:
+                conn.executemany(
+                    'UPDATE purges SET status = ?, expires_at = NULL, completed_at = ? '
+                    'WHERE scope = ? AND endpoint_name = ? AND domains = ? AND path = ? AND owner = ?',
+                    [(STATUS_SUCCEEDED, time.time()) + key for key in keys]
+                )
+            else:
+                conn.executemany(
+                    'DELETE FROM purges WHERE scope = ? AND endpoint_name = ? AND domains = ? AND path = ? '
+                    'AND owner = ?', keys
+                )
+
+    def renew(self):
+        """延长本进程所有在途记录的租约"""
+        with self.coordinator.conn:
+            self.coordinator.conn.execute(
+                'UPDATE purges SET expires_at = ? WHERE owner = ? AND status = ?',
+                (time.time() + self.coordinator.lease, self.owner, STATUS_INFLIGHT)
+            )
+
+    async def keep_alive(self):
+        """运行期间定期续约，直到被取消"""
+        while True:
+            await asyncio.sleep(self.coordinator.lease / 3)
+            self.renew()
+
+    def release(self):
+        """删除本进程仍在途的记录（运行结束、出错或被取消时），等待方随即重新认领"""
+        with self.coordinator.conn:
+            self.coordinator.conn.execute(
+                'DELETE FROM purges WHERE owner = ? AND status = ?', (self.owner, STATUS_INFLIGHT)
+            )
@@ -0,0 +1,373 @@
+"""
+清除合并服务
+
+常驻进程，通过本地 HTTP（或 Unix socket）接收清除请求。在防抖窗口内到达的请求
+按 endpoint 合并为去重后的路径集合，再通过同一个预热的异步客户端统一提交，
+把大量零散的小清除合并为少量 ARM 操作。调用方拿到请求 ID 后可以轮询结果。
+
+接口：
+- POST /purge      提交清除请求，请求体与 NDJSON 批量任务相同，返回 202 和请求 ID
+- GET  /jobs/{id}  查询请求状态：pending / running / succeeded / failed
+- GET  /health     服务状态与统计
+- GET  /metrics    Prometheus 指标（各阶段耗时与计数器）
+"""
+
+import asyncio
+import dataclasses
+import time
+import uuid
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from async_purge import AsyncAzureFrontDoorPurgeClient
+from instrumentation import PrometheusSink
+from path_planner import PathTrie, WILDCARD, normalize_paths, plan_purge_units, DEFAULT_MAX_PATHS_PER_REQUEST
+from purge_models import PurgeJob, JobResult, PurgeOutcome, PurgeUnit, UnitResult
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+
+# 默认防抖窗口（秒）：最后一个请求到达后等待这么久没有新请求才提交
+DEFAULT_DEBOUNCE_WINDOW = 2.0
+
+# 默认最长等待（秒）：持续有请求到达时，第一个请求最多等待这么久就提交
+DEFAULT_MAX_DELAY = 10.0
+
+# 已完成请求的保留时间（秒），过期后查询返回 404
+DEFAULT_RESULT_TTL = 3600.0
+
+# 默认监听地址
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8787
+
+# 请求状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+
+def _json_response(data: dict, status: int = 200) -> "web.Response":
+    # aiohttp.web 只在服务真正运行时导入，命令行的其他子命令不承担导入开销
+    from aiohttp import web
+    return web.json_response(data, status=status)
+
+
+class PurgeRequest:
+    """服务收到的一个清除请求及其状态"""
+
+    def __init__(self, job: PurgeJob):
+        self.job = job
+        self.status = STATUS_PENDING
+        self.received_at = time.time()
+        self.completed_at = 0.0
+        self.batch_id: Optional[str] = None
+        self.result: Optional[JobResult] = None
+
+    @property
+    def request_id(self) -> str:
+        return self.job.job_id
+
+    def finish(self, result: JobResult):
+        self.result = result
+        self.status = STATUS_SUCCEEDED if result else STATUS_FAILED
+        self.completed_at = time.time()
+
+    def to_dict(self) -> dict:
+        data = {
+            'id': self.request_id,
+            'status': self.status,
+            'endpoints': list(self.job.endpoint_names),
+            'paths': list(self.job.paths),
+            'received_at': self.received_at,
+        }
+        if self.job.domains:
+            data['domains'] = list(self.job.domains)
+        if self.batch_id:
+            data['batch_id'] = self.batch_id
+        if self.result is not None:
+            data['completed_at'] = self.completed_at
+            data['result'] = self.result.to_dict()
+        return data
+
+
+class PurgeCoalescer:
+    """
+    防抖合并器
+
+    请求先进入当前批次；最后一个请求之后 window 秒内没有新请求，或批次中第一个请求
+    已等待 max_delay 秒时，整个批次交给 flush 处理。批次之间可以并发执行。
+    """
+
+    def __init__(self, flush: Callable[[List[PurgeRequest]], Awaitable[None]],
+                 window: float = DEFAULT_DEBOUNCE_WINDOW, max_delay: float = DEFAULT_MAX_DELAY):
+        self.flush = flush
+        self.window = window
+        self.max_delay = max_delay
+        self._batch: List[PurgeRequest] = []
+        self._first_at = 0.0
+        self._last_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._batch)
+
+    def start(self):
+        self._timer = asyncio.create_task(self._run())
+
+    def submit(self, request: PurgeRequest):
+        """把请求加入当前批次"""
+        now = time.monotonic()
+        if not self._batch:
+            self._first_at = now
+        self._last_at = now
+        self._batch.append(request)
+        self._wakeup.set()
+
+    def _deadline(self) -> float:
+        return min(self._last_at + self.window, self._first_at + self.max_delay)
+
+    async def _run(self):
+        while True:
+            if not self._batch:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._deadline() - time.monotonic()
+            if delay > 0:
+                # 等到截止时间，期间的新请求会推迟截止时间
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._flush_batch()
+
+    def _flush_batch(self):
+        batch, self._batch = self._batch, []
+        task = asyncio.create_task(self.flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def close(self):
+        """提交剩余批次并等待所有批次完成"""
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+        if self._batch:
+            self._flush_batch()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+class PurgeDaemon:
+    """清除合并服务：HTTP 接口 + 防抖合并 + 预热的异步客户端"""
+
+    def __init__(self, client: AsyncAzureFrontDoorPurgeClient,
+                 window: float = DEFAULT_DEBOUNCE_WINDOW,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                 route_aware: bool = False,
+                 schedule_options: Optional[dict] = None,
+                 result_ttl: float = DEFAULT_RESULT_TTL,
+                 metrics: Optional[PrometheusSink] = None):
+        """
+        Args:
+            client: 异步清除客户端，由服务负责打开和关闭
+            window: 防抖窗口（秒）
+            max_delay: 批次最长等待时间（秒）
+            max_paths_per_request: 单次清除请求的最大路径数
+            route_aware: 是否按路由索引只向实际提供路径的 endpoints 发送清除
+            schedule_options: 传给 purge_units 的调度参数
+            result_ttl: 已完成请求的保留时间（秒）
+            metrics: 客户端埋点使用的 Prometheus 聚合，为 None 时不提供 /metrics
+        """
+        self.client = client
+        self.max_paths_per_request = max_paths_per_request
+        self.route_aware = route_aware
+        self.schedule_options = schedule_options or {}
+        self.result_ttl = result_ttl
+        self.metrics = metrics
+        self.coalescer = PurgeCoalescer(self._flush, window, max_delay)
+        self.requests: Dict[str, PurgeRequest] = {}
+        self.stats = {'requests': 0, 'batches': 0, 'units': 0}
+
+    def create_app(self) -> "web.Application":
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post('/purge', self.handle_purge)
+        app.router.add_get('/jobs/{request_id}', self.handle_job)
+        app.router.add_get('/health', self.handle_health)
+        if self.metrics is not None:
+            app.router.add_get('/metrics', self.handle_metrics)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: "web.Application"):
+        # 预热：建立连接池并提前获取 endpoint 清单，第一批清除不再等待这些调用
+        await self.client.open()
+        try:
+            await self.client.get_endpoints()
+        except Exception as e:
+            self.client.log(f"⚠️  预取 endpoint 清单失败: {str(e)}")
+        self.coalescer.start()
+        self.client.log(f"🟢 清除合并服务已启动（防抖窗口 {self.coalescer.window:.1f}s，"
+                        f"最长等待 {self.coalescer.max_delay:.1f}s）")
+
+    async def _on_cleanup(self, app: "web.Application"):
+        await self.coalescer.close()
+        await self.client.close()
+
+    async def handle_purge(self, request: "web.Request") -> "web.Response":
+        try:
+            job = PurgeJob.from_dict(await request.json(), uuid.uuid4().hex[:12])
+            normalize_paths(job.paths)
+        except ValueError as e:
+            return _json_response({'error': f"无效的请求: {str(e)}"}, status=400)
+        if job.job_id in self.requests:
+            return _json_response({'error': f"请求 ID 已存在: {job.job_id}"}, status=409)
+
+        self._expire_requests()
+        purge_request = PurgeRequest(job)
+        self.requests[job.job_id] = purge_request
+        self.stats['requests'] += 1
+        self.coalescer.submit(purge_request)
+        return _json_response(purge_request.to_dict(), status=202)
+
+    async def handle_job(self, request: "web.Request") -> "web.Response":
+        purge_request = self.requests.get(request.match_info['request_id'])
+        if purge_request is None:
+            return _json_response({'error': '未找到该请求'}, status=404)
+        return _json_response(purge_request.to_dict())
+
+    async def handle_health(self, request: "web.Request") -> "web.Response":
+        running = sum(1 for r in self.requests.values() if r.status == STATUS_RUNNING)
+        return _json_response({
+            'status': 'ok',
+            'pending': self.coalescer.pending,
+            'running': running,
+            **self.stats
+        })
+
+    async def handle_metrics(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+        return web.Response(text=self.metrics.render(), content_type='text/plain', charset='utf-8')
+
+    def _expire_requests(self):
+        """移除超过保留时间的已完成请求"""
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            request_id for request_id, r in self.requests.items()
+            if r.completed_at and r.completed_at < cutoff
+        ]
+        for request_id in expired:
+            del self.requests[request_id]
+
+    async def _plan_batch(self, batch: List[PurgeRequest]) -> Dict[PurgeUnit, List[PurgeRequest]]:
+        """
+        把一个批次的请求按 (endpoint, domains) 合并，生成去重后的清除单元
+
+        Returns:
+            Dict[PurgeUnit, List[PurgeRequest]]: 清除单元（按提交顺序）到其覆盖了路径的请求的映射
+        """
+        all_endpoints = None
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[PurgeRequest]] = {}
+        for purge_request in batch:
+            endpoint_names = purge_request.job.endpoint_names
+            if not endpoint_names:
+                if all_endpoints is None:
+                    all_endpoints = tuple(e.name for e in await self.client.get_endpoints())
+                endpoint_names = all_endpoints
+                purge_request.job = dataclasses.replace(purge_request.job, endpoint_names=endpoint_names)
+            for endpoint_name in endpoint_names:
+                groups.setdefault((endpoint_name, purge_request.job.domains), []).append(purge_request)
+
+        route_index = await self.client._get_route_index_or_none() if self.route_aware else None
+        units: Dict[PurgeUnit, List[PurgeRequest]] = {}
+        for (endpoint_name, domains), requests in groups.items():
+            paths = [path for purge_request in requests for path in purge_request.job.paths]
+            planned = plan_purge_units([endpoint_name], paths, self.max_paths_per_request, route_index)
+            if domains:
+                planned = [dataclasses.replace(unit, domains=domains) for unit in planned]
+            for unit in planned:
+                # 合并后一个请求的路径可能被其他请求更宽的通配符覆盖，也算作该请求的单元
+                trie = PathTrie()
+                for path in unit.paths:
+                    if path.endswith(WILDCARD):
+                        trie.add_wildcard(path[:-1])
+                units.setdefault(unit, []).extend(
+                    purge_request for purge_request in requests
+                    if any(path in unit.paths or trie.covers(path)
+                           for path in normalize_paths(purge_request.job.paths))
+                )
+        return units
+
+    async def _flush(self, batch: List[PurgeRequest]):
+        """提交一个批次，并把每个清除单元的结果分发给覆盖了其路径的请求"""
+        for purge_request in batch:
+            purge_request.status = STATUS_RUNNING
+
+        try:
+            requests_by_unit = await self._plan_batch(batch)
+            units = list(requests_by_unit)
+            self.stats['batches'] += 1
+            self.stats['units'] += len(units)
+            self.client.log(f"🧺 合并 {len(batch)} 个清除请求为 {len(units)} 个清除单元")
+
+            # 每个批次对应任务日志中的一个任务；批次可能并发执行，因此在这里创建任务
+            batch_id = None
+            if self.client.journal is not None:
+                batch_id = self.client.journal.create_job(
+                    self.client.subscription_id, self.client.resource_group_name,
+                    self.client.front_door_name, units
+                )
+            for purge_request in batch:
+                purge_request.batch_id = batch_id
+
+            # 每个请求只汇总覆盖了其路径的单元：同一 endpoint 上其他请求的单元失败不影响本请求
+            outcomes: Dict[str, Dict[str, PurgeOutcome]] = {
+                purge_request.request_id: {name: PurgeOutcome(name) for name in purge_request.job.endpoint_names}
+                for purge_request in batch
+            }
+
+            def on_result(unit_result: UnitResult):
+                endpoint_name = unit_result.unit.endpoint_name
+                for purge_request in requests_by_unit.get(unit_result.unit, []):
+                    outcomes[purge_request.request_id][endpoint_name].add(unit_result)
+
+            await self.client.purge_units(units, job_id=batch_id, on_result=on_result, **self.schedule_options)
+        except Exception as e:
+            self.client.log(f"❌ 批次提交失败: {str(e)}")
+            for purge_request in batch:
+                purge_request.finish(JobResult(purge_request.request_id, error=str(e)))
+            return
+
+        for purge_request in batch:
+            purge_request.finish(JobResult(purge_request.request_id, outcomes[purge_request.request_id]))
+
+
+def serve(daemon: PurgeDaemon, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          unix_path: Optional[str] = None):
+    """
+    运行清除合并服务，直到收到中断信号
+
+    Args:
+        daemon: 服务实例
+        host: 监听地址
+        port: 监听端口
+        unix_path: Unix socket 路径，指定时不监听 TCP
+    """
+    from aiohttp import web
+
+    app = daemon.create_app()
+    if unix_path:
+        web.run_app(app, path=unix_path, print=daemon.client.log)
+    else:
+        web.run_app(app, host=host, port=port, print=daemon.client.log)
@@ -0,0 +1,200 @@
+"""
+清除任务日志
+
+把每个清除任务（endpoints × 路径块）的每个清除单元在提交和完成时写入本地 SQLite，
+用于只重试未完成的单元（--resume），并让窗口期内重复提交的相同单元保持幂等。
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+from purge_models import PurgeUnit, UnitResult
+from purge_settings import get_state_path, ensure_parent_dir
+
+
+# 默认幂等窗口（秒）：窗口期内已成功的相同单元不再重复提交
+DEFAULT_IDEMPOTENCY_WINDOW = 300.0
+
+# 单元状态
+STATUS_PENDING = 'pending'
+STATUS_SUBMITTED = 'submitted'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+DONE_STATUSES = (STATUS_SUCCEEDED, STATUS_SKIPPED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    subscription_id TEXT NOT NULL,
+    resource_group TEXT NOT NULL,
+    profile TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    job_id TEXT NOT NULL,
+    unit_key TEXT NOT NULL,
+    endpoint_name TEXT NOT NULL,
+    paths TEXT NOT NULL,
+    domains TEXT NOT NULL DEFAULT '[]',
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    submitted_at REAL,
+    completed_at REAL,
+    PRIMARY KEY (job_id, unit_key)
+);
+CREATE INDEX IF NOT EXISTS idx_units_key ON units (unit_key, status, completed_at);
+"""
+
+
+def make_unit_key(subscription_id: str, resource_group: str, profile: str, unit: PurgeUnit) -> str:
+    """生成清除单元的唯一键（与路径顺序无关）"""
+    raw = '|'.join([subscription_id, resource_group.lower(), profile.lower(), unit.endpoint_name.lower()]
+                   + sorted(unit.paths) + ['@' + domain.lower() for domain in sorted(unit.domains)])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class PurgeJournal:
+    """基于 SQLite 的清除任务日志"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 数据库文件路径，默认为状态目录下的 journal.db
+        """
+        self.path = path or get_state_path('journal.db')
+        ensure_parent_dir(self.path)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """为旧版本创建的日志补充新列"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(units)')}
+        if 'domains' not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE units ADD COLUMN domains TEXT NOT NULL DEFAULT '[]'")
+
+    def close(self):
+        self.conn.close()
+
+    def create_job(self, subscription_id: str, resource_group: str, profile: str,
+                   units: Iterable[PurgeUnit]) -> str:
+        """
+        创建新任务并记录所有清除单元
+
+        Returns:
+            str: 任务 ID
+        """
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO jobs VALUES (?, ?, ?, ?, ?)',
+                (job_id, time.time(), subscription_id, resource_group, profile)
+            )
+        self.add_units(job_id, subscription_id, resource_group, profile, units)
+        return job_id
+
+    def add_units(self, job_id: str, subscription_id: str, resource_group: str, profile: str,
+                  units: Iterable[PurgeUnit]):
+        """向已有任务追加清除单元（流式输入时单元陆续到达）"""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO units (job_id, unit_key, endpoint_name, paths, domains, status) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (job_id, make_unit_key(subscription_id, resource_group, profile, unit),
+                     unit.endpoint_name, json.dumps(list(unit.paths)), json.dumps(list(unit.domains)),
+                     STATUS_PENDING)
+                    for unit in units
+                ]
+            )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """获取任务信息，不存在时返回 None"""
+        row = self.conn.execute(
+            'SELECT job_id, created_at, subscription_id, resource_group, profile FROM jobs WHERE job_id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('job_id', 'created_at', 'subscription_id', 'resource_group', 'profile'), row))
+
+    def incomplete_units(self, job_id: str) -> List[PurgeUnit]:
+        """获取任务中尚未成功完成的清除单元"""
+        rows = self.conn.execute(
+            'SELECT endpoint_name, paths, domains FROM units WHERE job_id = ? AND status NOT IN (?, ?)',
+            (job_id,) + DONE_STATUSES
+        ).fetchall()
+        return [
+            PurgeUnit(endpoint_name, tuple(json.loads(paths)), tuple(json.loads(domains)))
+            for endpoint_name, paths, domains in rows
+        ]
+
+    def recently_succeeded(self, unit_key: str, window: float) -> bool:
+        """相同单元是否在窗口期内已成功完成（任意任务）"""
+        row = self.conn.execute(
+            'SELECT 1 FROM units WHERE unit_key = ? AND status = ? AND completed_at >= ? LIMIT 1',
+            (unit_key, STATUS_SUCCEEDED, time.time() - window)
+        ).fetchone()
+        return row is not None
+
+    def recent_lro_samples(self, subscription_id: str, resource_group: str, profile: str,
+                           limit: int) -> List[Tuple[float, int]]:
+        """
+        获取同一 profile 最近成功完成的清除单元的 LRO 耗时和尝试次数（用于 dry run 估计）
+
+        Returns:
+            List[Tuple[float, int]]: (最后一次提交到完成的秒数, 尝试次数)，按完成时间倒序
+        """
+        rows = self.conn.execute(
+            'SELECT u.completed_at - u.submitted_at, u.attempts FROM units u JOIN jobs j ON u.job_id = j.job_id '
+            'WHERE j.subscription_id = ? AND j.resource_group = ? AND j.profile = ? AND u.status = ? '
+            'AND u.submitted_at IS NOT NULL AND u.completed_at >= u.submitted_at '
+            'ORDER BY u.completed_at DESC LIMIT ?',
+            (subscription_id, resource_group, profile, STATUS_SUCCEEDED, limit)
+        ).fetchall()
+        return [(duration, attempts) for duration, attempts in rows]
+
+    def mark_submitted(self, job_id: str, unit_key: str):
+        with self.conn:
+            self.conn.execute(
+                'UPDATE units SET status = ?, attempts = attempts + 1, submitted_at = ? '
+                'WHERE job_id = ? AND unit_key = ?',
+                (STATUS_SUBMITTED, time.time(), job_id, unit_key)
+            )
+
+    def mark_completed(self, job_id: str, unit_key: str, result: UnitResult, skipped: bool = False):
+        if skipped:
+            status = STATUS_SKIPPED
+        else:
+            status = STATUS_SUCCEEDED if result.success else STATUS_FAILED
+        with self.conn:
+            self.conn.execute(
+                'UPDATE units SET status = ?, error = ?, completed_at = ? WHERE job_id = ? AND unit_key = ?',
+                (status, result.error, result.completed_at or time.time(), job_id, unit_key)
+            )
+
+    def completed_jobs(self, since: float, until: float) -> List[dict]:
+        """
+        获取时间范围内完成的清除任务（用于分析清除前后的缓存健康变化）
+
+        Returns:
+            List[dict]: job_id、profile、created_at、completed_at（最后一个单元完成的时间）、
+                units、succeeded、endpoints，按完成时间排列
+        """
+        rows = self.conn.execute(
+            'SELECT j.job_id, j.profile, j.created_at, MAX(u.completed_at), COUNT(*), '
+            'SUM(u.status IN (?, ?)), COUNT(DISTINCT u.endpoint_name) '
+            'FROM jobs j JOIN units u ON u.job_id = j.job_id '
+            'GROUP BY j.job_id HAVING MAX(u.completed_at) BETWEEN ? AND ? ORDER BY MAX(u.completed_at)',
+            DONE_STATUSES + (since, until)
+        ).fetchall()
+        fields = ('job_id', 'profile', 'created_at', 'completed_at', 'units', 'succeeded', 'endpoints')
+        return [dict(zip(fields, row)) for row in rows]
@@ -0,0 +1,143 @@
+"""
+缓存清除数据模型
+
+定义清除引擎各组件之间共享的数据结构，不依赖 Azure SDK。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PurgeUnit:
+    """一次 begin_purge_content 调用对应的清除单元"""
+
+    endpoint_name: str
+    paths: Tuple[str, ...]
+    domains: Tuple[str, ...] = ()
+
+    def contents(self) -> Dict[str, List[str]]:
+        """生成 begin_purge_content 的 contents 参数"""
+        contents = {"content_paths": list(self.paths)}
+        if self.domains:
+            contents["domains"] = list(self.domains)
+        return contents
+
+
+@dataclass
+class UnitResult:
+    """单个清除单元的执行结果"""
+
+    unit: PurgeUnit
+    success: bool
+    error: Optional[str] = None
+    submitted_at: float = 0.0
+    completed_at: float = 0.0
+    attempts: int = 1
+
+    @property
+    def elapsed(self) -> float:
+        """从提交到完成的耗时（秒）"""
+        if not self.submitted_at or not self.completed_at:
+            return 0.0
+        return self.completed_at - self.submitted_at
+
+
+@dataclass
+class PurgeOutcome:
+    """单个 endpoint 的清除结果（汇总其所有清除单元）"""
+
+    endpoint_name: str
+    success: bool = True
+    attempts: int = 0
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    units: int = 0
+
+    def __bool__(self) -> bool:
+        # 兼容原先返回 bool 的调用方
+        return self.success
+
+    def add(self, result: UnitResult):
+        """合并一个清除单元的结果"""
+        self.units += 1
+        self.attempts += result.attempts
+        self.elapsed = max(self.elapsed, result.elapsed)
+        if not result.success:
+            self.success = False
+            self.error = result.error
+
+
+@dataclass(frozen=True)
+class PurgeJob:
+    """一个批量清除任务（例如 NDJSON 输入中的一行）"""
+
+    job_id: str
+    endpoint_names: Tuple[str, ...] = ()
+    paths: Tuple[str, ...] = ('/*',)
+    domains: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: dict, default_id: str) -> "PurgeJob":
+        """
+        从字典创建任务
+
+        支持的字段：id、endpoints（省略或为空表示所有 endpoints）、paths（默认 ['/*']）、domains。
+        endpoints / paths / domains 可以是列表或逗号分隔的字符串。
+
+        Raises:
+            ValueError: 字段类型不正确
+        """
+        def as_tuple(value, name: str) -> Tuple[str, ...]:
+            if value is None:
+                return ()
+            if isinstance(value, str):
+                value = value.split(',')
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                raise ValueError(f"字段 '{name}' 必须是字符串列表")
+            return tuple(item.strip() for item in value if item.strip())
+
+        if not isinstance(data, dict):
+            raise ValueError("任务必须是 JSON 对象")
+        return cls(
+            job_id=str(data.get('id') or default_id),
+            endpoint_names=as_tuple(data.get('endpoints'), 'endpoints'),
+            paths=as_tuple(data.get('paths'), 'paths') or ('/*',),
+            domains=as_tuple(data.get('domains'), 'domains')
+        )
+
+
+@dataclass
+class JobResult:
+    """一个批量清除任务的结果（汇总其各 endpoint 的清除结果）"""
+
+    job_id: str
+    outcomes: Dict[str, PurgeOutcome] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and all(self.outcomes.values())
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def to_dict(self) -> dict:
+        """转换为可序列化为 JSON 的字典"""
+        data = {
+            'id': self.job_id,
+            'success': self.success,
+            'endpoints': {
+                name: {
+                    'success': outcome.success,
+                    'units': outcome.units,
+                    'attempts': outcome.attempts,
+                    'elapsed': round(outcome.elapsed, 3),
+                    'error': outcome.error
+                }
+                for name, outcome in self.outcomes.items()
+            }
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        return data
@@ -0,0 +1,290 @@
+"""
+清除计划（dry run）
+
+在不提交任何清除操作的情况下，给出将要执行的清除单元（endpoints × 路径块）、
+预计的 ARM 调用次数和预计耗时。耗时按速率控制器的令牌桶和并发上限推算提交时间，
+再按任务日志中最近记录的 LRO 耗时和轮询间隔推算完成时间。本模块不依赖 Azure SDK。
+"""
+
+import bisect
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+from purge_models import PurgeUnit
+from rate_control import DEFAULT_RATE, DEFAULT_BURST, DEFAULT_INITIAL_CONCURRENCY
+from purge_scheduler import DEFAULT_POLL_INTERVAL, DEFAULT_POLL_BACKOFF, DEFAULT_MAX_POLL_INTERVAL
+
+
+# 没有足够历史记录时使用的 LRO 耗时（秒）：Front Door 清除通常在几分钟内完成
+DEFAULT_LRO_P50 = 120.0
+DEFAULT_LRO_P90 = 300.0
+
+# 单次 begin_purge_content 提交请求的耗时估计（秒）
+DEFAULT_SUBMIT_LATENCY = 1.0
+
+# 读取的历史单元数，以及采用历史记录所需的最少样本数
+DEFAULT_HISTORY_LIMIT = 200
+MIN_HISTORY_SAMPLES = 5
+
+# 文本输出中每个清除单元最多列出的示例路径数，以及逐个列出清除单元的数量上限
+SAMPLE_PATHS = 3
+DETAIL_LIMIT = 50
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """最近秩百分位数（values 不能为空）"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def format_duration(seconds: float) -> str:
+    """把秒数格式化为 1h02m、3m05s、42s 这样的文本"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+@dataclass
+class LroHistory:
+    """最近清除单元的 LRO 耗时与尝试次数统计"""
+
+    samples: int = 0
+    p50: float = DEFAULT_LRO_P50
+    p90: float = DEFAULT_LRO_P90
+    attempts: float = 1.0
+
+    @property
+    def from_journal(self) -> bool:
+        """是否基于任务日志中的历史记录（否则为默认值）"""
+        return self.samples >= MIN_HISTORY_SAMPLES
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[Tuple[float, int]]) -> "LroHistory":
+        """
+        从 (LRO 耗时, 尝试次数) 样本创建，样本不足时使用默认值
+
+        Args:
+            samples: 任务日志中最近成功的清除单元（见 PurgeJournal.recent_lro_samples）
+        """
+        if len(samples) < MIN_HISTORY_SAMPLES:
+            return cls(samples=len(samples))
+        durations = [duration for duration, _ in samples]
+        return cls(
+            samples=len(samples),
+            p50=_percentile(durations, 0.5),
+            p90=_percentile(durations, 0.9),
+            attempts=sum(max(1, attempts) for _, attempts in samples) / len(samples)
+        )
+
+    def describe(self) -> str:
+        text = f"p50 {format_duration(self.p50)} / p90 {format_duration(self.p90)}"
+        if self.from_journal:
+            return f"最近 {self.samples} 个成功单元的 LRO 耗时 {text}"
+        return f"历史记录不足（{self.samples} 个），使用默认 LRO 耗时 {text}"
+
+
+def estimate_submit_times(count: int, max_concurrency: int, rate: float = DEFAULT_RATE,
+                          burst: int = DEFAULT_BURST,
+                          initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+                          submit_latency: float = DEFAULT_SUBMIT_LATENCY) -> List[float]:
+    """
+    推算每个清除单元提交完成的时间（相对开始时间，秒）
+
+    与 RateController 一致：令牌桶先放行 burst 个请求，之后每秒 rate 个；并发上限从
+    initial_concurrency 开始，每完成约一个并发窗口的提交加 1，直到 max_concurrency。
+
+    Returns:
+        List[float]: 按提交顺序排列的完成时间
+    """
+    max_concurrency = max(1, max_concurrency)
+    limit = float(max(1, min(initial_concurrency, max_concurrency)))
+    done: List[float] = []
+    for index in range(count):
+        token_at = 0.0 if index < burst or rate <= 0 else (index - burst + 1) / rate
+        concurrency = int(limit)
+        slot_at = done[index - concurrency] if index >= concurrency else 0.0
+        done.append(max(token_at, slot_at) + submit_latency)
+        limit = min(max_concurrency, limit + 1.0 / limit)
+    return done
+
+
+def poll_ticks(horizon: float, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               poll_backoff: float = DEFAULT_POLL_BACKOFF,
+               max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+               arrivals: Sequence[float] = ()) -> List[float]:
+    """
+    轮询循环各轮的时间点，直到超过 horizon
+
+    与 PurgeScheduler._poll_all 一致：两轮之间有新单元提交完成（加入在途集合）时间隔恢复为
+    poll_interval，否则按 poll_backoff 放大；第一个单元提交完成之前在途集合为空，间隔不变。
+
+    Args:
+        horizon: 需要覆盖的时间（秒）
+        arrivals: 各单元提交完成的时间（见 estimate_submit_times），为空时每轮都退避
+
+    Returns:
+        List[float]: 相对开始时间的轮询时间点，最后一个不小于 horizon
+    """
+    arrivals = sorted(arrivals)
+    ticks = []
+    base = max(poll_interval, 0.001)
+    previous, now, interval = float('-inf'), 0.0, base
+    while not ticks or ticks[-1] < horizon:
+        now += interval
+        ticks.append(now)
+        if bisect.bisect_right(arrivals, now) > bisect.bisect_right(arrivals, previous):
+            interval = base
+        elif not arrivals or arrivals[0] <= now:
+            interval = min(interval * poll_backoff, max_poll_interval)
+        previous = now
+    return ticks
+
+
+@dataclass
+class PurgePlan:
+    """一次清除的执行计划与成本估计"""
+
+    profile: str
+    endpoint_names: List[str]
+    units: List[PurgeUnit]
+    recent_units: List[PurgeUnit] = field(default_factory=list)
+    max_paths_per_request: int = 0
+    max_concurrency: int = 0
+    rate: float = DEFAULT_RATE
+    burst: int = DEFAULT_BURST
+    poll_interval: float = DEFAULT_POLL_INTERVAL
+    poll_backoff: float = DEFAULT_POLL_BACKOFF
+    max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL
+    history: LroHistory = field(default_factory=LroHistory)
+
+    def __post_init__(self):
+        self._estimate()
+
+    def _estimate(self):
+        """按提交时间、LRO 耗时和轮询时间点推算耗时与轮询次数"""
+        submits = estimate_submit_times(len(self.units), self.max_concurrency, self.rate, self.burst)
+        last_submit = submits[-1] if submits else 0.0
+        ticks = poll_ticks(last_submit + self.history.p90, self.poll_interval, self.poll_backoff,
+                           self.max_poll_interval, submits)
+
+        def detected_at(finished_at: float) -> float:
+            # LRO 完成后的下一轮轮询才会发现
+            return ticks[min(len(ticks) - 1, bisect.bisect_left(ticks, finished_at))]
+
+        self.submit_seconds = last_submit
+        self.estimated_seconds = detected_at(last_submit + self.history.p50) if submits else 0.0
+        self.worst_case_seconds = detected_at(last_submit + self.history.p90) if submits else 0.0
+        # 每个单元的轮询次数：从提交完成到被发现完成之间的轮询轮数
+        polls = sum(
+            bisect.bisect_right(ticks, detected_at(submitted + self.history.p50)) - bisect.bisect_right(ticks, submitted)
+            for submitted in submits
+        )
+        self.submit_calls = int(round(len(self.units) * self.history.attempts))
+        self.poll_calls = int(round(polls * self.history.attempts))
+
+    @property
+    def skipped_endpoints(self) -> List[str]:
+        """没有任何清除单元的 endpoints（路由不提供任何清除路径）"""
+        planned = {unit.endpoint_name for unit in self.units + self.recent_units}
+        return [name for name in self.endpoint_names if name not in planned]
+
+    @property
+    def paths(self) -> List[str]:
+        """计划中出现的所有清除路径（保持顺序、去重）"""
+        return list(dict.fromkeys(path for unit in self.units for path in unit.paths))
+
+    @property
+    def total_calls(self) -> int:
+        return self.submit_calls + self.poll_calls
+
+    def units_by_endpoint(self) -> Dict[str, List[PurgeUnit]]:
+        grouped: Dict[str, List[PurgeUnit]] = {}
+        for unit in self.units:
+            grouped.setdefault(unit.endpoint_name, []).append(unit)
+        return grouped
+
+    def describe(self, detail_limit: int = DETAIL_LIMIT) -> List[str]:
+        """
+        生成可读的计划文本
+
+        Args:
+            detail_limit: 清除单元不超过该数量时逐个列出
+
+        Returns:
+            List[str]: 输出行
+        """
+        grouped = self.units_by_endpoint()
+        lines = [
+            f"🧭 清除计划（dry run，未提交任何清除操作）: Front Door '{self.profile}'",
+            f"📁 清除路径: {len(self.paths)} 个（规范化后）",
+            f"🎯 Endpoints: {len(grouped)}/{len(self.endpoint_names)} 个需要清除",
+            f"📦 清除单元: {len(self.units)} 个（endpoints × 路径块，每块最多 {self.max_paths_per_request} 个路径）",
+        ]
+        if self.skipped_endpoints:
+            lines.append(f"⏭️  {len(self.skipped_endpoints)} 个 endpoints 的路由不包含任何清除路径，将跳过: "
+                         f"{', '.join(self.skipped_endpoints)}")
+        if self.recent_units:
+            lines.append(f"♻️  {len(self.recent_units)} 个清除单元在幂等窗口内已成功执行，将跳过")
+
+        if len(self.units) > detail_limit:
+            lines.append(f"   （清除单元超过 {detail_limit} 个，未逐个列出；输出 JSON 可查看完整计划）")
+        else:
+            for endpoint_name, units in grouped.items():
+                path_count = sum(len(unit.paths) for unit in units)
+                lines.append(f"   - {endpoint_name}: {len(units)} 个单元, {path_count} 个路径")
+                for index, unit in enumerate(units, 1):
+                    sample = ', '.join(unit.paths[:SAMPLE_PATHS])
+                    more = f" 等 {len(unit.paths)} 个" if len(unit.paths) > SAMPLE_PATHS else ''
+                    domains = f" @ {', '.join(unit.domains)}" if unit.domains else ''
+                    lines.append(f"       [{index}/{len(units)}] {sample}{more}{domains}")
+
+        lines.extend([
+            f"🔢 预计 ARM 调用: 提交 {self.submit_calls} 次 + 轮询约 {self.poll_calls} 次 = {self.total_calls} 次"
+            + (f"（历史平均每个单元尝试 {self.history.attempts:.2f} 次）" if self.history.attempts > 1 else ''),
+            f"⏱️  预计耗时: 约 {format_duration(self.estimated_seconds)}（p90 约 {format_duration(self.worst_case_seconds)}），"
+            f"其中提交约 {format_duration(self.submit_seconds)}",
+            f"   并发上限 {self.max_concurrency}，ARM 速率 {self.rate:g}/s（突发 {self.burst}），"
+            f"首次轮询间隔 {self.poll_interval:g}s",
+            f"📈 {self.history.describe()}",
+        ])
+        return lines
+
+    def to_dict(self) -> dict:
+        """转换为可序列化为 JSON 的字典"""
+        return {
+            'profile': self.profile,
+            'endpoints': len(self.endpoint_names),
+            'skipped_endpoints': self.skipped_endpoints,
+            'units': [
+                {'endpoint': unit.endpoint_name, 'paths': list(unit.paths), 'domains': list(unit.domains)}
+                for unit in self.units
+            ],
+            'recently_succeeded_units': len(self.recent_units),
+            'calls': {'submit': self.submit_calls, 'poll': self.poll_calls, 'total': self.total_calls},
+            'estimate': {
+                'seconds': round(self.estimated_seconds, 1),
+                'p90_seconds': round(self.worst_case_seconds, 1),
+                'submit_seconds': round(self.submit_seconds, 1),
+            },
+            'settings': {
+                'max_paths_per_request': self.max_paths_per_request,
+                'max_concurrency': self.max_concurrency,
+                'rate': self.rate,
+                'burst': self.burst,
+                'poll_interval': self.poll_interval,
+                'poll_backoff': self.poll_backoff,
+                'max_poll_interval': self.max_poll_interval,
+            },
+            'lro_history': {
+                'samples': self.history.samples,
+                'from_journal': self.history.from_journal,
+                'p50_seconds': round(self.history.p50, 1),
+                'p90_seconds': round(self.history.p90, 1),
+                'attempts': round(self.history.attempts, 2),
+            },
+        }
+
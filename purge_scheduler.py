@@ -0,0 +1,305 @@
+"""
+缓存清除 LRO 调度器
+
+先提交所有清除单元，再由单个轮询循环统一查询所有 LRO 的状态，
+而不是在每个清除操作上阻塞等待 .result()。
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from instrumentation import (
+    Instrumentation, PHASE_SUBMIT, PHASE_LRO_WAIT, PHASE_RETRY_WAIT, PHASE_PURGE, STATUS_OK, STATUS_ERROR,
+    COUNTER_SUCCEEDED, COUNTER_FAILED, COUNTER_THROTTLED, COUNTER_RETRIES
+)
+from purge_models import PurgeUnit, UnitResult
+from rate_control import RateController, get_throttle_delay
+from retry_policy import RetryPolicy, CircuitBreaker, LroFailedError
+
+
+# 默认轮询参数（秒）
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_POLL_BACKOFF = 1.5
+DEFAULT_MAX_POLL_INTERVAL = 30.0
+
+# LRO 的失败状态
+FAILED_STATES = ('failed', 'canceled', 'cancelled')
+
+# 输入结束标记
+_FEED_DONE = object()
+
+
+class _UnitState:
+    """调度过程中单个清除单元的状态"""
+
+    def __init__(self, unit: PurgeUnit):
+        self.unit = unit
+        self.attempts = 0
+        self.poll_errors = 0
+        self.first_submitted_at = 0.0
+        self.lro_started_at = 0.0
+        self.poller: Any = None
+
+
+class PurgeScheduler:
+    """先全部提交、后统一轮询的清除调度器"""
+
+    def __init__(self, submit: Callable[[PurgeUnit], Awaitable[Any]],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 poll_backoff: float = DEFAULT_POLL_BACKOFF,
+                 max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                 rate_controller: Optional[RateController] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 max_concurrency: Optional[int] = None):
+        """
+        初始化调度器
+
+        Args:
+            submit: 提交单个清除单元并返回 AsyncLROPoller 的协程函数
+            poll_interval: 首次轮询间隔
+            poll_backoff: 每轮轮询后间隔的放大倍数
+            max_poll_interval: 轮询间隔上限
+            rate_controller: 共享的速率控制器，为 None 时使用默认参数新建
+            retry_policy: 提交与轮询的重试策略，为 None 时使用默认参数新建
+            circuit_breaker: 按 endpoint 的熔断器，为 None 时使用默认参数新建
+            instrumentation: 埋点记录器，记录提交、LRO 等待、重试等待等阶段和计数器
+            max_concurrency: 本调度器同时进行的最大提交数，为 None 时取速率控制器的并发上限；
+                只限制本次运行，不修改共享的速率控制器
+        """
+        self.submit = submit
+        self.poll_interval = poll_interval
+        self.poll_backoff = poll_backoff
+        self.max_poll_interval = max_poll_interval
+        self.rate_controller = rate_controller or RateController()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.instrumentation = instrumentation or Instrumentation()
+        self.max_concurrency = min(max_concurrency or self.rate_controller.max_concurrency,
+                                   self.rate_controller.max_concurrency)
+        self.throttled = 0
+        self.retried = 0
+
+    async def run(self, units: List[PurgeUnit]) -> AsyncIterator[UnitResult]:
+        """
+        执行所有清除单元，并在每个单元最终完成时立即产出结果
+
+        Args:
+            units: 要执行的清除单元列表
+
+        Yields:
+            UnitResult: 按完成顺序产出的单元结果
+        """
+        async def feed():
+            for unit in units:
+                yield unit
+
+        # 每个工作协程同时只提交一个单元，数量即本次运行的并发上限；实际并发由速率控制器动态调整
+        worker_count = min(len(units), self.max_concurrency)
+        async for result in self._run(feed(), worker_count):
+            yield result
+
+    async def run_stream(self, units: AsyncIterable[PurgeUnit]) -> AsyncIterator[UnitResult]:
+        """
+        执行持续到达的清除单元：单元到达后立即排队提交，不必等待全部单元就绪
+
+        Args:
+            units: 清除单元的异步迭代器，结束后等待所有在途单元完成
+
+        Yields:
+            UnitResult: 按完成顺序产出的单元结果
+        """
+        async for result in self._run(units, self.max_concurrency):
+            yield result
+
+    async def _run(self, units: AsyncIterable[PurgeUnit], worker_count: int) -> AsyncIterator[UnitResult]:
+        self._results: asyncio.Queue = asyncio.Queue()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Dict[int, _UnitState] = {}
+        self._timers: Set[asyncio.Task] = set()
+        self._unfinished: Set[_UnitState] = set()
+
+        outstanding = 0
+        feeding = True
+
+        async def feed():
+            nonlocal outstanding
+            try:
+                async for unit in units:
+                    outstanding += 1
+                    state = _UnitState(unit)
+                    self._unfinished.add(state)
+                    self._queue.put_nowait(state)
+            except Exception as e:
+                self._results.put_nowait(e)
+            finally:
+                self._results.put_nowait(_FEED_DONE)
+
+        tasks = [asyncio.create_task(feed())]
+        tasks.extend(asyncio.create_task(self._submit_worker()) for _ in range(max(1, worker_count)))
+        tasks.append(asyncio.create_task(self._poll_all()))
+
+        try:
+            while feeding or outstanding:
+                item = await self._results.get()
+                if item is _FEED_DONE:
+                    feeding = False
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    outstanding -= 1
+                    yield item
+        finally:
+            for task in tasks + list(self._timers):
+                task.cancel()
+            await asyncio.gather(*tasks, *self._timers, return_exceptions=True)
+            # 提前结束（出错或被取消）时交还未完成单元持有的半开试探，熔断器在多次运行之间共享
+            for state in self._unfinished:
+                self.circuit_breaker.release(state.unit.endpoint_name, state)
+
+    def _finish(self, state: _UnitState, success: bool, error: Optional[str] = None):
+        """记录单元的最终结果（熔断器按单元的最终结果计数，而不是每次尝试）"""
+        self._unfinished.discard(state)
+        if success:
+            self.circuit_breaker.record_success(state.unit.endpoint_name)
+        else:
+            self.circuit_breaker.record_failure(state.unit.endpoint_name)
+        completed_at = time.time()
+        self.instrumentation.count(COUNTER_SUCCEEDED if success else COUNTER_FAILED)
+        self.instrumentation.record_span(
+            PHASE_PURGE, state.first_submitted_at or completed_at, completed_at,
+            STATUS_OK if success else STATUS_ERROR,
+            endpoint=state.unit.endpoint_name, attempts=str(state.attempts)
+        )
+        self._results.put_nowait(UnitResult(
+            unit=state.unit, success=success, error=error,
+            submitted_at=state.first_submitted_at, completed_at=completed_at,
+            attempts=state.attempts
+        ))
+
+    def _fail_attempt(self, state: _UnitState, error: BaseException):
+        """一次尝试失败：按重试策略延迟重新提交，或记录最终失败"""
+        if self.retry_policy.should_retry(error, state.attempts):
+            self.retried += 1
+            self.instrumentation.count(COUNTER_RETRIES)
+            self._requeue(state, self.retry_policy.get_delay(state.attempts))
+        else:
+            self._finish(state, False, str(error))
+
+    def _requeue(self, state: _UnitState, delay: float = 0.0):
+        """将单元重新放回提交队列"""
+        if delay <= 0:
+            self._queue.put_nowait(state)
+            return
+
+        async def put_later():
+            started = time.time()
+            await asyncio.sleep(delay)
+            self.instrumentation.record_span(PHASE_RETRY_WAIT, started, time.time(),
+                                             endpoint=state.unit.endpoint_name)
+            self._queue.put_nowait(state)
+
+        timer = asyncio.create_task(put_later())
+        self._timers.add(timer)
+        timer.add_done_callback(self._timers.discard)
+
+    async def _submit_worker(self):
+        """第一阶段：从队列中取出单元并提交"""
+        while True:
+            state = await self._queue.get()
+
+            endpoint_name = state.unit.endpoint_name
+            if not self.circuit_breaker.allow(endpoint_name, state):
+                # 熔断器打开：延后到允许试探时再提交（试探进行中则每个轮询间隔检查一次），不计为尝试
+                self._requeue(state, self.circuit_breaker.retry_after(endpoint_name) or self.poll_interval)
+                continue
+
+            async with self.rate_controller.slot():
+                state.attempts += 1
+                if not state.first_submitted_at:
+                    state.first_submitted_at = time.time()
+                try:
+                    with self.instrumentation.span(PHASE_SUBMIT, endpoint=state.unit.endpoint_name):
+                        state.poller = await self.submit(state.unit)
+                except Exception as e:
+                    delay = get_throttle_delay(e)
+                    if delay is None:
+                        self._fail_attempt(state, e)
+                    else:
+                        # 被限流：降低并发并重新排队，不计为失败或重试次数
+                        state.attempts -= 1
+                        self.rate_controller.on_throttle(delay)
+                        self.throttled += 1
+                        self.instrumentation.count(COUNTER_THROTTLED)
+                        self._requeue(state)
+                    continue
+
+            self.rate_controller.on_success()
+            state.poll_errors = 0
+            state.lro_started_at = time.time()
+            self._pending[id(state)] = state
+
+    async def _poll_all(self):
+        """
+        第二阶段：在单个循环中轮询所有在途 LRO
+
+        轮询间隔只在在途集合没有新单元加入时退避；有新提交的单元时恢复为初始间隔，
+        使其与单独轮询时一样尽快得到首次查询。
+        """
+        interval = self.poll_interval
+        polled = set()
+
+        while True:
+            await asyncio.sleep(interval)
+
+            if self._pending.keys() - polled:
+                interval = self.poll_interval
+            elif self._pending:
+                interval = min(interval * self.poll_backoff, self.max_poll_interval)
+
+            if self._pending:
+                await asyncio.gather(*(
+                    self._poll_one(state) for state in list(self._pending.values())
+                ))
+            polled = set(self._pending)
+
+    async def _poll_one(self, state: _UnitState):
+        """查询单个 LRO 的状态，完成后移出在途集合"""
+        polling_method = state.poller.polling_method()
+        try:
+            if not polling_method.finished():
+                await polling_method.update_status()
+            if not polling_method.finished():
+                return
+        except Exception as e:
+            delay = get_throttle_delay(e)
+            if delay is not None:
+                # 轮询被限流：保留在途状态，下一轮再查询
+                self.rate_controller.on_throttle(delay)
+                self.throttled += 1
+                self.instrumentation.count(COUNTER_THROTTLED)
+                return
+
+            # 轮询失败不代表清除失败：可重试的错误下一轮继续查询
+            state.poll_errors += 1
+            if self.retry_policy.should_retry(e, state.poll_errors):
+                return
+            del self._pending[id(state)]
+            self._record_lro_wait(state, STATUS_ERROR)
+            self._finish(state, False, str(e))
+            return
+
+        del self._pending[id(state)]
+        status = polling_method.status()
+        self._record_lro_wait(state, STATUS_ERROR if status.lower() in FAILED_STATES else STATUS_OK)
+        if status.lower() in FAILED_STATES:
+            # LRO 失败：按重试策略重新提交
+            self._fail_attempt(state, LroFailedError(f"清除操作状态: {status}"))
+        else:
+            self._finish(state, True)
+
+    def _record_lro_wait(self, state: _UnitState, status: str):
+        self.instrumentation.record_span(PHASE_LRO_WAIT, state.lro_started_at, time.time(), status,
+                                         endpoint=state.unit.endpoint_name)
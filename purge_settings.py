@@ -0,0 +1,29 @@
+"""
+本地状态配置
+
+清除任务日志、endpoint 缓存等本地状态文件统一存放在状态目录中，
+默认为 ~/.afd-purge，可通过 PURGE_STATE_DIR 环境变量修改。
+状态目录只在第一次写入状态文件时创建，只读的命令（例如 --help、dry run）不会创建它。
+"""
+
+import os
+
+
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser('~'), '.afd-purge')
+
+
+def get_state_dir() -> str:
+    """获取本地状态目录（不创建）"""
+    return os.path.expanduser(os.getenv('PURGE_STATE_DIR', DEFAULT_STATE_DIR))
+
+
+def get_state_path(filename: str) -> str:
+    """获取状态目录下某个文件的完整路径（不创建目录）"""
+    return os.path.join(get_state_dir(), filename)
+
+
+def ensure_parent_dir(path: str):
+    """在第一次写入状态文件之前创建其所在目录"""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
@@ -0,0 +1,250 @@
+"""
+ARM 调用速率控制
+
+令牌桶限制请求速率，AIMD（加性增、乘性减）控制并发数：调用成功时逐步提高并发，
+遇到 429 / Retry-After 或剩余配额偏低时立即减半并暂停。所有清除调用共享同一个控制器。
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping, Optional
+
+
+# 默认参数
+DEFAULT_INITIAL_CONCURRENCY = 10
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 100
+# 与 ARM 订阅级写操作令牌桶一致：容量 200，每秒补充 10 个
+DEFAULT_RATE = 10.0          # 每秒令牌数
+DEFAULT_BURST = 200          # 令牌桶容量
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_THROTTLE_DELAY = 5.0  # 没有 Retry-After 时的暂停时间（秒）
+DECREASE_COOLDOWN = 1.0       # 两次减小并发之间的最短间隔（秒），避免一批 429 把并发压到最低
+
+# 剩余配额低于该值时视为即将被限流
+LOW_REMAINING_THRESHOLD = 10
+RATELIMIT_REMAINING_PREFIX = 'x-ms-ratelimit-remaining-'
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，允许一定的突发"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: int = DEFAULT_BURST):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """
+        尝试取出一个令牌
+
+        Returns:
+            float: 0 表示成功取出；否则为需要等待的秒数
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """等待直到取出一个令牌"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+def get_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """解析 Retry-After / retry-after-ms 响应头，返回秒数"""
+    if not headers:
+        return None
+    headers = {name.lower(): value for name, value in headers.items()}
+    for name, scale in (('retry-after-ms', 0.001), ('x-ms-retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                # HTTP-date 格式不做解析，使用默认暂停时间
+                return None
+    return None
+
+
+def get_throttle_delay(error: Exception) -> Optional[float]:
+    """
+    判断异常是否为 ARM 限流错误
+
+    Args:
+        error: 调用时抛出的异常
+
+    Returns:
+        Optional[float]: 限流时返回建议的等待秒数，否则返回 None
+    """
+    if getattr(error, 'status_code', None) != 429:
+        return None
+    response = getattr(error, 'response', None)
+    delay = get_retry_after(getattr(response, 'headers', None))
+    return DEFAULT_THROTTLE_DELAY if delay is None else delay
+
+
+class ConcurrencyBudget:
+    """多个速率控制器共享的全局并发预算（例如多订阅 / 多 profile 同时清除）"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 延迟创建，确保绑定到实际运行的事件循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._get_semaphore():
+            yield
+
+
+class RateController:
+    """共享的 ARM 调用速率与并发控制器（令牌桶 + AIMD）"""
+
+    def __init__(self, initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+                 min_concurrency: int = DEFAULT_MIN_CONCURRENCY,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+                 budget: Optional[ConcurrencyBudget] = None):
+        """
+        Args:
+            initial_concurrency: 初始并发上限
+            min_concurrency: 并发上限的下限
+            max_concurrency: 并发上限的上限
+            rate: 每秒允许的调用数
+            burst: 允许的突发调用数
+            decrease_factor: 被限流时并发上限的缩小倍数
+            budget: 与其他控制器共享的全局并发预算，为 None 时不限制
+        """
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.decrease_factor = decrease_factor
+        self.bucket = TokenBucket(rate, burst)
+        self.budget = budget
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        self.throttle_count = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def concurrency(self) -> int:
+        """当前并发上限"""
+        return int(self.limit)
+
+    def _get_condition(self) -> asyncio.Condition:
+        # 延迟创建，确保绑定到实际运行的事件循环
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    @asynccontextmanager
+    async def _budget_slot(self) -> AsyncIterator[None]:
+        if self.budget is None:
+            yield
+        else:
+            async with self.budget.slot():
+                yield
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        占用一个调用名额：等待并发名额、暂停结束和令牌，最后才占用共享的全局并发预算
+
+        暂停和令牌等待放在预算之前，避免被限流或等待令牌的调用占着预算，
+        阻塞其他控制器中已经可以发出的调用。
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.bucket.acquire()
+            async with self._budget_slot():
+                yield
+        finally:
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+    def on_success(self):
+        """调用成功：每完成约一个并发窗口的调用，并发上限加 1"""
+        self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def _decrease(self):
+        """乘性减小并发上限（冷却期内只减一次）"""
+        now = time.monotonic()
+        if now - self.decreased_at < DECREASE_COOLDOWN:
+            return
+        self.decreased_at = now
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+
+    def on_throttle(self, delay: Optional[float] = None):
+        """
+        被限流：并发上限乘性减小，并暂停所有调用
+
+        Args:
+            delay: 暂停秒数（来自 Retry-After）
+        """
+        self.throttle_count += 1
+        self._decrease()
+        delay = DEFAULT_THROTTLE_DELAY if delay is None else delay
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def observe_headers(self, status_code: int, headers: Optional[Mapping[str, str]]):
+        """
+        根据响应状态和头信息调整速率
+
+        Args:
+            status_code: HTTP 状态码
+            headers: 响应头
+        """
+        if status_code == 429:
+            self.on_throttle(get_retry_after(headers))
+            return
+        if not headers:
+            return
+
+        for name, value in headers.items():
+            if name.lower().startswith(RATELIMIT_REMAINING_PREFIX):
+                try:
+                    remaining = int(value)
+                except ValueError:
+                    continue
+                if remaining < LOW_REMAINING_THRESHOLD:
+                    # 配额即将耗尽，提前减小并发但不暂停
+                    self._decrease()
+                    return
+
+    def observe_response(self, pipeline_response: Any):
+        """azure-core raw_response_hook 回调：观察每个 ARM 响应"""
+        http_response = pipeline_response.http_response
+        self.observe_headers(http_response.status_code, http_response.headers)
@@ -0,0 +1,159 @@
+"""
+清除操作重试策略
+
+为清除提交和 LRO 轮询提供指数退避（带抖动）重试，区分可重试与致命错误，
+并为每个 endpoint 维护一个熔断器，连续失败时暂停提交而不是继续消耗配额。
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, Hashable
+
+
+# 默认参数
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 60.0
+
+# 可重试的 HTTP 状态码（429 由速率控制器单独处理）
+RETRYABLE_STATUS_CODES = {408, 425, 500, 502, 503, 504}
+
+# 可重试的异常类型名（避免直接依赖 azure.core.exceptions）
+RETRYABLE_ERROR_TYPES = {
+    'ServiceRequestError', 'ServiceResponseError', 'ServiceRequestTimeoutError',
+    'ServiceResponseTimeoutError', 'IncompleteReadError', 'ClientConnectorError',
+    'ServerDisconnectedError',
+}
+
+
+class LroFailedError(Exception):
+    """清除 LRO 以失败或取消状态结束"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    判断错误是否值得重试
+
+    网络错误、超时、5xx 以及 LRO 失败状态视为可重试；认证、权限、
+    资源不存在、参数错误等 4xx 视为致命错误。
+
+    Args:
+        error: 捕获的异常
+
+    Returns:
+        bool: 是否可重试
+    """
+    if isinstance(error, (LroFailedError, asyncio.TimeoutError, ConnectionError, TimeoutError)):
+        return True
+
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+
+    return any(cls.__name__ in RETRYABLE_ERROR_TYPES for cls in type(error).__mro__)
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动的重试策略"""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 jitter: bool = True):
+        """
+        Args:
+            max_attempts: 每个清除单元的最大尝试次数（含首次）
+            base_delay: 首次重试的基础等待时间（秒）
+            max_delay: 单次等待时间上限（秒）
+            jitter: 是否在 [0, 退避时间] 内随机抖动
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def should_retry(self, error: BaseException, attempts: int) -> bool:
+        """已尝试 attempts 次后是否继续重试"""
+        return attempts < self.max_attempts and is_retryable(error)
+
+    def get_delay(self, attempts: int) -> float:
+        """
+        计算第 attempts 次失败后的等待时间
+
+        Args:
+            attempts: 已尝试次数（从 1 开始）
+
+        Returns:
+            float: 等待秒数
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class CircuitBreaker:
+    """
+    按 endpoint 维护的熔断器
+
+    以清除单元为单位计数：一个单元用完所有重试仍然失败才算一次失败，连续 failure_threshold
+    个单元失败后打开熔断器。打开期间的单元延后提交而不是直接失败；冷却时间过后进入半开状态，
+    只有一个单元（试探者）可以提交，它的重试也都允许，其最终结果决定关闭熔断器还是重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        """
+        Args:
+            failure_threshold: 连续多少个清除单元最终失败后打开熔断器
+            reset_timeout: 熔断器打开后多久允许一次试探（半开）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures: Dict[str, int] = {}
+        self.opened_at: Dict[str, float] = {}
+        self.probes: Dict[str, Hashable] = {}
+
+    def allow(self, key: str, caller: Hashable = None) -> bool:
+        """
+        是否允许对该 endpoint 发起调用
+
+        Args:
+            key: endpoint 名称
+            caller: 调用者标识（例如清除单元）；半开状态下只允许成为试探者的调用者继续调用
+        """
+        opened_at = self.opened_at.get(key)
+        if opened_at is None:
+            return True
+        # 半开状态下已有试探在进行，得到结果之前只允许试探者本身（包括它的重试）
+        if key in self.probes:
+            return caller is not None and self.probes[key] == caller
+        # 超过冷却时间后进入半开状态，只允许第一个调用者试探
+        if time.monotonic() - opened_at >= self.reset_timeout:
+            self.probes[key] = caller
+            return True
+        return False
+
+    def retry_after(self, key: str) -> float:
+        """熔断器打开时距离允许试探还有多少秒；已经半开（试探在进行）或关闭时为 0"""
+        opened_at = self.opened_at.get(key)
+        if opened_at is None or key in self.probes:
+            return 0.0
+        return max(0.0, opened_at + self.reset_timeout - time.monotonic())
+
+    def release(self, key: str, caller: Hashable):
+        """试探者没有得到最终结果就退出（运行出错或被取消）时交还试探，让下一个调用者试探"""
+        if key in self.probes and self.probes[key] == caller:
+            del self.probes[key]
+
+    def record_success(self, key: str):
+        self.failures.pop(key, None)
+        self.opened_at.pop(key, None)
+        self.probes.pop(key, None)
+
+    def record_failure(self, key: str):
+        self.failures[key] = self.failures.get(key, 0) + 1
+        self.probes.pop(key, None)
+        if self.failures[key] >= self.failure_threshold:
+            self.opened_at[key] = time.monotonic()
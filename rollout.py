@@ -0,0 +1,379 @@
+"""
+分批（波次）清除发布
+
+一次性清除所有 endpoints 的 '/*' 会让全部回源流量同时打到源站。分批模式把清除单元
+按 endpoint 或路径块分成若干波次依次执行：每一波完成后等待一段时间让回源流量到达，
+再探测源站（健康检查 URL 的状态码、延迟和错误率），源站健康才继续下一波；
+下一波的大小按探测到的余量自适应放大，源站不健康时缩小并等待恢复。
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from dataclasses import dataclass
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from path_planner import DEFAULT_MAX_PATHS_PER_REQUEST, parse_path_list
+from purge_models import PurgeOutcome, PurgeUnit
+
+if TYPE_CHECKING:
+    import aiohttp
+    from async_purge import AsyncAzureFrontDoorPurgeClient
+
+
+# 分批方式：按 endpoint（每波清除若干个 endpoint 的全部路径）或按路径块（每波在所有 endpoints 上清除若干路径块）
+WAVE_BY_ENDPOINT = 'endpoint'
+WAVE_BY_PATH = 'path'
+
+# 默认参数
+DEFAULT_INITIAL_WAVE = 1           # 第一波的大小
+DEFAULT_MAX_WAVE = 0               # 波次大小上限，0 表示不限制
+DEFAULT_SETTLE_TIME = 15.0         # 每波完成后等待回源流量到达的时间（秒）
+DEFAULT_MAX_LATENCY = 1.0          # 健康检查延迟阈值（秒，取各次探测的中位数）
+DEFAULT_MAX_ERROR_RATE = 0.05      # 健康检查错误率阈值
+DEFAULT_PROBE_SAMPLES = 5          # 每个健康检查 URL 每次探测的请求数
+DEFAULT_PROBE_TIMEOUT = 5.0        # 单个健康检查请求的超时（秒）
+DEFAULT_RECHECK_INTERVAL = 10.0    # 源站不健康时重新探测的间隔（秒）
+DEFAULT_MAX_UNHEALTHY_WAIT = 600.0  # 等待源站恢复的最长时间（秒），超过后停止发布
+
+
+@dataclass
+class OriginHealth:
+    """一次源站探测的结果"""
+
+    healthy: bool
+    latency: Optional[float] = None   # 成功请求延迟的中位数（秒）
+    error_rate: float = 0.0
+    headroom: float = 0.0             # 0~1，距离阈值的余量，决定下一波放大多少
+    detail: str = ''
+
+    def describe(self) -> str:
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else '-'
+        text = f"延迟 {latency}, 错误率 {self.error_rate:.0%}, 余量 {self.headroom:.0%}"
+        return f"{text} ({self.detail})" if self.detail else text
+
+
+async def _http_get_status(session: "aiohttp.ClientSession", url: str, timeout: float) -> int:
+    """使用共享的会话请求健康检查 URL，返回状态码"""
+    import aiohttp
+
+    async with session.get(url, allow_redirects=False,
+                           timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        return response.status
+
+
+class OriginProbe:
+    """
+    源站健康探测
+
+    每次探测向每个健康检查 URL 并发发送 samples 个请求：状态码 >= 400、超时或连接失败
+    计为错误。错误率不超过 max_error_rate 且延迟中位数不超过 max_latency 时视为健康。
+    一次发布中的所有探测共享同一个 HTTP 会话（见 session），复用到源站的连接。
+    """
+
+    def __init__(self, urls: Sequence[str],
+                 max_latency: float = DEFAULT_MAX_LATENCY,
+                 max_error_rate: float = DEFAULT_MAX_ERROR_RATE,
+                 samples: int = DEFAULT_PROBE_SAMPLES,
+                 timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 fetch: Callable[[Any, str, float], Awaitable[int]] = _http_get_status):
+        """
+        Args:
+            urls: 健康检查 URL（通常直接指向源站，绕过 CDN）
+            max_latency: 延迟阈值（秒）
+            max_error_rate: 错误率阈值
+            samples: 每个 URL 每次探测的请求数
+            timeout: 单个请求的超时（秒）
+            fetch: 使用 session 发送请求并返回状态码的函数，默认使用 aiohttp
+        """
+        if not urls:
+            raise ValueError("至少需要一个健康检查 URL")
+        self.urls = list(urls)
+        self.max_latency = max_latency
+        self.max_error_rate = max_error_rate
+        self.samples = max(1, samples)
+        self.timeout = timeout
+        self.fetch = fetch
+
+    def create_session(self) -> "aiohttp.ClientSession":
+        """创建探测使用的 HTTP 会话"""
+        import aiohttp
+
+        return aiohttp.ClientSession()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[Any]:
+        """在一次发布（或一次单独的探测）期间持有共享的 HTTP 会话"""
+        session = self.create_session()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    async def _sample(self, session: Any, url: str) -> Optional[float]:
+        """发送一个请求，成功时返回延迟，失败时返回 None"""
+        started = time.monotonic()
+        try:
+            status = await asyncio.wait_for(self.fetch(session, url, self.timeout), self.timeout)
+        except Exception:
+            return None
+        return time.monotonic() - started if status < 400 else None
+
+    async def check(self, session: Optional[Any] = None) -> OriginHealth:
+        """
+        探测一次源站
+
+        Args:
+            session: 共享的 HTTP 会话；为 None 时为本次探测单独创建
+        """
+        if session is None:
+            async with self.session() as session:
+                return await self.check(session)
+
+        samples = await asyncio.gather(*(
+            self._sample(session, url) for url in self.urls for _ in range(self.samples)
+        ))
+        latencies = [latency for latency in samples if latency is not None]
+        error_rate = 1 - len(latencies) / len(samples)
+        if not latencies:
+            return OriginHealth(False, error_rate=error_rate, detail='所有健康检查请求均失败')
+
+        latency = statistics.median(latencies)
+        latency_headroom = 1 - latency / self.max_latency if self.max_latency > 0 else 1.0
+        if self.max_error_rate > 0:
+            error_headroom = 1 - error_rate / self.max_error_rate
+        else:
+            error_headroom = 0.0 if error_rate else 1.0
+        headroom = max(0.0, min(1.0, latency_headroom, error_headroom))
+
+        reasons = []
+        if latency > self.max_latency:
+            reasons.append(f"延迟超过 {self.max_latency * 1000:.0f}ms")
+        if error_rate > self.max_error_rate:
+            reasons.append(f"错误率超过 {self.max_error_rate:.0%}")
+        return OriginHealth(not reasons, latency, error_rate, headroom, ', '.join(reasons))
+
+
+class WaveSizer:
+    """
+    波次大小控制
+
+    源站健康时按余量放大：余量为 1（远低于阈值）时下一波翻倍，余量接近 0 时保持不变；
+    源站不健康时减半。
+    """
+
+    def __init__(self, initial: int = DEFAULT_INITIAL_WAVE, maximum: int = DEFAULT_MAX_WAVE):
+        self.maximum = maximum
+        self.size = self._clamp(initial)
+
+    def _clamp(self, size: int) -> int:
+        if self.maximum:
+            size = min(size, self.maximum)
+        return max(1, size)
+
+    def on_healthy(self, headroom: float):
+        self.size = self._clamp(max(self.size, round(self.size * (1 + headroom))))
+
+    def on_unhealthy(self):
+        self.size = max(1, self.size // 2)
+
+
+def group_wave_items(units: List[PurgeUnit], by: str = WAVE_BY_ENDPOINT) -> List[List[PurgeUnit]]:
+    """
+    把清除单元分组为波次的基本项，保持首次出现的顺序
+
+    Args:
+        units: 清除单元
+        by: WAVE_BY_ENDPOINT 按 endpoint 分组；WAVE_BY_PATH 按路径块序号分组（各 endpoint 的第 i 个路径块
+            为一组）。按路由过滤后各 endpoint 的路径块内容不同，因此不能按路径本身分组
+
+    Returns:
+        List[List[PurgeUnit]]: 分组后的清除单元，每组计为波次大小中的 1
+    """
+    if by not in (WAVE_BY_ENDPOINT, WAVE_BY_PATH):
+        raise ValueError(f"未知的分批方式: {by}")
+    groups: Dict[object, List[PurgeUnit]] = {}
+    chunk_counts: Dict[str, int] = {}
+    for unit in units:
+        if by == WAVE_BY_ENDPOINT:
+            key = unit.endpoint_name
+        else:
+            key = chunk_counts.get(unit.endpoint_name, 0)
+            chunk_counts[unit.endpoint_name] = key + 1
+        groups.setdefault(key, []).append(unit)
+    return list(groups.values())
+
+
+class StagedRollout:
+    """按波次执行清除，并在波次之间按源站健康状况决定是否继续"""
+
+    def __init__(self, client: "AsyncAzureFrontDoorPurgeClient",
+                 probe: Optional[OriginProbe] = None,
+                 by: str = WAVE_BY_ENDPOINT,
+                 initial_wave: int = DEFAULT_INITIAL_WAVE,
+                 max_wave: int = DEFAULT_MAX_WAVE,
+                 settle_time: float = DEFAULT_SETTLE_TIME,
+                 recheck_interval: float = DEFAULT_RECHECK_INTERVAL,
+                 max_unhealthy_wait: float = DEFAULT_MAX_UNHEALTHY_WAIT):
+        """
+        Args:
+            client: 异步清除客户端
+            probe: 源站探测；为 None 时不做健康检查，按固定大小分批
+            by: 分批方式，WAVE_BY_ENDPOINT 或 WAVE_BY_PATH
+            initial_wave: 第一波的大小（endpoint 数或路径块数）
+            max_wave: 波次大小上限，0 表示不限制
+            settle_time: 每波完成后等待回源流量到达的时间（秒）
+            recheck_interval: 源站不健康时重新探测的间隔（秒）
+            max_unhealthy_wait: 等待源站恢复的最长时间（秒），超过后停止发布
+        """
+        self.client = client
+        self.probe = probe
+        self.by = by
+        self.sizer = WaveSizer(initial_wave, max_wave)
+        self.settle_time = settle_time
+        self.recheck_interval = recheck_interval
+        self.max_unhealthy_wait = max_unhealthy_wait
+
+    async def _wait_until_healthy(self, session: Optional[Any] = None, adapt: bool = True) -> bool:
+        """
+        探测源站直到健康
+
+        Args:
+            session: 本次发布共享的探测会话（OriginProbe.session）
+            adapt: 是否按探测结果放大下一波（第一波之前只确认源站健康，不放大）
+
+        Returns:
+            bool: 源站健康；超过最长等待时间仍不健康时返回 False
+        """
+        if self.probe is None:
+            return True
+        deadline = time.monotonic() + self.max_unhealthy_wait
+        recovered = False
+        while True:
+            health = await self.probe.check(session)
+            if health.healthy:
+                # 刚从不健康中恢复时保持缩小后的大小
+                if adapt and not recovered:
+                    self.sizer.on_healthy(health.headroom)
+                self.client.log(f"💚 源站健康: {health.describe()}")
+                return True
+
+            self.sizer.on_unhealthy()
+            recovered = True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.client.log(f"🛑 源站在 {self.max_unhealthy_wait:.0f}s 内未恢复: {health.describe()}")
+                return False
+            self.client.log(f"🩺 源站不健康，{self.recheck_interval:.0f}s 后重新探测，"
+                            f"下一波缩小为 {self.sizer.size}: {health.describe()}")
+            await asyncio.sleep(min(self.recheck_interval, remaining))
+
+    async def run(self, units: List[PurgeUnit], **kwargs) -> Dict[str, PurgeOutcome]:
+        """
+        分批执行清除单元
+
+        所有单元记录在同一个清除任务中；因源站持续不健康而停止时，未执行的单元保留为
+        未完成状态，可以用 --resume 继续。
+
+        Args:
+            units: 清除单元
+            **kwargs: 传给 purge_units 的调度参数
+
+        Returns:
+            Dict[str, PurgeOutcome]: endpoint 名称到清除结果的映射
+        """
+        results = {unit.endpoint_name: PurgeOutcome(unit.endpoint_name) for unit in units}
+        items = group_wave_items(units, self.by)
+
+        job_id = None
+        client = self.client
+        if client.journal is not None and units:
+            job_id = client.journal.create_job(
+                client.subscription_id, client.resource_group_name, client.front_door_name, units
+            )
+            client.job_id = job_id
+            client.log(f"🧾 清除任务 ID: {job_id}")
+        if self.probe is None:
+            client.log("⚠️  未配置源站健康检查，按固定大小分批清除")
+
+        # 整个发布期间的健康探测共享一个 HTTP 会话
+        async with AsyncExitStack() as stack:
+            session = await stack.enter_async_context(self.probe.session()) if self.probe else None
+
+            wave = 0
+            while items:
+                if not await self._wait_until_healthy(session, adapt=wave > 0):
+                    break
+
+                wave += 1
+                batch, items = items[:self.sizer.size], items[self.sizer.size:]
+                wave_units = [unit for item in batch for unit in item]
+                client.log(f"🌊 第 {wave} 波: {len(batch)} 个{'endpoints' if self.by == WAVE_BY_ENDPOINT else '路径块'}, "
+                           f"{len(wave_units)} 个清除单元，剩余 {len(items)}")
+
+                wave_results = await client.purge_units(wave_units, job_id=job_id, **kwargs)
+                for endpoint_name, outcome in wave_results.items():
+                    merged = results[endpoint_name]
+                    merged.units += outcome.units
+                    merged.attempts += outcome.attempts
+                    merged.elapsed = max(merged.elapsed, outcome.elapsed)
+                    if not outcome.success:
+                        merged.success = False
+                        merged.error = outcome.error
+
+                if items and self.settle_time > 0:
+                    client.log(f"⏳ 等待 {self.settle_time:.0f}s 让回源流量到达后再探测源站")
+                    await asyncio.sleep(self.settle_time)
+
+        if items:
+            skipped = {unit.endpoint_name for item in items for unit in item}
+            for endpoint_name in skipped:
+                results[endpoint_name].success = False
+                results[endpoint_name].error = "源站不健康，发布已停止"
+            hint = f"，可用 --resume {job_id} 继续" if job_id else ''
+            client.log(f"🛑 剩余 {len(items)} 组清除单元未执行{hint}")
+        return results
+
+    async def purge(self, endpoint_names: List[str], paths: List[str],
+                    max_paths_per_request: int = DEFAULT_MAX_PATHS_PER_REQUEST,
+                    route_aware: bool = False,
+                    domains: Optional[List[str]] = None,
+                    **kwargs) -> Dict[str, PurgeOutcome]:
+        """分批清除多个 endpoints 的缓存，参数与 AsyncAzureFrontDoorPurgeClient.purge_many 相同"""
+        units = await self.client.plan_units(endpoint_names, paths, max_paths_per_request, route_aware, domains)
+        results = await self.run(units, **kwargs)
+        self.client.fill_skipped_endpoints(endpoint_names, results)
+        return results
+
+
+def get_rollout_options() -> dict:
+    """从环境变量读取分批发布参数（StagedRollout 与 OriginProbe 的参数）"""
+    return {
+        'health_urls': parse_path_list(os.getenv('PURGE_HEALTH_URLS', '')),
+        'max_latency': float(os.getenv('PURGE_HEALTH_MAX_LATENCY', DEFAULT_MAX_LATENCY)),
+        'max_error_rate': float(os.getenv('PURGE_HEALTH_MAX_ERROR_RATE', DEFAULT_MAX_ERROR_RATE)),
+        'by': os.getenv('PURGE_WAVE_BY', WAVE_BY_ENDPOINT),
+        'initial_wave': int(os.getenv('PURGE_WAVE_SIZE', DEFAULT_INITIAL_WAVE)),
+        'max_wave': int(os.getenv('PURGE_WAVE_MAX_SIZE', DEFAULT_MAX_WAVE)),
+        'settle_time': float(os.getenv('PURGE_WAVE_SETTLE', DEFAULT_SETTLE_TIME)),
+        'max_unhealthy_wait': float(os.getenv('PURGE_HEALTH_MAX_WAIT', DEFAULT_MAX_UNHEALTHY_WAIT)),
+    }
+
+
+def create_rollout(client: "AsyncAzureFrontDoorPurgeClient", options: dict) -> StagedRollout:
+    """由 get_rollout_options 形式的参数创建分批发布"""
+    probe = None
+    if options.get('health_urls'):
+        probe = OriginProbe(options['health_urls'],
+                            max_latency=options.get('max_latency', DEFAULT_MAX_LATENCY),
+                            max_error_rate=options.get('max_error_rate', DEFAULT_MAX_ERROR_RATE))
+    return StagedRollout(
+        client, probe,
+        by=options.get('by', WAVE_BY_ENDPOINT),
+        initial_wave=options.get('initial_wave', DEFAULT_INITIAL_WAVE),
+        max_wave=options.get('max_wave', DEFAULT_MAX_WAVE),
+        settle_time=options.get('settle_time', DEFAULT_SETTLE_TIME),
+        max_unhealthy_wait=options.get('max_unhealthy_wait', DEFAULT_MAX_UNHEALTHY_WAIT)
+    )
@@ -0,0 +1,198 @@
+"""
+路由 / 域名索引
+
+根据 profile 的路由、自定义域名和源站组，建立"路径模式 + 主机名 → endpoint"的索引，
+使每个清除路径只发送到真正提供该路径的 endpoints，并据此填写清除请求的 domains 字段。
+本模块的匹配逻辑不依赖 Azure SDK。
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from path_planner import WILDCARD, normalize_path
+from purge_settings import get_state_path, ensure_parent_dir
+
+
+# 默认索引缓存有效期（秒）
+DEFAULT_ROUTE_INDEX_TTL = 600.0
+
+
+def _resource_name(resource_id: Optional[str]) -> str:
+    """取 ARM 资源 ID 的最后一段作为名称"""
+    return (resource_id or '').rstrip('/').split('/')[-1]
+
+
+def _match_key(path: str) -> str:
+    """用于匹配的路径形式：去掉查询字符串，忽略大小写"""
+    return path.split('?', 1)[0].lower()
+
+
+def patterns_overlap(purge_path: str, route_pattern: str) -> bool:
+    """
+    判断清除路径与路由匹配模式是否可能命中相同的 URL
+
+    Args:
+        purge_path: 规范化后的清除路径，例如 '/images/*' 或 '/index.html'
+        route_pattern: 路由的 patterns_to_match 项，例如 '/*' 或 '/api/*'
+
+    Returns:
+        bool: 是否存在交集
+    """
+    purge_key = _match_key(purge_path)
+    route_key = _match_key(normalize_path(route_pattern) or '/*')
+
+    purge_wild = purge_key.endswith(WILDCARD)
+    route_wild = route_key.endswith(WILDCARD)
+    purge_prefix = purge_key.rstrip(WILDCARD)
+    route_prefix = route_key.rstrip(WILDCARD)
+
+    if purge_wild and route_wild:
+        return purge_prefix.startswith(route_prefix) or route_prefix.startswith(purge_prefix)
+    if purge_wild:
+        return route_key.startswith(purge_prefix)
+    if route_wild:
+        return purge_key.startswith(route_prefix)
+    return purge_key == route_key
+
+
+@dataclass(frozen=True)
+class RouteEntry:
+    """一个已启用路由的索引项"""
+
+    endpoint_name: str
+    route_name: str
+    patterns: Tuple[str, ...]
+    domains: Tuple[str, ...]
+    origin_group: str = ''
+
+    def matches(self, path: str) -> bool:
+        return any(patterns_overlap(path, pattern) for pattern in self.patterns)
+
+
+class RouteIndex:
+    """路径模式 / 主机名到 endpoints 的索引"""
+
+    def __init__(self, routes: Iterable[RouteEntry]):
+        self.routes = list(routes)
+        self._by_endpoint: Dict[str, List[RouteEntry]] = {}
+        self._by_host: Dict[str, Set[str]] = {}
+        for route in self.routes:
+            self._by_endpoint.setdefault(route.endpoint_name, []).append(route)
+            for domain in route.domains:
+                self._by_host.setdefault(domain.lower(), set()).add(route.endpoint_name)
+
+    @classmethod
+    def from_models(cls, endpoints: Iterable[Any], routes_by_endpoint: Dict[str, Iterable[Any]],
+                    custom_domains: Iterable[Any]) -> "RouteIndex":
+        """
+        从 SDK 模型构建索引
+
+        Args:
+            endpoints: EndpointInfo 或 AFDEndpoint 列表
+            routes_by_endpoint: endpoint 名称到 Route 模型列表的映射
+            custom_domains: AFDDomain 模型列表
+        """
+        domain_hosts = {
+            (domain.id or '').lower(): domain.host_name
+            for domain in custom_domains if getattr(domain, 'host_name', None)
+        }
+        host_names = {endpoint.name: endpoint.host_name for endpoint in endpoints}
+
+        entries = []
+        for endpoint_name, routes in routes_by_endpoint.items():
+            for route in routes:
+                if (getattr(route, 'enabled_state', None) or 'Enabled') != 'Enabled':
+                    continue
+
+                domains = [
+                    domain_hosts[ref.id.lower()]
+                    for ref in (getattr(route, 'custom_domains', None) or [])
+                    if ref.id and ref.id.lower() in domain_hosts
+                ]
+                if (getattr(route, 'link_to_default_domain', None) or 'Enabled') == 'Enabled' \
+                        and host_names.get(endpoint_name):
+                    domains.append(host_names[endpoint_name])
+
+                origin_group = getattr(route, 'origin_group', None)
+                entries.append(RouteEntry(
+                    endpoint_name=endpoint_name,
+                    route_name=route.name,
+                    patterns=tuple(getattr(route, 'patterns_to_match', None) or ['/*']),
+                    domains=tuple(sorted(set(domains))),
+                    origin_group=_resource_name(getattr(origin_group, 'id', None))
+                ))
+        return cls(entries)
+
+    def endpoints_for_path(self, path: str) -> Set[str]:
+        """提供该路径的 endpoints"""
+        return {route.endpoint_name for route in self.routes if route.matches(path)}
+
+    def endpoints_for_host(self, host_name: str) -> Set[str]:
+        """绑定了该主机名的 endpoints"""
+        return set(self._by_host.get(host_name.lower(), set()))
+
+    def serves(self, endpoint_name: str, path: str) -> bool:
+        """endpoint 是否有路由提供该路径"""
+        return any(route.matches(path) for route in self._by_endpoint.get(endpoint_name, []))
+
+    def domains_for(self, endpoint_name: str, paths: Iterable[str]) -> Tuple[str, ...]:
+        """endpoint 上提供这些路径的路由所绑定的全部主机名"""
+        paths = list(paths)
+        domains = set()
+        for route in self._by_endpoint.get(endpoint_name, []):
+            if any(route.matches(path) for path in paths):
+                domains.update(route.domains)
+        return tuple(sorted(domains))
+
+    def to_dict(self) -> dict:
+        return {'routes': [asdict(route) for route in self.routes]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RouteIndex":
+        return cls(
+            RouteEntry(**{**item, 'patterns': tuple(item['patterns']), 'domains': tuple(item['domains'])})
+            for item in data['routes']
+        )
+
+
+def _load_cache_file(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache_file(path: str, data: dict):
+    ensure_parent_dir(path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_cached_index(key: str, ttl: float = DEFAULT_ROUTE_INDEX_TTL) -> Optional[RouteIndex]:
+    """从磁盘读取新鲜的索引缓存，不存在或已过期时返回 None"""
+    entry = _load_cache_file(get_state_path('route_index.json')).get(key)
+    if not entry or time.time() - entry['built_at'] >= ttl:
+        return None
+    return RouteIndex.from_dict(entry['index'])
+
+
+def save_cached_index(key: str, index: RouteIndex):
+    """把索引写入磁盘缓存"""
+    path = get_state_path('route_index.json')
+    data = _load_cache_file(path)
+    data[key] = {'built_at': time.time(), 'index': index.to_dict()}
+    _write_cache_file(path, data)
+
+
+def invalidate_cached_index(key: str):
+    """删除某个 profile 的索引缓存"""
+    path = get_state_path('route_index.json')
+    data = _load_cache_file(path)
+    if data.pop(key, None) is not None:
+        _write_cache_file(path, data)
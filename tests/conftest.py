@@ -0,0 +1,7 @@
+"""测试公共配置：模块位于仓库根目录，直接加入导入路径"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
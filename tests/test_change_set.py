@@ -0,0 +1,78 @@
+"""change_set：变更文件 → 最小清除路径集合"""
+
+import io
+import json
+
+from change_set import (
+    UrlMapping, collapse_paths, diff_manifests, load_manifest, plan_changed_paths, read_changed_files
+)
+
+
+def test_read_changed_files_skips_blank_lines_and_comments():
+    stream = io.StringIO("dist/app.js\n\n# generated\n  dist/index.html  \n")
+    assert read_changed_files(stream) == ['dist/app.js', 'dist/index.html']
+
+
+def test_load_manifest_json_and_checksum_formats(tmp_path):
+    json_manifest = tmp_path / 'manifest.json'
+    json_manifest.write_text(json.dumps({'index.html': 'aaa', 'app.js': 'bbb'}), encoding='utf-8')
+    assert load_manifest(str(json_manifest)) == {'index.html': 'aaa', 'app.js': 'bbb'}
+
+    checksums = tmp_path / 'SHA256SUMS'
+    checksums.write_text("# sha256sum\naaa  index.html\nbbb *static/app.js\n", encoding='utf-8')
+    assert load_manifest(str(checksums)) == {'index.html': 'aaa', 'static/app.js': 'bbb'}
+
+
+def test_diff_manifests():
+    old = {'index.html': '1', 'app.js': '1', 'old.css': '1'}
+    new = {'index.html': '2', 'app.js': '1', 'new.css': '1'}
+
+    assert diff_manifests(old, new) == ['index.html', 'old.css']
+    assert diff_manifests(old, new, include_added=True) == ['index.html', 'new.css', 'old.css']
+
+
+def test_url_mapping_rules_index_files_and_clean_extensions():
+    mapping = UrlMapping.from_dict({
+        'rules': [{'from': 'dist/', 'to': '/'}, {'from': 'dist/assets/', 'to': '/static/'}],
+        'clean_extensions': ['.html'],
+    })
+
+    assert mapping.map_file('dist/assets/app.js') == ['/static/app.js']
+    assert mapping.map_file('./dist/docs/index.html') == ['/docs/index.html', '/docs/']
+    assert mapping.map_file('dist\\about.html') == ['/about.html', '/about']
+    assert mapping.map_file('other/file name.txt') == ['/other/file%20name.txt']
+
+
+def test_url_mapping_map_files_dedupes_in_order():
+    mapping = UrlMapping()
+    assert mapping.map_files(['b.js', 'index.html', 'b.js']) == ['/b.js', '/index.html', '/']
+
+
+def test_collapse_paths_with_universe_uses_changed_ratio():
+    universe = [f'/img/{i}.png' for i in range(10)] + ['/css/a.css', '/css/b.css', '/index.html']
+    changed = [f'/img/{i}.png' for i in range(8)] + ['/css/a.css']
+
+    assert collapse_paths(changed, universe, collapse_ratio=0.8) == ['/css/a.css', '/img/*']
+    assert collapse_paths(changed, universe, collapse_ratio=0.9) == sorted(changed)
+
+
+def test_collapse_paths_without_universe_uses_file_count_and_never_collapses_root():
+    changed = [f'/assets/{i}.js' for i in range(3)] + ['/a.html', '/b.html', '/c.html']
+
+    assert collapse_paths(changed, max_files_per_dir=3) == ['/a.html', '/assets/*', '/b.html', '/c.html']
+    assert collapse_paths(changed, max_files_per_dir=4) == sorted(changed)
+
+
+def test_collapse_paths_picks_shallowest_directory():
+    changed = ['/a/b/1.js', '/a/b/2.js', '/a/c/3.js']
+    assert collapse_paths(changed, changed + ['/index.html']) == ['/a/*']
+    assert collapse_paths(changed, changed) == ['/*']
+
+
+def test_plan_changed_paths_end_to_end():
+    mapping = UrlMapping(rules=[('dist/', '/')])
+    manifest = {f'dist/img/{i}.png': str(i) for i in range(4)}
+    manifest.update({'dist/index.html': 'x', 'dist/app.js': 'y', 'dist/about.html': 'z', 'dist/site.css': 'w'})
+    files = [f'dist/img/{i}.png' for i in range(4)] + ['dist/index.html']
+
+    assert plan_changed_paths(files, mapping, manifest) == ['/', '/img/*', '/index.html']
@@ -0,0 +1,137 @@
+"""health_store：样本汇总、小时 rollup 与趋势查询"""
+
+import pytest
+
+from health_store import HealthStore, ROLLUP_RESOLUTION, merge_summaries, parse_duration, summarize
+
+HOUR = ROLLUP_RESOLUTION
+# 对齐到整点的合成时间，避免依赖当前时间
+T0 = 480000 * HOUR
+
+
+def _result(ttfb, hit=True, pop='LON', status=200):
+    if status is None:
+        return {'pop': pop, 'error': 'timeout'}
+    return {'pop': pop, 'status_code': status, 'ttfb': ttfb, 'total_time': ttfb * 2,
+            'x_cache': 'TCP_HIT' if hit else 'TCP_MISS'}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HealthStore(str(tmp_path / 'health.db'), raw_retention=2 * HOUR, rollup_retention=30 * 86400)
+    yield store
+    store.close()
+
+
+def _fill(store, hours, per_hour=6, url='https://example.com/', pop='LON', ttfb=10.0, hit=True):
+    """从 T0 开始每小时写入 per_hour 个样本，返回写入的样本数"""
+    for hour in range(hours):
+        for index in range(per_hour):
+            ts = T0 + hour * HOUR + index * HOUR / per_hour
+            store.add_samples({url: [_result(ttfb + index, hit=hit, pop=pop)]}, ts)
+    return hours * per_hour
+
+
+@pytest.mark.parametrize('text, seconds', [('90', 90), ('30s', 30), ('15m', 900), ('24h', 86400), ('1.5d', 129600)])
+def test_parse_duration(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+def test_parse_duration_rejects_invalid_text():
+    with pytest.raises(ValueError):
+        parse_duration('soon')
+
+
+def test_summarize_counts_errors_hits_and_percentiles():
+    summary = summarize([(200, 10.0, 20.0, 1), (200, 30.0, 60.0, 0), (None, None, None, 0), (200, 20.0, 40.0, 1)])
+
+    assert (summary['samples'], summary['errors'], summary['hits']) == (4, 1, 2)
+    assert summary['hit_ratio'] == pytest.approx(2 / 3, abs=1e-4)
+    assert (summary['ttfb_p50'], summary['ttfb_p90'], summary['ttfb_max']) == (20.0, 28.0, 30.0)
+    assert summary['total_p99'] == 59.6
+
+
+def test_summarize_without_successful_samples():
+    summary = summarize([(None, None, None, 0)])
+    assert summary['hit_ratio'] is None
+    assert summary['ttfb_p50'] is None and summary['total_max'] is None
+
+
+def test_merge_summaries_weights_percentiles_by_successful_samples():
+    merged = merge_summaries([
+        summarize([(200, 10.0, 10.0, 1)] * 3),
+        summarize([(200, 50.0, 50.0, 0), (None, None, None, 0)]),
+    ])
+
+    assert (merged['samples'], merged['errors'], merged['hits']) == (5, 1, 3)
+    assert merged['hit_ratio'] == 0.75
+    assert merged['ttfb_p50'] == pytest.approx(20.0)
+    assert merged['ttfb_max'] == 50.0
+
+
+def test_rollup_summarizes_complete_hours_per_url_and_pop(store):
+    _fill(store, 3, pop='LON')
+    _fill(store, 3, pop='AMS', hit=False)
+
+    # 第 3 个小时尚未结束，不汇总
+    assert store.rollup(T0 + 2 * HOUR + 60) == 4
+    assert store.rollup(T0 + 2 * HOUR + 120) == 0
+
+    rows = store.conn.execute(
+        'SELECT bucket, pop, samples, hits, ttfb_p50, ttfb_max FROM rollups ORDER BY bucket, pop').fetchall()
+    assert rows == [
+        (T0, 'AMS', 6, 0, 12.5, 15.0), (T0, 'LON', 6, 6, 12.5, 15.0),
+        (T0 + HOUR, 'AMS', 6, 0, 12.5, 15.0), (T0 + HOUR, 'LON', 6, 6, 12.5, 15.0),
+    ]
+    assert store.pops() == ['AMS', 'LON']
+
+
+def test_rollup_prunes_raw_samples_past_retention(store):
+    _fill(store, 6)
+    now = T0 + 6 * HOUR + 60
+    store.rollup(now)
+
+    # 原始样本只保留最近 2 小时（按整点清理）
+    first = store.conn.execute('SELECT MIN(ts) FROM samples').fetchone()[0]
+    assert first == T0 + 4 * HOUR
+    assert store.conn.execute('SELECT COUNT(*) FROM rollups').fetchone()[0] == 6
+
+
+def test_trend_uses_rollups_before_raw_samples(store):
+    total = _fill(store, 6)
+    store.rollup(T0 + 6 * HOUR + 60)
+
+    rows = store.trend(T0, T0 + 6 * HOUR, resolution=HOUR)
+
+    assert [row['time'] for row in rows] == [T0 + hour * HOUR for hour in range(6)]
+    assert [row['approximate'] for row in rows] == [True] * 4 + [False] * 2
+    assert sum(row['samples'] for row in rows) == total
+    assert all(row['hit_ratio'] == 1.0 and row['ttfb_p50'] == 12.5 for row in rows)
+
+
+def test_trend_buckets_raw_samples_and_filters(store):
+    _fill(store, 1, per_hour=12, url='https://example.com/a', pop='LON', ttfb=10.0)
+    _fill(store, 1, per_hour=12, url='https://example.com/b', pop='AMS', ttfb=100.0, hit=False)
+
+    rows = store.trend(T0, T0 + HOUR, resolution=15 * 60)
+    assert [row['samples'] for row in rows] == [6, 6, 6, 6]
+    assert all(not row['approximate'] for row in rows)
+
+    only_a = store.trend(T0, T0 + HOUR, resolution=HOUR, url='https://example.com/a')
+    assert [(row['samples'], row['hit_ratio']) for row in only_a] == [(12, 1.0)]
+    only_ams = store.trend(T0, T0 + HOUR, resolution=HOUR, pop='AMS')
+    assert [(row['samples'], row['hit_ratio'], row['ttfb_max']) for row in only_ams] == [(12, 0.0, 111.0)]
+    assert store.trend(T0, T0 + HOUR, url='https://example.com/unknown') == []
+
+
+def test_around_compares_before_and_after_event(store):
+    _fill(store, 1, ttfb=10.0, hit=True)
+    store.add_samples({'https://example.com/': [_result(80.0, hit=False), _result(0, status=None)]},
+                      T0 + HOUR + 60)
+
+    result = store.around(T0 + HOUR, window=HOUR)
+
+    assert (result['before']['samples'], result['before']['hit_ratio']) == (6, 1.0)
+    assert (result['after']['samples'], result['after']['errors'], result['after']['hit_ratio']) == (2, 1, 0.0)
+    assert result['after']['ttfb_p50'] == 80.0
+    assert not result['before']['approximate']
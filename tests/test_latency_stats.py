@@ -0,0 +1,100 @@
+"""latency_stats：分组百分位数、报告统计、前后对比与导出"""
+
+import numpy as np
+import pytest
+
+from latency_stats import (
+    ALL, compare_stats, compute_stats, export_stats, format_ms, get_report_format, group_percentiles, load_stats
+)
+
+
+def _sample(state, ttfb, total=None):
+    return {'status_code': 200, 'x_cache': state, 'ttfb': ttfb, 'total_time': total if total is not None else ttfb}
+
+
+def test_group_percentiles_matches_numpy_percentile():
+    rng = np.random.default_rng(7)
+    codes = rng.integers(0, 4, size=500)
+    values = rng.exponential(50.0, size=500)
+    values[::17] = np.nan
+
+    stats = group_percentiles(codes, values, 5)
+
+    for group in range(4):
+        selected = values[(codes == group) & ~np.isnan(values)]
+        for p in (50, 90, 99):
+            assert stats[f"p{p}"][group] == pytest.approx(np.percentile(selected, p))
+        assert stats['max'][group] == pytest.approx(selected.max())
+    # 没有样本的组为 NaN
+    assert all(np.isnan(stats[name][4]) for name in stats)
+
+
+def test_group_percentiles_without_values():
+    stats = group_percentiles(np.zeros(2, dtype=int), np.array([np.nan, np.nan]), 1)
+    assert set(stats) == {'p50', 'p90', 'p99', 'max'}
+    assert all(np.isnan(values[0]) for values in stats.values())
+
+
+def test_compute_stats_groups_and_hit_ratio():
+    results = {
+        'https://example.com/b': [_sample('TCP_HIT', 10.0), _sample('TCP_MISS', 30.0), {'error': 'timeout'}],
+        'https://example.com/a': [_sample('TCP_HIT', 20.0, 25.0)],
+    }
+    rows = {(row['url'], row['cache_state']): row for row in compute_stats(results)}
+    order = [key for key in rows]
+
+    # URL 保持输入顺序，全部 URL 的分组排在最后（其中全部样本的行在前）
+    assert [url for url, state in order if state == ALL] == ['https://example.com/b', 'https://example.com/a', ALL]
+    assert order[-3:] == [(ALL, ALL), (ALL, 'TCP_HIT'), (ALL, 'TCP_MISS')]
+
+    url_b = rows[('https://example.com/b', ALL)]
+    assert (url_b['samples'], url_b['errors'], url_b['hit_ratio']) == (3, 1, 0.5)
+    assert url_b['ttfb_p50'] == 20.0
+    assert url_b['ttfb_max'] == 30.0
+
+    everything = rows[(ALL, ALL)]
+    assert (everything['samples'], everything['errors']) == (4, 1)
+    assert everything['hit_ratio'] == pytest.approx(2 / 3, abs=1e-4)
+
+    hits = rows[(ALL, 'TCP_HIT')]
+    assert (hits['samples'], hits['hit_ratio'], hits['ttfb_p50'], hits['total_max']) == (2, 1.0, 15.0, 25.0)
+
+
+def test_compute_stats_empty():
+    assert compute_stats({}) == []
+
+
+def test_compare_stats_reports_deltas():
+    before = [{'url': ALL, 'cache_state': ALL, 'hit_ratio': 0.9, 'ttfb_p50': 12.0}]
+    after = [
+        {'url': ALL, 'cache_state': ALL, 'hit_ratio': 0.5, 'ttfb_p50': 40.5},
+        {'url': 'https://example.com/new', 'cache_state': ALL, 'hit_ratio': 1.0, 'ttfb_p50': 5.0},
+    ]
+    rows = compare_stats(before, after)
+
+    assert rows[0]['before_hit_ratio'] == 0.9
+    assert rows[0]['delta_hit_ratio'] == -0.4
+    assert rows[0]['delta_ttfb_p50'] == 28.5
+    assert rows[1]['before_ttfb_p50'] is None
+    assert rows[1]['delta_ttfb_p50'] is None
+
+
+@pytest.mark.parametrize('name', ['report.json', 'report.csv'])
+def test_export_and_load_round_trip(tmp_path, name):
+    rows = compute_stats({'https://example.com/': [_sample('TCP_HIT', 10.0), {'error': 'reset'}]})
+    path = str(tmp_path / name)
+
+    export_stats(rows, path)
+    assert load_stats(path) == rows
+
+
+def test_get_report_format():
+    assert get_report_format('out.CSV') == 'csv'
+    assert get_report_format('out.txt', 'parquet') == 'parquet'
+    with pytest.raises(ValueError):
+        get_report_format('out.txt')
+
+
+def test_format_ms():
+    assert format_ms(None) == '-'
+    assert format_ms(12.345) == '12.3ms'
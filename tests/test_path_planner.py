@@ -0,0 +1,104 @@
+"""path_planner：路径规范化、通配符覆盖和清除单元规划"""
+
+import pytest
+
+from path_planner import PathTrie, chunk_paths, normalize_path, normalize_paths, plan_purge_units
+from purge_models import PurgeUnit
+from route_index import RouteEntry, RouteIndex
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('  ', None),
+    ('index.html', '/index.html'),
+    ('//static///app.js', '/static/app.js'),
+    ('https://www.example.com/a/b.css?v=2', '/a/b.css?v=2'),
+    ('/api/*?v=2', '/api/*'),
+    ('/api/**', '/api/*'),
+])
+def test_normalize_path(raw, expected):
+    assert normalize_path(raw) == expected
+
+
+@pytest.mark.parametrize('raw', ['/img/*.png', '/api/*/v1', '*/index.html'])
+def test_normalize_path_rejects_wildcard_before_the_end(raw):
+    # 截断为 '/img/*' 会把清除范围扩大到整个目录
+    with pytest.raises(ValueError):
+        normalize_path(raw)
+    with pytest.raises(ValueError):
+        normalize_paths(['/index.html', raw])
+
+
+def test_normalize_paths_root_wildcard_covers_everything():
+    assert normalize_paths(['/*', '/api/*']) == ['/*']
+    assert normalize_paths(['/api/*', '/*', '/index.html']) == ['/*']
+
+
+def test_normalize_paths_keeps_order_and_removes_covered_paths():
+    paths = ['/b.js', '/api/v1/*', '/a.css', '/api/*', '/api/v1/users', '/b.js', '/apix']
+    assert normalize_paths(paths) == ['/b.js', '/a.css', '/api/*', '/apix']
+
+
+def test_path_trie_covers():
+    trie = PathTrie()
+    trie.add_wildcard('/api/')
+    trie.add_wildcard('/img')
+
+    assert trie.covers('/api/users')
+    assert trie.covers('/api/v1/*')
+    assert trie.covers('/img')
+    assert trie.covers('/imgs/logo.png')
+    assert not trie.covers('/images/logo.png')
+    assert not trie.covers('/ap')
+    assert not trie.covers('/api')
+    assert not trie.covers('/static/app.js')
+    assert not PathTrie().covers('/anything')
+
+
+def test_chunk_paths():
+    assert chunk_paths(['/a', '/b', '/c'], 2) == [['/a', '/b'], ['/c']]
+    assert chunk_paths([], 2) == []
+    with pytest.raises(ValueError):
+        chunk_paths(['/a'], 0)
+
+
+def test_plan_purge_units_interleaves_chunks_across_endpoints():
+    paths = [f'/file{i}.js' for i in range(5)]
+    units = plan_purge_units(['ep1', 'ep2'], paths, max_paths_per_request=2)
+
+    assert [(unit.endpoint_name, unit.paths) for unit in units] == [
+        ('ep1', ('/file0.js', '/file1.js')),
+        ('ep2', ('/file0.js', '/file1.js')),
+        ('ep1', ('/file2.js', '/file3.js')),
+        ('ep2', ('/file2.js', '/file3.js')),
+        ('ep1', ('/file4.js',)),
+        ('ep2', ('/file4.js',)),
+    ]
+
+
+def test_plan_purge_units_route_aware_filters_paths_and_fills_domains():
+    index = RouteIndex([
+        RouteEntry('web', 'static', ('/static/*',), ('cdn.example.com',)),
+        RouteEntry('web', 'pages', ('/', '/index.html'), ('www.example.com',)),
+        RouteEntry('api', 'api', ('/api/*',), ('api.example.com',)),
+        RouteEntry('idle', 'other', ('/other/*',), ()),
+    ])
+    units = plan_purge_units(['web', 'api', 'idle'], ['/static/app.js', '/api/users', '/index.html'],
+                             route_index=index)
+
+    assert units == [
+        PurgeUnit('web', ('/static/app.js', '/index.html'), ('cdn.example.com', 'www.example.com')),
+        PurgeUnit('api', ('/api/users',), ('api.example.com',)),
+    ]
+
+
+def test_plan_purge_units_wildcard_reaches_every_overlapping_route():
+    index = RouteIndex([
+        RouteEntry('web', 'static', ('/static/*',), ('cdn.example.com',)),
+        RouteEntry('api', 'api', ('/api/*',), ('api.example.com',)),
+    ])
+    units = plan_purge_units(['web', 'api'], ['/*'], route_index=index)
+
+    assert units == [
+        PurgeUnit('web', ('/*',), ('cdn.example.com',)),
+        PurgeUnit('api', ('/*',), ('api.example.com',)),
+    ]
@@ -0,0 +1,173 @@
+"""purge_coordination：跨进程清除去重的覆盖判断与认领"""
+
+import asyncio
+import json
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from async_purge import AsyncAzureFrontDoorPurgeClient
+from purge_coordination import (
+    CLAIM_ATTACHED, CLAIM_FRESH, CLAIM_OWNED, PurgeCoordinator, _covers
+)
+from purge_models import PurgeUnit
+
+SCOPE = 'sub/rg/profile'
+
+
+def _entry(path, domains=()):
+    return path, json.dumps(sorted(domains))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """每个 PurgeCoordinator 实例模拟一个独立的进程，共用同一个协调表"""
+    return str(tmp_path / 'coordination.db')
+
+
+def test_covers_exact_and_wildcard_paths():
+    entries = [_entry('/index.html'), _entry('/static/*')]
+
+    assert _covers(entries, PurgeUnit('ep', ('/index.html', '/static/app.js', '/static/img/*')))
+    assert not _covers(entries, PurgeUnit('ep', ('/index.html', '/about.html')))
+    assert _covers([_entry('/*')], PurgeUnit('ep', ('/anything', '/a/*')))
+    assert not _covers([], PurgeUnit('ep', ('/a',)))
+
+
+def test_covers_domain_scoping():
+    unrestricted = [_entry('/*')]
+    restricted = [_entry('/*', ['www.example.com', 'cdn.example.com'])]
+
+    # 不限域名的清除覆盖任意域名
+    assert _covers(unrestricted, PurgeUnit('ep', ('/a',), ('www.example.com',)))
+    # 限定域名的清除只覆盖其域名的子集
+    assert _covers(restricted, PurgeUnit('ep', ('/a',), ('WWW.example.com',)))
+    assert not _covers(restricted, PurgeUnit('ep', ('/a',), ('www.example.com', 'api.example.com')))
+    assert not _covers(restricted, PurgeUnit('ep', ('/a',)))
+
+
+def test_claim_attaches_to_inflight_and_reuses_success(db_path):
+    unit = PurgeUnit('ep1', ('/*',))
+    first = PurgeCoordinator(db_path).session(SCOPE)
+    second = PurgeCoordinator(db_path).session(SCOPE)
+
+    assert first.claim([unit]) == [CLAIM_OWNED]
+    assert second.claim([unit, PurgeUnit('EP1', ('/a.js',)), PurgeUnit('ep2', ('/a.js',))]) == [
+        CLAIM_ATTACHED, CLAIM_ATTACHED, CLAIM_OWNED
+    ]
+
+    first.complete(unit, True)
+    assert second.claim([PurgeUnit('ep1', ('/a.js',))]) == [CLAIM_FRESH]
+
+
+def test_claim_ignores_purges_started_before_the_session(db_path):
+    unit = PurgeUnit('ep1', ('/a.js',))
+    first = PurgeCoordinator(db_path).session(SCOPE)
+    assert first.claim([unit]) == [CLAIM_OWNED]
+    first.complete(unit, True)
+
+    time.sleep(0.01)
+    later = PurgeCoordinator(db_path).session(SCOPE)
+    # 早于本次运行开始的清除可能发生在本次部署之前，不能沿用
+    assert later.claim([unit]) == [CLAIM_OWNED]
+    # 流式任务按任务到达时间判断
+    assert later.claim([PurgeUnit('ep2', ('/a.js',))], not_before=later.started_at) == [CLAIM_OWNED]
+
+
+def test_failed_purge_is_reclaimed(db_path):
+    unit = PurgeUnit('ep1', ('/a.js',))
+    first = PurgeCoordinator(db_path).session(SCOPE)
+    second = PurgeCoordinator(db_path).session(SCOPE)
+
+    assert first.claim([unit]) == [CLAIM_OWNED]
+    first.complete(unit, False)
+    assert second.claim([unit]) == [CLAIM_OWNED]
+
+
+def test_expired_lease_and_release(db_path):
+    unit = PurgeUnit('ep1', ('/a.js',))
+    crashed = PurgeCoordinator(db_path, lease=0).session(SCOPE)
+    waiting = PurgeCoordinator(db_path).session(SCOPE)
+    other = PurgeCoordinator(db_path).session(SCOPE)
+    assert crashed.claim([unit]) == [CLAIM_OWNED]
+    time.sleep(0.01)
+    assert waiting.claim([unit]) == [CLAIM_OWNED]
+
+    assert other.claim([unit]) == [CLAIM_ATTACHED]
+    waiting.release()
+    assert other.claim([unit]) == [CLAIM_OWNED]
+
+
+def test_scopes_are_independent(db_path):
+    unit = PurgeUnit('ep1', ('/*',))
+    first = PurgeCoordinator(db_path).session(SCOPE)
+    second = PurgeCoordinator(db_path).session('sub/rg/other-profile')
+
+    assert first.claim([unit]) == [CLAIM_OWNED]
+    assert second.claim([unit]) == [CLAIM_OWNED]
+
+
+def test_wait_yields_when_other_process_finishes(db_path):
+    done, failed = PurgeUnit('ep1', ('/a.js',)), PurgeUnit('ep2', ('/a.js',))
+    owner = PurgeCoordinator(db_path).session(SCOPE)
+    waiter = PurgeCoordinator(db_path, wait_interval=0.01).session(SCOPE)
+    assert owner.claim([done, failed]) == [CLAIM_OWNED, CLAIM_OWNED]
+    assert waiter.claim([done, failed]) == [CLAIM_ATTACHED, CLAIM_ATTACHED]
+
+    async def run():
+        async def finish():
+            await asyncio.sleep(0.05)
+            owner.complete(done, True)
+            owner.complete(failed, False)
+
+        task = asyncio.create_task(finish())
+        claims = [item async for item in waiter.wait([done, failed])]
+        await task
+        return claims
+
+    assert sorted(asyncio.run(run()), key=lambda item: item[0].endpoint_name) == [
+        (done, CLAIM_FRESH), (failed, CLAIM_OWNED)
+    ]
+
+
+def test_purge_units_reuses_or_resubmits_units_attached_to_another_process(db_path):
+    done, failed = PurgeUnit('ep1', ('/a.js',)), PurgeUnit('ep2', ('/a.js',))
+    owner = PurgeCoordinator(db_path).session('sub/rg/fd')
+    assert owner.claim([done, failed]) == [CLAIM_OWNED, CLAIM_OWNED]
+    # 模拟在本次运行开始之后才开始的清除
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('UPDATE purges SET started_at = ?', (time.time() + 60,))
+
+    submitted = []
+
+    async def begin_purge_content(endpoint_name, **kwargs):
+        submitted.append(endpoint_name)
+        polling_method = SimpleNamespace(finished=lambda: True, status=lambda: 'Succeeded')
+        return SimpleNamespace(polling_method=lambda: polling_method)
+
+    coordinator = PurgeCoordinator(db_path, wait_interval=0.01)
+    client = AsyncAzureFrontDoorPurgeClient(
+        'tenant', 'client', 'secret', 'sub', 'rg', 'fd', log=lambda message: None, coordinator=coordinator,
+        cdn_client=SimpleNamespace(afd_endpoints=SimpleNamespace(begin_purge_content=begin_purge_content))
+    )
+
+    async def run():
+        async def finish():
+            await asyncio.sleep(0.05)
+            owner.complete(done, True)
+            owner.complete(failed, False)
+
+        task = asyncio.create_task(finish())
+        results = await client.purge_units([done, failed], poll_interval=0.01)
+        await task
+        return results
+
+    results = asyncio.run(run())
+
+    assert (results['ep1'].success, results['ep1'].attempts) == (True, 0)
+    assert (results['ep2'].success, results['ep2'].attempts) == (True, 1)
+    assert submitted == ['ep2']
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM purges WHERE status = 'inflight'").fetchone() == (0,)
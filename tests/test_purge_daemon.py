@@ -0,0 +1,117 @@
+"""purge_daemon：防抖合并与按请求分发清除结果"""
+
+import asyncio
+from types import SimpleNamespace
+
+from purge_daemon import PurgeCoalescer, PurgeDaemon, PurgeRequest, STATUS_FAILED, STATUS_SUCCEEDED
+from purge_models import PurgeJob, UnitResult
+
+
+class FakeClient:
+    """PurgeDaemon 使用的客户端接口的替身：包含 fail_path 的单元失败，其余成功"""
+
+    def __init__(self, endpoints=('ep1', 'ep2'), fail_path=None):
+        self.endpoints = [SimpleNamespace(name=name) for name in endpoints]
+        self.fail_path = fail_path
+        self.journal = None
+        self.submitted = []
+
+    def log(self, message):
+        pass
+
+    async def get_endpoints(self):
+        return self.endpoints
+
+    async def _get_route_index_or_none(self):
+        return None
+
+    async def purge_units(self, units, job_id=None, on_result=None, **kwargs):
+        self.submitted.extend(units)
+        for unit in units:
+            failed = self.fail_path in unit.paths
+            on_result(UnitResult(unit, not failed, 'HTTP 503' if failed else None,
+                                 submitted_at=1.0, completed_at=3.0 if failed else 2.0, attempts=4 if failed else 1))
+        return {}
+
+
+def _request(job_id, endpoints, paths):
+    return PurgeRequest(PurgeJob(job_id, tuple(endpoints), tuple(paths)))
+
+
+def test_flush_coalesces_requests_into_deduplicated_units():
+    client = FakeClient()
+    daemon = PurgeDaemon(client, max_paths_per_request=10)
+    batch = [_request('a', ['ep1'], ['/a.js', '/b.js']), _request('b', ['ep1'], ['/b.js', '/c.js']),
+             _request('c', [], ['/*'])]
+
+    asyncio.run(daemon._flush(batch))
+
+    assert sorted((unit.endpoint_name, unit.paths) for unit in client.submitted) == [
+        ('ep1', ('/*',)), ('ep2', ('/*',))
+    ]
+    assert all(request.status == STATUS_SUCCEEDED for request in batch)
+    # 省略 endpoints 的请求展开为全部 endpoints
+    assert batch[2].job.endpoint_names == ('ep1', 'ep2')
+    assert daemon.stats['units'] == 2
+
+
+def test_failed_unit_only_fails_requests_whose_paths_it_covers():
+    client = FakeClient(fail_path='/b/*')
+    daemon = PurgeDaemon(client, max_paths_per_request=1)
+    first = _request('first', ['ep1'], ['/a.js'])
+    second = _request('second', ['ep1', 'ep2'], ['/b/*'])
+    covered = _request('covered', ['ep1'], ['/b/x.js'])
+
+    asyncio.run(daemon._flush([first, second, covered]))
+
+    assert first.status == STATUS_SUCCEEDED
+    outcome = first.result.outcomes['ep1']
+    assert (outcome.units, outcome.attempts, outcome.elapsed, outcome.error) == (1, 1, 1.0, None)
+
+    assert second.status == STATUS_FAILED
+    assert second.result.outcomes['ep1'].error == 'HTTP 503'
+    assert second.result.outcomes['ep1'].attempts == 4
+    assert not second.result.outcomes['ep2'].success
+
+    # '/b/x.js' 被合并进 '/b/*'，其结果跟随覆盖它的单元
+    assert covered.status == STATUS_FAILED
+    assert covered.result.outcomes['ep1'].units == 1
+
+
+def test_flush_reports_planning_errors_to_every_request():
+    class BrokenClient(FakeClient):
+        async def get_endpoints(self):
+            raise RuntimeError('boom')
+
+    daemon = PurgeDaemon(BrokenClient())
+    request = _request('a', [], ['/*'])
+
+    asyncio.run(daemon._flush([request]))
+
+    assert request.status == STATUS_FAILED
+    assert request.result.error == 'boom'
+
+
+def test_coalescer_flushes_after_quiet_window_and_max_delay():
+    batches = []
+
+    async def flush(batch):
+        batches.append([request.request_id for request in batch])
+
+    async def run():
+        coalescer = PurgeCoalescer(flush, window=0.05, max_delay=0.12)
+        coalescer.start()
+        coalescer.submit(_request('a', ['ep1'], ['/a']))
+        coalescer.submit(_request('b', ['ep1'], ['/b']))
+        await asyncio.sleep(0.1)
+        # 持续到达的请求在 max_delay 到期时一起提交
+        for index in range(6):
+            coalescer.submit(_request(f'c{index}', ['ep1'], ['/c']))
+            await asyncio.sleep(0.03)
+        await coalescer.close()
+
+    asyncio.run(run())
+
+    assert batches[0] == ['a', 'b']
+    assert len(batches) == 3
+    assert sum(len(batch) for batch in batches) == 8
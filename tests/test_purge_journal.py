@@ -0,0 +1,118 @@
+"""purge_journal：任务日志、--resume 只重试未完成单元、幂等窗口"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from async_purge import AsyncAzureFrontDoorPurgeClient
+from purge_journal import PurgeJournal, make_unit_key
+from purge_models import PurgeUnit, UnitResult
+from retry_policy import RetryPolicy
+
+
+SCOPE = ('sub', 'rg', 'fd')
+
+
+class FakeAfdEndpoints:
+    """begin_purge_content 立即返回已结束的 LRO；failing 中的 endpoint 以 Failed 结束"""
+
+    def __init__(self):
+        self.failing = set()
+        self.calls = []
+
+    async def begin_purge_content(self, resource_group_name, profile_name, endpoint_name, contents, **kwargs):
+        self.calls.append((endpoint_name, tuple(contents['content_paths'])))
+        status = 'Failed' if endpoint_name in self.failing else 'Succeeded'
+        polling_method = SimpleNamespace(finished=lambda: True, status=lambda: status)
+        return SimpleNamespace(polling_method=lambda: polling_method)
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setenv('PURGE_STATE_DIR', str(tmp_path))
+    journal = PurgeJournal(str(tmp_path / 'journal.db'))
+    yield journal
+    journal.close()
+
+
+def _client(journal, **kwargs):
+    cdn = SimpleNamespace(afd_endpoints=FakeAfdEndpoints())
+    return AsyncAzureFrontDoorPurgeClient(
+        'tenant', 'client', 'secret', *SCOPE, log=lambda message: None,
+        retry_policy=RetryPolicy(max_attempts=1), journal=journal, cdn_client=cdn, **kwargs
+    )
+
+
+def _purge(client, units, **kwargs):
+    return asyncio.run(client.purge_units(units, poll_interval=0.01, **kwargs))
+
+
+def test_unit_key_ignores_path_order_and_name_case():
+    first = PurgeUnit('EP1', ('/a', '/b'), ('www.example.com',))
+    second = PurgeUnit('ep1', ('/b', '/a'), ('WWW.example.com',))
+
+    assert make_unit_key(*SCOPE, first) == make_unit_key(*SCOPE, second)
+    assert make_unit_key(*SCOPE, first) != make_unit_key('sub', 'rg', 'other', first)
+    assert make_unit_key(*SCOPE, first) != make_unit_key(*SCOPE, PurgeUnit('ep1', ('/a', '/b')))
+
+
+def test_incomplete_units_excludes_succeeded_and_skipped(journal):
+    units = [PurgeUnit('ep1', ('/a',)), PurgeUnit('ep2', ('/a',), ('www.example.com',)), PurgeUnit('ep3', ('/a',))]
+    job_id = journal.create_job(*SCOPE, units)
+    keys = [make_unit_key(*SCOPE, unit) for unit in units]
+
+    journal.mark_submitted(job_id, keys[0])
+    journal.mark_completed(job_id, keys[0], UnitResult(units[0], True, completed_at=1.0, attempts=1))
+    journal.mark_completed(job_id, keys[1], UnitResult(units[1], False, 'HTTP 503', attempts=1))
+    journal.mark_completed(job_id, keys[2], UnitResult(units[2], True), skipped=True)
+
+    assert journal.incomplete_units(job_id) == [units[1]]
+    assert journal.get_job(job_id)['profile'] == 'fd'
+    assert journal.get_job('missing') is None
+
+
+def test_resume_resubmits_only_failed_units(journal):
+    client = _client(journal)
+    client.cdn_client.afd_endpoints.failing = {'ep2'}
+    units = [PurgeUnit('ep1', ('/a',)), PurgeUnit('ep2', ('/a',))]
+
+    results = _purge(client, units)
+    job_id = client.job_id
+    assert results['ep1'].success and not results['ep2'].success
+
+    retry = _client(journal, idempotency_window=0)
+    results = asyncio.run(retry.resume(job_id, poll_interval=0.01))
+
+    assert list(results) == ['ep2'] and results['ep2'].success
+    assert retry.cdn_client.afd_endpoints.calls == [('ep2', ('/a',))]
+    assert journal.incomplete_units(job_id) == []
+
+
+def test_resume_rejects_unknown_or_foreign_jobs(journal):
+    job_id = journal.create_job('sub', 'rg', 'other-fd', [PurgeUnit('ep1', ('/a',))])
+    client = _client(journal)
+
+    with pytest.raises(ValueError):
+        asyncio.run(client.resume('missing'))
+    with pytest.raises(ValueError):
+        asyncio.run(client.resume(job_id))
+
+
+def test_recently_succeeded_units_are_skipped_within_the_window(journal):
+    units = [PurgeUnit('ep1', ('/a', '/b'))]
+    _purge(_client(journal), units)
+
+    repeat = _client(journal)
+    skipped = []
+    results = _purge(repeat, [PurgeUnit('ep1', ('/b', '/a'))], on_result=skipped.append)
+
+    assert repeat.cdn_client.afd_endpoints.calls == []
+    assert results['ep1'].success and results['ep1'].attempts == 0
+    assert [result.attempts for result in skipped] == [0]
+    assert journal.incomplete_units(repeat.job_id) == []
+
+    # 窗口为 0 时重新提交
+    fresh = _client(journal, idempotency_window=0)
+    _purge(fresh, units)
+    assert fresh.cdn_client.afd_endpoints.calls == [('ep1', ('/a', '/b'))]
@@ -0,0 +1,27 @@
+"""purge_plan：提交时间与轮询时间点的估计"""
+
+from purge_plan import estimate_submit_times, poll_ticks
+
+
+def test_submit_times_follow_burst_then_rate():
+    times = estimate_submit_times(6, max_concurrency=100, rate=2, burst=4, initial_concurrency=100,
+                                  submit_latency=0)
+
+    assert times == [0, 0, 0, 0, 0.5, 1.0]
+
+
+def test_submit_times_respect_concurrency():
+    times = estimate_submit_times(4, max_concurrency=1, rate=0, initial_concurrency=1, submit_latency=1)
+
+    assert times == [1, 2, 3, 4]
+
+
+def test_poll_ticks_back_off_without_new_units():
+    assert poll_ticks(10, poll_interval=1, poll_backoff=2, max_poll_interval=4) == [1, 3, 7, 11]
+
+
+def test_poll_ticks_reset_when_units_keep_arriving():
+    # 与 _poll_all 一致：第一个单元提交前不退避，之后每轮有新单元时恢复初始间隔
+    ticks = poll_ticks(12, poll_interval=1, poll_backoff=2, max_poll_interval=4, arrivals=[2.5, 3.5, 4.5])
+
+    assert ticks == [1, 2, 3, 4, 5, 6, 8, 12]
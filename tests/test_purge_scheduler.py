@@ -0,0 +1,239 @@
+"""purge_scheduler：先提交后轮询、重试、限流重新排队和熔断"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import purge_scheduler
+from purge_models import PurgeUnit
+from purge_scheduler import PurgeScheduler, _UnitState
+from rate_control import RateController
+from retry_policy import CircuitBreaker, RetryPolicy
+
+
+class HttpError(Exception):
+    """带状态码和响应头的 ARM 错误"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FakePoller:
+    """AsyncLROPoller 的最小替身：轮询 polls_needed 次后以 status 结束"""
+
+    def __init__(self, events=None, polls_needed=1, status='Succeeded'):
+        self.events = events if events is not None else []
+        self.polls_needed = polls_needed
+        self.polls = 0
+        self._status = status
+
+    def polling_method(self):
+        return self
+
+    def finished(self):
+        return self.polls >= self.polls_needed
+
+    async def update_status(self):
+        self.polls += 1
+        self.events.append('poll')
+
+    def status(self):
+        return self._status
+
+
+class FakeService:
+    """按预设的错误序列响应每个单元的提交"""
+
+    def __init__(self, errors=None, polls_needed=1, lro_status=None):
+        self.errors = {key: list(value) for key, value in (errors or {}).items()}
+        self.polls_needed = polls_needed
+        self.lro_status = {key: list(value) for key, value in (lro_status or {}).items()}
+        self.events = []
+        self.submits = []
+
+    async def submit(self, unit):
+        key = unit.paths[0]
+        self.submits.append(key)
+        self.events.append('submit')
+        await asyncio.sleep(0)
+        if self.errors.get(key):
+            raise self.errors[key].pop(0)
+        status = self.lro_status[key].pop(0) if self.lro_status.get(key) else 'Succeeded'
+        return FakePoller(self.events, self.polls_needed, status)
+
+
+def _scheduler(service, **kwargs):
+    kwargs.setdefault('retry_policy', RetryPolicy(base_delay=0.001, max_delay=0.001, jitter=False))
+    kwargs.setdefault('rate_controller', RateController(rate=1000, burst=1000))
+    return PurgeScheduler(service.submit, poll_interval=0.01, max_poll_interval=0.02, **kwargs)
+
+
+def _run(scheduler, units):
+    async def collect():
+        return {result.unit.paths[0]: result async for result in scheduler.run(units)}
+    return asyncio.run(collect())
+
+
+def test_submits_every_unit_before_polling():
+    service = FakeService(polls_needed=2)
+    units = [PurgeUnit('ep', (f'/{i}',)) for i in range(5)]
+
+    results = _run(_scheduler(service), units)
+
+    assert all(result.success and result.attempts == 1 for result in results.values())
+    assert service.events[:5] == ['submit'] * 5
+    assert service.events.count('poll') == 10
+
+
+def test_transient_errors_use_every_attempt_without_tripping_the_breaker():
+    # 同一 endpoint 的两个单元都连续遇到 3 次 503，第 4 次成功
+    service = FakeService(errors={'/a': [HttpError(503)] * 3, '/b': [HttpError(503)] * 3})
+    units = [PurgeUnit('ep', ('/a',)), PurgeUnit('ep', ('/b',))]
+    scheduler = _scheduler(service, retry_policy=RetryPolicy(max_attempts=4, base_delay=0.001, jitter=False))
+
+    results = _run(scheduler, units)
+
+    assert [(results[key].success, results[key].attempts) for key in ('/a', '/b')] == [(True, 4), (True, 4)]
+    assert len(service.submits) == 8
+    assert scheduler.retried == 6
+
+
+def test_final_failure_keeps_the_real_error():
+    service = FakeService(errors={'/a': [HttpError(503)] * 2})
+    scheduler = _scheduler(service, retry_policy=RetryPolicy(max_attempts=2, base_delay=0.001, jitter=False))
+
+    result = _run(scheduler, [PurgeUnit('ep', ('/a',))])['/a']
+
+    assert not result.success
+    assert result.attempts == 2
+    assert result.error == 'HTTP 503'
+
+
+def test_fatal_errors_are_not_retried():
+    service = FakeService(errors={'/a': [HttpError(403)]})
+    result = _run(_scheduler(service), [PurgeUnit('ep', ('/a',))])['/a']
+
+    assert (result.success, result.attempts, result.error) == (False, 1, 'HTTP 403')
+
+
+def test_failed_lro_is_resubmitted():
+    service = FakeService(lro_status={'/a': ['Failed']})
+    result = _run(_scheduler(service), [PurgeUnit('ep', ('/a',))])['/a']
+
+    assert (result.success, result.attempts) == (True, 2)
+
+
+def test_throttled_submit_is_requeued_without_counting_an_attempt():
+    service = FakeService(errors={'/a': [HttpError(429, {'retry-after-ms': '20'})]})
+    controller = RateController(rate=1000, burst=1000)
+    scheduler = _scheduler(service, rate_controller=controller)
+
+    started = time.monotonic()
+    result = _run(scheduler, [PurgeUnit('ep', ('/a',))])['/a']
+
+    assert (result.success, result.attempts) == (True, 1)
+    assert (scheduler.throttled, scheduler.retried) == (1, 0)
+    assert controller.throttle_count == 1
+    assert time.monotonic() - started >= 0.02
+
+
+def test_open_circuit_defers_units_until_the_probe_succeeds():
+    # 第一个单元最终失败后熔断器打开；同一 endpoint 的下一个单元等到半开时再提交，而不是直接失败
+    service = FakeService(errors={'/a': [HttpError(400)]})
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    scheduler = _scheduler(service, circuit_breaker=breaker,
+                           rate_controller=RateController(rate=1000, burst=1000, initial_concurrency=1,
+                                                          max_concurrency=1))
+
+    started = time.monotonic()
+    results = _run(scheduler, [PurgeUnit('ep', ('/a',)), PurgeUnit('ep', ('/b',))])
+
+    assert not results['/a'].success
+    assert (results['/b'].success, results['/b'].attempts) == (True, 1)
+    assert time.monotonic() - started >= 0.05
+    assert breaker.allow('ep')
+
+
+def test_half_open_probe_keeps_its_retries_and_other_units_wait():
+    service = FakeService(errors={'/probe': [HttpError(503)]})
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure('ep')
+    scheduler = _scheduler(service, circuit_breaker=breaker)
+
+    results = _run(scheduler, [PurgeUnit('ep', ('/probe',)), PurgeUnit('ep', ('/next',))])
+
+    assert (results['/probe'].success, results['/probe'].attempts) == (True, 2)
+    assert (results['/next'].success, results['/next'].attempts) == (True, 1)
+    # 试探成功之前其他单元不提交
+    assert service.submits == ['/probe', '/probe', '/next']
+
+
+def test_poll_interval_backs_off_and_resets_when_units_are_admitted(monkeypatch):
+    scheduler = PurgeScheduler(None, poll_interval=1, poll_backoff=2, max_poll_interval=8)
+    first, second = _UnitState(PurgeUnit('ep', ('/a',))), _UnitState(PurgeUnit('ep', ('/b',)))
+    first.poller = FakePoller(polls_needed=100)
+    second.poller = FakePoller(polls_needed=100)
+    scheduler._pending = {id(first): first}
+    intervals = []
+
+    class Stop(Exception):
+        pass
+
+    async def fake_sleep(delay):
+        intervals.append(delay)
+        if len(intervals) == 3:
+            scheduler._pending[id(second)] = second
+        if len(intervals) == 8:
+            raise Stop
+
+    monkeypatch.setattr(purge_scheduler, 'asyncio', SimpleNamespace(sleep=fake_sleep, gather=asyncio.gather))
+    with pytest.raises(Stop):
+        asyncio.run(scheduler._poll_all())
+
+    assert intervals == [1, 1, 2, 1, 2, 4, 8, 8]
+
+
+def test_poll_interval_does_not_grow_while_idle(monkeypatch):
+    scheduler = PurgeScheduler(None, poll_interval=1, poll_backoff=2, max_poll_interval=8)
+    scheduler._pending = {}
+    intervals = []
+
+    class Stop(Exception):
+        pass
+
+    async def fake_sleep(delay):
+        intervals.append(delay)
+        if len(intervals) == 4:
+            raise Stop
+
+    monkeypatch.setattr(purge_scheduler, 'asyncio', SimpleNamespace(sleep=fake_sleep, gather=asyncio.gather))
+    with pytest.raises(Stop):
+        asyncio.run(scheduler._poll_all())
+
+    assert intervals == [1, 1, 1, 1]
+
+
+def test_max_concurrency_limits_one_run_without_changing_the_shared_controller():
+    controller = RateController(rate=1000, burst=1000, initial_concurrency=50, max_concurrency=50)
+    in_flight = peak = 0
+
+    async def submit(unit):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.005)
+        in_flight -= 1
+        return FakePoller()
+
+    scheduler = PurgeScheduler(submit, poll_interval=0.01, rate_controller=controller, max_concurrency=3)
+    results = _run(scheduler, [PurgeUnit('ep', (f'/{index}',)) for index in range(12)])
+
+    assert len(results) == 12
+    assert peak == 3
+    assert controller.max_concurrency == 50
+    # 超过共享控制器上限的值按控制器上限处理
+    assert PurgeScheduler(submit, rate_controller=controller, max_concurrency=500).max_concurrency == 50
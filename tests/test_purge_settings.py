@@ -0,0 +1,32 @@
+"""purge_settings：状态目录只在第一次写入时创建"""
+
+import os
+
+from endpoint_inventory import EndpointInventory
+from purge_coordination import PurgeCoordinator
+from purge_journal import PurgeJournal
+from purge_settings import get_state_path
+from route_index import RouteIndex, save_cached_index
+
+
+def test_state_dir_is_created_on_first_write(tmp_path, monkeypatch):
+    state_dir = tmp_path / 'state'
+    monkeypatch.setenv('PURGE_STATE_DIR', str(state_dir))
+
+    assert get_state_path('journal.db') == str(state_dir / 'journal.db')
+    EndpointInventory()
+    assert not state_dir.exists()
+
+    save_cached_index('key', RouteIndex([]))
+    assert os.path.exists(state_dir / 'route_index.json')
+
+
+def test_journal_and_coordination_create_the_state_dir(tmp_path, monkeypatch):
+    for name, open_store in (('journal', PurgeJournal), ('coordination', PurgeCoordinator)):
+        state_dir = tmp_path / name
+        monkeypatch.setenv('PURGE_STATE_DIR', str(state_dir))
+
+        store = open_store()
+        store.close()
+
+        assert state_dir.is_dir()
@@ -0,0 +1,83 @@
+"""rate_control：令牌桶、AIMD 并发控制与共享并发预算"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from rate_control import (
+    ConcurrencyBudget, RateController, TokenBucket, DEFAULT_THROTTLE_DELAY, get_retry_after, get_throttle_delay
+)
+
+
+def test_paused_controller_does_not_hold_shared_budget():
+    budget = ConcurrencyBudget(1)
+    paused = RateController(budget=budget)
+    ready = RateController(budget=budget)
+    paused.on_throttle(0.3)
+    entered = {}
+
+    async def call(name, controller):
+        async with controller.slot():
+            entered[name] = time.monotonic()
+
+    async def run():
+        started = time.monotonic()
+        waiting = asyncio.create_task(call('paused', paused))
+        await asyncio.sleep(0.01)
+        await call('ready', ready)
+        await waiting
+        return started
+
+    started = asyncio.run(run())
+
+    assert entered['ready'] - started < 0.1
+    assert entered['paused'] - started >= 0.25
+
+
+def test_token_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.1
+
+
+def test_aimd_halves_on_throttle_and_grows_additively():
+    controller = RateController(initial_concurrency=8, min_concurrency=1, max_concurrency=10)
+
+    controller.on_throttle(2.0)
+    assert controller.concurrency == 4
+    assert controller.paused_until > time.monotonic() + 1.5
+    # 冷却期内的第二次限流只暂停，不再减小并发
+    controller.on_throttle(0.1)
+    assert controller.concurrency == 4
+
+    # 大约每完成一个并发窗口的调用加 1
+    for _ in range(4):
+        controller.on_success()
+    assert 4.9 < controller.limit < 5.0
+    for _ in range(100):
+        controller.on_success()
+    assert controller.concurrency == 10
+
+
+def test_observe_headers_decreases_on_low_remaining_quota():
+    controller = RateController(initial_concurrency=8)
+
+    controller.observe_headers(200, {'x-ms-ratelimit-remaining-subscription-writes': '100'})
+    assert controller.concurrency == 8
+    controller.observe_headers(200, {'x-ms-ratelimit-remaining-subscription-writes': '3'})
+    assert controller.concurrency == 4
+    assert controller.paused_until == 0.0
+
+
+def test_throttle_delay_from_retry_after_headers():
+    def error(status_code, headers):
+        return SimpleNamespace(status_code=status_code, response=SimpleNamespace(headers=headers))
+
+    assert get_throttle_delay(error(503, {'Retry-After': '7'})) is None
+    assert get_throttle_delay(error(429, {'Retry-After': '7'})) == 7.0
+    assert get_throttle_delay(error(429, {'retry-after-ms': '250'})) == 0.25
+    assert get_throttle_delay(error(429, {})) == DEFAULT_THROTTLE_DELAY
+    assert get_retry_after({'Retry-After': 'Wed, 21 Oct 2026 07:28:00 GMT'}) is None
@@ -0,0 +1,111 @@
+"""retry_policy：错误分类、指数退避与按清除单元计数的熔断器"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import retry_policy
+from retry_policy import CircuitBreaker, LroFailedError, RetryPolicy, is_retryable
+
+
+class ServiceResponseError(Exception):
+    """与 azure-core 同名的网络错误类型"""
+
+
+def _http_error(status_code):
+    error = Exception(f"HTTP {status_code}")
+    error.status_code = status_code
+    return error
+
+
+@pytest.mark.parametrize('error, expected', [
+    (LroFailedError('Failed'), True),
+    (asyncio.TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (ServiceResponseError(), True),
+    (_http_error(503), True),
+    (_http_error(408), True),
+    (_http_error(401), False),
+    (_http_error(404), False),
+    (ValueError('bad'), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_retry_policy_stops_after_max_attempts_and_on_fatal_errors():
+    policy = RetryPolicy(max_attempts=3)
+
+    assert policy.should_retry(_http_error(503), 1)
+    assert policy.should_retry(_http_error(503), 2)
+    assert not policy.should_retry(_http_error(503), 3)
+    assert not policy.should_retry(_http_error(403), 1)
+
+
+def test_retry_delay_is_exponential_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=False)
+
+    assert [policy.get_delay(attempts) for attempts in range(1, 6)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    jittered = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert all(0 <= jittered.get_delay(3) <= 4.0 for _ in range(50))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(retry_policy.time, 'monotonic', lambda: now.value)
+    return now
+
+
+def test_breaker_opens_after_consecutive_unit_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure('ep')
+    breaker.record_success('ep')
+    breaker.record_failure('ep')
+    assert breaker.allow('ep')
+
+    breaker.record_failure('ep')
+    assert not breaker.allow('ep')
+    assert breaker.retry_after('ep') == 30
+    # 其他 endpoint 不受影响
+    assert breaker.allow('other')
+
+    clock.value += 10
+    assert breaker.retry_after('ep') == 20
+
+
+def test_half_open_allows_a_single_probe_and_its_retries(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure('ep')
+    clock.value += 30
+
+    assert breaker.allow('ep', 'probe')
+    assert not breaker.allow('ep', 'other')
+    assert breaker.allow('ep', 'probe')
+    assert breaker.retry_after('ep') == 0
+
+    # 试探失败：重新打开并重新计时
+    breaker.record_failure('ep')
+    assert not breaker.allow('ep', 'other')
+    clock.value += 30
+    assert breaker.allow('ep', 'other')
+
+    # 试探成功：关闭熔断器
+    breaker.record_success('ep')
+    assert breaker.allow('ep', 'anyone')
+    assert breaker.allow('ep', 'else')
+
+
+def test_released_probe_lets_the_next_caller_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure('ep')
+    clock.value += 30
+    assert breaker.allow('ep', 'probe')
+
+    breaker.release('ep', 'other')
+    assert not breaker.allow('ep', 'other')
+    breaker.release('ep', 'probe')
+    assert breaker.allow('ep', 'other')
@@ -0,0 +1,40 @@
+"""rollout：波次分组"""
+
+import pytest
+
+from path_planner import plan_purge_units
+from route_index import RouteEntry, RouteIndex
+from rollout import WAVE_BY_ENDPOINT, WAVE_BY_PATH, group_wave_items
+
+
+def _names(groups):
+    return [[(unit.endpoint_name, unit.paths) for unit in group] for group in groups]
+
+
+def test_group_by_endpoint_keeps_first_appearance_order():
+    units = plan_purge_units(['ep1', 'ep2'], ['/a', '/b', '/c'], 2)
+
+    assert _names(group_wave_items(units, WAVE_BY_ENDPOINT)) == [
+        [('ep1', ('/a', '/b')), ('ep1', ('/c',))],
+        [('ep2', ('/a', '/b')), ('ep2', ('/c',))],
+    ]
+
+
+def test_group_by_path_aligns_chunks_even_when_routes_filter_paths():
+    index = RouteIndex([
+        RouteEntry('web', 'default', ('/*',), ('www.example.com',)),
+        RouteEntry('static', 'images', ('/images/*',), ('static.example.com',)),
+    ])
+    paths = ['/index.html', '/images/a.png', '/images/b.png', '/about.html']
+    units = plan_purge_units(['web', 'static'], paths, 2, index)
+
+    # 两个 endpoints 的路径块内容不同，仍按路径块序号组成两组，而不是每个单元各自一组
+    assert _names(group_wave_items(units, WAVE_BY_PATH)) == [
+        [('web', ('/index.html', '/images/a.png')), ('static', ('/images/a.png', '/images/b.png'))],
+        [('web', ('/images/b.png', '/about.html'))],
+    ]
+
+
+def test_unknown_grouping_is_rejected():
+    with pytest.raises(ValueError):
+        group_wave_items([], 'domain')
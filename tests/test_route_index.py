@@ -0,0 +1,88 @@
+"""route_index：路径模式匹配、按路由规划清除单元与索引缓存"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from path_planner import plan_purge_units
+from route_index import (
+    RouteEntry, RouteIndex, invalidate_cached_index, load_cached_index, patterns_overlap, save_cached_index
+)
+
+
+@pytest.mark.parametrize('purge_path, route_pattern, expected', [
+    ('/images/a.png', '/*', True),
+    ('/images/a.png', '/images/*', True),
+    ('/Images/A.png?v=2', '/images/*', True),
+    ('/css/site.css', '/images/*', False),
+    ('/images/*', '/images/thumbs/*', True),
+    ('/images/thumbs/*', '/images/*', True),
+    ('/images/*', '/api/*', False),
+    ('/api/*', '/api/health', True),
+    ('/index.html', '/index.html', True),
+    ('/index.html', '/about.html', False),
+])
+def test_patterns_overlap(purge_path, route_pattern, expected):
+    assert patterns_overlap(purge_path, route_pattern) is expected
+
+
+def _index():
+    return RouteIndex([
+        RouteEntry('web', 'default', ('/*',), ('web.azurefd.net', 'www.example.com')),
+        RouteEntry('static', 'images', ('/images/*',), ('static.example.com',)),
+        RouteEntry('static', 'css', ('/css/*',), ('cdn.example.com',)),
+    ])
+
+
+def test_index_lookups():
+    index = _index()
+
+    assert index.endpoints_for_path('/images/a.png') == {'web', 'static'}
+    assert index.endpoints_for_path('/js/app.js') == {'web'}
+    assert index.endpoints_for_host('WWW.example.com') == {'web'}
+    assert index.endpoints_for_host('unknown.example.com') == set()
+    assert index.serves('static', '/css/site.css')
+    assert not index.serves('static', '/js/app.js')
+    assert not index.serves('missing', '/*')
+    assert index.domains_for('static', ['/images/a.png']) == ('static.example.com',)
+    assert index.domains_for('static', ['/*']) == ('cdn.example.com', 'static.example.com')
+
+
+def test_route_aware_planning_skips_endpoints_without_matching_routes():
+    units = plan_purge_units(['web', 'static'], ['/js/app.js', '/images/a.png'], 10, _index())
+
+    assert sorted((unit.endpoint_name, unit.paths, unit.domains) for unit in units) == [
+        ('static', ('/images/a.png',), ('static.example.com',)),
+        ('web', ('/js/app.js', '/images/a.png'), ('web.azurefd.net', 'www.example.com')),
+    ]
+
+
+def test_from_models_skips_disabled_routes_and_resolves_domains():
+    endpoints = [SimpleNamespace(name='web', host_name='web.azurefd.net')]
+    domain_id = '/subscriptions/s/resourceGroups/rg/providers/Microsoft.Cdn/profiles/fd/customDomains/www'
+    custom_domains = [SimpleNamespace(id=domain_id, host_name='www.example.com')]
+    routes = {'web': [
+        SimpleNamespace(name='main', enabled_state='Enabled', patterns_to_match=['/*'],
+                        custom_domains=[SimpleNamespace(id=domain_id.upper())],
+                        link_to_default_domain='Disabled', origin_group=SimpleNamespace(id='/x/originGroups/og')),
+        SimpleNamespace(name='old', enabled_state='Disabled', patterns_to_match=['/old/*']),
+    ]}
+
+    index = RouteIndex.from_models(endpoints, routes, custom_domains)
+
+    assert index.routes == [RouteEntry('web', 'main', ('/*',), ('www.example.com',), 'og')]
+
+
+def test_index_round_trips_through_the_disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('PURGE_STATE_DIR', str(tmp_path))
+    index = _index()
+
+    assert RouteIndex.from_dict(index.to_dict()).routes == index.routes
+    assert load_cached_index('key') is None
+
+    save_cached_index('key', index)
+    assert load_cached_index('key').routes == index.routes
+    assert load_cached_index('key', ttl=0) is None
+
+    invalidate_cached_index('key')
+    assert load_cached_index('key') is None
@@ -5,79 +5,64 @@ Azure Front Door 缓存刷新验证工具
 这个脚本帮助您验证缓存刷新是否真正生效。
 """
 
-import requests
-import time
-from datetime import datetime
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Optional
 
-def test_cache_refresh(urls: List[str], test_iterations: int = 3) -> Dict:
+from cache_probe import CacheProber, DEFAULT_CONCURRENCY, DEFAULT_INTERVAL, DEFAULT_TIMEOUT, MODE_GET, pop_label
+from latency_stats import ALL, compute_stats, compare_stats, describe_row, describe_comparison
+
+def test_cache_refresh(urls: List[str], test_iterations: int = 3,
+                       concurrency: int = DEFAULT_CONCURRENCY,
+                       interval: float = DEFAULT_INTERVAL,
+                       timeout: float = DEFAULT_TIMEOUT,
+                       mode: str = MODE_GET,
+                       edge_ips: Optional[Dict[str, List[str]]] = None) -> Dict:
     """
     测试缓存刷新效果
     
+    所有 URL 并发测试，共用 keep-alive 连接池；每个 URL 的多次请求按 interval 独立调度。
+    指定 edge_ips 时同一请求并发发送到每个边缘 IP（Host 头和 SNI 不变），用于一次检查多个 POP。
+    
     Args:
         urls: 要测试的URL列表
         test_iterations: 测试次数
+        concurrency: 同时在途的最大请求数
+        interval: 同一 URL 两次请求之间的间隔（秒）
+        timeout: 单个请求的超时（秒）
+        mode: 探测模式：get（完整下载）、head、range（只取 1 字节）、stream（流式计算内容摘要）
+        edge_ips: 主机名到边缘 IP 的映射（见 edge_resolver.resolve_edge_ips）
     
     Returns:
         测试结果字典
     """
-    results = {}
-    
     print("🧪 开始缓存刷新验证测试")
+    print(f"🔍 测试 {len(urls)} 个 URL，每个 {test_iterations} 次，最大并发 {concurrency}，探测模式 {mode}")
+    if edge_ips:
+        edge_count = len({ip for ips in edge_ips.values() for ip in ips})
+        print(f"📍 固定到 {edge_count} 个边缘 IP，每个 IP 分别测试")
     print("=" * 50)
     
-    for url in urls:
-        print(f"\n🔍 测试 URL: {url}")
-        results[url] = []
-        
-        for i in range(test_iterations):
-            try:
-                print(f"  第 {i+1} 次请求...")
-                
-                # 发起HTTP请求
-                start_time = time.time()
-                response = requests.get(url, timeout=10)
-                response_time = time.time() - start_time
-                
-                # 获取响应头信息
-                headers_info = {
-                    'status_code': response.status_code,
-                    'response_time': round(response_time * 1000, 2),  # 毫秒
-                    'timestamp': datetime.now().strftime('%H:%M:%S'),
-                    'cache_control': response.headers.get('Cache-Control', 'N/A'),
-                    'etag': response.headers.get('ETag', 'N/A'),
-                    'last_modified': response.headers.get('Last-Modified', 'N/A'),
-                    'x_cache': response.headers.get('X-Cache', 'N/A'),
-                    'x_azure_ref': response.headers.get('X-Azure-Ref', 'N/A'),
-                    'content_length': response.headers.get('Content-Length', 'N/A')
-                }
-                
-                results[url].append(headers_info)
-                
-                print(f"    ✅ 状态: {headers_info['status_code']}, "
-                      f"响应时间: {headers_info['response_time']}ms, "
-                      f"X-Cache: {headers_info['x_cache']}")
-                
-                # 间隔一段时间
-                if i < test_iterations - 1:
-                    time.sleep(2)
-                    
-            except requests.RequestException as e:
-                error_info = {
-                    'error': str(e),
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }
-                results[url].append(error_info)
-                print(f"    ❌ 请求失败: {str(e)}")
-    
-    return results
+    prober = CacheProber(concurrency=concurrency, interval=interval, timeout=timeout, mode=mode)
+    return asyncio.run(prober.run(urls, test_iterations, edge_ips))
 
-def analyze_results(results: Dict) -> None:
-    """分析测试结果"""
+def analyze_results(results: Dict, baseline: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    分析测试结果
+    
+    Args:
+        results: test_cache_refresh 的返回值
+        baseline: 之前运行的统计报告（例如清除前），指定时输出对比
+    
+    Returns:
+        统计报告行（见 latency_stats.compute_stats）；指定 baseline 时为对比行（见 latency_stats.compare_stats）
+    """
     print("\n" + "=" * 50)
     print("📊 缓存刷新验证结果分析")
     print("=" * 50)
     
+    stats = compute_stats(results)
+    stats_by_group = {(row['url'], row['cache_state']): row for row in stats}
+    
     for url, tests in results.items():
         print(f"\n🌐 URL: {url}")
         print("-" * 40)
@@ -101,23 +86,87 @@ def analyze_results(results: Dict) -> None:
         unique_cache_states = set(cache_headers)
         
         print(f"💾 Cache 状态变化: {list(unique_cache_states)}")
+        for line in describe_row(stats_by_group[(url, ALL)]):
+            print(line)
         
-        # 分析 ETag 变化
+        # 分析内容变化：stream 模式优先比较内容摘要，其他模式比较 ETag
+        digests = {t['digest'] for t in successful_tests if 'digest' in t}
         etags = [t.get('etag', 'N/A') for t in successful_tests]
         unique_etags = set(etags)
         
-        if len(unique_etags) > 1:
+        if digests:
+            if len(digests) > 1:
+                print("🔄 检测到内容变化 (内容摘要不同)")
+            else:
+                print("📌 内容未变化 (内容摘要相同)")
+        elif len(unique_etags) > 1:
             print("🔄 检测到内容变化 (ETag不同)")
         else:
             print("📌 内容未变化 (ETag相同)")
+        if not digests and any(etag == 'N/A' or etag.startswith('W/') for etag in unique_etags):
+            print("💡 ETag 缺失或为弱 ETag，可使用 stream 模式按内容摘要判断")
         
         # 显示详细信息
         print("\n详细请求信息:")
         for i, test in enumerate(successful_tests, 1):
+            edge = f" - 边缘:{test['edge_ip']} ({test['pop']})" if 'edge_ip' in test else ''
             print(f"  {i}. {test['timestamp']} - "
                   f"状态:{test['status_code']} - "
                   f"时间:{test['response_time']}ms - "
-                  f"Cache:{test.get('x_cache', 'N/A')}")
+                  f"Cache:{test.get('x_cache', 'N/A')}{edge}")
+        
+        if any('edge_ip' in t for t in tests):
+            _analyze_pops(tests)
+    
+    if stats:
+        print(f"\n📈 全部 URL 汇总")
+        print("-" * 40)
+        for line in describe_row(stats_by_group[(ALL, ALL)]):
+            print(line)
+        for row in stats:
+            if row['url'] == ALL and row['cache_state'] != ALL:
+                print(f"  [{row['cache_state']}] {row['samples']} 个样本, "
+                      f"总耗时 p50 {row['total_p50']}ms / p99 {row['total_p99']}ms")
+    
+    if baseline is None:
+        return stats
+    
+    comparison = compare_stats(baseline, stats)
+    print(f"\n🆚 与基线对比（正值表示变慢）")
+    print("-" * 40)
+    for line in describe_comparison(row for row in comparison if row['url'] == ALL):
+        print(line)
+    return comparison
+
+def _analyze_pops(tests: List[Dict]):
+    """按 POP 分组输出同一 URL 在各边缘节点上的缓存状态、内容和延迟，并检查各 POP 的内容是否一致"""
+    by_pop: Dict[str, List[Dict]] = {}
+    for test in tests:
+        by_pop.setdefault(pop_label(test), []).append(test)
+    stats_by_pop = {row['url']: row for row in compute_stats(by_pop) if row['cache_state'] == ALL}
+    
+    print(f"\n📍 按 POP 分组 ({len(by_pop)} 个)")
+    contents = {}
+    for pop, pop_tests in sorted(by_pop.items()):
+        successful = [t for t in pop_tests if 'status_code' in t]
+        ips = sorted({t['edge_ip'] for t in pop_tests if 'edge_ip' in t})
+        row = stats_by_pop[pop]
+        print(f"  [{pop}] 边缘 IP: {', '.join(ips) or '本机解析'}, 成功 {len(successful)}/{len(pop_tests)}")
+        if not successful:
+            continue
+        # 内容标识：stream 模式用内容摘要，其他模式用 ETag
+        content = {t.get('digest', t.get('etag', 'N/A')) for t in successful} - {'N/A'}
+        if content:
+            contents[pop] = content
+        states = sorted({t.get('x_cache', 'N/A') for t in successful})
+        print(f"      Cache: {states}, 命中率 {row['hit_ratio']:.0%}, TTFB p50 {row['ttfb_p50']}ms, "
+              f"内容: {', '.join(sorted(c[:16] for c in content)) or 'N/A'}")
+    
+    distinct = {frozenset(content) for content in contents.values()}
+    if len(distinct) > 1:
+        print("  🔄 各 POP 返回的内容不一致：部分边缘节点可能仍在返回旧内容")
+    elif contents:
+        print("  📌 各 POP 返回的内容一致")
 
 def get_front_door_urls() -> List[str]:
     """获取要测试的Front Door URLs"""